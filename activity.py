@@ -0,0 +1,232 @@
+"""
+Append-only activity feed per business.
+
+Invoice, stock movement and order writes append one document to the
+``activity_events`` collection. Each event carries the fields the dashboard
+shows (message, amount, quantity, status), with customer and product names
+resolved when the event is written. The recent-activity feed is then one
+bounded read on the ``(user_id, created_at)`` index with no lookups per
+row. Events are never updated or deleted, so the collection doubles as an
+audit trail: ``actor_id`` records who was signed in when the change was
+made.
+
+Feeds are read newest first, ordered by ``(created_at, _id)``. A page's
+``next_cursor`` encodes the position of its last event, so the next page
+starts from the index instead of skipping over earlier rows.
+
+``backfill`` builds the creation events of existing invoices and stock
+movements, for data written before the feed existed.
+"""
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+COLLECTION = 'activity_events'
+DEFAULT_LIMIT = 15
+MAX_LIMIT = 100
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+_EPOCH = datetime(1970, 1, 1)
+
+# Newest-first pages per business, and the history of one document
+INDEXES = (
+    ([('user_id', 1), ('created_at', -1), ('_id', -1)], {}),
+    ('entity_id', {}),
+)
+QUERY_SHAPES = (
+    ('feed', {'user_id': ObjectId('0' * 24)}, [('created_at', -1), ('_id', -1)]),
+    ('history', {'entity_id': ObjectId('0' * 24)}, None),
+)
+
+def _to_object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+def _actor_id():
+    # Whoever is signed in; None for scripts and background jobs
+    try:
+        from flask import has_request_context
+        from flask_login import current_user
+        if has_request_context() and current_user and current_user.is_authenticated:
+            return _to_object_id(current_user.id)
+    except Exception:
+        pass
+    return None
+
+def event(user_id, event_type, action, entity_id, message, created_at=None, **fields):
+    """Build an event document; ``fields`` are extra display values"""
+    doc = {
+        'user_id': _to_object_id(user_id),
+        'type': event_type,
+        'action': action,
+        'entity_id': _to_object_id(entity_id),
+        'message': message,
+        'actor_id': _actor_id(),
+        'created_at': created_at or datetime.utcnow()
+    }
+    doc.update(fields)
+    return doc
+
+# Events of each model
+
+def invoice_event(before, after, customer_name=None):
+    """Event for an invoice write, given the documents before and after
+
+    Returns None when nothing worth showing changed.
+    """
+    invoice = after if after is not None else before
+    if invoice is None:
+        return None
+    number = invoice.get('invoice_number') or ''
+    fields = {
+        'amount': float(invoice.get('total_amount') or 0),
+        'status': invoice.get('status') or 'pending'
+    }
+    if before is None:
+        action, message = 'created', f'Invoice {number} created for {customer_name or "Unknown"}'
+    elif after is None:
+        action, message = 'deleted', f'Invoice {number} deleted'
+    elif before.get('status') != after.get('status'):
+        action, message = 'status_changed', f'Invoice {number} marked {fields["status"]}'
+    else:
+        action, message = 'updated', f'Invoice {number} updated'
+    return event(invoice.get('user_id'), 'invoice', action, invoice.get('_id'), message, **fields)
+
+def stock_event(user_id, movement, product_name=None):
+    """Event for a new stock movement document"""
+    movement_type = movement.get('movement_type') or 'adjustment'
+    quantity = movement.get('quantity') or 0
+    return event(
+        user_id, 'stock', movement_type, movement.get('_id'),
+        f'{movement_type.title()} {quantity} units of {product_name or "Unknown"}',
+        created_at=movement.get('created_at'),
+        quantity=quantity,
+        product_id=_to_object_id(movement.get('product_id')),
+        reference=movement.get('reference') or ''
+    )
+
+def order_event(user_id, order, previous_status=None, customer_name=None):
+    """Event for an order insert (previous_status None) or status change"""
+    number = order.get('order_number') or ''
+    status = order.get('status') or 'pending'
+    if previous_status is None:
+        action, message = 'created', f'Order {number} placed by {customer_name or "Unknown"}'
+    else:
+        action, message = 'status_changed', f'Order {number} marked {status}'
+    return event(
+        user_id, 'order', action, order.get('_id'), message,
+        amount=float(order.get('total_amount') or 0),
+        status=status
+    )
+
+def append(database, doc):
+    if doc is not None and doc.get('user_id'):
+        database[COLLECTION].insert_one(doc)
+    return doc
+
+# Reading the feed
+
+def _millis(value):
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+def encode_cursor(doc):
+    return f"{_millis(doc['created_at'])}_{doc['_id']}"
+
+def decode_cursor(cursor):
+    """(created_at, _id) of a cursor; raises ValueError if it is malformed"""
+    millis, _, event_id = (cursor or '').partition('_')
+    if not ObjectId.is_valid(event_id):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(event_id)
+
+def feed_row(doc):
+    """Dashboard dict for an event; MongoDB types are left to the JSON layer"""
+    row = {key: value for key, value in doc.items() if key not in ('_id', 'user_id', 'created_at')}
+    row['id'] = doc['_id']
+    row['date'] = doc['created_at'].strftime(DATE_FORMAT) if doc.get('created_at') else ''
+    return row
+
+def feed(database, user_id, limit=DEFAULT_LIMIT, cursor=None, event_type=None):
+    """(rows, next_cursor) for one page of a business's events, newest first
+
+    next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    query = {'user_id': _to_object_id(user_id)}
+    if event_type:
+        query['type'] = event_type
+    if cursor:
+        created_at, event_id = decode_cursor(cursor)
+        query['$or'] = [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': event_id}}
+        ]
+    # One extra document tells whether there is another page
+    docs = list(database[COLLECTION].find(query).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return [feed_row(doc) for doc in docs[:limit]], next_cursor
+
+# Backfill
+
+def backfill(database, user_id=None, since=None, batch_size=500):
+    """Write creation events for invoices and stock movements that lack one
+
+    Safe to re-run: events are keyed on (type, action, entity_id).
+    Returns the number of events written.
+    """
+    collection = database[COLLECTION]
+    written = 0
+
+    def upsert(docs):
+        nonlocal written
+        for doc in docs:
+            if doc is None or not doc.get('user_id'):
+                continue
+            key = {'type': doc['type'], 'action': doc['action'], 'entity_id': doc['entity_id']}
+            result = collection.update_one(key, {'$setOnInsert': doc}, upsert=True)
+            written += 1 if result.upserted_id is not None else 0
+
+    invoice_query = {}
+    if user_id:
+        invoice_query['user_id'] = _to_object_id(user_id)
+    if since:
+        invoice_query['created_at'] = {'$gte': since}
+    customers = {}
+    batch = []
+    for invoice in database['invoices'].find(invoice_query, batch_size=batch_size):
+        batch.append(invoice)
+        if len(batch) >= batch_size:
+            upsert(_invoice_backfill(database, batch, customers))
+            batch = []
+    if batch:
+        upsert(_invoice_backfill(database, batch, customers))
+
+    product_query = {'user_id': _to_object_id(user_id)} if user_id else {}
+    products = {
+        doc['_id']: doc for doc in database['products'].find(product_query, {'name': 1, 'user_id': 1})
+    }
+    movement_query = {'created_at': {'$gte': since}} if since else {}
+    if user_id:
+        movement_query['product_id'] = {'$in': list(products)}
+    batch = []
+    for movement in database['stock_movements'].find(movement_query, batch_size=batch_size):
+        product = products.get(movement.get('product_id'))
+        if product:
+            batch.append(stock_event(product.get('user_id'), movement, product.get('name')))
+        if len(batch) >= batch_size:
+            upsert(batch)
+            batch = []
+    upsert(batch)
+    return written
+
+def _invoice_backfill(database, invoices, customers):
+    missing = {invoice.get('customer_id') for invoice in invoices} - set(customers)
+    missing.discard(None)
+    if missing:
+        for doc in database['customers'].find({'_id': {'$in': list(missing)}}, {'name': 1}):
+            customers[doc['_id']] = doc.get('name')
+    for invoice in invoices:
+        doc = invoice_event(None, invoice, customers.get(invoice.get('customer_id')))
+        if doc is not None:
+            doc['created_at'] = invoice.get('created_at') or doc['created_at']
+            doc['actor_id'] = None
+        yield doc
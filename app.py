@@ -1,32 +1,57 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 from flask import Flask, render_template, send_from_directory, jsonify, request, send_file, make_response
 from flask_cors import CORS
+import importlib
 import os
 from config import config
 from database import init_app as init_db
 from flask_login import LoginManager
 from models import User
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
+from pdf_service import render_pdf, RenderQueueFull, RenderTimeout
 from io import BytesIO
 import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (module, blueprint, url prefix); imported by create_app. ReportLab and
+# openpyxl are only imported by the views that render PDFs or workbooks.
+BLUEPRINTS = (
+    ('routes.auth_routes', 'auth_bp', '/api/auth'),
+    ('routes.dashboard_routes', 'dashboard_bp', '/api/dashboard'),
+    ('routes.customer_routes', 'customer_bp', '/api/customers'),
+    ('routes.product_routes', 'product_bp', '/api/products'),
+    ('routes.invoice_routes', 'invoice_bp', '/api/invoices'),
+    ('routes.gst_routes', 'gst_bp', '/api/gst'),
+    ('routes.report_routes', 'report_bp', '/api/reports'),
+    ('routes.customer_auth_routes', 'customer_auth_bp', '/api/customer-auth'),
+    ('routes.super_admin_routes', 'super_admin_bp', '/api/super-admin'),
+    ('routes.admin_routes', 'admin_bp', '/api/admin'),
+    ('routes.import_export_routes', 'import_export_bp', '/api'),
+)
 
-# Import routes
-from routes.auth_routes import auth_bp
-from routes.dashboard_routes import dashboard_bp
-from routes.customer_routes import customer_bp
-from routes.product_routes import product_bp
-from routes.invoice_routes import invoice_bp
-from routes.gst_routes import gst_bp
-from routes.report_routes import report_bp
-from routes.customer_auth_routes import customer_auth_bp
-from routes.super_admin_routes import super_admin_bp
-from routes.admin_routes import admin_bp
-from routes.import_export_routes import import_export_bp
+IMPORT_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
+
+class BootTimer:
+    """Milliseconds spent in each step of create_app"""
+    
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        self.steps = {}
+    
+    def mark(self, step):
+        now = time.perf_counter()
+        self.steps[step] = round((now - self._last) * 1000, 1)
+        self._last = now
+    
+    @property
+    def total_ms(self):
+        return round((self._last - self.started) * 1000, 1)
 
 def create_app(config_name='development'):
+    boot = BootTimer()
     app = Flask(__name__, static_folder='frontend/dist', template_folder='frontend/dist')
     app.config.from_object(config[config_name])
     
@@ -45,16 +70,34 @@ def create_app(config_name='development'):
         }
     })
     
+    # Logging first, so everything below reports through it
+    import app_logging
+    app_logging.init_app(app)
+    boot.mark('setup')
+    
+    # Request metrics and /metrics; the pool listener needs the MongoClient not to exist yet
+    import metrics
+    metrics.init_app(app)
+    
+    # Query profiling listens to the MongoClient, so it is set up first
+    import query_profiler
+    query_profiler.init_app(app)
+    
     # Initialize MongoDB connection
     try:
         from database import init_app as init_db
         init_db(app)
+    except AssertionError:
+        # CHECK_QUERY_SHAPES (testing): an unindexed query shape fails the run
+        raise
     except Exception as e:
         # Log error but don't fail app startup - health check should still work
-        import logging
-        logging.warning(f"MongoDB initialization warning: {e}")
-        # Print to stdout for container logs
-        print(f"WARNING: MongoDB initialization issue (app will continue): {e}")
+        logger.warning("MongoDB initialization issue (app will continue): %s", e)
+    boot.mark('database')
+    
+    # Per-request identity map behind the models' find_by_id
+    import identity_map
+    identity_map.init_app(app)
     
     # Initialize login manager
     login_manager = LoginManager()
@@ -91,140 +134,21 @@ def create_app(config_name='development'):
         return jsonify({'status': 'healthy', 'message': 'GST Billing System API is running'}), 200
     
     # Register blueprints
-    app.register_blueprint(auth_bp, url_prefix='/api/auth')
-    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
-    app.register_blueprint(customer_bp, url_prefix='/api/customers')
-    app.register_blueprint(product_bp, url_prefix='/api/products')
-    app.register_blueprint(invoice_bp, url_prefix='/api/invoices')
-    app.register_blueprint(gst_bp, url_prefix='/api/gst')
-    app.register_blueprint(report_bp, url_prefix='/api/reports')
-    app.register_blueprint(customer_auth_bp, url_prefix='/api/customer-auth')
-    app.register_blueprint(super_admin_bp, url_prefix='/api/super-admin')
-    app.register_blueprint(admin_bp, url_prefix='/api/admin')
-    app.register_blueprint(import_export_bp, url_prefix='/api')
+    boot.mark('extensions')
+    for module_name, blueprint_name, url_prefix in BLUEPRINTS:
+        blueprint = getattr(importlib.import_module(module_name), blueprint_name)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+    boot.mark('blueprints')
     
     # PDF Generation endpoint
     @app.route('/api/generate-pdf', methods=['POST'])
     def generate_pdf():
         try:
             data = request.get_json()
-            
-            # Create PDF
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4)
-            elements = []
-            
-            # Styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1  # Center alignment
-            )
-            
-            # Business Header
-            business_name = data.get('business_name', '')
-            business_address = data.get('business_address', '')
-            business_phone = data.get('business_phone', '')
-            
-            elements.append(Paragraph(business_name, title_style))
-            if business_address:
-                elements.append(Paragraph(business_address, styles['Normal']))
-            if business_phone:
-                elements.append(Paragraph(f"Phone: {business_phone}", styles['Normal']))
-            
-            elements.append(Spacer(1, 20))
-            
-            # Invoice Details
             invoice_number = data.get('invoice_number', '')
-            invoice_date = data.get('invoice_date', '')
-            customer_name = data.get('customer_name', '')
-            customer_address = data.get('customer_address', '')
-            customer_phone = data.get('customer_phone', '')
-            
-            invoice_info = [
-                ['Invoice Number:', invoice_number],
-                ['Date:', invoice_date],
-                ['Customer:', customer_name],
-                ['Address:', customer_address],
-                ['Phone:', customer_phone]
-            ]
-            
-            invoice_table = Table(invoice_info, colWidths=[2*inch, 4*inch])
-            invoice_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            elements.append(invoice_table)
-            elements.append(Spacer(1, 20))
-            
-            # Items Table
-            items = data.get('items', [])
-            if items:
-                # Table headers
-                table_data = [['S.No', 'Product', 'Description', 'Quantity', 'Unit Price', 'Total']]
-                
-                # Add items
-                for i, item in enumerate(items, 1):
-                    product = item.get('product', {})
-                    table_data.append([
-                        str(i),
-                        product.get('name', ''),
-                        product.get('description', ''),
-                        str(item.get('quantity', 0)),
-                        f"₹{item.get('unit_price', 0):.2f}",
-                        f"₹{item.get('total', 0):.2f}"
-                    ])
-                
-                # Add total row
-                total_amount = data.get('total_amount', 0)
-                table_data.append(['', '', '', '', 'Total:', f"₹{total_amount:.2f}"])
-                
-                # Create table
-                items_table = Table(table_data, colWidths=[0.5*inch, 1.5*inch, 2*inch, 0.8*inch, 1*inch, 1*inch])
-                items_table.setStyle(TableStyle([
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),  # Header row
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),  # Total row
-                    ('FONTSIZE', (0, 0), (-1, -1), 9),
-                    ('GRID', (0, 0), (-1, -2), 1, colors.black),
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ]))
-                elements.append(items_table)
-            
-            # Custom columns if any
-            custom_columns = data.get('custom_columns', {})
-            if custom_columns:
-                elements.append(Spacer(1, 20))
-                elements.append(Paragraph("Additional Information:", styles['Heading2']))
-                
-                custom_data = [[key, value] for key, value in custom_columns.items()]
-                custom_table = Table(custom_data, colWidths=[2*inch, 4*inch])
-                custom_table.setStyle(TableStyle([
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ]))
-                elements.append(custom_table)
-            
-            # Notes
-            notes = data.get('notes', '')
-            if notes:
-                elements.append(Spacer(1, 20))
-                elements.append(Paragraph("Notes:", styles['Heading2']))
-                elements.append(Paragraph(notes, styles['Normal']))
             
-            # Build PDF
-            doc.build(elements)
-            buffer.seek(0)
+            # Rendered in the PDF worker pool, off the request thread
+            buffer = BytesIO(render_pdf('quick_invoice', data))
             
             return send_file(
                 buffer,
@@ -233,6 +157,10 @@ def create_app(config_name='development'):
                 mimetype='application/pdf'
             )
             
+        except RenderQueueFull as e:
+            return jsonify({'error': str(e)}), 503
+        except RenderTimeout as e:
+            return jsonify({'error': str(e)}), 504
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -253,6 +181,12 @@ def create_app(config_name='development'):
         else:
             return send_from_directory(app.static_folder, 'index.html')
     
+    boot.mark('routes')
+    app.extensions['boot_timings'] = dict(boot.steps, imports=round(IMPORT_MS, 1), total=boot.total_ms)
+    logger.info(
+        "App created in %.0f ms after %.0f ms of imports", boot.total_ms, IMPORT_MS,
+        extra={'boot_ms': app.extensions['boot_timings']}
+    )
     return app
 
 if __name__ == '__main__':
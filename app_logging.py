@@ -0,0 +1,195 @@
+"""
+Structured, non-blocking logging.
+
+Modules log through ``logging.getLogger(__name__)``. ``init_app`` sends
+every record through a ``QueueHandler``, so the thread serving a request
+only enqueues it. A ``QueueListener`` thread formats the record and writes
+it to stdout, where gunicorn and the hosting platform collect it.
+
+* Levels: ``LOG_LEVEL`` applies everywhere. ``LOG_LEVELS`` overrides it
+  per module, e.g. ``routes.invoice_routes=DEBUG,pymongo=WARNING``.
+* Format: ``LOG_FORMAT=json`` writes one JSON object per line with the
+  timestamp, level, logger, message, request fields, any ``extra`` values
+  and the traceback. ``text`` writes a single readable line, which suits
+  development.
+* Request correlation: every request gets an id. It is taken from an
+  incoming ``X-Request-ID`` header or generated, echoed in the response
+  and attached to every record logged while serving the request, along
+  with the method, path and signed-in user.
+* Sampling: DEBUG records are kept with probability
+  ``LOG_DEBUG_SAMPLE_RATE``. Any record can carry its own rate with
+  ``extra={'sample': 0.01}``, for errors that can repeat once per row.
+
+Per-document and per-row messages log at DEBUG. At the default INFO level
+they cost a level check and nothing is formatted.
+
+Each process runs its own listener thread. When gunicorn forks workers
+from a preloaded app, the listener is restarted in each child.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+DEFAULT_LEVEL = 'INFO'
+REQUEST_ID_HEADER = 'X-Request-ID'
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+_REQUEST_FIELDS = ('request_id', 'method', 'path', 'user_id')
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sample'} | set(_REQUEST_FIELDS)
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+def parse_levels(spec):
+    """{'routes.invoice_routes': 'DEBUG'} from 'routes.invoice_routes=DEBUG,...'"""
+    levels = {}
+    for part in (spec or '').split(','):
+        name, _, level = part.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+class RequestContextFilter(logging.Filter):
+    """Adds the request id, method, path and user of the current request"""
+
+    def filter(self, record):
+        record.request_id = '-'
+        record.method = record.path = record.user_id = None
+        try:
+            if has_request_context():
+                record.request_id = g.get('request_id') or '-'
+                record.method = request.method
+                record.path = request.path
+                # The user Flask-Login already loaded; never trigger a load from here
+                user = g.get('_login_user')
+                record.user_id = str(user.id) if getattr(user, 'id', None) else None
+        except Exception:
+            pass
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of DEBUG records, or of records with a ``sample`` rate"""
+
+    def __init__(self, debug_rate=1.0):
+        super().__init__()
+        self.debug_rate = debug_rate
+
+    def filter(self, record):
+        rate = getattr(record, 'sample', None)
+        if rate is None and record.levelno <= logging.DEBUG:
+            rate = self.debug_rate
+        return rate is None or rate >= 1 or random.random() < rate
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key in _REQUEST_FIELDS:
+            value = getattr(record, key, None)
+            if value not in (None, '-'):
+                entry[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Render the message and traceback on the calling thread, where
+        # the arguments are still valid, but keep them apart so the
+        # listener's formatter can place the traceback itself
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+_handler = None
+
+def _restart_listener():
+    # Threads do not survive fork; the queue and handlers do
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener)
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        _listener = None
+
+atexit.register(_stop_listener)
+
+def configure(level=DEFAULT_LEVEL, levels=None, fmt='json', debug_sample_rate=1.0, stream=None):
+    """Install the queue handler on the root logger; safe to call again"""
+    global _listener, _handler
+    _stop_listener()
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if fmt == 'json':
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(-1)
+    _handler = _QueueHandler(log_queue)
+    _handler.addFilter(SamplingFilter(debug_sample_rate))
+    _handler.addFilter(RequestContextFilter())
+    root.addHandler(_handler)
+    root.setLevel(level)
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+def init_app(app):
+    configure(
+        level=app.config.get('LOG_LEVEL', DEFAULT_LEVEL),
+        levels=parse_levels(app.config.get('LOG_LEVELS')),
+        fmt=app.config.get('LOG_FORMAT', 'json'),
+        debug_sample_rate=app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0)
+    )
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
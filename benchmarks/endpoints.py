@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+End-to-end API benchmark against a seeded tenant.
+
+Seeds a synthetic business (see ``seed.py``), signs in as its admin and one
+of its customers through the Flask test client, and times the hot
+endpoints: invoice list and create, inventory, product search, the
+customer catalogue, GST reports and exports. Every response body is read
+in full, so streamed responses are timed until their last byte.
+
+For each endpoint it reports p50/p95/p99 latency, errors, and the MongoDB
+commands per request counted by the query profiler. ``--json`` writes the
+results, along with the commit and the dataset size, so baselines from two
+commits can be compared with ``--compare``.
+
+MongoDB must be running; the target database is dropped and reseeded
+unless ``--no-seed`` reuses an earlier seed. ``--mongomock`` runs in
+memory instead, which suits the tiny and small scales; mongomock does
+not emit command events, so query counts are then missing. Run from the
+repository root:
+
+    python benchmarks/endpoints.py --scale small --runs 30 --json baseline.json
+    python benchmarks/endpoints.py --no-seed --json after.json --compare baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed as seeding
+
+ADMIN = 'admin'
+CUSTOMER = 'customer'
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+def _previous_month():
+    today = datetime.utcnow()
+    return (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+
+def build_endpoints(tenant, customer_ids):
+    """(name, role, method, request factory) for every benchmarked endpoint
+
+    A factory returns (path, request kwargs) and is called for each run,
+    so runs can vary their input.
+    """
+    year, month = _previous_month()
+    hot = [str(product_id) for product_id in tenant['hot_product_ids']]
+    rng = random.Random(tenant.get('random_seed', 42))
+
+    def fixed(path):
+        return lambda: (path, {})
+
+    def create_invoice():
+        items = [{'product_id': product_id, 'quantity': rng.randint(1, 3)} for product_id in rng.sample(hot, 3)]
+        return '/api/invoices/', {'json': {
+            'customer_id': str(rng.choice(customer_ids)),
+            'invoice_date': datetime.utcnow().strftime('%Y-%m-%d'),
+            'status': 'paid',
+            'items': items
+        }}
+
+    def product_search():
+        return f"/api/products/?search={rng.choice(seeding.ITEMS)}", {}
+
+    return [
+        ('invoice_list', ADMIN, 'GET', fixed('/api/invoices/')),
+        ('invoice_list_by_customer', ADMIN, 'GET',
+         lambda: (f'/api/invoices/?customer_id={rng.choice(customer_ids)}', {})),
+        ('invoice_create', ADMIN, 'POST', create_invoice),
+        ('inventory', ADMIN, 'GET', fixed('/api/products/inventory')),
+        ('product_search', ADMIN, 'GET', product_search),
+        ('stock_movements', ADMIN, 'GET', fixed('/api/products/stock-movements')),
+        ('admin_customers', ADMIN, 'GET', fixed('/api/admin/customers')),
+        ('customer_catalogue', CUSTOMER, 'GET', fixed('/api/customer-auth/products')),
+        ('customer_invoices', CUSTOMER, 'GET', fixed('/api/customer-auth/invoices')),
+        ('gst_summary', ADMIN, 'GET', fixed(f'/api/gst/api/gst/summary?year={year}&month={month}')),
+        ('gstr1', ADMIN, 'GET', fixed(f'/api/gst/gst/gstr1?year={year}&month={month}')),
+        ('sales_summary', ADMIN, 'GET', fixed('/api/reports/api/sales-summary?days=30')),
+        ('report_download', ADMIN, 'GET', fixed('/api/reports/api/download?format=excel&type=full&days=90')),
+        ('export_products_csv', ADMIN, 'GET', fixed('/api/export/products?format=csv')),
+        ('export_customers', ADMIN, 'GET', fixed('/api/export/customers'))
+    ]
+
+def _login(client, path, email, password):
+    response = client.post(path, json={'email': email, 'password': password})
+    if response.status_code != 200:
+        raise RuntimeError(f'Login to {path} failed with {response.status_code}: {response.get_data(as_text=True)[:200]}')
+
+def _query_counts(profiler_stats):
+    totals = profiler_stats.snapshot()['endpoints'].values()
+    requests = sum(entry['requests'] for entry in totals)
+    if not requests:
+        return None, None, None
+    commands = sum(entry['commands'] for entry in totals)
+    db_ms = sum(entry['db_ms'] for entry in totals)
+    return round(commands / requests, 1), max(entry['max_commands'] for entry in totals), round(db_ms / requests, 2)
+
+def run_endpoint(client, profiler_stats, method, factory, runs, warmup):
+    for _ in range(warmup):
+        path, kwargs = factory()
+        client.open(path, method=method, **kwargs).close()
+    profiler_stats.reset()
+
+    timings = []
+    errors = 0
+    statuses = {}
+    for _ in range(runs):
+        path, kwargs = factory()
+        start = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        body = response.get_data()
+        response.close()
+        timings.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code >= 400 or _reports_failure(response, body):
+            errors += 1
+    timings.sort()
+    queries_avg, queries_max, db_ms_avg = _query_counts(profiler_stats)
+    return {
+        'runs': runs,
+        'errors': errors,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'mean_ms': round(sum(timings) / len(timings), 2),
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'max_ms': round(timings[-1], 2),
+        'queries_avg': queries_avg,
+        'queries_max': queries_max,
+        'db_ms_avg': db_ms_avg,
+        'bytes': len(body)
+    }
+
+def _reports_failure(response, body):
+    # Several views answer 200 with {'success': false} when something breaks
+    if response.mimetype != 'application/json' or not body.startswith(b'{'):
+        return False
+    try:
+        return json.loads(body).get('success') is False
+    except ValueError:
+        return False
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """Print p50/p95 changes against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = {entry['name']: entry for entry in json.load(f)['endpoints']}
+    print(f"\nagainst {baseline_path}:")
+    for entry in results:
+        before = baseline.get(entry['name'])
+        if not before:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'queries_avg'):
+            if before.get(key) and entry.get(key) is not None:
+                changes.append(f"{key} {(entry[key] - before[key]) / before[key] * 100:+.0f}%")
+        print(f"  {entry['name']:<26} {'  '.join(changes)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot API endpoints against a seeded tenant')
+    seeding.add_scale_arguments(parser)
+    parser.add_argument('--no-seed', action='store_true', help='Reuse the tenant of an earlier seed')
+    parser.add_argument('--mongomock', action='store_true', help='Run against an in-memory mongomock database')
+    parser.add_argument('--runs', type=int, default=20, help='Timed requests per endpoint (default 20)')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint first (default 2)')
+    parser.add_argument('--only', help='Comma-separated endpoint names to run')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Print changes against an earlier --json file')
+    args = parser.parse_args(argv)
+
+    # Config reads the environment when it is imported
+    os.environ['MONGO_URI'] = args.mongo_uri
+    os.environ['QUERY_PROFILER'] = 'true'
+    os.environ['SESSION_COOKIE_SECURE'] = 'false'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('PDF_RENDER_WORKERS', '0')
+    if args.mongomock:
+        import mongomock
+        import database
+        database.MongoClient = mongomock.MongoClient
+
+    from app import create_app
+    from models import get_db
+    import query_profiler
+
+    app = create_app('development')
+    with app.app_context():
+        database = get_db()
+        if database is None:
+            print(f'Could not connect to {args.mongo_uri}', file=sys.stderr)
+            return 1
+        tenant = seeding.load_tenant(database) if args.no_seed else None
+        if tenant is None:
+            if args.no_seed:
+                print('No earlier seed found; seeding now', file=sys.stderr)
+            tenant = seeding.seed_from_args(database, args, log=lambda message: print(f'seeded {message}', file=sys.stderr))
+        customer_ids = [doc['_id'] for doc in database['customers'].find({'user_id': tenant['user_id']}, {'_id': 1}).limit(500)]
+
+    clients = {ADMIN: app.test_client(), CUSTOMER: app.test_client()}
+    _login(clients[ADMIN], '/api/auth/login', tenant['admin_email'], tenant['password'])
+    _login(clients[CUSTOMER], '/api/customer-auth/login', tenant['customer_email'], tenant['password'])
+
+    only = set(args.only.split(',')) if args.only else None
+    results = []
+    for name, role, method, factory in build_endpoints(tenant, customer_ids):
+        if only and name not in only:
+            continue
+        result = dict(name=name, method=method, **run_endpoint(
+            clients[role], query_profiler.stats, method, factory, args.runs, args.warmup
+        ))
+        results.append(result)
+        queries = f"{result['queries_avg']:>7} q" if result['queries_avg'] is not None else '      - q'
+        print(f"{name:<26} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+              f"p99 {result['p99_ms']:>9.2f} ms  {queries}  errors {result['errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'commit': _git_commit(),
+                'run_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'backend': 'mongomock' if args.mongomock else 'mongodb',
+                'dataset': tenant.get('counts'),
+                'runs': args.runs,
+                'endpoints': results
+            }, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
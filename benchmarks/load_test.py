@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test of the gunicorn entry point against a seeded tenant.
+
+Starts ``gunicorn wsgi:app`` on a local port, pointed at the seeded
+database, and runs locust headless with the users of one scenario:
+
+* ``morning-rush``: catalogue browsing and ordering by customers, with
+  order desks invoicing the orders as they come in;
+* ``invoice-burst``: concurrent invoice creation for the same hot SKUs;
+* ``month-end``: GST summaries, GSTR-1 and report downloads;
+* ``mixed``: all of the above at once.
+
+It reports throughput, error rate and latency percentiles per endpoint.
+It then checks what the run wrote to MongoDB:
+
+* duplicate invoice or order numbers, and requests that failed on the
+  unique index instead;
+* orders invoiced more than once;
+* hot SKUs sold below zero stock;
+* stock drift, where a product's stock no longer matches its starting
+  stock minus its stock movements, which means updates were lost.
+
+``--hot-stock`` resets the hot SKUs to a small stock before the run, so
+an invoice burst can run them out. The server uses the development
+config, so session cookies work over plain HTTP, with the profiler off
+and production-like logging. Pass ``--target`` to test a server that is
+already running; the database checks then assume it uses the same
+database. Needs locust and gunicorn. Run from the repository root:
+
+    python benchmarks/load_test.py --scale small --scenario invoice-burst --users 50 --duration 2m --hot-stock 200
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import seed as seeding
+
+# Locust user classes per scenario; their mix follows each class's weight
+SCENARIOS = {
+    'morning-rush': ('CatalogueCustomer', 'OrderDesk'),
+    'invoice-burst': ('HotSkuBiller',),
+    'month-end': ('MonthEndAccountant',),
+    'mixed': ('CatalogueCustomer', 'OrderDesk', 'HotSkuBiller', 'MonthEndAccountant')
+}
+
+def start_server(args):
+    env = dict(
+        os.environ,
+        MONGO_URI=args.mongo_uri,
+        FLASK_ENV='development',
+        QUERY_PROFILER='false',
+        SESSION_COOKIE_SECURE='false',
+        LOG_FORMAT='json',
+        LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING')
+    )
+    server = subprocess.Popen(
+        ['gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{args.port}', '--timeout', '120', 'wsgi:app'],
+        cwd=ROOT_DIR, env=env
+    )
+    url = f'http://127.0.0.1:{args.port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {server.returncode}')
+        try:
+            with urllib.request.urlopen(f'{url}/health', timeout=2):
+                return server, url
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError('gunicorn did not answer /health within 60 seconds')
+
+def run_locust(args, host, csv_prefix):
+    env = dict(os.environ, BENCHMARK_MONGO_URI=args.mongo_uri)
+    command = [
+        'locust', '-f', os.path.join(BENCHMARKS_DIR, 'locustfile.py'), '--headless',
+        '-u', str(args.users), '-r', str(args.spawn_rate), '-t', args.duration,
+        '--host', host, '--csv', csv_prefix, '--only-summary'
+    ] + list(SCENARIOS[args.scenario])
+    subprocess.call(command, cwd=ROOT_DIR, env=env)
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def read_stats(csv_prefix):
+    """Per-endpoint rows and the aggregated row of locust's stats CSV"""
+    endpoints = []
+    total = {}
+    with open(f'{csv_prefix}_stats.csv', newline='') as f:
+        for row in csv.DictReader(f):
+            entry = {
+                'method': row['Type'],
+                'name': row['Name'],
+                'requests': int(row['Request Count']),
+                'failures': int(row['Failure Count']),
+                'requests_per_s': _number(row['Requests/s']),
+                'p50_ms': _number(row['50%']),
+                'p95_ms': _number(row['95%']),
+                'p99_ms': _number(row['99%']),
+                'max_ms': _number(row['Max Response Time'])
+            }
+            entry['error_rate'] = round(entry['failures'] / entry['requests'], 4) if entry['requests'] else 0.0
+            if row['Name'] == 'Aggregated':
+                total = entry
+            else:
+                endpoints.append(entry)
+    failures = []
+    failures_path = f'{csv_prefix}_failures.csv'
+    if os.path.exists(failures_path):
+        with open(failures_path, newline='') as f:
+            failures = [
+                {'method': row['Method'], 'name': row['Name'], 'error': row['Error'], 'occurrences': int(row['Occurrences'])}
+                for row in csv.DictReader(f)
+            ]
+    return endpoints, total, failures
+
+def _duplicates(collection, field, since):
+    pipeline = [
+        {'$match': {'created_at': {'$gte': since}, field: {'$ne': None}}},
+        {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$limit': 100}
+    ]
+    return [{'value': str(doc['_id']), 'count': doc['count']} for doc in collection.aggregate(pipeline, allowDiskUse=True)]
+
+def check_anomalies(database, tenant, started_at, stock_before, failures):
+    """Data problems left behind by the run"""
+    duplicate_key_failures = sum(
+        failure['occurrences'] for failure in failures
+        if 'E11000' in failure['error'] or 'duplicate key' in failure['error'].lower()
+    )
+
+    hot_ids = list(stock_before)
+    moved = {product_id: 0 for product_id in hot_ids}
+    for doc in database['stock_movements'].aggregate([
+        {'$match': {'product_id': {'$in': hot_ids}, 'created_at': {'$gte': started_at}}},
+        {'$group': {
+            '_id': '$product_id',
+            'in': {'$sum': {'$cond': [{'$eq': ['$movement_type', 'in']}, '$quantity', 0]}},
+            'out': {'$sum': {'$cond': [{'$eq': ['$movement_type', 'out']}, '$quantity', 0]}}
+        }}
+    ]):
+        moved[doc['_id']] = doc['in'] - doc['out']
+
+    oversold = []
+    drift = []
+    for doc in database['products'].find({'_id': {'$in': hot_ids}}, {'name': 1, 'stock_quantity': 1}):
+        expected = stock_before[doc['_id']] + moved[doc['_id']]
+        stock = doc.get('stock_quantity') or 0
+        if stock < 0:
+            oversold.append({'product_id': str(doc['_id']), 'name': doc.get('name'), 'stock_quantity': stock})
+        if stock != expected:
+            drift.append({'product_id': str(doc['_id']), 'name': doc.get('name'), 'expected': expected, 'actual': stock})
+
+    return {
+        'duplicate_invoice_numbers': _duplicates(database['invoices'], 'invoice_number', started_at),
+        'duplicate_order_numbers': _duplicates(database['orders'], 'order_number', started_at),
+        'orders_invoiced_twice': _duplicates(database['invoices'], 'order_id', started_at),
+        'duplicate_key_failures': duplicate_key_failures,
+        'oversold_products': oversold,
+        'stock_drift': drift,
+        'invoices_created': database['invoices'].count_documents({'user_id': tenant['user_id'], 'created_at': {'$gte': started_at}}),
+        'orders_created': database['orders'].count_documents({'created_at': {'$gte': started_at}})
+    }
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the API with concurrent, realistic traffic')
+    seeding.add_scale_arguments(parser)
+    parser.add_argument('--no-seed', action='store_true', help='Reuse the tenant of an earlier seed')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed', help='Traffic to generate (default mixed)')
+    parser.add_argument('--users', type=int, default=50, help='Concurrent locust users (default 50)')
+    parser.add_argument('--spawn-rate', type=float, default=10, help='Users started per second (default 10)')
+    parser.add_argument('--duration', default='1m', help='Run time, e.g. 90s or 5m (default 1m)')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (default 4, as in the Procfile)')
+    parser.add_argument('--port', type=int, default=8055, help='Port for the gunicorn server (default 8055)')
+    parser.add_argument('--target', help='Test this already running server instead of starting gunicorn')
+    parser.add_argument('--hot-stock', type=int, help='Set the hot SKUs to this stock before the run')
+    parser.add_argument('--json', help='Write the report to this file')
+    args = parser.parse_args(argv)
+
+    database = seeding.connect(args.mongo_uri)
+    tenant = seeding.load_tenant(database) if args.no_seed else None
+    if tenant is None:
+        tenant = seeding.seed_from_args(database, args, log=lambda message: print(f'seeded {message}', file=sys.stderr))
+
+    hot_ids = tenant['hot_product_ids']
+    if args.hot_stock is not None:
+        database['products'].update_many({'_id': {'$in': hot_ids}}, {'$set': {'stock_quantity': args.hot_stock}})
+    stock_before = {
+        doc['_id']: doc.get('stock_quantity') or 0
+        for doc in database['products'].find({'_id': {'$in': hot_ids}}, {'stock_quantity': 1})
+    }
+
+    # Model timestamps are naive UTC
+    started_at = datetime.utcnow()
+    server = None
+    host = args.target
+    if not host:
+        server, host = start_server(args)
+    csv_prefix = os.path.join(tempfile.mkdtemp(prefix='gst-load-'), 'locust')
+    try:
+        run_locust(args, host, csv_prefix)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    endpoints, total, failures = read_stats(csv_prefix)
+    anomalies = check_anomalies(database, tenant, started_at, stock_before, failures)
+    report = {
+        'commit': _git_commit(),
+        'run_at': started_at.isoformat(timespec='seconds'),
+        'scenario': args.scenario,
+        'users': args.users,
+        'duration': args.duration,
+        'workers': None if args.target else args.workers,
+        'dataset': tenant.get('counts'),
+        'throughput_rps': total.get('requests_per_s'),
+        'error_rate': total.get('error_rate'),
+        'requests': total.get('requests'),
+        'endpoints': endpoints,
+        'failures': failures,
+        'anomalies': anomalies
+    }
+
+    print(f"\n{args.scenario}: {report['requests']} requests, {report['throughput_rps']} req/s, "
+          f"error rate {report['error_rate']:.2%}" if total else f'\n{args.scenario}: no requests recorded')
+    for entry in endpoints:
+        print(f"  {entry['method']:<5} {entry['name']:<48} {entry['requests']:>7}  p95 {entry['p95_ms']} ms  "
+              f"errors {entry['error_rate']:.2%}")
+    print('anomalies:')
+    for key, value in anomalies.items():
+        print(f"  {key}: {len(value) if isinstance(value, list) else value}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    found = any(anomalies[key] for key in (
+        'duplicate_invoice_numbers', 'duplicate_order_numbers', 'orders_invoiced_twice', 'oversold_products', 'stock_drift'
+    ))
+    return 1 if found else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Locust users modelling the traffic peaks of a seeded tenant.
+
+* ``CatalogueCustomer``: the morning rush. Customers sign in, browse and
+  search the catalogue and place orders for hot SKUs.
+* ``OrderDesk``: staff turning the morning's pending orders into
+  invoices. Several desks work the same queue, as they do in the shop.
+* ``HotSkuBiller``: counter billing, many invoices per second on the
+  same few hot SKUs.
+* ``MonthEndAccountant``: GST summaries, GSTR-1 and report downloads at
+  month end.
+
+The tenant comes from ``seed.py``; set ``BENCHMARK_MONGO_URI`` to the
+seeded database. ``load_test.py`` starts the server, picks the users of a
+scenario and checks the data for anomalies afterwards. To run locust
+directly:
+
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000 CatalogueCustomer OrderDesk
+"""
+import os
+import random
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from locust import HttpUser, between, constant, task
+
+import seed as seeding
+
+_tenant = None
+
+def tenant():
+    """The seeded tenant, read once per locust process"""
+    global _tenant
+    if _tenant is None:
+        database = seeding.connect(os.environ.get('BENCHMARK_MONGO_URI', seeding.DEFAULT_MONGO_URI))
+        _tenant = seeding.load_tenant(database)
+        if _tenant is None:
+            raise RuntimeError('No seeded tenant found; run benchmarks/seed.py first')
+        _tenant['hot_product_ids'] = [str(product_id) for product_id in _tenant['hot_product_ids']]
+    return _tenant
+
+def _check(response):
+    """Mark 200 responses carrying ``success: false`` as failures"""
+    if response.status_code >= 400:
+        response.failure(f'{response.status_code}: {response.text[:200]}')
+        return None
+    try:
+        body = response.json()
+    except ValueError:
+        response.success()
+        return None
+    if isinstance(body, dict) and body.get('success') is False:
+        response.failure(str(body.get('error') or body.get('message'))[:200])
+        return None
+    response.success()
+    return body
+
+class TenantUser(HttpUser):
+    abstract = True
+
+    def login(self, path, email):
+        with self.client.post(path, json={'email': email, 'password': tenant()['password']},
+                              name=path, catch_response=True) as response:
+            _check(response)
+
+    def hot_items(self, count, max_quantity):
+        return [
+            {'product_id': product_id, 'quantity': random.randint(1, max_quantity)}
+            for product_id in random.sample(tenant()['hot_product_ids'], count)
+        ]
+
+class CatalogueCustomer(TenantUser):
+    weight = 10
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        customers = min(tenant()['counts']['customers'], 1000)
+        self.login('/api/customer-auth/login', f'bench-customer-{random.randrange(customers)}@example.com')
+
+    @task(6)
+    def browse(self):
+        with self.client.get('/api/customer-auth/products', catch_response=True) as response:
+            _check(response)
+
+    @task(2)
+    def search(self):
+        term = random.choice(seeding.ITEMS)
+        with self.client.get(f'/api/customer-auth/products?search={term}', name='/api/customer-auth/products?search',
+                             catch_response=True) as response:
+            _check(response)
+
+    @task(1)
+    def my_orders(self):
+        with self.client.get('/api/customer-auth/orders', catch_response=True) as response:
+            _check(response)
+
+    @task(2)
+    def place_order(self):
+        items = self.hot_items(random.randint(1, 3), 5)
+        for item in items:
+            item['unit_price'] = 100
+        with self.client.post('/api/customer-auth/orders', json={'items': items, 'notes': 'load test'},
+                              catch_response=True) as response:
+            _check(response)
+
+class OrderDesk(TenantUser):
+    weight = 1
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.login('/api/auth/login', tenant()['admin_email'])
+
+    @task
+    def invoice_pending_order(self):
+        with self.client.get('/api/admin/orders?status=pending', name='/api/admin/orders',
+                             catch_response=True) as response:
+            body = _check(response)
+        orders = [order for order in (body or {}).get('orders', []) if order.get('status') == 'pending']
+        if not orders:
+            return
+        # Desks pick from the head of the same queue, so they sometimes collide
+        order = random.choice(orders[:5])
+        with self.client.post(f"/api/admin/orders/{order['id']}/generate-invoice",
+                              name='/api/admin/orders/[id]/generate-invoice', catch_response=True) as response:
+            _check(response)
+
+class HotSkuBiller(TenantUser):
+    weight = 2
+    wait_time = constant(0)
+
+    def on_start(self):
+        self.login('/api/auth/login', tenant()['admin_email'])
+        self.customer_ids = [str(tenant()['customer_id'])]
+
+    @task
+    def create_invoice(self):
+        payload = {
+            'customer_id': random.choice(self.customer_ids),
+            'invoice_date': datetime.utcnow().strftime('%Y-%m-%d'),
+            'status': 'paid',
+            'items': self.hot_items(2, 3)
+        }
+        with self.client.post('/api/invoices/', json=payload, catch_response=True) as response:
+            _check(response)
+
+class MonthEndAccountant(TenantUser):
+    weight = 1
+    wait_time = between(2, 5)
+
+    def on_start(self):
+        self.login('/api/auth/login', tenant()['admin_email'])
+        today = datetime.utcnow()
+        self.year, self.month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+
+    @task(3)
+    def gst_summary(self):
+        with self.client.get(f'/api/gst/api/gst/summary?year={self.year}&month={self.month}',
+                             name='/api/gst/api/gst/summary', catch_response=True) as response:
+            _check(response)
+
+    @task(2)
+    def gstr1(self):
+        with self.client.get(f'/api/gst/gst/gstr1?year={self.year}&month={self.month}',
+                             name='/api/gst/gst/gstr1', catch_response=True) as response:
+            _check(response)
+
+    @task(2)
+    def sales_summary(self):
+        with self.client.get('/api/reports/api/sales-summary?days=30', name='/api/reports/api/sales-summary',
+                             catch_response=True) as response:
+            _check(response)
+
+    @task(1)
+    def download_report(self):
+        with self.client.get('/api/reports/api/download?format=excel&type=full&days=30',
+                             name='/api/reports/api/download', catch_response=True) as response:
+            _check(response)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for invoice PDF rendering.
+
+Renders synthetic invoices with 1, 10 and 200 line items through the
+precompiled invoice template and reports per-invoice render time. No
+database is needed. Run from the repository root:
+
+    python benchmarks/pdf_render.py [--runs 20] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LINE_COUNTS = (1, 10, 200)
+
+def sample_context(line_count):
+    items = []
+    for i in range(line_count):
+        quantity = (i % 7) + 1
+        unit_price = 25.0 + i
+        total = quantity * unit_price
+        items.append({
+            'name': f'Product {i + 1}',
+            'name_hindi': 'टमाटर' if i % 3 == 0 else '',
+            'hsn_code': '0702',
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'gst_rate': 5,
+            'gst_amount': round(total * 0.05, 2),
+            'total': total
+        })
+    subtotal = sum(item['total'] for item in items)
+    tax = sum(item['gst_amount'] for item in items)
+    return {
+        'invoice_number': 'INV-BENCH-0001',
+        'invoice_date': '01/04/2024',
+        'due_date': '30/04/2024',
+        'notes': 'Benchmark invoice',
+        'business': {
+            'name': 'Bench Traders', 'gst_number': '29ABCDE1234F1Z5', 'address': 'MG Road, Bengaluru',
+            'phone': '9999999999', 'email': 'bench@example.com'
+        },
+        'customer': {
+            'name': 'Sample Customer', 'gstin': '29AAAAA0000A1Z5', 'address': 'Indiranagar, Bengaluru',
+            'phone': '8888888888', 'email': 'customer@example.com', 'state': 'Karnataka', 'pincode': '560038'
+        },
+        'items': items,
+        'subtotal': subtotal,
+        'cgst_amount': round(tax / 2, 2),
+        'sgst_amount': round(tax / 2, 2),
+        'igst_amount': 0.0,
+        'total_amount': round(subtotal + tax, 2)
+    }
+
+def bench(template, line_count, runs):
+    context = sample_context(line_count)
+    template.render(context)  # warm up
+    timings = []
+    size = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        size = len(template.render(context))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'line_items': line_count,
+        'runs': runs,
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(timings[len(timings) // 2], 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'pdf_bytes': size
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure invoice PDF render time')
+    parser.add_argument('--runs', type=int, default=20, help='Renders per line-item count (default 20)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args(argv)
+
+    # Styles, fonts and layouts are built here, once
+    start = time.perf_counter()
+    from pdf_templates import get_template
+    template = get_template('invoice')
+    setup_ms = (time.perf_counter() - start) * 1000
+    print(f"template setup: {setup_ms:.1f} ms (devanagari font: {template.devanagari_font or 'not found'})")
+
+    results = []
+    for line_count in LINE_COUNTS:
+        result = bench(template, line_count, args.runs)
+        results.append(result)
+        print(f"{line_count:>4} items: mean {result['mean_ms']:>8.2f} ms  p50 {result['p50_ms']:>8.2f} ms  "
+              f"p95 {result['p95_ms']:>8.2f} ms  ({result['pdf_bytes']} bytes)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'setup_ms': round(setup_ms, 2), 'results': results}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Synthetic tenant for benchmarks and load tests.
+
+Seeds one business (an admin user) with products, customers, invoices and
+stock movements, written straight to MongoDB with ``insert_many`` in
+batches. Invoice lines go through ``tax_engine.compute_batch`` so totals
+match what the app would have stored, and GST period summaries are
+rebuilt afterwards with ``gst_summaries.reconcile``.
+
+Sales are skewed the way real catalogues are: a few hot SKUs take a large
+share of invoice lines. The first ``HOT_PRODUCTS`` products are the hot
+ones, and the load tests order them concurrently.
+
+The tenant's credentials and ids are stored in the ``benchmark_tenant``
+collection, so a seeded database can be reused with ``--no-seed``. Run
+from the repository root:
+
+    python benchmarks/seed.py --mongo-uri mongodb://localhost:27017/gst_benchmark --scale medium
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from werkzeug.security import generate_password_hash
+
+DEFAULT_MONGO_URI = 'mongodb://localhost:27017/gst_benchmark'
+TENANT_COLLECTION = 'benchmark_tenant'
+ADMIN_EMAIL = 'bench-admin@example.com'
+CUSTOMER_EMAIL = 'bench-customer-0@example.com'
+PASSWORD = 'bench-password'
+BUSINESS_STATE = 'Karnataka'
+HOT_PRODUCTS = 20
+BATCH_SIZE = 5000
+
+# products, customers, invoices, stock movements
+SCALES = {
+    'tiny': (200, 100, 2000, 8000),
+    'small': (2000, 1000, 20000, 80000),
+    'medium': (10000, 5000, 100000, 400000),
+    'full': (50000, 20000, 500000, 2000000)
+}
+
+CATEGORIES = ('Vegetables', 'Fruits', 'Grains', 'Dairy', 'Spices', 'Beverages', 'Snacks', 'Household')
+WORDS = ('Fresh', 'Organic', 'Premium', 'Local', 'Farm', 'Select', 'Classic', 'Daily')
+ITEMS = ('Tomato', 'Onion', 'Potato', 'Rice', 'Wheat', 'Milk', 'Paneer', 'Turmeric', 'Tea', 'Mango')
+STATES = (BUSINESS_STATE,) * 4 + ('Tamil Nadu', 'Kerala', 'Maharashtra', 'Telangana')
+GST_RATES = (0, 5, 5, 12, 18, 28)
+STATUSES = ('paid',) * 6 + ('pending',) * 3 + ('cancelled',)
+
+def _batched_insert(collection, docs, batch_size=BATCH_SIZE):
+    batch = []
+    written = 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+def _pick_product(rng, product_count):
+    # Half of all lines go to the hot SKUs
+    if rng.random() < 0.5:
+        return rng.randrange(min(HOT_PRODUCTS, product_count))
+    return rng.randrange(product_count)
+
+def _products(rng, user_id, count, now):
+    for i in range(count):
+        price = round(rng.uniform(10, 2000), 2)
+        yield {
+            '_id': ObjectId(),
+            'user_id': user_id,
+            'admin_id': None,
+            'name': f'{rng.choice(WORDS)} {rng.choice(ITEMS)} {i}',
+            'sku': f'SKU-{i:06d}',
+            'hsn_code': f'{rng.randrange(1000, 9999)}',
+            'description': f'Benchmark product {i}',
+            'category': rng.choice(CATEGORIES),
+            'brand': None,
+            'price': price,
+            'purchase_price': round(price * 0.8, 2),
+            'gst_rate': float(rng.choice(GST_RATES)),
+            # Hot SKUs start with enough stock for a load test run
+            'stock_quantity': 100000 if i < HOT_PRODUCTS else rng.randrange(0, 500),
+            'min_stock_level': 10,
+            'unit': 'KG' if i % 3 == 0 else 'PCS',
+            'created_at': now - timedelta(days=rng.randrange(0, 720)),
+            'updated_at': now,
+            'is_active': i % 50 != 0
+        }
+
+def _customers(rng, user_id, count, now, password_hash):
+    for i in range(count):
+        yield {
+            '_id': ObjectId(),
+            'user_id': user_id,
+            'name': f'Customer {i}',
+            'email': f'bench-customer-{i}@example.com',
+            'password_hash': password_hash,
+            'phone': f'9{i:09d}',
+            'gstin': '',
+            'billing_address': f'{i} Market Road',
+            'state': rng.choice(STATES),
+            'pincode': f'{560000 + i % 1000}',
+            'opening_balance': 0.0,
+            'opening_balance_type': 'debit',
+            'credit_limit': 0.0,
+            'discount': 0.0,
+            'created_at': now - timedelta(days=rng.randrange(0, 720)),
+            'is_active': True
+        }
+
+def _invoices(rng, tenant, products, customers, count, days, now):
+    from tax_engine import compute_batch
+
+    prefix = f"INV-{str(tenant['user_id'])[:8]}-"
+    pending = []
+    for i in range(count):
+        customer = customers[rng.randrange(len(customers))]
+        items = []
+        for _ in range(rng.randint(1, 5)):
+            product = products[_pick_product(rng, len(products))]
+            items.append({
+                'product_id': product['_id'],
+                'quantity': rng.randint(1, 20),
+                'unit_price': product['price'],
+                'gst_rate': product['gst_rate'],
+                'hsn_code': product['hsn_code'],
+                'unit': product['unit']
+            })
+        invoice_date = (now - timedelta(days=rng.randrange(0, days))).replace(hour=0, minute=0, second=0, microsecond=0)
+        created_at = invoice_date + timedelta(seconds=rng.randrange(0, 86400))
+        pending.append({
+            '_id': ObjectId(),
+            'user_id': tenant['user_id'],
+            'customer_id': customer['_id'],
+            'order_id': None,
+            'invoice_number': f'{prefix}{1000 + i}',
+            'invoice_date': invoice_date,
+            'due_date': invoice_date + timedelta(days=30),
+            'status': rng.choice(STATUSES),
+            'payment_terms': None,
+            'notes': '',
+            'created_at': created_at,
+            'updated_at': created_at,
+            'items': items,
+            '_place_of_supply': customer['state']
+        })
+        if len(pending) >= BATCH_SIZE or i == count - 1:
+            results = compute_batch(
+                [{'items': doc['items'], 'place_of_supply': doc.pop('_place_of_supply')} for doc in pending],
+                BUSINESS_STATE
+            )
+            for doc, result in zip(pending, results):
+                for item, line in zip(doc['items'], result['items']):
+                    item['total'] = line['total']
+                    item['gst_amount'] = line['gst_amount']
+                for field in ('subtotal', 'cgst_amount', 'sgst_amount', 'igst_amount', 'total_amount'):
+                    doc[field] = result[field]
+                yield doc
+            pending = []
+
+def _stock_movements(rng, products, count, days, now):
+    for i in range(count):
+        product = products[_pick_product(rng, len(products))]
+        movement_type = 'in' if rng.random() < 0.3 else 'out'
+        yield {
+            '_id': ObjectId(),
+            'product_id': product['_id'],
+            'movement_type': movement_type,
+            'quantity': rng.randint(1, 50),
+            'reference': f'BENCH-{i}',
+            'notes': 'Benchmark movement',
+            'created_at': now - timedelta(seconds=rng.randrange(0, days * 86400))
+        }
+
+def seed(database, products=2000, customers=1000, invoices=20000, movements=80000, days=365, random_seed=42, log=print):
+    """Drop ``database`` and fill it with one synthetic tenant; returns the tenant document"""
+    from indexes import ensure_indexes
+    from gst_summaries import reconcile
+
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+    client = database.client
+    client.drop_database(database.name)
+    ensure_indexes(database)
+
+    started = time.perf_counter()
+    user_id = ObjectId()
+    database['users'].insert_one({
+        '_id': user_id,
+        'username': 'bench-admin',
+        'email': ADMIN_EMAIL,
+        'password_hash': generate_password_hash(PASSWORD),
+        'business_name': 'Bench Traders',
+        'gst_number': '29ABCDE1234F1Z5',
+        'business_address': 'MG Road, Bengaluru',
+        'business_state': BUSINESS_STATE,
+        'business_pincode': '560001',
+        'is_approved': True,
+        'is_active': True,
+        'created_at': now
+    })
+    tenant = {'user_id': user_id}
+
+    # Products and customers stay in memory; invoices and movements reference them
+    product_docs = list(_products(rng, user_id, products, now))
+    _batched_insert(database['products'], product_docs)
+    log(f'products: {len(product_docs)}')
+
+    customer_docs = list(_customers(rng, user_id, customers, now, generate_password_hash(PASSWORD)))
+    _batched_insert(database['customers'], customer_docs)
+    log(f'customers: {len(customer_docs)}')
+
+    written = _batched_insert(database['invoices'], _invoices(rng, tenant, product_docs, customer_docs, invoices, days, now))
+    log(f'invoices: {written}')
+
+    written = _batched_insert(database['stock_movements'], _stock_movements(rng, product_docs, movements, days, now))
+    log(f'stock movements: {written}')
+
+    reconcile(database, user_id=user_id, fix=True)
+
+    tenant.update({
+        '_id': 'tenant',
+        'admin_email': ADMIN_EMAIL,
+        'customer_email': CUSTOMER_EMAIL,
+        'password': PASSWORD,
+        'customer_id': customer_docs[0]['_id'],
+        'hot_product_ids': [doc['_id'] for doc in product_docs[:HOT_PRODUCTS]],
+        'counts': {'products': products, 'customers': customers, 'invoices': invoices, 'stock_movements': movements},
+        'days': days,
+        'random_seed': random_seed,
+        'seeded_at': now,
+        'seed_seconds': round(time.perf_counter() - started, 1)
+    })
+    database[TENANT_COLLECTION].insert_one(tenant)
+    log(f"seeded in {tenant['seed_seconds']} s")
+    return tenant
+
+def load_tenant(database):
+    """The tenant written by an earlier ``seed``, or None"""
+    return database[TENANT_COLLECTION].find_one({'_id': 'tenant'})
+
+def connect(mongo_uri):
+    from pymongo import MongoClient
+    client = MongoClient(mongo_uri)
+    db_name = mongo_uri.split('/')[-1].split('?')[0] or 'gst_benchmark'
+    return client[db_name]
+
+def add_scale_arguments(parser):
+    parser.add_argument('--mongo-uri', default=os.environ.get('BENCHMARK_MONGO_URI', DEFAULT_MONGO_URI),
+                        help=f'Database to seed; it is dropped first (default {DEFAULT_MONGO_URI})')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Dataset size preset (default small)')
+    parser.add_argument('--products', type=int, help='Override the preset product count')
+    parser.add_argument('--customers', type=int, help='Override the preset customer count')
+    parser.add_argument('--invoices', type=int, help='Override the preset invoice count')
+    parser.add_argument('--movements', type=int, help='Override the preset stock movement count')
+    parser.add_argument('--days', type=int, default=365, help='Spread invoices and movements over this many days')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible datasets')
+
+def seed_from_args(database, args, log=print):
+    products, customers, invoices, movements = SCALES[args.scale]
+    return seed(
+        database,
+        products=args.products or products,
+        customers=args.customers or customers,
+        invoices=args.invoices or invoices,
+        movements=args.movements or movements,
+        days=args.days,
+        random_seed=args.seed,
+        log=log
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed a synthetic tenant for benchmarks')
+    add_scale_arguments(parser)
+    args = parser.parse_args(argv)
+    seed_from_args(connect(args.mongo_uri), args)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Cold tier for closed invoices and old stock movements.
+
+``tier_out`` moves documents older than a horizon (``ARCHIVE_HORIZON_DAYS``)
+from the hot collections into archive collections with the same indexes:
+
+* paid and cancelled invoices, whose ``created_at`` and ``invoice_date``
+  are both before the horizon, go to ``invoices_archive``;
+* stock movements go to ``stock_movements_archive``, and their
+  quantities are summed into ``stock_movement_rollups``, one document per
+  product and month, rebuilt from the archive after every run.
+
+GST period summaries stay where they are, so GSTR-3B figures and the
+dashboard never need the archive. Each batch is copied with upserts,
+then deleted from the hot collection only where a document is unchanged
+since it was read (same ``version`` and ``updated_at``). Documents edited
+in between are copied again; ones that no longer belong in the archive
+lose their copy and stay hot. An interrupted run is simply run again.
+
+The ``archive_horizons`` collection records, per hot collection, the
+cutoff documents were moved up to. Read paths go through ``aggregate``
+and ``find`` here, passing the lower bound of their date range: when it
+is at or after the horizon only the hot collection is read, otherwise the
+archive is merged in (``$unionWith`` for aggregations, a sorted merge for
+finds). Hot collections then only hold recent and open documents,
+however long a business has been trading.
+"""
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from maintenance import iter_batches
+from migrations import Throttle
+
+logger = logging.getLogger(__name__)
+
+ARCHIVES = {
+    'invoices': 'invoices_archive',
+    'stock_movements': 'stock_movements_archive'
+}
+HORIZONS_COLLECTION = 'archive_horizons'
+COLLECTION = 'stock_movement_rollups'
+DEFAULT_HORIZON_DAYS = 730
+CLOSED_INVOICE_STATUSES = ('paid', 'cancelled')
+# Horizons change once per tier_out run; workers re-read them this often
+HORIZON_TTL = 60.0
+# Times a batch is copied again when documents change while it is moved
+MOVE_ATTEMPTS = 3
+
+_ANY_ID = ObjectId('0' * 24)
+
+# (keys, options) and (name, filter, sort) of the rollups, as models declare them for indexes.py
+INDEXES = (
+    ([('product_id', 1), ('period_year', 1), ('period_month', 1)], {'unique': True}),
+)
+QUERY_SHAPES = (
+    ('by_product', {'product_id': _ANY_ID}, [('period_year', 1), ('period_month', 1)]),
+)
+
+_horizons = {}
+
+def horizon(database, collection):
+    """Cutoff up to which ``collection`` was moved to its archive, or None"""
+    cached = _horizons.get(collection)
+    if cached is not None and time.monotonic() - cached[1] < HORIZON_TTL:
+        return cached[0]
+    doc = database[HORIZONS_COLLECTION].find_one({'_id': collection})
+    value = doc.get('before') if doc else None
+    _horizons[collection] = (value, time.monotonic())
+    return value
+
+def needs_archive(database, collection, since=None):
+    """Whether a read from ``since`` onwards (None: all time) reaches archived documents"""
+    if collection not in ARCHIVES:
+        return False
+    cutoff = horizon(database, collection)
+    return cutoff is not None and (since is None or since < cutoff)
+
+def aggregate(database, collection, pipeline, since=None, **kwargs):
+    """``collection.aggregate`` that also reads the archive when ``since`` is before the horizon
+
+    The pipeline must start with its ``$match``; archived documents
+    matching it are added right after, so later stages see both.
+    """
+    if needs_archive(database, collection, since):
+        first = pipeline[0]
+        pipeline = [first, {'$unionWith': {'coll': ARCHIVES[collection], 'pipeline': [first]}}] + list(pipeline[1:])
+    return database[collection].aggregate(pipeline, **kwargs)
+
+def _sort_key(sort):
+    directions = {direction for _, direction in sort}
+    if len(directions) != 1:
+        raise ValueError('Federated finds sort every key in the same direction')
+    fields = [field for field, _ in sort]
+
+    # MongoDB sorts missing and null values before everything else
+    def key(doc):
+        return tuple((0, None) if doc.get(field) is None else (1, doc[field]) for field in fields)
+    return key, directions.pop() < 0
+
+def find(database, collection, query, projection=None, sort=None, since=None):
+    """Documents matching ``query`` from the hot collection and, when needed, its archive
+
+    With ``sort`` the two cursors are merged in order; a sort on
+    ``(field, direction)`` pairs in one direction is supported.
+    """
+    hot = database[collection].find(query, projection)
+    if sort:
+        hot = hot.sort(sort)
+    if not needs_archive(database, collection, since):
+        return hot
+    cold = database[ARCHIVES[collection]].find(query, projection)
+    if not sort:
+        return itertools.chain(hot, cold)
+    cold = cold.sort(sort)
+    key, reverse = _sort_key(sort)
+    return heapq.merge(hot, cold, key=key, reverse=reverse)
+
+def find_one(database, collection, query, sort=None):
+    """``find_one`` that also looks in the archive
+
+    Without ``sort`` the archive is only read when the hot collection has
+    no match; with it, whichever of the two matches sorts first wins.
+    """
+    doc = database[collection].find_one(query, sort=sort)
+    if (doc is not None and not sort) or not needs_archive(database, collection):
+        return doc
+    cold = database[ARCHIVES[collection]].find_one(query, sort=sort)
+    if doc is None or cold is None:
+        return doc if cold is None else cold
+    key, reverse = _sort_key(sort)
+    return (max if reverse else min)(doc, cold, key=key)
+
+def find_archived(database, collection, query):
+    """The archived document matching ``query``, without reading the hot collection"""
+    if not needs_archive(database, collection):
+        return None
+    return database[ARCHIVES[collection]].find_one(query)
+
+def count_documents(database, collection, query, since=None):
+    count = database[collection].count_documents(query)
+    if needs_archive(database, collection, since):
+        count += database[ARCHIVES[collection]].count_documents(query)
+    return count
+
+def tier_query(collection, before):
+    """Filter selecting the documents of ``collection`` that belong in the archive"""
+    if collection == 'invoices':
+        return {
+            'status': {'$in': list(CLOSED_INVOICE_STATUSES)},
+            'created_at': {'$lt': before},
+            'invoice_date': {'$lt': before}
+        }
+    if collection == 'stock_movements':
+        return {'created_at': {'$lt': before}}
+    raise ValueError(f'{collection} has no archive tier')
+
+def rebuild_rollups(database, since=None):
+    """Recompute stock_movement_rollups from the archived movements, from ``since``'s month on"""
+    match = {}
+    if since is not None:
+        match['created_at'] = {'$gte': datetime(since.year, since.month, 1)}
+    database[ARCHIVES['stock_movements']].aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': {
+                'product_id': '$product_id',
+                'period_year': {'$year': '$created_at'},
+                'period_month': {'$month': '$created_at'}
+            },
+            'quantity_in': {'$sum': {'$cond': [{'$eq': ['$movement_type', 'in']}, '$quantity', 0]}},
+            'quantity_out': {'$sum': {'$cond': [{'$eq': ['$movement_type', 'out']}, '$quantity', 0]}},
+            # Adjustments set the stock level outright, so only their count adds up
+            'adjustments': {'$sum': {'$cond': [{'$in': ['$movement_type', ['in', 'out']]}, 0, 1]}},
+            'movements': {'$sum': 1}
+        }},
+        {'$project': {
+            '_id': 0,
+            'product_id': '$_id.product_id',
+            'period_year': '$_id.period_year',
+            'period_month': '$_id.period_month',
+            'quantity_in': 1,
+            'quantity_out': 1,
+            'adjustments': 1,
+            'movements': 1,
+            'updated_at': '$$NOW'
+        }},
+        {'$merge': {
+            'into': COLLECTION,
+            'on': ['product_id', 'period_year', 'period_month'],
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ], allowDiskUse=True)
+
+def _unchanged(doc):
+    # None also matches documents without the field (stock movements are never updated)
+    return {'_id': doc['_id'], 'version': doc.get('version'), 'updated_at': doc.get('updated_at')}
+
+def _move_batch(database, collection, query, docs):
+    """Copy a batch to the archive and delete what was copied; returns the count moved"""
+    hot = database[collection]
+    archive = database[ARCHIVES[collection]]
+    moved = 0
+    for _ in range(MOVE_ATTEMPTS):
+        archive.bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in docs], ordered=False)
+        moved += hot.delete_many({'$and': [query, {'$or': [_unchanged(doc) for doc in docs]}]}).deleted_count
+        # Whatever is still hot was edited after it was read
+        left = [doc['_id'] for doc in hot.find({'_id': {'$in': [doc['_id'] for doc in docs]}}, {'_id': 1})]
+        if not left:
+            return moved
+        docs = list(hot.find({'$and': [query, {'_id': {'$in': left}}]}))
+        stale = set(left) - {doc['_id'] for doc in docs}
+        if stale:
+            # No longer belongs in the archive, so only the hot copy stays
+            archive.delete_many({'_id': {'$in': list(stale)}})
+        if not docs:
+            return moved
+    # Still changing: keep them hot and leave them for the next run
+    archive.delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+    return moved
+
+def tier_out(database, collection, horizon_days=DEFAULT_HORIZON_DAYS, batch_size=1000, max_rate=None,
+             pause=0.0, dry_run=False, now=None):
+    """Move documents of ``collection`` older than the horizon to its archive; returns the count"""
+    before = (now or datetime.utcnow()) - timedelta(days=horizon_days)
+    query = tier_query(collection, before)
+    throttle = Throttle(max_rate, pause)
+    states = database[HORIZONS_COLLECTION]
+    previous = states.find_one({'_id': collection}) or {}
+    if not dry_run and (previous.get('before') is None or before > previous['before']):
+        # Record the new horizon first: readers then look in both places
+        # while documents are in flight, once their cached horizon expires
+        states.update_one({'_id': collection}, {'$set': {'before': before, 'updated_at': datetime.utcnow()}}, upsert=True)
+        time.sleep(HORIZON_TTL)
+    moved = 0
+    for docs in iter_batches(database[collection], query, batch_size):
+        moved += len(docs) if dry_run else _move_batch(database, collection, query, docs)
+        throttle.wait(len(docs))
+    if not dry_run:
+        if collection == 'stock_movements':
+            # Months from the previous horizon on gained movements; older ones are final
+            rebuild_rollups(database, since=previous.get('before'))
+        states.update_one({'_id': collection}, {'$inc': {'moved': moved}, '$set': {'finished_at': datetime.utcnow()}})
+    logger.info("Moved %s %s created before %s to %s", moved, collection, before, ARCHIVES[collection])
+    return moved
@@ -23,6 +23,39 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'static/uploads'
     
+    # Rendered invoice PDF cache
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or os.path.join('cache', 'pdf')
+    PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    
+    # PDF rendering worker pool (0 workers renders inline)
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+    PDF_RENDER_QUEUE = int(os.environ.get('PDF_RENDER_QUEUE', 32))
+    PDF_RENDER_TIMEOUT = int(os.environ.get('PDF_RENDER_TIMEOUT', 30))
+    PDF_JOBS_DIR = os.environ.get('PDF_JOBS_DIR') or os.path.join('cache', 'pdf_jobs')
+    
+    # Logging: level, per-module overrides ("routes.invoice_routes=DEBUG,pymongo=WARNING"),
+    # json or text lines, and the fraction of DEBUG records kept
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+    
+    # Build missing MongoDB indexes while the app boots; production runs
+    # "manage.py ensure-indexes" at deploy time instead
+    ENSURE_INDEXES_ON_BOOT = os.environ.get('ENSURE_INDEXES_ON_BOOT', 'false').lower() == 'true'
+    
+    # Closed invoices and stock movements older than this move to the
+    # archive collections ("manage.py tier-out", cold_storage.py)
+    ARCHIVE_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 730))
+    
+    # Bearer token required on /metrics when set
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # MongoDB query profiling: Server-Timing headers, N+1 warnings, /api/debug/queries
+    QUERY_PROFILER = os.environ.get('QUERY_PROFILER', 'false').lower() == 'true'
+    QUERY_N_PLUS_ONE_THRESHOLD = int(os.environ.get('QUERY_N_PLUS_ONE_THRESHOLD', 5))
+    QUERY_PROFILE_HISTORY = int(os.environ.get('QUERY_PROFILE_HISTORY', 100))
+    
     # GST Configuration
     GST_RATES = {
         '0': 0,
@@ -42,6 +75,9 @@ class Config:
 class DevelopmentConfig(Config):
     DEBUG = True
     FLASK_ENV = 'development'
+    QUERY_PROFILER = os.environ.get('QUERY_PROFILER', 'true').lower() == 'true'
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    ENSURE_INDEXES_ON_BOOT = os.environ.get('ENSURE_INDEXES_ON_BOOT', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -52,6 +88,10 @@ class TestingConfig(Config):
     TESTING = True
     MONGO_URI = 'mongodb://localhost:27017/test_db'
     WTF_CSRF_ENABLED = False
+    PDF_RENDER_WORKERS = 0
+    ENSURE_INDEXES_ON_BOOT = True
+    # explain() every registered query shape on boot; COLLSCAN fails the run
+    CHECK_QUERY_SHAPES = True
 
 config = {
     'development': DevelopmentConfig,
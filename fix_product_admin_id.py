@@ -1,98 +0,0 @@
-"""
-Migration script to make admin_id nullable in product table
-"""
-import sqlite3
-import os
-import sys
-
-# Reconfigure stdout for Windows compatibility
-if sys.platform == 'win32':
-    try:
-        sys.stdout.reconfigure(encoding='utf-8')
-    except:
-        pass
-
-def fix_admin_id_column():
-    """Make admin_id nullable in product table"""
-    
-    # Check both possible database locations
-    db_paths = [
-        'instance/app.db',
-        'instance/gst_inventory.db',
-        'app.db',
-        'gst_inventory.db'
-    ]
-    
-    for db_path in db_paths:
-        if not os.path.exists(db_path):
-            continue
-            
-        print(f"\n[INFO] Checking database: {db_path}")
-        
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Check if product table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='product'")
-            if not cursor.fetchone():
-                print(f"[SKIP] Product table does not exist in {db_path}")
-                conn.close()
-                continue
-            
-            # Check current admin_id column definition
-            cursor.execute("PRAGMA table_info(product)")
-            columns = cursor.fetchall()
-            admin_id_col = [col for col in columns if col[1] == 'admin_id']
-            
-            if not admin_id_col:
-                print(f"[SKIP] admin_id column does not exist in {db_path}")
-                conn.close()
-                continue
-            
-            admin_id_info = admin_id_col[0]
-            is_nullable = admin_id_info[3] == 0  # 0 means NOT NULL, 1 means nullable
-            
-            if is_nullable:
-                print(f"[SKIP] admin_id is already nullable in {db_path}")
-                conn.close()
-                continue
-            
-            print(f"[INFO] admin_id is currently NOT NULL in {db_path}")
-            print(f"[INFO] SQLite doesn't support ALTER COLUMN, so we'll update existing NULL values first")
-            
-            # Update any NULL admin_id values to use user_id or a default
-            cursor.execute("UPDATE product SET admin_id = user_id WHERE admin_id IS NULL AND user_id IS NOT NULL")
-            updated = cursor.rowcount
-            if updated > 0:
-                print(f"[INFO] Updated {updated} products to set admin_id = user_id")
-            
-            # For products where both are NULL, set to 1 (first admin)
-            cursor.execute("SELECT id FROM user LIMIT 1")
-            first_user = cursor.fetchone()
-            if first_user:
-                default_user_id = first_user[0]
-                cursor.execute(f"UPDATE product SET admin_id = {default_user_id} WHERE admin_id IS NULL")
-                updated2 = cursor.rowcount
-                if updated2 > 0:
-                    print(f"[INFO] Updated {updated2} products to set admin_id = {default_user_id}")
-            
-            conn.commit()
-            print(f"[OK] Updated NULL admin_id values in {db_path}")
-            print(f"[NOTE] SQLite doesn't support ALTER COLUMN, so admin_id remains NOT NULL in schema")
-            print(f"[NOTE] But we've ensured all existing rows have values")
-            
-            conn.close()
-            
-        except sqlite3.Error as e:
-            print(f"[ERROR] Database error in {db_path}: {e}")
-        except Exception as e:
-            print(f"[ERROR] Unexpected error in {db_path}: {e}")
-
-if __name__ == '__main__':
-    print("=" * 60)
-    print("Fix Product admin_id Column")
-    print("=" * 60)
-    fix_admin_id_column()
-    print("\n[OK] Migration completed!")
-
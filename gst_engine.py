@@ -0,0 +1,423 @@
+"""
+GSTR-1 engine.
+
+Builds the B2B / B2CL / B2CS / HSN sections of a GSTR-1 return from a single
+MongoDB aggregation over the invoices collection and emits them in the GST
+portal's JSON format, one chunk at a time.
+"""
+import json
+from datetime import datetime
+from bson import ObjectId
+
+import cold_storage
+
+# State codes as used in GSTINs and the portal's "pos" field
+GST_STATE_CODES = {
+    'jammu and kashmir': '01',
+    'himachal pradesh': '02',
+    'punjab': '03',
+    'chandigarh': '04',
+    'uttarakhand': '05',
+    'haryana': '06',
+    'delhi': '07',
+    'rajasthan': '08',
+    'uttar pradesh': '09',
+    'bihar': '10',
+    'sikkim': '11',
+    'arunachal pradesh': '12',
+    'nagaland': '13',
+    'manipur': '14',
+    'mizoram': '15',
+    'tripura': '16',
+    'meghalaya': '17',
+    'assam': '18',
+    'west bengal': '19',
+    'jharkhand': '20',
+    'odisha': '21',
+    'chhattisgarh': '22',
+    'madhya pradesh': '23',
+    'gujarat': '24',
+    'dadra and nagar haveli and daman and diu': '26',
+    'maharashtra': '27',
+    'karnataka': '29',
+    'goa': '30',
+    'lakshadweep': '31',
+    'kerala': '32',
+    'tamil nadu': '33',
+    'puducherry': '34',
+    'andaman and nicobar islands': '35',
+    'telangana': '36',
+    'andhra pradesh': '37',
+    'ladakh': '38',
+}
+
+# Unregistered inter-state invoices above this value are reported as B2CL
+B2CL_THRESHOLD = 100000
+
+# Product.unit -> portal unit quantity code
+UQC_CODES = {
+    'PCS': 'PCS',
+    'NOS': 'NOS',
+    'KG': 'KGS',
+    'KGS': 'KGS',
+    'GM': 'GMS',
+    'GMS': 'GMS',
+    'G': 'GMS',
+    'L': 'LTR',
+    'LTR': 'LTR',
+    'ML': 'MLT',
+    'BOX': 'BOX',
+    'DOZ': 'DOZ',
+    'MTR': 'MTR',
+}
+
+def state_code(state=None, gstin=None):
+    """Return the two digit state code for a GSTIN or a state name"""
+    if gstin and len(gstin) >= 2 and gstin[:2].isdigit():
+        return gstin[:2]
+    if state:
+        return GST_STATE_CODES.get(str(state).strip().lower(), '')
+    return ''
+
+def period_bounds(month, year):
+    """Return the [start, end) datetimes covering a filing month"""
+    start = datetime(year, month, 1)
+    if month == 12:
+        end = datetime(year + 1, 1, 1)
+    else:
+        end = datetime(year, month + 1, 1)
+    return start, end
+
+def _r(value):
+    return round(float(value or 0), 2)
+
+def _to_object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+class GSTR1Builder:
+    """Stream a GSTR-1 return for one business and filing month"""
+
+    def __init__(self, database, user, month, year, batch_size=500):
+        self.database = database
+        self.user = user
+        self.month = month
+        self.year = year
+        self.batch_size = batch_size
+        self.user_id = _to_object_id(user.id)
+        self.business_state_code = state_code(getattr(user, 'business_state', None), getattr(user, 'gst_number', None))
+        self._customers = {}
+
+    def match_stage(self):
+        start, end = period_bounds(self.month, self.year)
+        return {
+            'user_id': self.user_id,
+            'status': 'paid',
+            'invoice_date': {'$gte': start, '$lt': end}
+        }
+
+    def pipeline(self):
+        """One row per (invoice, rate, product), sorted so invoices arrive contiguously"""
+        return [
+            {'$match': self.match_stage()},
+            {'$unwind': '$items'},
+            {'$group': {
+                '_id': {
+                    'invoice': '$_id',
+                    'rate': {'$ifNull': ['$items.gst_rate', 0]},
+                    'product': '$items.product_id',
+                    'hsn': '$items.hsn_code',
+                    'unit': '$items.unit'
+                },
+                'customer_id': {'$first': '$customer_id'},
+                'invoice_number': {'$first': '$invoice_number'},
+                'invoice_date': {'$first': '$invoice_date'},
+                'total_amount': {'$first': '$total_amount'},
+                'igst_amount': {'$first': '$igst_amount'},
+                'quantity': {'$sum': {'$ifNull': ['$items.quantity', 0]}},
+                'taxable_value': {'$sum': {'$ifNull': ['$items.total', 0]}},
+                'tax_amount': {'$sum': {'$ifNull': ['$items.gst_amount', 0]}}
+            }},
+            {'$sort': {'customer_id': 1, 'invoice_date': 1, '_id.invoice': 1}}
+        ]
+
+    def iter_invoices(self):
+        """Yield one dict per invoice, with its items collapsed by GST rate"""
+        current = None
+        start, _ = period_bounds(self.month, self.year)
+        cursor = cold_storage.aggregate(
+            self.database, 'invoices', self.pipeline(), since=start, allowDiskUse=True, batchSize=self.batch_size
+        )
+        for row in cursor:
+            key = row['_id']
+            if current is None or current['id'] != key['invoice']:
+                if current is not None:
+                    yield current
+                current = {
+                    'id': key['invoice'],
+                    'customer_id': row.get('customer_id'),
+                    'invoice_number': row.get('invoice_number') or '',
+                    'invoice_date': row.get('invoice_date'),
+                    'total_amount': _r(row.get('total_amount')),
+                    'inter_state': (row.get('igst_amount') or 0) > 0,
+                    'rates': {},
+                    'products': []
+                }
+            rate = float(key.get('rate') or 0)
+            bucket = current['rates'].setdefault(rate, {'taxable_value': 0.0, 'tax_amount': 0.0})
+            bucket['taxable_value'] += row.get('taxable_value') or 0
+            bucket['tax_amount'] += row.get('tax_amount') or 0
+            current['products'].append((key.get('product'), key.get('hsn'), key.get('unit'), rate, row.get('quantity') or 0,
+                                        row.get('taxable_value') or 0, row.get('tax_amount') or 0))
+        if current is not None:
+            yield current
+
+    def _load_customers(self, customer_ids):
+        missing = [cid for cid in customer_ids if cid is not None and cid not in self._customers]
+        if not missing:
+            return
+        for doc in self.database['customers'].find(
+            {'_id': {'$in': missing}},
+            {'name': 1, 'gstin': 1, 'state': 1}
+        ):
+            self._customers[doc['_id']] = doc
+        for cid in missing:
+            self._customers.setdefault(cid, {})
+
+    def iter_invoice_batches(self):
+        """Yield lists of invoices with their customers already batch-loaded"""
+        batch = []
+        for invoice in self.iter_invoices():
+            batch.append(invoice)
+            if len(batch) >= self.batch_size:
+                self._load_customers({inv['customer_id'] for inv in batch})
+                yield batch
+                batch = []
+        if batch:
+            self._load_customers({inv['customer_id'] for inv in batch})
+            yield batch
+
+    def customer(self, customer_id):
+        return self._customers.get(customer_id) or {}
+
+    def _items(self, invoice):
+        items = []
+        for num, (rate, bucket) in enumerate(sorted(invoice['rates'].items()), 1):
+            txval = _r(bucket['taxable_value'])
+            tax = bucket['tax_amount'] or 0
+            if invoice['inter_state']:
+                iamt, camt, samt = _r(tax), 0.0, 0.0
+            else:
+                iamt, camt, samt = 0.0, _r(tax / 2), _r(tax / 2)
+            items.append({
+                'num': num,
+                'itm_det': {'txval': txval, 'rt': rate, 'iamt': iamt, 'camt': camt, 'samt': samt, 'csamt': 0.0}
+            })
+        return items
+
+    def _place_of_supply(self, customer):
+        return state_code(customer.get('state'), customer.get('gstin')) or self.business_state_code
+
+    @staticmethod
+    def _portal_date(value):
+        if hasattr(value, 'strftime'):
+            return value.strftime('%d-%m-%Y')
+        return str(value or '')
+
+    def iter_json(self):
+        """Yield the GSTR-1 return as portal JSON text, section by section"""
+        hsn = {}
+        b2cl = {}
+        b2cs = {}
+
+        yield '{"gstin": %s, "fp": %s, "b2b": [' % (
+            json.dumps(getattr(self.user, 'gst_number', '') or ''),
+            json.dumps(f'{self.month:02d}{self.year}')
+        )
+
+        first = True
+        open_ctin = None
+        open_entry = None
+        for batch in self.iter_invoice_batches():
+            for invoice in batch:
+                customer = self.customer(invoice['customer_id'])
+                pos = self._place_of_supply(customer)
+                items = self._items(invoice)
+                for product_id, hsn_code, unit, rate, qty, txval, tax in invoice['products']:
+                    # Items written before hsn_code was denormalised fall back to the product
+                    key = ('hsn', hsn_code, unit, rate) if hsn_code else ('product', product_id, None, rate)
+                    bucket = hsn.setdefault(key, {'qty': 0.0, 'txval': 0.0, 'iamt': 0.0, 'camt': 0.0})
+                    bucket['qty'] += qty
+                    bucket['txval'] += txval
+                    if invoice['inter_state']:
+                        bucket['iamt'] += tax
+                    else:
+                        bucket['camt'] += tax / 2
+
+                ctin = (customer.get('gstin') or '').strip()
+                if ctin:
+                    entry = {
+                        'inum': invoice['invoice_number'],
+                        'idt': self._portal_date(invoice['invoice_date']),
+                        'val': invoice['total_amount'],
+                        'pos': pos,
+                        'rchrg': 'N',
+                        'inv_typ': 'R',
+                        'itms': items
+                    }
+                    if ctin != open_ctin:
+                        if open_entry is not None:
+                            yield ('' if first else ',') + json.dumps(open_entry)
+                            first = False
+                        open_ctin = ctin
+                        open_entry = {'ctin': ctin, 'inv': []}
+                    open_entry['inv'].append(entry)
+                elif invoice['inter_state'] and invoice['total_amount'] > B2CL_THRESHOLD:
+                    b2cl.setdefault(pos, []).append({
+                        'inum': invoice['invoice_number'],
+                        'idt': self._portal_date(invoice['invoice_date']),
+                        'val': invoice['total_amount'],
+                        'itms': items
+                    })
+                else:
+                    sply_ty = 'INTER' if invoice['inter_state'] else 'INTRA'
+                    for item in items:
+                        det = item['itm_det']
+                        row = b2cs.setdefault((sply_ty, pos, det['rt']), {'txval': 0.0, 'iamt': 0.0, 'camt': 0.0, 'samt': 0.0})
+                        row['txval'] += det['txval']
+                        row['iamt'] += det['iamt']
+                        row['camt'] += det['camt']
+                        row['samt'] += det['samt']
+        if open_entry is not None:
+            yield ('' if first else ',') + json.dumps(open_entry)
+
+        yield '], "b2cl": '
+        yield json.dumps([{'pos': pos, 'inv': invs} for pos, invs in sorted(b2cl.items())])
+
+        yield ', "b2cs": '
+        yield json.dumps([
+            {
+                'sply_ty': sply_ty, 'pos': pos, 'typ': 'OE', 'rt': rt,
+                'txval': _r(row['txval']), 'iamt': _r(row['iamt']),
+                'camt': _r(row['camt']), 'samt': _r(row['samt']), 'csamt': 0.0
+            }
+            for (sply_ty, pos, rt), row in sorted(b2cs.items())
+        ])
+
+        yield ', "hsn": '
+        yield json.dumps({'data': self.hsn_rows(hsn)})
+        yield '}'
+
+    def hsn_rows(self, buckets):
+        """Collapse (product, rate) totals into portal HSN rows"""
+        product_ids = {_to_object_id(ref) for kind, ref, _, _ in buckets if kind == 'product'}
+        product_ids = [pid for pid in product_ids if isinstance(pid, ObjectId)]
+        products = {}
+        if product_ids:
+            for doc in self.database['products'].find(
+                {'_id': {'$in': product_ids}},
+                {'hsn_code': 1, 'name': 1, 'unit': 1}
+            ):
+                products[doc['_id']] = doc
+
+        rows = {}
+        for (kind, ref, unit, rate), bucket in buckets.items():
+            if kind == 'product':
+                product = products.get(_to_object_id(ref)) or {}
+                hsn_code = product.get('hsn_code') or ''
+                unit = product.get('unit')
+            else:
+                product = {}
+                hsn_code = ref
+            uqc = UQC_CODES.get(str(unit or '').upper(), 'OTH')
+            row = rows.setdefault((hsn_code, uqc, rate), {
+                'desc': product.get('name') or '',
+                'qty': 0.0, 'txval': 0.0, 'iamt': 0.0, 'camt': 0.0
+            })
+            row['qty'] += bucket['qty']
+            row['txval'] += bucket['txval']
+            row['iamt'] += bucket['iamt']
+            row['camt'] += bucket['camt']
+
+        data = []
+        for num, ((hsn_code, uqc, rate), row) in enumerate(sorted(rows.items(), key=lambda kv: (str(kv[0][0]), kv[0][2])), 1):
+            data.append({
+                'num': num,
+                'hsn_sc': hsn_code,
+                'desc': row['desc'],
+                'uqc': uqc,
+                'qty': round(row['qty'], 3),
+                'rt': rate,
+                'txval': _r(row['txval']),
+                'val': _r(row['txval'] + row['iamt'] + 2 * row['camt']),
+                'iamt': _r(row['iamt']),
+                'camt': _r(row['camt']),
+                'samt': _r(row['camt']),
+                'csamt': 0.0
+            })
+        return data
+
+    def build(self):
+        """Return the whole return as a dict (small periods and tests)"""
+        return json.loads(''.join(self.iter_json()))
+
+def hsn_summary(database, user_id, start, end, status='paid'):
+    """Quantity, taxable value and tax per (HSN, rate, unit) for invoices dated in [start, end)
+
+    Reads only the hsn_code/unit snapshot stored on each invoice item, so the
+    pipeline runs off the {user_id, invoice_date} index without a $lookup.
+    """
+    inter_state = {'$gt': [{'$ifNull': ['$igst_amount', 0]}, 0]}
+    tax = {'$ifNull': ['$items.gst_amount', 0]}
+    pipeline = [
+        {'$match': {
+            'user_id': _to_object_id(user_id),
+            'invoice_date': {'$gte': start, '$lt': end},
+            'status': status
+        }},
+        {'$unwind': '$items'},
+        {'$group': {
+            '_id': {
+                'hsn_code': {'$ifNull': ['$items.hsn_code', '']},
+                'gst_rate': {'$ifNull': ['$items.gst_rate', 0]},
+                'unit': {'$ifNull': ['$items.unit', '']}
+            },
+            'quantity': {'$sum': {'$ifNull': ['$items.quantity', 0]}},
+            'taxable_value': {'$sum': {'$ifNull': ['$items.total', 0]}},
+            'igst': {'$sum': {'$cond': [inter_state, tax, 0]}},
+            'cgst': {'$sum': {'$cond': [inter_state, 0, {'$divide': [tax, 2]}]}},
+            'invoice_ids': {'$addToSet': '$_id'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'hsn_code': '$_id.hsn_code',
+            'gst_rate': '$_id.gst_rate',
+            'unit': '$_id.unit',
+            'quantity': 1,
+            'taxable_value': 1,
+            'igst': 1,
+            'cgst': 1,
+            'invoice_count': {'$size': '$invoice_ids'}
+        }},
+        {'$sort': {'hsn_code': 1, 'gst_rate': 1}}
+    ]
+
+    rows = []
+    for row in cold_storage.aggregate(database, 'invoices', pipeline, since=start, allowDiskUse=True):
+        total_tax = (row.get('igst') or 0) + 2 * (row.get('cgst') or 0)
+        rows.append({
+            'hsn_code': row.get('hsn_code') or '',
+            'gst_rate': float(row.get('gst_rate') or 0),
+            'unit': row.get('unit') or '',
+            'uqc': UQC_CODES.get(str(row.get('unit') or '').upper(), 'OTH'),
+            'quantity': round(float(row.get('quantity') or 0), 3),
+            'taxable_value': _r(row.get('taxable_value')),
+            'igst': _r(row.get('igst')),
+            'cgst': _r(row.get('cgst')),
+            'sgst': _r(row.get('cgst')),
+            'total_tax': _r(total_tax),
+            'total_value': _r((row.get('taxable_value') or 0) + total_tax),
+            'invoice_count': row.get('invoice_count', 0)
+        })
+    return rows
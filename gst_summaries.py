@@ -0,0 +1,267 @@
+"""
+Precomputed GST totals per business and filing period.
+
+Every paid invoice contributes its subtotal, CGST/SGST/IGST and per-rate
+values to one document in the ``gst_period_summaries`` collection. The
+document is maintained with ``$inc`` as invoices are created, edited, paid
+or deleted, so GSTR-3B figures are a single ``find_one`` away. ``reconcile``
+recomputes the same figures from the raw invoices to audit or repair them.
+"""
+import logging
+from datetime import datetime, date
+from bson import ObjectId
+
+import cold_storage
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'gst_period_summaries'
+COUNTED_STATUS = 'paid'
+TOTAL_FIELDS = ('total_taxable_value', 'total_cgst', 'total_sgst', 'total_igst', 'total_invoices')
+TOLERANCE = 0.01
+
+# (keys, options) and (name, filter, sort), as models declare them for indexes.py
+INDEXES = (
+    ([('user_id', 1), ('period_year', 1), ('period_month', 1)], {'unique': True}),
+)
+QUERY_SHAPES = (
+    ('period', {'user_id': ObjectId('0' * 24), 'period_year': 2000, 'period_month': 1}, None),
+)
+
+def _to_object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+def rate_key(rate):
+    """Field-safe key for a GST rate (18 -> '18', 12.5 -> '12_5')"""
+    rate = float(rate or 0)
+    if rate.is_integer():
+        return str(int(rate))
+    return str(rate).replace('.', '_')
+
+def _period(invoice_date):
+    if isinstance(invoice_date, (datetime, date)):
+        return invoice_date.year, invoice_date.month
+    if isinstance(invoice_date, str) and invoice_date:
+        try:
+            parsed = datetime.strptime(invoice_date[:10], '%Y-%m-%d')
+            return parsed.year, parsed.month
+        except ValueError:
+            return None
+    return None
+
+def invoice_contribution(doc):
+    """Return ((user_id, year, month), increments) for a paid invoice, else None"""
+    if not doc or doc.get('status') != COUNTED_STATUS:
+        return None
+    period = _period(doc.get('invoice_date'))
+    if period is None or not doc.get('user_id'):
+        return None
+    increments = {
+        'total_taxable_value': float(doc.get('subtotal') or 0),
+        'total_cgst': float(doc.get('cgst_amount') or 0),
+        'total_sgst': float(doc.get('sgst_amount') or 0),
+        'total_igst': float(doc.get('igst_amount') or 0),
+        'total_invoices': 1
+    }
+    for item in doc.get('items') or []:
+        if not isinstance(item, dict):
+            continue
+        key = rate_key(item.get('gst_rate'))
+        taxable_field = f'by_rate.{key}.taxable_value'
+        gst_field = f'by_rate.{key}.gst_amount'
+        increments[taxable_field] = increments.get(taxable_field, 0.0) + float(item.get('total') or 0)
+        increments[gst_field] = increments.get(gst_field, 0.0) + float(item.get('gst_amount') or 0)
+    return (_to_object_id(doc['user_id']), period[0], period[1]), increments
+
+def _apply(database, key, increments):
+    increments = {field: value for field, value in increments.items() if value}
+    if not increments:
+        return
+    user_id, year, month = key
+    database[COLLECTION].update_one(
+        {'user_id': user_id, 'period_year': year, 'period_month': month},
+        {
+            '$inc': increments,
+            '$set': {'updated_at': datetime.utcnow()},
+            '$setOnInsert': {'created_at': datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+def record_invoice_change(database, before, after):
+    """Move an invoice's contribution from its old state to its new one"""
+    record_invoice_changes(database, [(before, after)])
+
+def record_invoice_changes(database, changes):
+    """Apply many (before, after) invoice pairs, one update per touched period"""
+    if database is None:
+        return
+    deltas = {}
+    for before, after in changes:
+        old = invoice_contribution(before)
+        new = invoice_contribution(after)
+        if old:
+            bucket = deltas.setdefault(old[0], {})
+            for field, value in old[1].items():
+                bucket[field] = bucket.get(field, 0) - value
+        if new:
+            bucket = deltas.setdefault(new[0], {})
+            for field, value in new[1].items():
+                bucket[field] = bucket.get(field, 0) + value
+    for key, increments in deltas.items():
+        _apply(database, key, increments)
+
+def get_summary(database, user_id, year, month):
+    """Read the stored summary for one period, with zeros when nothing was filed"""
+    doc = database[COLLECTION].find_one({
+        'user_id': _to_object_id(user_id),
+        'period_year': year,
+        'period_month': month
+    }) or {}
+    summary = {field: doc.get(field, 0) or 0 for field in TOTAL_FIELDS}
+    summary['by_rate'] = {
+        key: values
+        for key, values in (doc.get('by_rate') or {}).items()
+        if values.get('taxable_value') or values.get('gst_amount')
+    }
+    summary['updated_at'] = doc.get('updated_at')
+    return summary
+
+def _period_match(user_id=None, year=None, month=None):
+    match = {'status': COUNTED_STATUS}
+    if user_id is not None:
+        match['user_id'] = _to_object_id(user_id)
+    if year is not None:
+        if month is not None:
+            start = datetime(year, month, 1)
+            end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        else:
+            start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+        match['invoice_date'] = {'$gte': start, '$lt': end}
+    else:
+        # Legacy invoices with a string invoice_date would fail $year; undated_invoices counts them
+        match['invoice_date'] = {'$type': 'date'}
+    return match
+
+def undated_invoices(database, user_id=None):
+    """Number of counted invoices whose invoice_date is not a date, which reconcile skips"""
+    query = {'status': COUNTED_STATUS, 'invoice_date': {'$not': {'$type': 'date'}}}
+    if user_id is not None:
+        query['user_id'] = _to_object_id(user_id)
+    return cold_storage.count_documents(database, 'invoices', query)
+
+def compute_from_invoices(database, user_id=None, year=None, month=None):
+    """Recompute summaries from raw invoices, archived ones included, keyed by (user_id, year, month)"""
+    match = _period_match(user_id, year, month)
+    since = match['invoice_date'].get('$gte')
+    period_id = {
+        'user_id': '$user_id',
+        'year': {'$year': '$invoice_date'},
+        'month': {'$month': '$invoice_date'}
+    }
+    computed = {}
+    totals_pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': period_id,
+            'total_taxable_value': {'$sum': '$subtotal'},
+            'total_cgst': {'$sum': '$cgst_amount'},
+            'total_sgst': {'$sum': '$sgst_amount'},
+            'total_igst': {'$sum': '$igst_amount'},
+            'total_invoices': {'$sum': 1}
+        }}
+    ]
+    for row in cold_storage.aggregate(database, 'invoices', totals_pipeline, since=since, allowDiskUse=True):
+        key = (row['_id']['user_id'], row['_id']['year'], row['_id']['month'])
+        computed[key] = {field: row.get(field, 0) or 0 for field in TOTAL_FIELDS}
+        computed[key]['by_rate'] = {}
+
+    rates_pipeline = [
+        {'$match': match},
+        {'$unwind': '$items'},
+        {'$group': {
+            '_id': dict(period_id, rate='$items.gst_rate'),
+            'taxable_value': {'$sum': '$items.total'},
+            'gst_amount': {'$sum': '$items.gst_amount'}
+        }}
+    ]
+    for row in cold_storage.aggregate(database, 'invoices', rates_pipeline, since=since, allowDiskUse=True):
+        key = (row['_id']['user_id'], row['_id']['year'], row['_id']['month'])
+        if key not in computed:
+            continue
+        # 18 and 18.0 group separately but share a key
+        bucket = computed[key]['by_rate'].setdefault(rate_key(row['_id'].get('rate')), {'taxable_value': 0, 'gst_amount': 0})
+        bucket['taxable_value'] += row.get('taxable_value', 0) or 0
+        bucket['gst_amount'] += row.get('gst_amount', 0) or 0
+    return computed
+
+def _diff(stored, computed):
+    diff = {}
+    for field in TOTAL_FIELDS:
+        have = stored.get(field, 0) or 0
+        want = computed.get(field, 0) or 0
+        if abs(have - want) > TOLERANCE:
+            diff[field] = {'stored': have, 'computed': want}
+    stored_rates = stored.get('by_rate') or {}
+    computed_rates = computed.get('by_rate') or {}
+    for key in set(stored_rates) | set(computed_rates):
+        for field in ('taxable_value', 'gst_amount'):
+            have = (stored_rates.get(key) or {}).get(field, 0) or 0
+            want = (computed_rates.get(key) or {}).get(field, 0) or 0
+            if abs(have - want) > TOLERANCE:
+                diff[f'by_rate.{key}.{field}'] = {'stored': have, 'computed': want}
+    return diff
+
+def reconcile(database, user_id=None, year=None, month=None, fix=False):
+    """Compare stored summaries with raw invoices; optionally overwrite drifted ones
+
+    Returns a list of {user_id, period_year, period_month, diff} entries for
+    every period whose stored figures disagree with the invoices.
+    Invoices whose invoice_date is not a date can't be placed in a period
+    and are skipped with a warning.
+    """
+    if month is not None and year is None:
+        raise ValueError('Reconciling a month needs its year')
+    computed = compute_from_invoices(database, user_id, year, month)
+    undated = undated_invoices(database, user_id)
+    if undated:
+        logger.warning("Skipped %s paid invoice(s) whose invoice_date is not a date", undated)
+
+    query = {}
+    if user_id is not None:
+        query['user_id'] = _to_object_id(user_id)
+    if year is not None:
+        query['period_year'] = year
+        if month is not None:
+            query['period_month'] = month
+    stored = {
+        (doc['user_id'], doc['period_year'], doc['period_month']): doc
+        for doc in database[COLLECTION].find(query)
+    }
+
+    report = []
+    for key in set(computed) | set(stored):
+        diff = _diff(stored.get(key) or {}, computed.get(key) or {})
+        if not diff:
+            continue
+        report.append({
+            'user_id': str(key[0]),
+            'period_year': key[1],
+            'period_month': key[2],
+            'diff': diff
+        })
+        if fix:
+            values = computed.get(key) or {field: 0 for field in TOTAL_FIELDS}
+            values.setdefault('by_rate', {})
+            database[COLLECTION].update_one(
+                {'user_id': key[0], 'period_year': key[1], 'period_month': key[2]},
+                {
+                    '$set': dict(values, updated_at=datetime.utcnow(), reconciled_at=datetime.utcnow()),
+                    '$setOnInsert': {'created_at': datetime.utcnow()}
+                },
+                upsert=True
+            )
+    report.sort(key=lambda entry: (entry['user_id'], entry['period_year'], entry['period_month']))
+    return report
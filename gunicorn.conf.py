@@ -0,0 +1,27 @@
+"""
+Gunicorn settings picked up automatically from the working directory.
+
+Command line options (see the Procfile) still take precedence. This file
+only prepares Prometheus multiprocess mode: every worker writes its
+metrics to files in PROMETHEUS_MULTIPROC_DIR, so /metrics reports the
+whole server rather than the worker that happened to answer.
+"""
+import os
+import shutil
+import tempfile
+
+# Must be set before any worker imports prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'gst-prometheus'))
+
+def on_starting(server):
+    # Values left over from a previous run would be added to this one
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
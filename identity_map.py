@@ -0,0 +1,127 @@
+"""
+Request-scoped identity map for model lookups.
+
+During one request the same customer or product is often asked for many
+times: Flask-Login loads the current user, the view looks it up again, and
+every invoice line of a list looks up its product. ``find_by_id`` on the
+models consults the map of the current request first, so each document is
+read at most once per request and every lookup returns the same object.
+Misses are remembered too.
+
+Ids that are about to be needed can be announced with ``defer`` (the models
+expose it as ``Model.prefetch(ids)``). The next ``find_by_id`` on that
+collection loads all of them with a single ``$in`` query instead of one
+round trip per id.
+
+The map lives on ``flask.g`` and is dropped when the request is torn down.
+Outside a request (``manage.py``, background threads) there is no map and
+``find_by_id`` reads MongoDB directly.
+"""
+from bson import ObjectId
+from flask import g, has_request_context
+
+MISSING = object()
+
+def _key(object_id):
+    return str(object_id)
+
+class IdentityMap:
+    """Models loaded during one request, by collection and id"""
+
+    def __init__(self):
+        self._objects = {}
+        self._pending = {}
+
+    def get(self, collection, object_id):
+        """The loaded model, None for a known miss, or MISSING"""
+        return self._objects.get(collection, {}).get(_key(object_id), MISSING)
+
+    def add(self, collection, object_id, obj):
+        self._objects.setdefault(collection, {})[_key(object_id)] = obj
+
+    def discard(self, collection, object_id):
+        self._objects.get(collection, {}).pop(_key(object_id), None)
+
+    def defer(self, collection, ids):
+        """Queue ids to be loaded with the next lookup on ``collection``"""
+        known = self._objects.get(collection, {})
+        pending = self._pending.setdefault(collection, set())
+        for object_id in ids:
+            key = _key(object_id)
+            if object_id and key not in known and ObjectId.is_valid(key):
+                pending.add(key)
+
+    def take_pending(self, collection):
+        return [ObjectId(key) for key in self._pending.pop(collection, ())]
+
+    def clear(self):
+        self._objects.clear()
+        self._pending.clear()
+
+def current():
+    """The identity map of the current request, or None outside a request"""
+    if not has_request_context():
+        return None
+    identity_map = g.get('_identity_map')
+    if identity_map is None:
+        identity_map = g._identity_map = IdentityMap()
+    return identity_map
+
+def load(cls, object_id, database):
+    """Find ``cls`` by id through the request's identity map
+
+    Deferred ids of the same collection are fetched in the same query.
+    Returns None for unknown or malformed ids.
+    """
+    identity_map = current()
+    if identity_map is not None:
+        obj = identity_map.get(cls.collection_name, object_id)
+        if obj is not MISSING:
+            return obj
+    if not object_id or not ObjectId.is_valid(str(object_id)):
+        return None
+    oid = ObjectId(str(object_id))
+    collection = database[cls.collection_name]
+    if identity_map is None:
+        doc = collection.find_one({'_id': oid})
+        return cls.from_dict(doc) if doc else None
+
+    ids = identity_map.take_pending(cls.collection_name)
+    if oid not in ids:
+        ids.append(oid)
+    if len(ids) == 1:
+        doc = collection.find_one({'_id': oid})
+        docs = [doc] if doc else []
+    else:
+        docs = collection.find({'_id': {'$in': ids}})
+    for doc in docs:
+        identity_map.add(cls.collection_name, doc['_id'], cls.from_dict(doc))
+    for missing_id in ids:
+        if identity_map.get(cls.collection_name, missing_id) is MISSING:
+            identity_map.add(cls.collection_name, missing_id, None)
+    return identity_map.get(cls.collection_name, oid)
+
+def prefetch(cls, ids):
+    """Announce ids of ``cls`` that the request is about to look up"""
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.defer(cls.collection_name, ids)
+
+def remember(obj):
+    """Make a freshly saved model the one find_by_id returns"""
+    identity_map = current()
+    if identity_map is not None and obj.id:
+        identity_map.add(obj.collection_name, obj.id, obj)
+
+def forget(cls, object_id):
+    """Drop a deleted document from the request's map"""
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.discard(cls.collection_name, object_id)
+
+def init_app(app):
+    @app.teardown_request
+    def clear_identity_map(exc=None):
+        identity_map = g.pop('_identity_map', None)
+        if identity_map is not None:
+            identity_map.clear()
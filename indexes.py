@@ -0,0 +1,151 @@
+"""
+Declarative MongoDB index registry.
+
+Each model declares the indexes of its collection in ``INDEXES`` as
+(keys, options) pairs, keys being a field name or a list of (field,
+direction) pairs as ``create_index`` takes them. ``QUERY_SHAPES`` lists the
+(name, filter, sort) of the queries the routes run on the collection.
+Modules that own a collection without a model (``gst_summaries``,
+``activity``, ``cold_storage``) declare the same two tuples at module
+level, and the archive collections reuse their hot model's.
+
+``diff`` compares the registry with the live database; ``ensure_indexes``
+builds what is missing and never drops anything, so indexes created by
+hand survive until someone removes them. ``check_query_shapes`` runs
+``explain()`` on every registered shape and reports the ones whose winning
+plan scans the whole collection. ``manage.py ensure-indexes`` and
+``manage.py check-indexes`` are the command line entry points.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _sources():
+    """(collection, declarer) for everything that declares indexes"""
+    import activity
+    import cold_storage
+    import gst_summaries
+    import models
+
+    declarers = [
+        models.User, models.SuperAdmin, models.Customer, models.Product, models.Invoice,
+        models.InvoiceItem, models.StockMovement, models.GSTReport, models.Order,
+        models.OrderItem, models.CustomerProductPrice
+    ]
+    sources = [(model.collection_name, model) for model in declarers]
+    # Archive collections are read with the same queries as their hot ones
+    sources.extend((cold_storage.ARCHIVES[model.collection_name], model) for model in (models.Invoice, models.StockMovement))
+    sources.append((cold_storage.COLLECTION, cold_storage))
+    sources.append((gst_summaries.COLLECTION, gst_summaries))
+    sources.append((activity.COLLECTION, activity))
+    return sources
+
+def key_list(keys):
+    return [(keys, 1)] if isinstance(keys, str) else list(keys)
+
+def _key_tuple(keys):
+    return tuple((field, direction) for field, direction in key_list(keys))
+
+def registry():
+    """Every registered index as (collection, keys, options)"""
+    return [
+        (collection, keys, options)
+        for collection, declarer in _sources()
+        for keys, options in getattr(declarer, 'INDEXES', ())
+    ]
+
+def query_shapes():
+    """Every registered query shape as (collection, name, filter, sort)"""
+    return [
+        (collection, name, query, sort)
+        for collection, declarer in _sources()
+        for name, query, sort in getattr(declarer, 'QUERY_SHAPES', ())
+    ]
+
+def diff(database):
+    """Compare the registry with the live indexes
+
+    Returns a dict with ``missing`` (registered entries not built yet),
+    ``changed`` (built on the same keys with different uniqueness) and
+    ``unregistered`` (live indexes nobody declares, as (collection, name)).
+    """
+    registered = registry()
+    live = {}
+    for collection in sorted({entry[0] for entry in registered}):
+        live[collection] = {
+            _key_tuple(info['key']): (name, bool(info.get('unique')))
+            for name, info in database[collection].index_information().items()
+            if name != '_id_'
+        }
+
+    missing = []
+    changed = []
+    declared = set()
+    for collection, keys, options in registered:
+        key = _key_tuple(keys)
+        declared.add((collection, key))
+        if key not in live[collection]:
+            missing.append((collection, keys, options))
+        elif live[collection][key][1] != bool(options.get('unique')):
+            changed.append((collection, live[collection][key][0], options))
+
+    unregistered = [
+        (collection, name)
+        for collection, indexes in live.items()
+        for key, (name, _) in indexes.items()
+        if (collection, key) not in declared
+    ]
+    return {'missing': missing, 'changed': changed, 'unregistered': unregistered}
+
+def missing_indexes(database):
+    return diff(database)['missing']
+
+def ensure_indexes(database):
+    """Create the registered indexes that don't exist yet; safe to run repeatedly
+
+    Returns the (collection, index name) pairs that were created.
+    """
+    created = []
+    for collection, keys, options in missing_indexes(database):
+        name = database[collection].create_index(key_list(keys), **options)
+        created.append((collection, name))
+        logger.info("Created index %s on %s", name, collection)
+    return created
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+def winning_stages(database, collection, query, sort=None):
+    """Stage names of the winning plan MongoDB picks for this query"""
+    cursor = database[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    planner = cursor.explain().get('queryPlanner', {})
+    return list(_stages(planner.get('winningPlan', {})))
+
+def check_query_shapes(database):
+    """Registered query shapes whose winning plan is a COLLSCAN
+
+    Returns (collection, name, stages) for each offender; an empty list
+    means every shape is served by an index.
+    """
+    offenders = []
+    for collection, name, query, sort in query_shapes():
+        stages = winning_stages(database, collection, query, sort)
+        if 'COLLSCAN' in stages:
+            offenders.append((collection, name, stages))
+    return offenders
+
+def assert_query_shapes_indexed(database):
+    """Raise AssertionError naming every query shape that scans its collection"""
+    offenders = check_query_shapes(database)
+    assert not offenders, 'Query shapes without an index: ' + ', '.join(
+        f"{collection}.{name} ({' > '.join(stages)})" for collection, name, stages in offenders
+    )
@@ -0,0 +1,102 @@
+"""
+Fast JSON responses for the large list endpoints.
+
+``jsonify`` goes through the standard library encoder, and the list views
+used to walk their payload once more beforehand to turn ObjectIds into
+strings. Here the payload is encoded in a single pass with orjson, whose
+``default`` hook handles the types Mongo documents contain:
+
+* ObjectId becomes its hex string;
+* datetime and date become ``isoformat()``, which matches what the views
+  produced by hand;
+* Decimal becomes a float.
+
+Without orjson the same hook is used with the standard library encoder.
+
+``stream_json`` sends ``{"success": true, "<key>": [...]}`` while the items
+are still being produced, encoding them ``STREAM_CHUNK_SIZE`` at a time.
+Only the current chunk is ever encoded in memory, and the first bytes
+leave before the last document has been read.
+
+These helpers are opt-in per view. The app-wide ``jsonify`` is unchanged,
+because Flask renders datetimes there as HTTP dates.
+"""
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from bson import ObjectId
+from flask import Response, stream_with_context
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 200
+JSON_MIMETYPE = 'application/json'
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+if ORJSON_AVAILABLE:
+    # Datetimes go through _default so they keep isoformat()'s output
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj):
+        """Encode to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(obj):
+        """Encode to UTF-8 JSON bytes"""
+        return _encoder.encode(obj).encode('utf-8')
+
+def json_response(payload, status=200):
+    """Drop-in for ``jsonify(payload), status`` on large payloads"""
+    return Response(dumps(payload), status=status, mimetype=JSON_MIMETYPE)
+
+def _stream(key, items, fields, chunk_size):
+    # Open the object, emit the scalar fields, then the array piece by piece
+    head = dumps(fields)[:-1]
+    yield head + (b',' if fields else b'') + dumps(key) + b':['
+    chunk = []
+    first = True
+    try:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield (b'' if first else b',') + dumps(chunk)[1:-1]
+                first = False
+                chunk = []
+        if chunk:
+            yield (b'' if first else b',') + dumps(chunk)[1:-1]
+        yield b']}'
+    except Exception as e:
+        # Headers are already sent, so close the document and say why it stopped
+        logger.exception("Error streaming %s: %s", key, e)
+        yield b'],"truncated":true,"error":' + dumps(str(e)) + b'}'
+
+def stream_json(key, items, status=200, chunk_size=STREAM_CHUNK_SIZE, **fields):
+    """Stream ``{**fields, key: [*items]}`` as items are produced
+
+    ``items`` may be any iterable, typically a generator over a cursor; it
+    runs inside the request context after the view has returned.
+    """
+    return Response(
+        stream_with_context(_stream(key, items, fields, chunk_size)),
+        status=status,
+        mimetype=JSON_MIMETYPE
+    )
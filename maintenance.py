@@ -0,0 +1,293 @@
+"""
+Bounded maintenance jobs: archival, trimming and tenant purges.
+
+Everything here works in batches walked in ``_id`` order, so no job holds
+more than ``batch_size`` documents in memory or deletes more than one
+batch at a time. A batch is removed with a single ``delete_many`` on the
+ids that were read (and written to the archive), repeating the job's
+filter: a document that stopped matching since is kept, and one that
+started matching is left for the next run. ``Throttle`` (shared with
+migrations.py) caps the documents handled per second.
+
+``archive`` copies old invoices, stock movements or invoice items to a
+compressed JSON Lines file (gzip, MongoDB extended JSON, one document per
+line) or a Parquet dataset, and deletes each batch once it is on disk.
+Archiving invoices also archives their ``invoice_items`` rows. Running the
+job again continues where an interrupted run stopped, because what was
+archived is gone from the collection. ``purge_tenant`` deletes every
+document of one business, collection by collection.
+
+``manage.py archive``, ``manage.py purge-tenant`` and ``clean_database.py``
+are the command line entry points.
+"""
+import gzip
+import importlib.util
+import itertools
+import logging
+import os
+from datetime import datetime
+from bson import ObjectId, json_util
+
+from migrations import Throttle
+
+logger = logging.getLogger(__name__)
+
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+FORMATS = ('jsonl', 'parquet')
+# Invoices still being paid stay in the working set whatever their age
+ARCHIVED_INVOICE_STATUSES = ('paid', 'cancelled')
+# Collections holding a business's data, children before their parents
+TENANT_COLLECTIONS = (
+    'invoice_items', 'invoices', 'order_items', 'orders', 'stock_movements', 'customer_product_prices',
+    'products', 'customers', 'gst_period_summaries', 'gst_reports', 'activity_events'
+)
+# In-lists of referenced ids are sent this many at a time
+ID_CHUNK = 1000
+
+def _to_object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+def _chunks(values, size=ID_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def iter_batches(collection, query, batch_size=1000, projection=None):
+    """Matching documents in _id order, one list of at most batch_size at a time"""
+    last_id = None
+    while True:
+        page = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+        docs = list(collection.find(page, projection).sort('_id', 1).limit(batch_size))
+        if not docs:
+            return
+        yield docs
+        last_id = docs[-1]['_id']
+
+def delete_batch(collection, query, docs):
+    """Delete these documents of a batch, as long as they still match query"""
+    ids = [doc['_id'] for doc in docs]
+    return collection.delete_many({'$and': [query, {'_id': {'$in': ids}}]}).deleted_count
+
+def batched_delete(collection, query, batch_size=1000, max_rate=None, pause=0.0, dry_run=False):
+    """Delete every document matching query, one _id range at a time; returns the count"""
+    throttle = Throttle(max_rate, pause)
+    deleted = 0
+    for docs in iter_batches(collection, query, batch_size, {'_id': 1}):
+        deleted += len(docs) if dry_run else delete_batch(collection, query, docs)
+        throttle.wait(len(docs))
+    return deleted
+
+class ArchiveWriter:
+    """Append-only archive in JSON Lines (gzip) or Parquet
+
+    Every batch is on disk and fsynced before write() returns, so it can be
+    deleted from MongoDB straight after. A JSON Lines archive is one file;
+    appending to it adds a gzip member, which gzip readers read through. A
+    Parquet archive is a directory with one part file per batch, since a
+    Parquet file is only readable once its footer is written. The parts
+    keep ``_id``, the tenant and the timestamp as columns and the whole
+    document as extended JSON in ``document``, so documents of different
+    shapes share one schema.
+    """
+
+    def __init__(self, path, fmt='jsonl'):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown archive format {fmt}; use one of {", ".join(FORMATS)}')
+        if fmt == 'parquet' and not PYARROW_AVAILABLE:
+            raise RuntimeError('Parquet archives need pyarrow (pip install pyarrow)')
+        self.path = path
+        self.fmt = fmt
+        self.written = 0
+        self._raw = None
+        self._file = None
+        self._parts = 0
+
+    def write(self, docs):
+        """Write a batch; returns once it is durable"""
+        if self.fmt == 'jsonl':
+            if self._file is None:
+                self._raw = open(self.path, 'ab')
+                self._file = gzip.GzipFile(fileobj=self._raw, mode='ab')
+            self._file.write(''.join(json_util.dumps(doc) + '\n' for doc in docs).encode('utf-8'))
+            self._file.flush()
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            os.makedirs(self.path, exist_ok=True)
+            table = pa.table({
+                '_id': [str(doc['_id']) for doc in docs],
+                'user_id': [str(doc['user_id']) if doc.get('user_id') is not None else None for doc in docs],
+                'created_at': [doc.get('created_at') for doc in docs],
+                'document': [json_util.dumps(doc) for doc in docs]
+            }, schema=pa.schema([
+                ('_id', pa.string()), ('user_id', pa.string()), ('created_at', pa.timestamp('ms')), ('document', pa.string())
+            ]))
+            part = os.path.join(self.path, f'part-{self._parts:05d}.parquet')
+            pq.write_table(table, part, compression='zstd')
+            with open(part, 'rb') as f:
+                os.fsync(f.fileno())
+            self._parts += 1
+        self.written += len(docs)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+
+def archive_query(collection, before, user_id=None, database=None):
+    """Filter selecting what ``archive`` moves out of ``collection``"""
+    user_id = _to_object_id(user_id)
+    if collection == 'invoices':
+        query = {'created_at': {'$lt': before}, 'status': {'$in': list(ARCHIVED_INVOICE_STATUSES)}}
+        if user_id is not None:
+            query['user_id'] = user_id
+        return query
+    if collection == 'stock_movements':
+        query = {'created_at': {'$lt': before}}
+        if user_id is not None:
+            product_ids = [doc['_id'] for doc in database['products'].find({'user_id': user_id}, {'_id': 1})]
+            query['product_id'] = {'$in': product_ids}
+        return query
+    if collection == 'invoice_items':
+        # Line rows carry no timestamp; their ObjectId records when they were written
+        if user_id is not None:
+            raise ValueError('invoice_items are archived with their invoices when scoped to a business')
+        return {'_id': {'$lt': ObjectId.from_datetime(before)}}
+    raise ValueError(f'{collection} cannot be archived')
+
+def archive(database, collection, before, path, fmt='jsonl', user_id=None, batch_size=1000,
+            max_rate=None, pause=0.0, delete=True):
+    """Copy old documents of ``collection`` to an archive file, deleting each batch once written
+
+    Returns the number of documents archived per collection.
+    """
+    query = archive_query(collection, before, user_id=user_id, database=database)
+    throttle = Throttle(max_rate, pause)
+    counts = {collection: 0}
+    writer = ArchiveWriter(path, fmt)
+    items_writer = None
+    try:
+        for docs in iter_batches(database[collection], query, batch_size):
+            writer.write(docs)
+            if collection == 'invoices':
+                if items_writer is None:
+                    items_writer = ArchiveWriter(_sibling_path(path, 'invoice_items'), fmt)
+                counts['invoice_items'] = counts.get('invoice_items', 0) + _archive_invoice_items(
+                    database, [doc['_id'] for doc in docs], items_writer, delete
+                )
+            if delete:
+                delete_batch(database[collection], query, docs)
+            counts[collection] += len(docs)
+            logger.info("Archived %s %s to %s", counts[collection], collection, path)
+            throttle.wait(len(docs))
+    finally:
+        writer.close()
+        if items_writer is not None:
+            items_writer.close()
+    return counts
+
+def _archive_invoice_items(database, invoice_ids, writer, delete):
+    archived = 0
+    for chunk in _chunks(invoice_ids):
+        query = {'invoice_id': {'$in': chunk}}
+        docs = list(database['invoice_items'].find(query))
+        if docs:
+            writer.write(docs)
+            if delete:
+                database['invoice_items'].delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+            archived += len(docs)
+    return archived
+
+def _sibling_path(path, name):
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, f'{name}-{filename}')
+
+def archive_path(directory, collection, fmt='jsonl', now=None):
+    """Timestamped file name for an archive of ``collection`` in ``directory``"""
+    stamp = (now or datetime.utcnow()).strftime('%Y%m%dT%H%M%S')
+    # Parquet archives are directories of part files
+    extension = 'jsonl.gz' if fmt == 'jsonl' else 'parquet'
+    return os.path.join(directory, f'{collection}-{stamp}.{extension}')
+
+def _id_chunks(collection, query):
+    for docs in iter_batches(collection, query, ID_CHUNK, {'_id': 1}):
+        yield [doc['_id'] for doc in docs]
+
+def tenant_queries(database, user_id):
+    """(collection, query) for every document of one business, in delete order
+
+    Referenced ids are read ID_CHUNK at a time while the queries are
+    consumed, so a parent's rows are still there when its children's
+    queries are built.
+    """
+    user_id = _to_object_id(user_id)
+    for collection in TENANT_COLLECTIONS:
+        if collection == 'invoice_items':
+            for chunk in _id_chunks(database['invoices'], {'user_id': user_id}):
+                yield collection, {'invoice_id': {'$in': chunk}}
+        elif collection in ('order_items', 'orders'):
+            # Customer orders only reference the customer who placed them
+            order_queries = itertools.chain([{'user_id': user_id}], (
+                {'customer_id': {'$in': chunk}} for chunk in _id_chunks(database['customers'], {'user_id': user_id})
+            ))
+            for query in order_queries:
+                if collection == 'orders':
+                    yield collection, query
+                else:
+                    for chunk in _id_chunks(database['orders'], query):
+                        yield collection, {'order_id': {'$in': chunk}}
+        elif collection == 'stock_movements':
+            for chunk in _id_chunks(database['products'], {'user_id': user_id}):
+                yield collection, {'product_id': {'$in': chunk}}
+        elif collection == 'customer_product_prices':
+            for chunk in _id_chunks(database['customers'], {'user_id': user_id}):
+                yield collection, {'customer_id': {'$in': chunk}}
+        else:
+            yield collection, {'user_id': user_id}
+
+def purge_tenant(database, user_id, archive_dir=None, fmt='jsonl', batch_size=1000, max_rate=None,
+                 pause=0.0, dry_run=False, keep_user=False):
+    """Delete every document of one business; returns the count per collection
+
+    With ``archive_dir`` each collection is written to an archive file
+    there first. The business's user account goes last, unless
+    ``keep_user`` is set.
+    """
+    user_id = _to_object_id(user_id)
+    counts = {}
+    queries = tenant_queries(database, user_id)
+    if not keep_user:
+        queries = itertools.chain(queries, [('users', {'_id': user_id})])
+    writers = {}
+    try:
+        for collection, query in queries:
+            if archive_dir and not dry_run:
+                if collection not in writers:
+                    writers[collection] = ArchiveWriter(archive_path(archive_dir, f'{user_id}-{collection}', fmt), fmt)
+                throttle = Throttle(max_rate, pause)
+                deleted = 0
+                for docs in iter_batches(database[collection], query, batch_size):
+                    writers[collection].write(docs)
+                    deleted += delete_batch(database[collection], query, docs)
+                    throttle.wait(len(docs))
+            else:
+                deleted = batched_delete(database[collection], query, batch_size, max_rate, pause, dry_run)
+            counts[collection] = counts.get(collection, 0) + deleted
+            if deleted:
+                logger.info("Purged %s %s of business %s", deleted, collection, user_id)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return counts
+
+def purge_all(database, batch_size=1000, max_rate=None, pause=0.0, dry_run=False):
+    """Delete every business and its data, keeping super admin accounts"""
+    counts = {}
+    for collection in TENANT_COLLECTIONS + ('users',):
+        counts[collection] = batched_delete(database[collection], {}, batch_size, max_rate, pause, dry_run)
+    return counts
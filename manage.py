@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Management commands for the GST Billing System
+
+Usage:
+    python manage.py reconcile-gst-summaries [--user-id ID] [--year YYYY] [--month M] [--fix]
+    python manage.py recalculate-invoice-taxes [--user-id ID] [--batch-size N] [--pause SECONDS]
+                                               [--report PATH] [--dry-run] [--resume RUN_ID]
+    python manage.py backfill-activity [--user-id ID] [--days N]
+    python manage.py ensure-indexes [--dry-run]
+    python manage.py check-indexes [--build]
+    python manage.py migrate [--status] [--only VERSION[,VERSION]] [--rerun] [--batch-size N]
+                             [--pause SECONDS] [--max-rate DOCS] [--dry-run]
+    python manage.py archive COLLECTION --dir DIR (--before YYYY-MM-DD | --older-than-days N)
+                             [--user-id ID] [--format jsonl|parquet] [--keep] [--batch-size N] [--max-rate DOCS]
+    python manage.py purge-tenant --user-id ID --yes [--archive-dir DIR] [--keep-user] [--dry-run]
+    python manage.py tier-out [--collection invoices|stock_movements] [--horizon-days N] [--dry-run]
+                              [--batch-size N] [--max-rate DOCS]
+"""
+import argparse
+import json
+import os
+import sys
+
+from app import create_app
+
+def reconcile_gst_summaries(args):
+    """Audit gst_period_summaries against raw invoices, optionally repairing drift"""
+    from models import get_db
+    from gst_summaries import reconcile, undated_invoices
+
+    report = reconcile(get_db(), user_id=args.user_id, year=args.year, month=args.month, fix=args.fix)
+    print(json.dumps(report, indent=2, default=str))
+    action = 'Repaired' if args.fix else 'Found'
+    print(f"{action} {len(report)} period(s) out of sync", file=sys.stderr)
+    undated = undated_invoices(get_db(), user_id=args.user_id)
+    if undated:
+        print(f"Skipped {undated} paid invoice(s) whose invoice_date is not a date", file=sys.stderr)
+    return 1 if report and not args.fix else 0
+
+def recalculate_invoice_taxes(args):
+    """Recompute line GST on stored invoices in resumable batches"""
+    from models import get_db
+    from tax_recalc import TaxRecalculation
+
+    job = TaxRecalculation(
+        get_db(),
+        user_id=args.user_id,
+        batch_size=args.batch_size,
+        pause=args.pause,
+        dry_run=args.dry_run,
+        report_path=args.report,
+        run_id=args.resume
+    )
+    try:
+        state = job.run()
+    except KeyboardInterrupt:
+        print(f"Interrupted; resume with --resume {job.run_id}", file=sys.stderr)
+        return 130
+    print(json.dumps(state, indent=2, default=str))
+    return 0
+
+def backfill_activity(args):
+    """Create activity feed events for invoices and stock movements written before the feed existed"""
+    from datetime import datetime, timedelta
+    from models import get_db
+    from activity import backfill
+
+    since = datetime.utcnow() - timedelta(days=args.days) if args.days else None
+    written = backfill(get_db(), user_id=args.user_id, since=since)
+    print(f"Wrote {written} activity event(s)", file=sys.stderr)
+    return 0
+
+def _print_diff(report):
+    for collection, keys, options in report['missing']:
+        print(f"missing       {collection}: {keys} {options or ''}".rstrip())
+    for collection, name, options in report['changed']:
+        print(f"changed       {collection}: {name} should be {options or 'non-unique'}")
+    for collection, name in report['unregistered']:
+        print(f"unregistered  {collection}: {name}")
+
+def ensure_indexes(args):
+    """Build missing MongoDB indexes from the model registry; run at deploy time, safe to repeat"""
+    from models import get_db
+    from indexes import diff, ensure_indexes as build
+
+    database = get_db()
+    if args.dry_run:
+        report = diff(database)
+        _print_diff(report)
+        print(f"{len(report['missing'])} index(es) missing", file=sys.stderr)
+        return 0
+    created = build(database)
+    for collection, name in created:
+        print(f"{collection}: {name}")
+    print(f"Created {len(created)} index(es)", file=sys.stderr)
+    return 0
+
+def check_indexes(args):
+    """Diff the index registry against the database and explain() every registered query shape"""
+    from models import get_db
+    from indexes import check_query_shapes, diff, ensure_indexes as build
+
+    database = get_db()
+    if args.build:
+        build(database)
+    report = diff(database)
+    _print_diff(report)
+    offenders = check_query_shapes(database)
+    for collection, name, stages in offenders:
+        print(f"COLLSCAN      {collection}.{name}: {' > '.join(stages)}")
+    print(f"{len(report['missing'])} index(es) missing, {len(offenders)} query shape(s) scanning a collection",
+          file=sys.stderr)
+    return 1 if report['missing'] or report['changed'] or offenders else 0
+
+def migrate(args):
+    """Apply pending data migrations in resumable, throttled batches"""
+    from models import get_db
+    from migrations import MigrationLocked, MigrationRunner
+
+    runner = MigrationRunner(
+        get_db(),
+        batch_size=args.batch_size,
+        pause=args.pause,
+        max_rate=args.max_rate,
+        dry_run=args.dry_run
+    )
+    if args.status:
+        for state in runner.status():
+            print(f"{state['version']:>4}  {state['name']:<34} {state['status']:<12} "
+                  f"scanned {state.get('scanned', 0)}  modified {state.get('modified', 0)}")
+        return 0
+    versions = {int(version) for version in args.only.split(',')} if args.only else None
+    try:
+        states = runner.run(versions=versions, rerun=args.rerun)
+    except MigrationLocked as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Interrupted; run migrate again to resume", file=sys.stderr)
+        return 130
+    print(json.dumps(states, indent=2, default=str))
+    print(f"Applied {len(states)} migration(s)", file=sys.stderr)
+    return 0
+
+def archive(args):
+    """Move old invoices, stock movements or invoice items to compressed archive files"""
+    from datetime import datetime, timedelta
+    from models import get_db
+    from maintenance import archive as run_archive, archive_path
+
+    if args.before:
+        before = datetime.strptime(args.before, '%Y-%m-%d')
+    else:
+        before = datetime.utcnow() - timedelta(days=args.older_than_days)
+    os.makedirs(args.dir, exist_ok=True)
+    path = archive_path(args.dir, args.collection, args.format)
+    counts = run_archive(
+        get_db(), args.collection, before, path,
+        fmt=args.format,
+        user_id=args.user_id,
+        batch_size=args.batch_size,
+        max_rate=args.max_rate,
+        pause=args.pause,
+        delete=not args.keep
+    )
+    print(json.dumps({'path': path, 'before': before, 'archived': counts}, indent=2, default=str))
+    return 0
+
+def purge_tenant(args):
+    """Delete all data of one business in batches, optionally archiving it first"""
+    from models import get_db
+    from maintenance import purge_tenant as run_purge
+
+    if not args.yes and not args.dry_run:
+        print("Refusing to purge without --yes", file=sys.stderr)
+        return 2
+    if args.archive_dir:
+        os.makedirs(args.archive_dir, exist_ok=True)
+    counts = run_purge(
+        get_db(), args.user_id,
+        archive_dir=args.archive_dir,
+        fmt=args.format,
+        batch_size=args.batch_size,
+        max_rate=args.max_rate,
+        pause=args.pause,
+        dry_run=args.dry_run,
+        keep_user=args.keep_user
+    )
+    print(json.dumps(counts, indent=2))
+    action = 'Would delete' if args.dry_run else 'Deleted'
+    print(f"{action} {sum(counts.values())} document(s)", file=sys.stderr)
+    return 0
+
+def tier_out(args):
+    """Move closed invoices and stock movements past the horizon to the archive collections"""
+    from flask import current_app
+    from models import get_db
+    from cold_storage import ARCHIVES, tier_out as run_tier_out
+
+    horizon_days = args.horizon_days or current_app.config['ARCHIVE_HORIZON_DAYS']
+    moved = {}
+    for collection in [args.collection] if args.collection else list(ARCHIVES):
+        moved[collection] = run_tier_out(
+            get_db(), collection,
+            horizon_days=horizon_days,
+            batch_size=args.batch_size,
+            max_rate=args.max_rate,
+            pause=args.pause,
+            dry_run=args.dry_run
+        )
+    print(json.dumps({'horizon_days': horizon_days, 'moved': moved}, indent=2))
+    action = 'Would move' if args.dry_run else 'Moved'
+    print(f"{action} {sum(moved.values())} document(s)", file=sys.stderr)
+    return 0
+
+def _add_throttle_arguments(parser):
+    parser.add_argument('--batch-size', type=int, default=1000, help='Documents per batch (default 1000)')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    parser.add_argument('--max-rate', type=float, help='Handle at most this many documents per second')
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='GST Billing System management commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    reconcile_parser = subparsers.add_parser('reconcile-gst-summaries', help=reconcile_gst_summaries.__doc__)
+    reconcile_parser.add_argument('--user-id', help='Only reconcile this business')
+    reconcile_parser.add_argument('--year', type=int, help='Only reconcile this year')
+    reconcile_parser.add_argument('--month', type=int, help='Only reconcile this month (requires --year)')
+    reconcile_parser.add_argument('--fix', action='store_true', help='Overwrite drifted summaries with recomputed values')
+    reconcile_parser.set_defaults(func=reconcile_gst_summaries)
+
+    recalc_parser = subparsers.add_parser('recalculate-invoice-taxes', help=recalculate_invoice_taxes.__doc__)
+    recalc_parser.add_argument('--user-id', help='Only recalculate this business')
+    recalc_parser.add_argument('--batch-size', type=int, default=500, help='Invoices per batch (default 500)')
+    recalc_parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    recalc_parser.add_argument('--report', help='Append a JSON Lines diff of corrected invoices to this file')
+    recalc_parser.add_argument('--dry-run', action='store_true', help='Report differences without writing them')
+    recalc_parser.add_argument('--resume', metavar='RUN_ID', help='Continue an interrupted run from its checkpoint')
+    recalc_parser.set_defaults(func=recalculate_invoice_taxes)
+
+    activity_parser = subparsers.add_parser('backfill-activity', help=backfill_activity.__doc__)
+    activity_parser.add_argument('--user-id', help='Only backfill this business')
+    activity_parser.add_argument('--days', type=int, help='Only backfill the last N days')
+    activity_parser.set_defaults(func=backfill_activity)
+
+    indexes_parser = subparsers.add_parser('ensure-indexes', help=ensure_indexes.__doc__)
+    indexes_parser.add_argument('--dry-run', action='store_true', help='List missing indexes without building them')
+    indexes_parser.set_defaults(func=ensure_indexes)
+
+    check_parser = subparsers.add_parser('check-indexes', help=check_indexes.__doc__)
+    check_parser.add_argument('--build', action='store_true', help='Build missing indexes before checking')
+    check_parser.set_defaults(func=check_indexes)
+
+    migrate_parser = subparsers.add_parser('migrate', help=migrate.__doc__)
+    migrate_parser.add_argument('--status', action='store_true', help='List migrations and their progress')
+    migrate_parser.add_argument('--only', help='Comma-separated versions to apply')
+    migrate_parser.add_argument('--rerun', action='store_true', help='Walk completed migrations again from the start')
+    migrate_parser.add_argument('--batch-size', type=int, default=1000, help='Documents per batch (default 1000)')
+    migrate_parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    migrate_parser.add_argument('--max-rate', type=float, help='Scan at most this many documents per second')
+    migrate_parser.add_argument('--dry-run', action='store_true', help='Count the updates without writing anything')
+    migrate_parser.set_defaults(func=migrate)
+
+    archive_parser = subparsers.add_parser('archive', help=archive.__doc__)
+    archive_parser.add_argument('collection', choices=('invoices', 'stock_movements', 'invoice_items'))
+    archive_parser.add_argument('--dir', required=True, help='Directory for the archive files')
+    cutoff = archive_parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument('--before', help='Archive documents created before this date (YYYY-MM-DD)')
+    cutoff.add_argument('--older-than-days', type=int, help='Archive documents older than N days')
+    archive_parser.add_argument('--user-id', help='Only archive this business')
+    archive_parser.add_argument('--format', choices=('jsonl', 'parquet'), default='jsonl', help='Archive format (default jsonl)')
+    archive_parser.add_argument('--keep', action='store_true', help='Write the archive without deleting anything')
+    _add_throttle_arguments(archive_parser)
+    archive_parser.set_defaults(func=archive)
+
+    purge_parser = subparsers.add_parser('purge-tenant', help=purge_tenant.__doc__)
+    purge_parser.add_argument('--user-id', required=True, help='Business to purge')
+    purge_parser.add_argument('--yes', action='store_true', help='Confirm the purge')
+    purge_parser.add_argument('--archive-dir', help='Archive every purged document here first')
+    purge_parser.add_argument('--format', choices=('jsonl', 'parquet'), default='jsonl', help='Archive format (default jsonl)')
+    purge_parser.add_argument('--keep-user', action='store_true', help="Keep the business's user account")
+    purge_parser.add_argument('--dry-run', action='store_true', help='Count the documents without deleting them')
+    _add_throttle_arguments(purge_parser)
+    purge_parser.set_defaults(func=purge_tenant)
+
+    tier_parser = subparsers.add_parser('tier-out', help=tier_out.__doc__)
+    tier_parser.add_argument('--collection', choices=('invoices', 'stock_movements'), help='Only tier this collection')
+    tier_parser.add_argument('--horizon-days', type=int, help='Override ARCHIVE_HORIZON_DAYS')
+    tier_parser.add_argument('--dry-run', action='store_true', help='Count the documents without moving them')
+    _add_throttle_arguments(tier_parser)
+    tier_parser.set_defaults(func=tier_out)
+
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'reconcile-gst-summaries' and args.month is not None and args.year is None:
+        parser.error('--month requires --year')
+    app = create_app(os.environ.get('FLASK_ENV', 'development'))
+    with app.app_context():
+        return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Prometheus metrics for capacity planning.
+
+``GET /metrics`` exposes, in the Prometheus text format:
+
+* ``http_request_duration_seconds{blueprint, route, method, status}``:
+  latency histogram per route pattern, not per URL, so ids don't multiply
+  the series. Streamed responses are timed until their last byte.
+* ``http_requests_in_flight{blueprint}``
+* ``mongo_pool_connections{state="open"|"in_use"}``,
+  ``mongo_pool_checkout_wait_seconds`` and
+  ``mongo_pool_checkout_failures_total{reason}``, fed by a pymongo pool
+  listener.
+* ``pdf_render_seconds{kind, mode}``, with mode one of sync, batch or job.
+* ``import_export_rows_total{direction, entity}`` and
+  ``import_export_duration_seconds{direction, entity}``.
+* ``invoices_created_total`` and ``stock_movements_total{movement_type}``.
+
+Under gunicorn each worker is a separate process. ``gunicorn.conf.py``
+sets ``PROMETHEUS_MULTIPROC_DIR``, so every worker writes its values to
+memory-mapped files there and ``/metrics`` adds them up, whichever worker
+answers the scrape. Gauges use ``livesum`` so dead workers drop out.
+
+prometheus_client is optional. Without it the recording helpers do
+nothing and ``/metrics`` answers 503. Set ``METRICS_TOKEN`` to require
+``Authorization: Bearer <token>`` on scrapes.
+"""
+import hmac
+import os
+import threading
+import time
+from flask import g, jsonify, request, Response
+from pymongo import monitoring
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PDF_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+IMPORT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+UNMATCHED_ROUTE = '<unmatched>'
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'API request latency',
+        ['blueprint', 'route', 'method', 'status'], buckets=LATENCY_BUCKETS
+    )
+    REQUESTS_IN_FLIGHT = Gauge(
+        'http_requests_in_flight', 'Requests being served', ['blueprint'], multiprocess_mode='livesum'
+    )
+    POOL_CONNECTIONS = Gauge(
+        'mongo_pool_connections', 'MongoDB pool connections', ['state'], multiprocess_mode='livesum'
+    )
+    POOL_CHECKOUT_WAIT = Histogram(
+        'mongo_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection',
+        buckets=LATENCY_BUCKETS
+    )
+    POOL_CHECKOUT_FAILURES = Counter(
+        'mongo_pool_checkout_failures_total', 'Failed connection checkouts', ['reason']
+    )
+    PDF_RENDER = Histogram(
+        'pdf_render_seconds', 'PDF render time', ['kind', 'mode'], buckets=PDF_BUCKETS
+    )
+    IMPORT_EXPORT_ROWS = Counter(
+        'import_export_rows_total', 'Rows imported or exported', ['direction', 'entity']
+    )
+    IMPORT_EXPORT_DURATION = Histogram(
+        'import_export_duration_seconds', 'Import and export run time', ['direction', 'entity'],
+        buckets=IMPORT_BUCKETS
+    )
+    INVOICES_CREATED = Counter('invoices_created_total', 'Invoices created')
+    STOCK_MOVEMENTS = Counter('stock_movements_total', 'Stock movements written', ['movement_type'])
+
+# Recording helpers; all of them are no-ops without prometheus_client
+
+def observe_pdf_render(kind, mode, seconds):
+    if PROMETHEUS_AVAILABLE:
+        PDF_RENDER.labels(kind, mode).observe(seconds)
+
+def observe_rows(direction, entity, rows, seconds):
+    """Rows moved by one import or export and how long it took"""
+    if PROMETHEUS_AVAILABLE:
+        IMPORT_EXPORT_ROWS.labels(direction, entity).inc(rows)
+        IMPORT_EXPORT_DURATION.labels(direction, entity).observe(seconds)
+
+def invoice_created():
+    if PROMETHEUS_AVAILABLE:
+        INVOICES_CREATED.inc()
+
+def stock_movement_written(movement_type):
+    if PROMETHEUS_AVAILABLE:
+        STOCK_MOVEMENTS.labels(movement_type or 'unknown').inc()
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Open and in-use connections plus checkout waits of the MongoClient pools"""
+
+    def __init__(self):
+        self._waiting = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        POOL_CONNECTIONS.labels('open').inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        POOL_CONNECTIONS.labels('open').dec()
+
+    def connection_check_out_started(self, event):
+        self._waiting.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._waiting.started = None
+        POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._waiting, 'started', None)
+        if started is not None:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self._waiting.started = None
+        POOL_CONNECTIONS.labels('in_use').inc()
+
+    def connection_checked_in(self, event):
+        POOL_CONNECTIONS.labels('in_use').dec()
+
+_pool_listener = None
+_pool_listener_lock = threading.Lock()
+
+def _register_pool_listener():
+    # Like the query profiler, this must happen before the MongoClient exists
+    global _pool_listener
+    with _pool_listener_lock:
+        if _pool_listener is None:
+            _pool_listener = PoolMetricsListener()
+            monitoring.register(_pool_listener)
+
+def _registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    from prometheus_client import REGISTRY
+    return REGISTRY
+
+def init_app(app):
+    """Request metrics and the /metrics endpoint; call before init_db"""
+    token = app.config.get('METRICS_TOKEN')
+
+    def metrics_view():
+        if not PROMETHEUS_AVAILABLE:
+            return jsonify({'success': False, 'error': 'Metrics require the prometheus_client package'}), 503
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied, f'Bearer {token}'):
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if not PROMETHEUS_AVAILABLE:
+        return
+    _register_pool_listener()
+
+    @app.before_request
+    def start_request_timer():
+        blueprint = request.blueprint or 'app'
+        g._metrics = (time.perf_counter(), blueprint)
+        REQUESTS_IN_FLIGHT.labels(blueprint).inc()
+
+    @app.after_request
+    def remember_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def observe_request(exc=None):
+        started = g.pop('_metrics', None)
+        if started is None:
+            return
+        started, blueprint = started
+        REQUESTS_IN_FLIGHT.labels(blueprint).dec()
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        status = 500 if exc is not None else g.get('_metrics_status', 500)
+        REQUEST_LATENCY.labels(blueprint, route, request.method, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,375 @@
+"""
+Versioned, resumable data migrations.
+
+Every migration is a ``Migration`` subclass in ``MIGRATIONS`` with a
+unique, increasing ``version``. It changes one collection. Its ``query``
+selects the documents that still need the change and ``update(doc)``
+returns the update for one of them. ``MigrationRunner`` applies the pending
+migrations in version order. Each one walks its collection in ``_id``
+order, ``batch_size`` documents at a time, and writes a batch with one
+unordered ``bulk_write``. Every write repeats the migration's query, so a
+document the app fixed in the meantime is left alone.
+
+Progress is recorded in the ``migrations`` collection, one document per
+version with its status, the last ``_id`` done and counters. An
+interrupted migration resumes after that ``_id``, and completed
+migrations are skipped. ``rerun`` walks a migration again from the start,
+which is safe because its query only matches documents that still need
+the change. A lease on the state document stops two runners, for example
+two deploys, from working on the same migration at once.
+
+``pause`` sleeps between batches and ``max_rate`` caps the documents
+scanned per second, to leave room for live traffic. The models read
+missing fields as their defaults, so the app runs while a migration is
+half done. ``manage.py migrate`` is the command line entry point.
+"""
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = 'migrations'
+LEASE = timedelta(minutes=5)
+
+class MigrationLocked(Exception):
+    """Raised when another runner holds the lease on a migration"""
+
+class Throttle:
+    """Keeps a loop under ``max_rate`` units per second, sleeping at least ``pause`` each step"""
+
+    def __init__(self, max_rate=None, pause=0.0):
+        self.max_rate = max_rate
+        self.pause = pause
+        self._started = time.monotonic()
+        self._done = 0
+
+    def wait(self, done):
+        self._done += done
+        delay = self.pause or 0.0
+        if self.max_rate:
+            delay = max(delay, self._done / self.max_rate - (time.monotonic() - self._started))
+        if delay > 0:
+            time.sleep(delay)
+
+class Migration:
+    """One change to the documents of one collection
+
+    Subclasses set ``version``, ``name``, ``collection``, ``query`` and
+    optionally ``projection``, and implement ``update``. ``prepare`` can
+    load whatever a batch needs from other collections in one query.
+    """
+
+    version = None
+    name = None
+    collection = None
+    query = {}
+    projection = None
+
+    def prepare(self, database, docs):
+        """Load what update() needs for this batch"""
+
+    def update(self, doc):
+        """The update for ``doc``, or None to leave it as it is"""
+        raise NotImplementedError
+
+    def operations(self, database, docs):
+        self.prepare(database, docs)
+        ops = []
+        for doc in docs:
+            update = self.update(doc)
+            if update:
+                ops.append(UpdateOne(dict(self.query, _id=doc['_id']), update))
+        return ops
+
+class FieldDefaults(Migration):
+    """Store the model default of fields that older documents lack"""
+
+    defaults = {}
+
+    @property
+    def query(self):
+        return {'$or': [{field: {'$exists': False}} for field in self.defaults]}
+
+    @property
+    def projection(self):
+        return dict.fromkeys(self.defaults, 1)
+
+    def update(self, doc):
+        fields = {field: value for field, value in self.defaults.items() if field not in doc}
+        return {'$set': fields} if fields else None
+
+class ObjectIdReferences(Migration):
+    """Convert references stored as hex strings to ObjectIds, so indexed lookups find them"""
+
+    fields = ()
+
+    @property
+    def query(self):
+        return {'$or': [{field: {'$type': 'string'}} for field in self.fields]}
+
+    @property
+    def projection(self):
+        return dict.fromkeys(self.fields, 1)
+
+    def update(self, doc):
+        fields = {
+            field: ObjectId(doc[field]) for field in self.fields
+            if isinstance(doc.get(field), str) and ObjectId.is_valid(doc[field])
+        }
+        return {'$set': fields} if fields else None
+
+class ProductReferences(ObjectIdReferences):
+    version = 1
+    name = 'product-object-id-references'
+    collection = 'products'
+    fields = ('user_id', 'admin_id')
+
+class CustomerReferences(ObjectIdReferences):
+    version = 2
+    name = 'customer-object-id-references'
+    collection = 'customers'
+    fields = ('user_id',)
+
+class InvoiceReferences(ObjectIdReferences):
+    version = 3
+    name = 'invoice-object-id-references'
+    collection = 'invoices'
+    fields = ('user_id', 'customer_id', 'order_id')
+
+class OrderReferences(ObjectIdReferences):
+    version = 4
+    name = 'order-object-id-references'
+    collection = 'orders'
+    fields = ('customer_id',)
+
+class ProductDefaults(FieldDefaults):
+    # Was add_purchase_price_column.py, add_unit_to_product.py and migrate_product_table.py.
+    # The catalogue filters on is_active, so products without it were never listed.
+    version = 5
+    name = 'product-field-defaults'
+    collection = 'products'
+    defaults = {
+        'purchase_price': 0.0,
+        'gst_rate': 18.0,
+        'stock_quantity': 0,
+        'min_stock_level': 10,
+        'unit': 'PCS',
+        'is_active': True
+    }
+
+class ProductOwner(Migration):
+    # Was add_user_id_to_product.py and fix_product_admin_id.py: products
+    # created before user_id existed belong to the admin who created them
+    version = 6
+    name = 'product-user-id'
+    collection = 'products'
+    query = {'user_id': None, 'admin_id': {'$ne': None}}
+    projection = {'admin_id': 1}
+
+    def update(self, doc):
+        return {'$set': {'user_id': doc['admin_id']}}
+
+class CustomerDefaults(FieldDefaults):
+    # Was add_customer_fields_migration.py and migrate_customer_table.py
+    version = 7
+    name = 'customer-field-defaults'
+    collection = 'customers'
+    defaults = {
+        'opening_balance': 0.0,
+        'opening_balance_type': 'debit',
+        'credit_limit': 0.0,
+        'discount': 0.0,
+        'is_active': True
+    }
+
+class CustomerBillingAddress(Migration):
+    # Was migrate_customer_data.py
+    version = 8
+    name = 'customer-billing-address'
+    collection = 'customers'
+    query = {'billing_address': {'$in': [None, '']}, 'address': {'$nin': [None, '']}}
+    projection = {'address': 1}
+
+    def update(self, doc):
+        return {'$set': {'billing_address': doc['address']}}
+
+class CustomerOwner(Migration):
+    # Was add_user_id_to_customer.py, which gave every such customer to the
+    # first admin. Here a customer goes to the business that invoiced them,
+    # and is left alone when no business or several did.
+    version = 9
+    name = 'customer-user-id'
+    collection = 'customers'
+    query = {'user_id': None}
+    projection = {'_id': 1}
+
+    def prepare(self, database, docs):
+        self._owners = {}
+        for row in database['invoices'].aggregate([
+            {'$match': {'customer_id': {'$in': [doc['_id'] for doc in docs]}, 'user_id': {'$ne': None}}},
+            {'$group': {'_id': '$customer_id', 'user_ids': {'$addToSet': '$user_id'}}}
+        ]):
+            if len(row['user_ids']) == 1:
+                self._owners[row['_id']] = row['user_ids'][0]
+
+    def update(self, doc):
+        owner = self._owners.get(doc['_id'])
+        return {'$set': {'user_id': owner}} if owner is not None else None
+
+class UserDefaults(FieldDefaults):
+    # Was migrate_user_table.py
+    version = 10
+    name = 'user-field-defaults'
+    collection = 'users'
+    defaults = {'is_approved': False, 'is_active': True}
+
+class SuperAdminDefaults(FieldDefaults):
+    # Was migrate_super_admin_table.py
+    version = 11
+    name = 'super-admin-field-defaults'
+    collection = 'super_admins'
+    defaults = {'is_active': True}
+
+MIGRATIONS = (
+    ProductReferences,
+    CustomerReferences,
+    InvoiceReferences,
+    OrderReferences,
+    ProductDefaults,
+    ProductOwner,
+    CustomerDefaults,
+    CustomerBillingAddress,
+    CustomerOwner,
+    UserDefaults,
+    SuperAdminDefaults,
+)
+
+class MigrationRunner:
+    """Applies registered migrations in version order, checkpointing every batch
+
+    With ``dry_run`` every batch is read and its updates counted, but
+    nothing is written, not even progress.
+    """
+
+    def __init__(self, database, migrations=MIGRATIONS, batch_size=1000, pause=0.0, max_rate=None, dry_run=False):
+        versions = [migration.version for migration in migrations]
+        if len(set(versions)) != len(versions):
+            raise ValueError('Migration versions must be unique')
+        self.database = database
+        self.migrations = sorted((migration() for migration in migrations), key=lambda migration: migration.version)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_rate = max_rate
+        self.dry_run = dry_run
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def status(self):
+        """Every registered migration with its recorded progress"""
+        states = {doc['_id']: doc for doc in self.database[STATE_COLLECTION].find()}
+        return [
+            dict(states.get(migration.version, {'status': 'pending'}), version=migration.version, name=migration.name)
+            for migration in self.migrations
+        ]
+
+    def run(self, versions=None, rerun=False, max_batches=None):
+        """Apply the pending migrations (or only ``versions``); returns their final states"""
+        results = []
+        for migration in self.migrations:
+            if versions and migration.version not in versions:
+                continue
+            state = self.apply(migration, rerun=rerun, max_batches=max_batches)
+            if state is not None:
+                results.append(state)
+        return results
+
+    def _claim(self, migration, rerun):
+        states = self.database[STATE_COLLECTION]
+        now = datetime.utcnow()
+        states.update_one({'_id': migration.version}, {'$setOnInsert': {
+            'status': 'pending', 'last_id': None, 'scanned': 0, 'modified': 0, 'created_at': now
+        }}, upsert=True)
+        claimable = ['pending', 'paused', 'failed', 'interrupted'] + (['completed'] if rerun else [])
+        fields = {
+            'name': migration.name,
+            'collection': migration.collection,
+            'status': 'running',
+            'owner': self.owner,
+            'lease_until': now + LEASE,
+            'started_at': now,
+            'updated_at': now
+        }
+        if rerun:
+            fields.update(last_id=None, scanned=0, modified=0)
+        state = states.find_one_and_update(
+            {'_id': migration.version, '$or': [
+                {'status': {'$in': claimable}},
+                {'status': 'running', 'lease_until': {'$lt': now}}
+            ]},
+            {'$set': fields, '$unset': {'error': '', 'finished_at': ''}},
+            return_document=ReturnDocument.AFTER
+        )
+        if state is not None:
+            return state
+        current = states.find_one({'_id': migration.version})
+        if current and current.get('status') == 'completed':
+            return None
+        raise MigrationLocked(f"Migration {migration.version} ({migration.name}) is being run by {current.get('owner')}")
+
+    def _checkpoint(self, state, **fields):
+        fields['updated_at'] = datetime.utcnow()
+        state.update(fields)
+        if not self.dry_run:
+            self.database[STATE_COLLECTION].update_one({'_id': state['_id']}, {'$set': fields})
+
+    def apply(self, migration, rerun=False, max_batches=None):
+        """Run one migration to completion (or max_batches); None if it had already completed"""
+        if self.dry_run:
+            state = {'_id': migration.version, 'name': migration.name, 'last_id': None, 'scanned': 0, 'modified': 0}
+        else:
+            state = self._claim(migration, rerun)
+            if state is None:
+                return None
+        logger.info("Migration %s (%s) running from _id %s", migration.version, migration.name, state['last_id'])
+
+        collection = self.database[migration.collection]
+        throttle = Throttle(self.max_rate, self.pause)
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                query = migration.query
+                if state['last_id'] is not None:
+                    query = {'$and': [query, {'_id': {'$gt': state['last_id']}}]}
+                docs = list(collection.find(query, migration.projection).sort('_id', 1).limit(self.batch_size))
+                if not docs:
+                    self._checkpoint(state, status='completed', finished_at=datetime.utcnow())
+                    logger.info("Migration %s (%s) completed: %s scanned, %s modified",
+                                migration.version, migration.name, state['scanned'], state['modified'])
+                    break
+                ops = migration.operations(self.database, docs)
+                if self.dry_run:
+                    modified = len(ops)
+                elif ops:
+                    modified = collection.bulk_write(ops, ordered=False).modified_count
+                else:
+                    modified = 0
+                self._checkpoint(
+                    state,
+                    last_id=docs[-1]['_id'],
+                    scanned=state['scanned'] + len(docs),
+                    modified=state['modified'] + modified,
+                    lease_until=datetime.utcnow() + LEASE
+                )
+                batches += 1
+                throttle.wait(len(docs))
+            else:
+                # Stopped by max_batches; the next run picks up from last_id
+                self._checkpoint(state, status='paused')
+        except BaseException as e:
+            self._checkpoint(state, status='interrupted' if isinstance(e, KeyboardInterrupt) else 'failed', error=str(e))
+            raise
+        return state
@@ -1,7 +1,17 @@
-from datetime import datetime
+from datetime import date, datetime
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId
+import cold_storage
+import identity_map
+from gst_summaries import record_invoice_change
+from activity import append as append_activity, invoice_event, order_event, stock_event
+from tax_engine import compute_batch, compute_line, round_half_up
+from pdf_cache import invalidate_invoice as invalidate_invoice_pdfs
+import metrics
+import logging
+
+logger = logging.getLogger(__name__)
 
 def get_db():
     """Get the database instance dynamically"""
@@ -52,10 +62,214 @@ class BaseModel:
                 result[key] = value
         return result
 
+_MISSING = object()
+
+def _today():
+    return datetime.utcnow().date()
+
+def _bson_date(value):
+    # BSON has no date type, so calendar dates are stored as midnight
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time())
+    return value
+
+def _slots(fields):
+    return ('id',) + tuple(name for name, _ in fields)
+
+class ConcurrentModificationError(Exception):
+    """Raised by a versioned save when the document changed since it was loaded"""
+
+class ArchivedDocumentError(Exception):
+    """Raised when saving or deleting a document read from the cold archive"""
+
+# Placeholder values for QUERY_SHAPES; explain() only needs the shape of a filter
+_ANY_ID = ObjectId('0' * 24)
+_ANY_DATE = datetime(2000, 1, 1)
+
+def _changed(old, new):
+    # A list or dict that is still the loaded object may have been edited in
+    # place (invoice items), which comparing it with itself can't tell
+    if new is old:
+        return isinstance(new, (list, dict))
+    return old != new
+
+class Document:
+    """Base for document models with declared fields
+    
+    FIELDS lists (attribute, default) pairs; a callable default is called
+    for each new object. REF_FIELDS are references to other documents, held
+    as strings once loaded from MongoDB. Models declare
+    ``__slots__ = _slots(FIELDS)`` so instances carry no __dict__ (the
+    Flask-Login models keep one, since UserMixin is not slotted).
+    
+    Both the constructor and from_dict go through _load, which reads the
+    BSON dict directly instead of copying it into keyword arguments.
+    
+    A loaded model remembers the values it was loaded with, so saving it
+    sends only the fields that changed. Nothing is copied for this, so
+    read-only loads stay cheap: a list or dict field still holding the
+    object it was loaded with is always sent, since it may have been
+    edited in place, while one that was replaced is compared by value. Numeric fields changed through
+    increment() are sent as ``$inc`` and so compose with concurrent
+    writers. Every update also increments ``version``; save(check_version=True)
+    makes the update conditional on it and raises
+    ConcurrentModificationError if someone else saved first.
+    
+    find_by_id goes through the request's identity map (identity_map.py),
+    so within a request each document is read once and every lookup gets
+    the same object; prefetch() batches the reads of ids known up front.
+    
+    Documents read from the cold archive (cold_storage.py) have
+    ``archived`` set and are read-only: save() and delete() raise
+    ArchivedDocumentError.
+    
+    INDEXES lists the (keys, options) of the collection's indexes and
+    QUERY_SHAPES the (name, filter, sort) of the queries the routes run
+    on it; indexes.py builds the first and checks the second with explain().
+    """
+    
+    __slots__ = ('version', '_orig', '_inc', 'archived')
+    collection_name = None
+    FIELDS = ()
+    REF_FIELDS = ()
+    INDEXES = ()
+    QUERY_SHAPES = ()
+    
+    def __init__(self, **kwargs):
+        self._load(kwargs)
+    
+    def _load(self, data, from_db=False):
+        get = data.get
+        self.id = get('_id') or get('id')
+        self.version = get('version')
+        self._inc = None
+        self.archived = False
+        orig = {} if from_db else None
+        for name, default in self.FIELDS:
+            value = get(name, _MISSING)
+            if value is _MISSING:
+                value = default() if callable(default) else default
+            setattr(self, name, value)
+            if from_db:
+                orig[name] = value
+        self._orig = orig
+        if from_db:
+            for name in self.REF_FIELDS:
+                value = getattr(self, name)
+                if isinstance(value, ObjectId):
+                    setattr(self, name, str(value))
+    
+    def increment(self, name, amount):
+        """Add amount to a numeric field; saved as $inc rather than $set"""
+        setattr(self, name, (getattr(self, name) or 0) + amount)
+        if self._orig is not None:
+            self._inc = self._inc or {}
+            self._inc[name] = self._inc.get(name, 0) + amount
+    
+    def changes(self, data):
+        """($set, $inc) bodies for saving ``data``, the output of to_dict()
+        
+        Models that were not loaded from MongoDB set every field.
+        """
+        if self._orig is None:
+            return {key: value for key, value in data.items() if key != '_id'}, {}
+        inc = dict(self._inc or {})
+        orig = self._orig
+        fields = {
+            key: value for key, value in data.items()
+            if key != '_id' and key not in inc and (key not in orig or _changed(orig[key], value))
+        }
+        return fields, inc
+    
+    def _mark_saved(self, data):
+        self._orig = {key: value for key, value in data.items() if key != '_id'}
+        self._inc = None
+        identity_map.remember(self)
+    
+    def _update(self, db, data, check_version=False, return_before=False):
+        """Write the changed fields of an existing document
+        
+        Returns (written, before); before is the previous document when
+        return_before is set. Nothing is written when only updated_at
+        would change, and written is False when no document matched.
+        """
+        fields, inc = self.changes(data)
+        if self._orig is not None and not inc and set(fields) <= {'updated_at'}:
+            return False, None
+        update = {'$inc': dict(inc, version=1)}
+        if fields:
+            update['$set'] = fields
+        query = {'_id': data['_id']}
+        if check_version:
+            # None also matches documents written before versioning
+            query['version'] = self.version
+        collection = db[self.collection_name]
+        if return_before:
+            before = collection.find_one_and_update(query, update)
+            matched = before is not None
+        else:
+            before = None
+            matched = collection.update_one(query, update).matched_count > 0
+        if not matched:
+            if check_version:
+                raise ConcurrentModificationError(
+                    f'{type(self).__name__} {self.id} was modified by someone else; reload and try again'
+                )
+            return False, None
+        self.version = (self.version or 0) + 1
+        self._mark_saved(data)
+        return True, before
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Build a model from a MongoDB document without modifying it"""
+        if data is None:
+            return None
+        obj = cls.__new__(cls)
+        obj._load(data, from_db=True)
+        return obj
+    
+    @classmethod
+    def prefetch(cls, ids):
+        """Load these ids with the next find_by_id of this request, in one query"""
+        identity_map.prefetch(cls, ids)
+    
+    @classmethod
+    def find_views(cls, query, fields, sort=None, database=None, since=None):
+        """Yield read-only dicts holding only ``fields`` plus 'id'
+        
+        For list endpoints that just serialise documents: the query is
+        projected to ``fields`` and no model objects are built. Missing
+        fields get the model defaults; ObjectIds are left for the JSON
+        layer to encode. ``since`` is the earliest date the query can
+        match; collections with a cold tier (cold_storage.py) read their
+        archive too when it is before the horizon or None.
+        """
+        database = database if database is not None else get_db()
+        defaults = dict(cls.FIELDS)
+        cursor = cold_storage.find(database, cls.collection_name, query, dict.fromkeys(fields, 1), sort, since=since)
+        for doc in cursor:
+            view = {'id': doc['_id']}
+            for name in fields:
+                value = doc.get(name, _MISSING)
+                if value is _MISSING:
+                    default = defaults.get(name)
+                    value = default() if callable(default) else default
+                view[name] = value
+            yield view
+
 class User(UserMixin):
     """User model for business owners"""
     
     collection_name = 'users'
+    INDEXES = (
+        ('email', {'unique': True}),
+        ('username', {'unique': True}),
+        ('gst_number', {'unique': True}),
+    )
+    QUERY_SHAPES = (
+        ('login', {'email': 'a@example.com'}, None),
+    )
     
     def __init__(self, **kwargs):
         self.id = kwargs.get('_id') or kwargs.get('id')
@@ -136,8 +350,8 @@ class User(UserMixin):
         try:
             return cls(**user_data)
         except Exception as e:
-            print(f"Error creating User from dict: {e}")
-            print(f"Data: {user_data}")
+            logger.error("Error creating User from dict: %s", e)
+            logger.debug("Data: %s", user_data)
             raise
     
     def save(self):
@@ -164,9 +378,7 @@ class User(UserMixin):
                     raise ValueError("Failed to insert document: result is None or missing inserted_id")
             return self
         except Exception as e:
-            import traceback
-            print(f"Error saving user: {e}")
-            traceback.print_exc()
+            logger.exception("Error saving user: %s", e)
             raise
     
     @classmethod
@@ -178,11 +390,9 @@ class User(UserMixin):
                 return None
             if not user_id:
                 return None
-            doc = db[cls.collection_name].find_one({'_id': ObjectId(user_id)})
-            if doc:
-                return cls.from_dict(doc)
+            return identity_map.load(cls, user_id, db)
         except Exception as e:
-            print(f"Error finding user by ID: {e}")
+            logger.error("Error finding user by ID: %s", e)
         return None
     
     @classmethod
@@ -196,7 +406,7 @@ class User(UserMixin):
             if doc:
                 return cls.from_dict(doc)
         except Exception as e:
-            print(f"Error finding user by email: {e}")
+            logger.error("Error finding user by email: %s", e)
         return None
     
     @classmethod
@@ -212,7 +422,7 @@ class User(UserMixin):
             if doc:
                 return cls.from_dict(doc)
         except Exception as e:
-            print(f"Error finding user by GST number: {e}")
+            logger.error("Error finding user by GST number: %s", e)
         return None
     
     @classmethod
@@ -228,7 +438,7 @@ class User(UserMixin):
             if doc:
                 return cls.from_dict(doc)
         except Exception as e:
-            print(f"Error finding user by username: {e}")
+            logger.error("Error finding user by username: %s", e)
         return None
     
     def __repr__(self):
@@ -238,6 +448,12 @@ class SuperAdmin(UserMixin):
     """Super Admin model"""
     
     collection_name = 'super_admins'
+    INDEXES = (
+        ('email', {'unique': True}),
+    )
+    QUERY_SHAPES = (
+        ('login', {'email': 'a@example.com'}, None),
+    )
     
     def __init__(self, **kwargs):
         self.id = kwargs.get('_id') or kwargs.get('id')
@@ -302,9 +518,7 @@ class SuperAdmin(UserMixin):
             db = get_db()
             if db is None:
                 return None
-            doc = db[cls.collection_name].find_one({'_id': ObjectId(admin_id)})
-            if doc:
-                return cls.from_dict(doc)
+            return identity_map.load(cls, admin_id, db)
         except:
             pass
         return None
@@ -323,37 +537,45 @@ class SuperAdmin(UserMixin):
     def __repr__(self):
         return f'<SuperAdmin {self.name}>'
 
-class Customer(UserMixin):
+class Customer(Document, UserMixin):
     """Customer model with login capabilities"""
     
     collection_name = 'customers'
-    
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.user_id = kwargs.get('user_id')
-        self.name = kwargs.get('name')
-        self.email = kwargs.get('email')
-        self.password_hash = kwargs.get('password_hash')
-        self.phone = kwargs.get('phone')
-        self.gstin = kwargs.get('gstin')
-        self.company_name = kwargs.get('company_name')
-        self.billing_address = kwargs.get('billing_address')
-        self.shipping_address = kwargs.get('shipping_address')
-        self.state = kwargs.get('state')
-        self.pincode = kwargs.get('pincode')
-        self.bank_name = kwargs.get('bank_name')
-        self.bank_account_number = kwargs.get('bank_account_number')
-        self.bank_ifsc = kwargs.get('bank_ifsc')
-        self.opening_balance = kwargs.get('opening_balance', 0.0)
-        self.opening_balance_type = kwargs.get('opening_balance_type', 'debit')
-        self.credit_limit = kwargs.get('credit_limit', 0.0)
-        self.discount = kwargs.get('discount', 0.0)
-        self.notes = kwargs.get('notes')
-        self.tags = kwargs.get('tags')
-        self.cc_emails = kwargs.get('cc_emails')
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
-        # Use __dict__ to set is_active since UserMixin has it as a property
-        self.__dict__['is_active'] = kwargs.get('is_active', True)
+    INDEXES = (
+        ('email', {'unique': True}),
+        ('user_id', {}),
+    )
+    QUERY_SHAPES = (
+        ('login', {'email': 'a@example.com'}, None),
+        ('by_business', {'user_id': _ANY_ID}, None),
+    )
+    
+    FIELDS = (
+        ('user_id', None),
+        ('name', None),
+        ('email', None),
+        ('password_hash', None),
+        ('phone', None),
+        ('gstin', None),
+        ('company_name', None),
+        ('billing_address', None),
+        ('shipping_address', None),
+        ('state', None),
+        ('pincode', None),
+        ('bank_name', None),
+        ('bank_account_number', None),
+        ('bank_ifsc', None),
+        ('opening_balance', 0.0),
+        ('opening_balance_type', 'debit'),
+        ('credit_limit', 0.0),
+        ('discount', 0.0),
+        ('notes', None),
+        ('tags', None),
+        ('cc_emails', None),
+        ('created_at', datetime.utcnow),
+        ('is_active', True),
+    )
+    REF_FIELDS = ('user_id',)
     
     @property
     def is_active(self):
@@ -399,17 +621,7 @@ class Customer(UserMixin):
             'is_active': self.is_active
         }
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'user_id' in data and isinstance(data['user_id'], ObjectId):
-            data['user_id'] = str(data['user_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save customer to MongoDB"""
         try:
             db = get_db()
@@ -417,13 +629,14 @@ class Customer(UserMixin):
                 raise ValueError("Database not initialized. Call init_app() first.")
             data = self.to_dict()
             if '_id' in data and data['_id']:
-                db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+                self._update(db, data, check_version)
             else:
                 result = db[self.collection_name].insert_one(data)
                 self.id = str(result.inserted_id)
+                self._mark_saved(data)
             return self
         except Exception as e:
-            print(f"Error saving customer: {e}")
+            logger.error("Error saving customer: %s", e)
             raise
     
     @classmethod
@@ -433,9 +646,7 @@ class Customer(UserMixin):
             db = get_db()
             if db is None:
                 return None
-            doc = db[cls.collection_name].find_one({'_id': ObjectId(customer_id)})
-            if doc:
-                return cls.from_dict(doc)
+            return identity_map.load(cls, customer_id, db)
         except:
             pass
         return None
@@ -451,45 +662,58 @@ class Customer(UserMixin):
             if doc:
                 return cls.from_dict(doc)
         except Exception as e:
-            print(f"Error finding customer by email: {e}")
+            logger.error("Error finding customer by email: %s", e)
         return None
     
     def __repr__(self):
         return f'<Customer {self.name}>'
 
-class Product:
+class Product(Document):
     """Product model"""
     
     collection_name = 'products'
-    
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.user_id = kwargs.get('user_id')
-        self.admin_id = kwargs.get('admin_id')
-        self.name = kwargs.get('name')
-        self.sku = kwargs.get('sku')
-        self.hsn_code = kwargs.get('hsn_code')
-        self.description = kwargs.get('description')
-        self.category = kwargs.get('category')
-        self.brand = kwargs.get('brand')
-        self.price = kwargs.get('price')
-        self.purchase_price = kwargs.get('purchase_price', 0.0)
-        self.gst_rate = kwargs.get('gst_rate', 18.0)
-        self.stock_quantity = kwargs.get('stock_quantity', 0)
-        self.min_stock_level = kwargs.get('min_stock_level', 10)
-        self.unit = kwargs.get('unit', 'PCS')
-        self.image_url = kwargs.get('image_url')
-        self.weight = kwargs.get('weight')
-        self.dimensions = kwargs.get('dimensions')
-        self.vegetable_name = kwargs.get('vegetable_name')
-        self.vegetable_name_hindi = kwargs.get('vegetable_name_hindi')
-        self.quantity_gm = kwargs.get('quantity_gm')
-        self.quantity_kg = kwargs.get('quantity_kg')
-        self.rate_per_gm = kwargs.get('rate_per_gm')
-        self.rate_per_kg = kwargs.get('rate_per_kg')
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
-        self.updated_at = kwargs.get('updated_at', datetime.utcnow())
-        self.is_active = kwargs.get('is_active', True)
+    INDEXES = (
+        ([('user_id', 1), ('is_active', 1), ('name', 1)], {}),
+        ('admin_id', {}),
+        ('sku', {}),
+    )
+    QUERY_SHAPES = (
+        ('catalogue', {'user_id': _ANY_ID, 'is_active': True}, [('name', 1)]),
+        ('by_business', {'user_id': _ANY_ID}, [('name', 1)]),
+        ('by_name', {'user_id': _ANY_ID, 'is_active': True, 'name': 'Tomato'}, None),
+        ('by_sku', {'sku': 'SKU-1', 'user_id': _ANY_ID}, None),
+    )
+    
+    FIELDS = (
+        ('user_id', None),
+        ('admin_id', None),
+        ('name', None),
+        ('sku', None),
+        ('hsn_code', None),
+        ('description', None),
+        ('category', None),
+        ('brand', None),
+        ('price', None),
+        ('purchase_price', 0.0),
+        ('gst_rate', 18.0),
+        ('stock_quantity', 0),
+        ('min_stock_level', 10),
+        ('unit', 'PCS'),
+        ('image_url', None),
+        ('weight', None),
+        ('dimensions', None),
+        ('vegetable_name', None),
+        ('vegetable_name_hindi', None),
+        ('quantity_gm', None),
+        ('quantity_kg', None),
+        ('rate_per_gm', None),
+        ('rate_per_kg', None),
+        ('created_at', datetime.utcnow),
+        ('updated_at', datetime.utcnow),
+        ('is_active', True),
+    )
+    REF_FIELDS = ('user_id', 'admin_id')
+    __slots__ = _slots(FIELDS)
     
     @property
     def is_low_stock(self):
@@ -526,19 +750,7 @@ class Product:
             'is_active': self.is_active
         }
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'user_id' in data and isinstance(data['user_id'], ObjectId):
-            data['user_id'] = str(data['user_id'])
-        if 'admin_id' in data and isinstance(data['admin_id'], ObjectId):
-            data['admin_id'] = str(data['admin_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save product to MongoDB"""
         db = get_db()
         if db is None:
@@ -546,10 +758,11 @@ class Product:
         data = self.to_dict()
         data['updated_at'] = datetime.utcnow()
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            self._update(db, data, check_version)
         else:
             result = db[self.collection_name].insert_one(data)
             self.id = str(result.inserted_id)
+            self._mark_saved(data)
         return self
     
     @classmethod
@@ -559,9 +772,7 @@ class Product:
         if db is None:
             raise ValueError("Database not initialized. Call init_app() first.")
         try:
-            doc = db[cls.collection_name].find_one({'_id': ObjectId(product_id)})
-            if doc:
-                return cls.from_dict(doc)
+            return identity_map.load(cls, product_id, db)
         except:
             pass
         return None
@@ -569,56 +780,76 @@ class Product:
     def __repr__(self):
         return f'<Product {self.name}>'
 
-class Invoice:
+class Invoice(Document):
     """Invoice model"""
     
     collection_name = 'invoices'
-    
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.user_id = kwargs.get('user_id')
-        self.customer_id = kwargs.get('customer_id')
-        self.order_id = kwargs.get('order_id')
-        self.invoice_number = kwargs.get('invoice_number')
-        self.invoice_date = kwargs.get('invoice_date', datetime.utcnow().date())
-        self.due_date = kwargs.get('due_date')
-        self.subtotal = kwargs.get('subtotal', 0.0)
-        self.cgst_amount = kwargs.get('cgst_amount', 0.0)
-        self.sgst_amount = kwargs.get('sgst_amount', 0.0)
-        self.igst_amount = kwargs.get('igst_amount', 0.0)
-        self.total_amount = kwargs.get('total_amount', 0.0)
-        self.status = kwargs.get('status', 'pending')
-        self.payment_terms = kwargs.get('payment_terms')
-        self.notes = kwargs.get('notes')
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
-        self.updated_at = kwargs.get('updated_at', datetime.utcnow())
-        self.items = kwargs.get('items', [])
-    
-    def calculate_totals(self):
-        """Calculate invoice totals"""
-        self.subtotal = sum(item.get('total', 0) for item in self.items)
-        
-        # Get customer and user for state comparison
-        customer = Customer.find_by_id(self.customer_id)
-        user = User.find_by_id(self.user_id)
+    INDEXES = (
+        ('invoice_number', {'unique': True}),
+        ([('user_id', 1), ('created_at', 1)], {}),
+        ([('user_id', 1), ('invoice_date', 1)], {}),
+        ([('user_id', 1), ('status', 1), ('invoice_date', 1)], {}),
+        ('customer_id', {}),
+        ('order_id', {}),
+    )
+    QUERY_SHAPES = (
+        ('list', {'user_id': _ANY_ID}, [('created_at', -1)]),
+        ('list_by_status', {'user_id': _ANY_ID, 'status': 'paid', 'invoice_date': {'$gte': _ANY_DATE, '$lte': _ANY_DATE}},
+         [('created_at', -1)]),
+        ('period', {'user_id': _ANY_ID, 'invoice_date': {'$gte': _ANY_DATE, '$lt': _ANY_DATE}}, None),
+        ('last_number', {'user_id': _ANY_ID}, [('_id', -1)]),
+        ('by_customer', {'customer_id': _ANY_ID}, [('created_at', -1)]),
+        ('by_order', {'order_id': _ANY_ID}, None),
+        ('by_number', {'invoice_number': 'INV-1'}, None),
+    )
+    
+    FIELDS = (
+        ('user_id', None),
+        ('customer_id', None),
+        ('order_id', None),
+        ('invoice_number', None),
+        ('invoice_date', _today),
+        ('due_date', None),
+        ('subtotal', 0.0),
+        ('cgst_amount', 0.0),
+        ('sgst_amount', 0.0),
+        ('igst_amount', 0.0),
+        ('total_amount', 0.0),
+        ('status', 'pending'),
+        ('payment_terms', None),
+        ('notes', None),
+        ('created_at', datetime.utcnow),
+        ('updated_at', datetime.utcnow),
+        ('items', list),
+    )
+    REF_FIELDS = ('user_id', 'customer_id', 'order_id')
+    __slots__ = _slots(FIELDS)
+    
+    def calculate_totals(self, business_state=None, customer_state=None):
+        """Calculate line taxes and invoice totals
         
-        if customer and user:
-            customer_state = customer.state
-            business_state = user.business_state
+        Pass the supplier's business_state and the customer's state (place of
+        supply) when the caller already has them; otherwise both are looked up.
+        """
+        if business_state is None and customer_state is None:
+            customer = Customer.find_by_id(self.customer_id)
+            user = User.find_by_id(self.user_id)
+            business_state = user.business_state if user else None
+            customer_state = customer.state if customer else None
         
-        if customer_state == business_state:
-            # Same state - CGST + SGST
-            total_gst = sum(item.get('gst_amount', 0) for item in self.items)
-            self.cgst_amount = total_gst / 2
-            self.sgst_amount = total_gst / 2
-            self.igst_amount = 0.0
-        else:
-            # Different state - IGST
-            self.igst_amount = sum(item.get('gst_amount', 0) for item in self.items)
-            self.cgst_amount = 0.0
-            self.sgst_amount = 0.0
+        result = compute_batch(
+            [{'items': [item for item in self.items if isinstance(item, dict)], 'place_of_supply': customer_state}],
+            business_state
+        )[0]
+        for item, line in zip([item for item in self.items if isinstance(item, dict)], result['items']):
+            item['total'] = line['total']
+            item['gst_amount'] = line['gst_amount']
         
-        self.total_amount = self.subtotal + self.cgst_amount + self.sgst_amount + self.igst_amount
+        self.subtotal = result['subtotal']
+        self.cgst_amount = result['cgst_amount']
+        self.sgst_amount = result['sgst_amount']
+        self.igst_amount = result['igst_amount']
+        self.total_amount = result['total_amount']
 
     def to_dict(self):
         return {
@@ -627,8 +858,8 @@ class Invoice:
             'customer_id': ObjectId(self.customer_id) if self.customer_id and isinstance(self.customer_id, str) and ObjectId.is_valid(self.customer_id) else self.customer_id,
             'order_id': ObjectId(self.order_id) if self.order_id and isinstance(self.order_id, str) and ObjectId.is_valid(self.order_id) else self.order_id,
             'invoice_number': self.invoice_number,
-            'invoice_date': self.invoice_date,
-            'due_date': self.due_date,
+            'invoice_date': _bson_date(self.invoice_date),
+            'due_date': _bson_date(self.due_date),
             'subtotal': self.subtotal,
             'cgst_amount': self.cgst_amount,
             'sgst_amount': self.sgst_amount,
@@ -642,44 +873,101 @@ class Invoice:
             'items': self.items
         }
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'user_id' in data and isinstance(data['user_id'], ObjectId):
-            data['user_id'] = str(data['user_id'])
-        if 'customer_id' in data and isinstance(data['customer_id'], ObjectId):
-            data['customer_id'] = str(data['customer_id'])
-        if 'order_id' in data and isinstance(data['order_id'], ObjectId):
-            data['order_id'] = str(data['order_id'])
-        return cls(**data)
-    
-    def save(self):
+    def denormalize_item_products(self, db):
+        """Copy hsn_code and unit from products onto items that don't carry them yet"""
+        missing = [item for item in self.items or [] if isinstance(item, dict) and 'hsn_code' not in item and item.get('product_id')]
+        if not missing:
+            return
+        product_ids = {ObjectId(item['product_id']) if isinstance(item['product_id'], str) and ObjectId.is_valid(item['product_id']) else item['product_id'] for item in missing}
+        products = {doc['_id']: doc for doc in db[Product.collection_name].find(
+            {'_id': {'$in': list(product_ids)}},
+            {'hsn_code': 1, 'unit': 1}
+        )}
+        for item in missing:
+            product_id = ObjectId(item['product_id']) if isinstance(item['product_id'], str) and ObjectId.is_valid(item['product_id']) else item['product_id']
+            product = products.get(product_id) or {}
+            item['hsn_code'] = product.get('hsn_code')
+            item['unit'] = product.get('unit')
+    
+    def _check_writable(self):
+        if self.archived:
+            raise ArchivedDocumentError(f'Invoice {self.invoice_number} is archived and read-only')
+    
+    def save(self, check_version=False):
         """Save invoice to MongoDB"""
+        self._check_writable()
         db = get_db()
         if db is None:
             raise ValueError("Database not initialized. Call init_app() first.")
+        self.denormalize_item_products(db)
         data = self.to_dict()
         data['updated_at'] = datetime.utcnow()
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            # Returns the document as it was before the update
+            written, before = self._update(db, data, check_version, return_before=True)
+            if not written:
+                return self
         else:
+            before = None
             result = db[self.collection_name].insert_one(data)
             self.id = str(result.inserted_id)
+            self._mark_saved(data)
+            metrics.invoice_created()
+        try:
+            record_invoice_change(db, before, data)
+        except Exception as e:
+            logger.error("Error updating GST period summary for invoice %s: %s", self.invoice_number, e)
+        try:
+            customer = Customer.find_by_id(self.customer_id) if before is None and self.customer_id else None
+            append_activity(db, invoice_event(before, dict(data, _id=self.id), customer.name if customer else None))
+        except Exception as e:
+            logger.error("Error recording activity for invoice %s: %s", self.invoice_number, e)
+        if before is not None:
+            try:
+                invalidate_invoice_pdfs(self.id)
+            except Exception as e:
+                logger.error("Error clearing cached PDFs for invoice %s: %s", self.invoice_number, e)
         return self
     
+    def delete(self):
+        """Delete invoice and its items from MongoDB"""
+        self._check_writable()
+        db = get_db()
+        if db is None:
+            raise ValueError("Database not initialized. Call init_app() first.")
+        invoice_id_obj = ObjectId(self.id) if isinstance(self.id, str) and ObjectId.is_valid(self.id) else self.id
+        before = db[self.collection_name].find_one_and_delete({'_id': invoice_id_obj})
+        identity_map.forget(type(self), self.id)
+        if before is None:
+            # Already deleted, or moved to the archive since it was loaded
+            return
+        db['invoice_items'].delete_many({'invoice_id': invoice_id_obj})
+        try:
+            record_invoice_change(db, before, None)
+        except Exception as e:
+            logger.error("Error updating GST period summary for invoice %s: %s", self.invoice_number, e)
+        try:
+            append_activity(db, invoice_event(before, None))
+        except Exception as e:
+            logger.error("Error recording activity for invoice %s: %s", self.invoice_number, e)
+        try:
+            invalidate_invoice_pdfs(self.id)
+        except Exception as e:
+            logger.error("Error clearing cached PDFs for invoice %s: %s", self.invoice_number, e)
+    
     @classmethod
     def find_by_id(cls, invoice_id):
-        """Find invoice by ID"""
+        """Find invoice by ID, falling back to the archive for tiered-out invoices"""
         db = get_db()
         if db is None:
             raise ValueError("Database not initialized. Call init_app() first.")
         try:
-            doc = db[cls.collection_name].find_one({'_id': ObjectId(invoice_id)})
-            if doc:
-                return cls.from_dict(doc)
+            invoice = identity_map.load(cls, invoice_id, db)
+            if invoice is None and ObjectId.is_valid(str(invoice_id)):
+                invoice = cls.from_dict(cold_storage.find_archived(db, cls.collection_name, {'_id': ObjectId(str(invoice_id))}))
+                if invoice is not None:
+                    invoice.archived = True
+            return invoice
         except:
             pass
         return None
@@ -687,24 +975,30 @@ class Invoice:
     def __repr__(self):
         return f'<Invoice {self.invoice_number}>'
 
-class InvoiceItem:
+class InvoiceItem(Document):
     """Invoice item model"""
     
     collection_name = 'invoice_items'
     
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.invoice_id = kwargs.get('invoice_id')
-        self.product_id = kwargs.get('product_id')
-        self.quantity = kwargs.get('quantity')
-        self.unit_price = kwargs.get('unit_price')
-        self.gst_rate = kwargs.get('gst_rate')
-        self.gst_amount = kwargs.get('gst_amount')
-        self.total = kwargs.get('total')
-    
-    def calculate_totals(self):
-        """Calculate item totals"""
-        self.total = self.quantity * self.unit_price
+    FIELDS = (
+        ('invoice_id', None),
+        ('product_id', None),
+        ('quantity', None),
+        ('unit_price', None),
+        ('gst_rate', None),
+        ('gst_amount', None),
+        ('total', None),
+        # Snapshot of the product's HSN code and unit, so HSN reports need no product lookup
+        ('hsn_code', None),
+        ('unit', None),
+    )
+    REF_FIELDS = ('invoice_id', 'product_id')
+    __slots__ = _slots(FIELDS)
+    
+    def calculate_totals(self, inter_state=False):
+        """Calculate item taxable value and GST"""
+        self.total, cgst, sgst, igst = compute_line(self.quantity, self.unit_price, self.gst_rate, inter_state)
+        self.gst_amount = round_half_up(cgst + sgst + igst)
 
     def to_dict(self):
         return {
@@ -715,50 +1009,50 @@ class InvoiceItem:
             'unit_price': self.unit_price,
             'gst_rate': self.gst_rate,
             'gst_amount': self.gst_amount,
-            'total': self.total
+            'total': self.total,
+            'hsn_code': self.hsn_code,
+            'unit': self.unit
         }
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'invoice_id' in data and isinstance(data['invoice_id'], ObjectId):
-            data['invoice_id'] = str(data['invoice_id'])
-        if 'product_id' in data and isinstance(data['product_id'], ObjectId):
-            data['product_id'] = str(data['product_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save invoice item to MongoDB"""
         db = get_db()
         if db is None:
             raise ValueError("Database not initialized. Call init_app() first.")
         data = self.to_dict()
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            self._update(db, data, check_version)
         else:
             result = db[self.collection_name].insert_one(data)
             self.id = str(result.inserted_id)
+            self._mark_saved(data)
         return self
     
     def __repr__(self):
         return f'<InvoiceItem Product:{self.product_id}>'
 
-class StockMovement:
+class StockMovement(Document):
     """Stock movement model for tracking inventory changes"""
     
     collection_name = 'stock_movements'
-    
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.product_id = kwargs.get('product_id')
-        self.movement_type = kwargs.get('movement_type')
-        self.quantity = kwargs.get('quantity')
-        self.reference = kwargs.get('reference')
-        self.notes = kwargs.get('notes')
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
+    INDEXES = (
+        ([('product_id', 1), ('created_at', 1)], {}),
+    )
+    QUERY_SHAPES = (
+        ('recent', {'product_id': _ANY_ID}, [('created_at', -1)]),
+        ('by_products', {'product_id': {'$in': [_ANY_ID]}}, None),
+    )
+    
+    FIELDS = (
+        ('product_id', None),
+        ('movement_type', None),
+        ('quantity', None),
+        ('reference', None),
+        ('notes', None),
+        ('created_at', datetime.utcnow),
+    )
+    REF_FIELDS = ('product_id',)
+    __slots__ = _slots(FIELDS)
     
     def to_dict(self):
         return {
@@ -771,49 +1065,50 @@ class StockMovement:
             'created_at': self.created_at
         }
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'product_id' in data and isinstance(data['product_id'], ObjectId):
-            data['product_id'] = str(data['product_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save stock movement to MongoDB"""
         db = get_db()
         if db is None:
             raise ValueError("Database not initialized. Call init_app() first.")
         data = self.to_dict()
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            self._update(db, data, check_version)
         else:
             result = db[self.collection_name].insert_one(data)
             self.id = str(result.inserted_id)
+            self._mark_saved(data)
+            metrics.stock_movement_written(self.movement_type)
+            try:
+                # Usually already loaded by the caller, so served from the identity map
+                product = Product.find_by_id(self.product_id) if self.product_id else None
+                if product:
+                    append_activity(db, stock_event(product.user_id, dict(data, _id=self.id), product.name))
+            except Exception as e:
+                logger.error("Error recording activity for stock movement %s: %s", self.id, e)
         return self
     
     def __repr__(self):
         return f'<StockMovement {self.movement_type} {self.quantity}>'
 
-class GSTReport:
+class GSTReport(Document):
     """GST report model for storing periodic reports"""
     
     collection_name = 'gst_reports'
     
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.user_id = kwargs.get('user_id')
-        self.report_type = kwargs.get('report_type')
-        self.period_month = kwargs.get('period_month')
-        self.period_year = kwargs.get('period_year')
-        self.total_taxable_value = kwargs.get('total_taxable_value', 0.0)
-        self.total_cgst = kwargs.get('total_cgst', 0.0)
-        self.total_sgst = kwargs.get('total_sgst', 0.0)
-        self.total_igst = kwargs.get('total_igst', 0.0)
-        self.report_data = kwargs.get('report_data')
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
+    FIELDS = (
+        ('user_id', None),
+        ('report_type', None),
+        ('period_month', None),
+        ('period_year', None),
+        ('total_taxable_value', 0.0),
+        ('total_cgst', 0.0),
+        ('total_sgst', 0.0),
+        ('total_igst', 0.0),
+        ('report_data', None),
+        ('created_at', datetime.utcnow),
+    )
+    REF_FIELDS = ('user_id',)
+    __slots__ = _slots(FIELDS)
     
     def to_dict(self):
         return {
@@ -830,49 +1125,51 @@ class GSTReport:
             'created_at': self.created_at
         }
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'user_id' in data and isinstance(data['user_id'], ObjectId):
-            data['user_id'] = str(data['user_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save GST report to MongoDB"""
         db = get_db()
         if db is None:
             raise ValueError("Database not initialized. Call init_app() first.")
         data = self.to_dict()
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            self._update(db, data, check_version)
         else:
             result = db[self.collection_name].insert_one(data)
             self.id = str(result.inserted_id)
+            self._mark_saved(data)
         return self
     
     def __repr__(self):
         return f'<GSTReport {self.report_type} {self.period_month}/{self.period_year}>'
 
-class Order:
+class Order(Document):
     """Order model for customer orders"""
     
     collection_name = 'orders'
-    
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.customer_id = kwargs.get('customer_id')
-        self.order_number = kwargs.get('order_number')
-        self.order_date = kwargs.get('order_date', datetime.utcnow())
-        self.status = kwargs.get('status', 'pending')
-        self.subtotal = kwargs.get('subtotal', 0.0)
-        self.total_amount = kwargs.get('total_amount', 0.0)
-        self.notes = kwargs.get('notes')
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
-        self.updated_at = kwargs.get('updated_at', datetime.utcnow())
-        self.items = kwargs.get('items', [])
+    INDEXES = (
+        ('order_number', {'unique': True}),
+        ([('user_id', 1), ('created_at', 1)], {}),
+        ('customer_id', {}),
+    )
+    QUERY_SHAPES = (
+        ('by_business', {'user_id': _ANY_ID}, [('created_at', -1)]),
+        ('by_customer', {'customer_id': _ANY_ID}, [('created_at', -1)]),
+    )
+    
+    FIELDS = (
+        ('customer_id', None),
+        ('order_number', None),
+        ('order_date', datetime.utcnow),
+        ('status', 'pending'),
+        ('subtotal', 0.0),
+        ('total_amount', 0.0),
+        ('notes', None),
+        ('created_at', datetime.utcnow),
+        ('updated_at', datetime.utcnow),
+        ('items', list),
+    )
+    REF_FIELDS = ('customer_id',)
+    __slots__ = _slots(FIELDS)
     
     def calculate_totals(self):
         """Calculate order totals"""
@@ -898,17 +1195,7 @@ class Order:
             data['_id'] = ObjectId(self.id) if isinstance(self.id, str) and ObjectId.is_valid(self.id) else self.id
         return data
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'customer_id' in data and isinstance(data['customer_id'], ObjectId):
-            data['customer_id'] = str(data['customer_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save order to MongoDB"""
         db = get_db()
         if db is None:
@@ -921,15 +1208,28 @@ class Order:
             del data['_id']
         
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            previous_status = (self._orig or {}).get('status')
+            written, _ = self._update(db, data, check_version)
+            if written and previous_status != self.status:
+                self._record_activity(db, data, previous_status or 'unknown')
         else:
             result = db[self.collection_name].insert_one(data)
             if result and result.inserted_id:
                 self.id = str(result.inserted_id)
+                self._mark_saved(data)
+                self._record_activity(db, data)
             else:
                 raise ValueError("Failed to insert order: result is None or missing inserted_id")
         return self
     
+    def _record_activity(self, db, data, previous_status=None):
+        try:
+            customer = Customer.find_by_id(self.customer_id) if self.customer_id else None
+            if customer:
+                append_activity(db, order_event(customer.user_id, dict(data, _id=self.id), previous_status, customer.name))
+        except Exception as e:
+            logger.error("Error recording activity for order %s: %s", self.order_number, e)
+    
     @classmethod
     def find_by_id(cls, order_id):
         """Find order by ID"""
@@ -937,9 +1237,7 @@ class Order:
         if db is None:
             raise ValueError("Database not initialized. Call init_app() first.")
         try:
-            doc = db[cls.collection_name].find_one({'_id': ObjectId(order_id)})
-            if doc:
-                return cls.from_dict(doc)
+            return identity_map.load(cls, order_id, db)
         except:
             pass
         return None
@@ -947,18 +1245,26 @@ class Order:
     def __repr__(self):
         return f'<Order {self.order_number}>'
 
-class OrderItem:
+class OrderItem(Document):
     """Order item model"""
     
     collection_name = 'order_items'
-    
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.order_id = kwargs.get('order_id')
-        self.product_id = kwargs.get('product_id')
-        self.quantity = kwargs.get('quantity')
-        self.unit_price = kwargs.get('unit_price')
-        self.total = kwargs.get('total')
+    INDEXES = (
+        ('order_id', {}),
+    )
+    QUERY_SHAPES = (
+        ('by_order', {'order_id': _ANY_ID}, None),
+    )
+    
+    FIELDS = (
+        ('order_id', None),
+        ('product_id', None),
+        ('quantity', None),
+        ('unit_price', None),
+        ('total', None),
+    )
+    REF_FIELDS = ('order_id', 'product_id')
+    __slots__ = _slots(FIELDS)
     
     def calculate_totals(self):
         """Calculate item totals"""
@@ -978,19 +1284,7 @@ class OrderItem:
             data['_id'] = ObjectId(self.id) if isinstance(self.id, str) and ObjectId.is_valid(self.id) else self.id
         return data
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'order_id' in data and isinstance(data['order_id'], ObjectId):
-            data['order_id'] = str(data['order_id'])
-        if 'product_id' in data and isinstance(data['product_id'], ObjectId):
-            data['product_id'] = str(data['product_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save order item to MongoDB"""
         db = get_db()
         if db is None:
@@ -1002,11 +1296,12 @@ class OrderItem:
             del data['_id']
         
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            self._update(db, data, check_version)
         else:
             result = db[self.collection_name].insert_one(data)
             if result and result.inserted_id:
                 self.id = str(result.inserted_id)
+                self._mark_saved(data)
             else:
                 raise ValueError("Failed to insert order item: result is None or missing inserted_id")
         return self
@@ -1014,18 +1309,27 @@ class OrderItem:
     def __repr__(self):
         return f'<OrderItem Product:{self.product_id}>'
 
-class CustomerProductPrice:
+class CustomerProductPrice(Document):
     """Customer-specific product pricing"""
     
     collection_name = 'customer_product_prices'
-    
-    def __init__(self, **kwargs):
-        self.id = kwargs.get('_id') or kwargs.get('id')
-        self.customer_id = kwargs.get('customer_id')
-        self.product_id = kwargs.get('product_id')
-        self.price = kwargs.get('price')
-        self.created_at = kwargs.get('created_at', datetime.utcnow())
-        self.updated_at = kwargs.get('updated_at', datetime.utcnow())
+    INDEXES = (
+        ([('customer_id', 1), ('product_id', 1)], {'unique': True}),
+    )
+    QUERY_SHAPES = (
+        ('price', {'customer_id': _ANY_ID, 'product_id': _ANY_ID}, None),
+        ('by_customer', {'customer_id': _ANY_ID}, None),
+    )
+    
+    FIELDS = (
+        ('customer_id', None),
+        ('product_id', None),
+        ('price', None),
+        ('created_at', datetime.utcnow),
+        ('updated_at', datetime.utcnow),
+    )
+    REF_FIELDS = ('customer_id', 'product_id')
+    __slots__ = _slots(FIELDS)
     
     def to_dict(self):
         return {
@@ -1037,19 +1341,7 @@ class CustomerProductPrice:
             'updated_at': self.updated_at
         }
     
-    @classmethod
-    def from_dict(cls, data):
-        if data is None:
-            return None
-        if '_id' in data:
-            data['id'] = str(data['_id'])
-        if 'customer_id' in data and isinstance(data['customer_id'], ObjectId):
-            data['customer_id'] = str(data['customer_id'])
-        if 'product_id' in data and isinstance(data['product_id'], ObjectId):
-            data['product_id'] = str(data['product_id'])
-        return cls(**data)
-    
-    def save(self):
+    def save(self, check_version=False):
         """Save customer product price to MongoDB"""
         db = get_db()
         if db is None:
@@ -1057,10 +1349,11 @@ class CustomerProductPrice:
         data = self.to_dict()
         data['updated_at'] = datetime.utcnow()
         if '_id' in data and data['_id']:
-            db[self.collection_name].update_one({'_id': data['_id']}, {'$set': data})
+            self._update(db, data, check_version)
         else:
             result = db[self.collection_name].insert_one(data)
             self.id = str(result.inserted_id)
+            self._mark_saved(data)
         return self
     
     @classmethod
@@ -0,0 +1,150 @@
+"""
+Content-addressed cache for rendered invoice PDFs.
+
+A PDF is stored as ``<invoice_id>/<sha256>.pdf`` where the hash covers
+everything printed on the invoice plus ``INVOICE_TEMPLATE_VERSION``. Any edit
+to the invoice (or to the customer/business details it prints) changes the
+hash, so a stale PDF is never served; ``invalidate_invoice`` also drops the
+old files eagerly when an invoice is saved or deleted.
+
+Files are written to a temporary name and moved into place, so concurrent
+workers rendering the same invoice never see a half-written PDF. Hits touch
+the file's mtime and the directory is trimmed oldest-first once it grows
+past ``PDF_CACHE_MAX_BYTES``. Walking the directory costs a stat per file,
+so stores only add to a per-process byte count; the walk runs when that
+count passes the limit, or every ``EVICT_INTERVAL`` seconds to catch up
+with what other workers wrote.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join('cache', 'pdf')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Trim to this fraction of the limit so eviction doesn't run on every store
+EVICT_TO = 0.9
+# Seconds after which a store rescans the cache even below the limit
+EVICT_INTERVAL = 60.0
+
+# Bytes this process believes are cached; None until the first scan
+_usage = {'bytes': None, 'scanned_at': 0.0}
+_usage_lock = threading.Lock()
+
+def _config(name, default):
+    try:
+        from flask import current_app, has_app_context
+        if has_app_context():
+            return current_app.config.get(name, default)
+    except ImportError:
+        pass
+    return default
+
+def cache_dir():
+    directory = os.path.abspath(_config('PDF_CACHE_DIR', DEFAULT_CACHE_DIR))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def content_key(context):
+    """SHA-256 of the rendered content and template version"""
+    from pdf_generator import INVOICE_TEMPLATE_VERSION
+    payload = json.dumps(context, sort_keys=True, default=str)
+    return hashlib.sha256(f'{INVOICE_TEMPLATE_VERSION}:{payload}'.encode('utf-8')).hexdigest()
+
+def _path(invoice_id, key):
+    return os.path.join(cache_dir(), str(invoice_id), f'{key}.pdf')
+
+def lookup(invoice_id, key):
+    """Path of a cached PDF, or None; a hit refreshes its LRU position"""
+    path = _path(invoice_id, key)
+    try:
+        os.utime(path, None)
+    except FileNotFoundError:
+        return None
+    return path
+
+def store(invoice_id, key, pdf_bytes):
+    """Atomically write a rendered PDF into the cache and return its path"""
+    path = _path(invoice_id, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if _needs_eviction(len(pdf_bytes)):
+        evict()
+    return path
+
+def _needs_eviction(added):
+    max_bytes = _config('PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    with _usage_lock:
+        if _usage['bytes'] is None:
+            return True
+        _usage['bytes'] += added
+        return _usage['bytes'] > max_bytes or time.monotonic() - _usage['scanned_at'] > EVICT_INTERVAL
+
+def _entries(directory):
+    for invoice_dir in os.scandir(directory):
+        if not invoice_dir.is_dir():
+            continue
+        for entry in os.scandir(invoice_dir.path):
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, entry.path
+
+def evict(max_bytes=None):
+    """Delete least recently used PDFs until the cache fits its size limit"""
+    max_bytes = max_bytes if max_bytes is not None else _config('PDF_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    entries = list(_entries(cache_dir()))
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        _scanned(total)
+        return 0
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes * EVICT_TO:
+            break
+        try:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            # Already gone, or the invoice directory still has other files
+            pass
+        total -= size
+        removed += 1
+    _scanned(total)
+    return removed
+
+def _scanned(total):
+    with _usage_lock:
+        _usage['bytes'] = total
+        _usage['scanned_at'] = time.monotonic()
+
+def invalidate_invoice(invoice_id):
+    """Drop every cached PDF of an invoice"""
+    if not invoice_id:
+        return
+    shutil.rmtree(os.path.join(cache_dir(), str(invoice_id)), ignore_errors=True)
+
+def get_invoice_pdf(invoice):
+    """Return (path, key) of the invoice's PDF, rendering it on a cache miss"""
+    from pdf_generator import invoice_pdf_context
+    from pdf_service import render_pdf
+    context = invoice_pdf_context(invoice)
+    key = content_key(context)
+    path = lookup(invoice.id, key)
+    if path is None:
+        path = store(invoice.id, key, render_pdf('invoice', context))
+    return path, key
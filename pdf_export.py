@@ -0,0 +1,141 @@
+"""
+Bulk export of invoice PDFs as one streamed ZIP or a merged PDF.
+
+Invoices matching the filter are read in ``_id`` order, ``EXPORT_BATCH_SIZE``
+at a time. Each batch loads its users, customers and products with one
+query apiece, takes PDFs from the content-addressed cache where present and
+renders the rest in parallel through the PDF worker pool. Newly rendered
+files go back into the cache, so a repeated export is mostly disk reads.
+
+The ZIP is written into a small buffer that is drained after every file, so
+only the current batch is ever in memory regardless of how many invoices
+match. Merging into a single PDF needs ``pypdf`` and keeps the merged
+document in memory, so it is capped at ``MERGE_MAX_INVOICES``.
+"""
+import importlib.util
+import re
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO
+from bson import ObjectId
+
+from models import Invoice
+from pdf_cache import content_key, lookup, store
+from pdf_generator import invoice_pdf_contexts
+from pdf_service import render_many, render_pdf
+
+# pypdf is imported by merged_pdf, not while a worker boots
+PYPDF_AVAILABLE = importlib.util.find_spec('pypdf') is not None
+
+EXPORT_BATCH_SIZE = 100
+MERGE_MAX_INVOICES = 500
+
+def _to_object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+def export_query(user_id, start=None, end=None, customer_id=None, status=None):
+    """Mongo filter for an export; start/end are dates, both inclusive"""
+    query = {'user_id': _to_object_id(user_id)}
+    if start or end:
+        query['invoice_date'] = {}
+        if start:
+            query['invoice_date']['$gte'] = datetime.combine(start, datetime.min.time())
+        if end:
+            query['invoice_date']['$lt'] = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    if customer_id:
+        query['customer_id'] = _to_object_id(customer_id)
+    if status:
+        query['status'] = status
+    return query
+
+def iter_invoice_batches(database, query, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of Invoice objects, paging by _id so no cursor stays open"""
+    last_id = None
+    while True:
+        page_query = dict(query)
+        if last_id is not None:
+            page_query['_id'] = {'$gt': last_id}
+        docs = list(database['invoices'].find(page_query).sort('_id', 1).limit(batch_size))
+        if not docs:
+            return
+        last_id = docs[-1]['_id']
+        yield [Invoice.from_dict(doc) for doc in docs]
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def iter_invoice_pdfs(database, query, batch_size=EXPORT_BATCH_SIZE):
+    """Yield (invoice, pdf_bytes) for every matching invoice, in _id order"""
+    for invoices in iter_invoice_batches(database, query, batch_size):
+        contexts = invoice_pdf_contexts(invoices)
+        keys = [content_key(context) for context in contexts]
+        cached = [lookup(invoice.id, key) for invoice, key in zip(invoices, keys)]
+        misses = [index for index, path in enumerate(cached) if path is None]
+        rendered = dict(zip(misses, render_many('invoice', [(contexts[index],) for index in misses])))
+        for index, invoice in enumerate(invoices):
+            if index in rendered:
+                pdf_bytes = rendered.pop(index)
+                store(invoice.id, keys[index], pdf_bytes)
+            else:
+                try:
+                    pdf_bytes = _read(cached[index])
+                except FileNotFoundError:
+                    # Evicted since the lookup
+                    pdf_bytes = render_pdf('invoice', contexts[index])
+            yield invoice, pdf_bytes
+
+def _file_name(invoice, used):
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', str(invoice.invoice_number or invoice.id))
+    if name in used:
+        name = f'{name}_{invoice.id}'
+    used.add(name)
+    return f'{name}.pdf'
+
+class _ChunkSink:
+    """Write-only file object that hands its contents back in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(invoice_pdfs):
+    """Generate a ZIP archive chunk by chunk from (invoice, pdf_bytes) pairs"""
+    sink = _ChunkSink()
+    used = set()
+    # PDFs are already compressed, so store them as they are
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for invoice, pdf_bytes in invoice_pdfs:
+            archive.writestr(_file_name(invoice, used), pdf_bytes)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+def merged_pdf(invoice_pdfs):
+    """Concatenate PDFs into one document; returns an in-memory file"""
+    if not PYPDF_AVAILABLE:
+        raise RuntimeError('Merged PDF export requires the pypdf package')
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter()
+    for invoice, pdf_bytes in invoice_pdfs:
+        writer.append(PdfReader(BytesIO(pdf_bytes)))
+    output = BytesIO()
+    writer.write(output)
+    output.seek(0)
+    return output
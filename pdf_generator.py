@@ -1,347 +1,166 @@
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-import os
-from datetime import datetime
-from models import Invoice, Customer, Product, User
-from database import db
+from io import BytesIO
+from datetime import datetime, date
+from bson import ObjectId
+from models import Invoice, Customer, Product, User, get_db
 
-def generate_invoice_pdf(invoice):
-    """Generate PDF for invoice using ReportLab"""
-    # Create PDF file
-    filename = f"invoice_{invoice.invoice_number}.pdf"
-    filepath = os.path.join('static', 'uploads', filename)
-    
-    doc = SimpleDocTemplate(filepath, pagesize=A4)
-    story = []
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#007bff')
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        textColor=colors.HexColor('#333333')
-    )
-    
-    normal_style = styles['Normal']
-    
-    # Title
-    story.append(Paragraph("TAX INVOICE", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Business and Invoice Info
-    business_data = [
-        [Paragraph(f"<b>{invoice.user.business_name or 'My Business'}</b>", normal_style), 
-         Paragraph(f"<b>Invoice No:</b> {invoice.invoice_number}", normal_style)],
-        [Paragraph(f"GST: {invoice.user.gst_number or 'N/A'}", normal_style),
-         Paragraph(f"<b>Date:</b> {invoice.invoice_date.strftime('%d/%m/%Y')}", normal_style)],
-        [Paragraph(f"Address: {invoice.user.business_address or 'N/A'}", normal_style),
-         Paragraph(f"<b>Due Date:</b> {invoice.due_date.strftime('%d/%m/%Y') if invoice.due_date else 'N/A'}", normal_style)],
-        [Paragraph(f"Phone: {invoice.user.business_phone or 'N/A'}", normal_style), ""],
-        [Paragraph(f"Email: {invoice.user.business_email or 'N/A'}", normal_style), ""]
-    ]
-    
-    business_table = Table(business_data, colWidths=[4*inch, 3*inch])
-    business_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(business_table)
-    story.append(Spacer(1, 20))
-    
-    # Customer Info
-    story.append(Paragraph("Bill To:", heading_style))
-    customer_data = [
-        [f"Name: {invoice.customer.name}"],
-        [f"GSTIN: {invoice.customer.gstin or 'N/A'}"],
-        [f"Address: {invoice.customer.billing_address}"],
-        [f"Phone: {invoice.customer.phone}"],
-        [f"Email: {invoice.customer.email or 'N/A'}"],
-        [f"State: {invoice.customer.state} - {invoice.customer.pincode}"]
-    ]
-    
-    customer_table = Table(customer_data, colWidths=[7*inch])
-    customer_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8f9fa')),
-        ('ROUNDEDCORNERS', [6]),
-    ]))
-    story.append(customer_table)
-    story.append(Spacer(1, 20))
-    
-    # Invoice Items Table
-    story.append(Paragraph("Invoice Items:", heading_style))
-    
-    # Table headers
-    headers = ['S.No', 'Item', 'HSN', 'Qty', 'Rate', 'GST %', 'GST Amt', 'Total']
-    table_data = [headers]
-    
-    # Add items
-    for i, item in enumerate(invoice.items, 1):
-        # Calculate item totals if not already calculated
-        if not hasattr(item, 'total') or item.total == 0:
-            item_total = item.quantity * item.unit_price
-            item_gst = item_total * (item.gst_rate / 100)
-            item.total = item_total + item_gst
-            item.gst_amount = item_gst
-        
-        table_data.append([
-            str(i),
-            item.product.name if item.product else 'Unknown Product',
-            item.product.hsn_code if item.product else 'N/A',
-            str(item.quantity),
-            f"₹{item.unit_price:.2f}",
-            f"{item.gst_rate}%",
-            f"₹{item.gst_amount:.2f}",
-            f"₹{item.total:.2f}"
-        ])
-    
-    # Create table
-    item_table = Table(table_data, colWidths=[0.5*inch, 2*inch, 0.8*inch, 0.6*inch, 1*inch, 0.6*inch, 1*inch, 1*inch])
-    item_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),  # Headers
-        ('ALIGN', (0, 1), (-1, -1), 'LEFT'),   # Data
-        ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),  # Numbers
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#007bff')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-    ]))
-    story.append(item_table)
-    story.append(Spacer(1, 20))
-    
-    # Calculate totals
-    subtotal = sum(item.quantity * item.unit_price for item in invoice.items)
-    total_gst = sum(item.gst_amount for item in invoice.items)
-    
-    # Determine GST split based on customer state vs business state
-    if invoice.customer.state == invoice.user.business_state:
-        # Same state - CGST + SGST
-        cgst = total_gst / 2
-        sgst = total_gst / 2
-    else:
-        # Different state - IGST
-        cgst = 0
-        sgst = 0
-    
-    total_amount = subtotal + total_gst
-    
-    # Totals
-    totals_data = [
-        ['Subtotal:', f"₹{subtotal:.2f}"],
-        ['CGST:', f"₹{cgst:.2f}"],
-        ['SGST:', f"₹{sgst:.2f}"],
-        ['Total Amount:', f"₹{total_amount:.2f}"]
+def __getattr__(name):
+    # INVOICE_TEMPLATE_VERSION is part of every cached invoice PDF's key (see
+    # InvoiceTemplate.version). pdf_templates builds its ReportLab styles on
+    # import, so it is only loaded once something renders or asks for this.
+    if name == 'INVOICE_TEMPLATE_VERSION':
+        from pdf_templates import InvoiceTemplate
+        return InvoiceTemplate.version
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def get_template(name):
+    from pdf_templates import get_template as load_template
+    return load_template(name)
+
+def _format_date(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, str) and value:
+        try:
+            return datetime.strptime(value[:10], '%Y-%m-%d').strftime('%d/%m/%Y')
+        except ValueError:
+            return value
+    return 'N/A'
+
+def invoice_pdf_context(invoice):
+    """Collect everything printed on an invoice PDF as plain JSON-safe values"""
+    return invoice_pdf_contexts([invoice])[0]
+
+def _oid(value):
+    return ObjectId(value) if isinstance(value, str) and ObjectId.is_valid(value) else value
+
+def invoice_pdf_contexts(invoices):
+    """Contexts for many invoices, loading their users, customers and products in one query each"""
+    database = get_db()
+    users, customers, products = {}, {}, {}
+    user_ids = list({_oid(invoice.user_id) for invoice in invoices if invoice.user_id})
+    customer_ids = list({_oid(invoice.customer_id) for invoice in invoices if invoice.customer_id})
+    product_ids = list({
+        _oid(item['product_id'])
+        for invoice in invoices for item in invoice.items or []
+        if isinstance(item, dict) and item.get('product_id')
+    })
+    if database is not None:
+        if user_ids:
+            users = {str(doc['_id']): User.from_dict(doc) for doc in database['users'].find({'_id': {'$in': user_ids}})}
+        if customer_ids:
+            customers = {str(doc['_id']): Customer.from_dict(doc) for doc in database['customers'].find({'_id': {'$in': customer_ids}})}
+        if product_ids:
+            products = {
+                str(doc['_id']): doc
+                for doc in database['products'].find({'_id': {'$in': product_ids}}, {'name': 1, 'hsn_code': 1, 'vegetable_name_hindi': 1})
+            }
+    return [
+        _invoice_context(invoice, users.get(str(invoice.user_id)), customers.get(str(invoice.customer_id)), products)
+        for invoice in invoices
     ]
-    
-    totals_table = Table(totals_data, colWidths=[2*inch, 1.5*inch])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 14),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#007bff')),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    story.append(totals_table)
-    
-    # Add notes if available
-    if invoice.notes:
-        story.append(Spacer(1, 20))
-        story.append(Paragraph("Notes:", heading_style))
-        story.append(Paragraph(invoice.notes, normal_style))
-    
-    # Add footer
-    story.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_CENTER,
-        textColor=colors.grey
-    )
-    story.append(Paragraph(f"Thank you for your business! | {invoice.user.business_name or 'My Business'}", footer_style))
-    
-    # Build PDF
-    doc.build(story)
+
+def _invoice_context(invoice, user, customer, products):
+    items = [item for item in invoice.items or [] if isinstance(item, dict)]
+    return {
+        'invoice_number': invoice.invoice_number,
+        'invoice_date': _format_date(invoice.invoice_date),
+        'due_date': _format_date(invoice.due_date) if invoice.due_date else 'N/A',
+        'notes': invoice.notes or '',
+        'business': {
+            'name': (user.business_name if user else None) or 'My Business',
+            'gst_number': (user.gst_number if user else None) or 'N/A',
+            'address': (user.business_address if user else None) or 'N/A',
+            'phone': (user.business_phone if user else None) or 'N/A',
+            'email': (user.business_email if user else None) or 'N/A'
+        },
+        'customer': {
+            'name': customer.name if customer else 'Unknown Customer',
+            'gstin': (customer.gstin if customer else None) or 'N/A',
+            'address': (customer.billing_address if customer else None) or 'N/A',
+            'phone': (customer.phone if customer else None) or 'N/A',
+            'email': (customer.email if customer else None) or 'N/A',
+            'state': (customer.state if customer else None) or '',
+            'pincode': (customer.pincode if customer else None) or ''
+        },
+        'items': [
+            {
+                'name': (products.get(str(item.get('product_id'))) or {}).get('name') or 'Unknown Product',
+                'name_hindi': (products.get(str(item.get('product_id'))) or {}).get('vegetable_name_hindi') or '',
+                'hsn_code': item.get('hsn_code') or (products.get(str(item.get('product_id'))) or {}).get('hsn_code') or 'N/A',
+                'quantity': item.get('quantity', 0),
+                'unit_price': float(item.get('unit_price') or 0),
+                'gst_rate': item.get('gst_rate', 0),
+                'gst_amount': float(item.get('gst_amount') or 0),
+                'total': float(item.get('total') or 0)
+            }
+            for item in items
+        ],
+        'subtotal': float(invoice.subtotal or 0),
+        'cgst_amount': float(invoice.cgst_amount or 0),
+        'sgst_amount': float(invoice.sgst_amount or 0),
+        'igst_amount': float(invoice.igst_amount or 0),
+        'total_amount': float(invoice.total_amount or 0)
+    }
+
+def render_invoice_pdf(context):
+    """Render an invoice context (see invoice_pdf_context) and return the PDF bytes"""
+    return get_template('invoice').render(context)
+
+def generate_invoice_pdf(invoice):
+    """Generate PDF for invoice using ReportLab, served from the PDF cache"""
+    from pdf_cache import get_invoice_pdf
+    filepath, _ = get_invoice_pdf(invoice)
     return filepath
 
+def gst_report_pdf_context(report):
+    """Collect everything printed on a GST report PDF as plain values"""
+    user = User.find_by_id(report.user_id) if report.user_id else None
+    created_at = report.created_at if isinstance(report.created_at, datetime) else datetime.utcnow()
+    return {
+        'report_type': report.report_type or '',
+        'period_month': report.period_month,
+        'period_year': report.period_year,
+        'generated_on': created_at.strftime('%d/%m/%Y %H:%M'),
+        'business_name': (user.business_name if user else None) or 'N/A',
+        'gst_number': (user.gst_number if user else None) or 'N/A',
+        'total_taxable_value': float(report.total_taxable_value or 0),
+        'total_cgst': float(report.total_cgst or 0),
+        'total_sgst': float(report.total_sgst or 0),
+        'total_igst': float(report.total_igst or 0)
+    }
+
+def render_gst_report_pdf(context):
+    """Render a GST report context (see gst_report_pdf_context) and return the PDF bytes"""
+    return get_template('gst_report').render(context)
+
 def generate_gst_report_pdf(report):
-    """Generate PDF for GST report using ReportLab"""
-    filename = f"gst_report_{report.report_type}_{report.period_month}_{report.period_year}.pdf"
-    filepath = os.path.join('static', 'uploads', filename)
-    
-    doc = SimpleDocTemplate(filepath, pagesize=A4)
-    story = []
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#007bff')
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        textColor=colors.HexColor('#333333')
-    )
-    
-    normal_style = styles['Normal']
-    
-    # Title
-    story.append(Paragraph(f"GST {report.report_type.upper()} Report", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Report Info
-    info_data = [
-        [Paragraph("<b>Report Type:</b>", normal_style), report.report_type.upper()],
-        [Paragraph("<b>Period:</b>", normal_style), f"{report.period_month}/{report.period_year}"],
-        [Paragraph("<b>Generated On:</b>", normal_style), report.created_at.strftime('%d/%m/%Y %H:%M')],
-        [Paragraph("<b>Business:</b>", normal_style), report.user.business_name],
-        [Paragraph("<b>GST Number:</b>", normal_style), report.user.gst_number]
-    ]
-    
-    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    story.append(info_table)
-    story.append(Spacer(1, 20))
-    
-    # Summary
-    story.append(Paragraph("Summary:", heading_style))
-    summary_data = [
-        ['Total Taxable Value:', f"₹{report.total_taxable_value:.2f}"],
-        ['Total CGST:', f"₹{report.total_cgst:.2f}"],
-        ['Total SGST:', f"₹{report.total_sgst:.2f}"],
-        ['Total IGST:', f"₹{report.total_igst:.2f}"],
-        ['Total Tax:', f"₹{report.total_cgst + report.total_sgst + report.total_igst:.2f}"]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#007bff')),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    story.append(summary_table)
-    
-    # Build PDF
-    doc.build(story)
-    return filepath
+    """Generate PDF for GST report using ReportLab; returns an in-memory file"""
+    from pdf_service import render_pdf
+    return BytesIO(render_pdf('gst_report', gst_report_pdf_context(report)))
+
+def render_sales_report_pdf(report_data, report_type, start_date, end_date):
+    """Render a sales report and return the PDF bytes"""
+    return get_template('sales_report').render({
+        'report_data': report_data,
+        'report_type': report_type,
+        'period': f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}",
+        'generated_on': datetime.now().strftime('%d/%m/%Y %H:%M')
+    })
 
 def generate_sales_report_pdf(report_data, report_type, start_date, end_date):
-    """Generate PDF for sales report using ReportLab"""
-    filename = f"sales_report_{report_type}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.pdf"
-    filepath = os.path.join('static', 'uploads', filename)
-    
-    doc = SimpleDocTemplate(filepath, pagesize=A4)
-    story = []
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#007bff')
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        textColor=colors.HexColor('#333333')
-    )
-    
-    normal_style = styles['Normal']
-    
-    # Title
-    story.append(Paragraph(f"Sales Report - {report_type.title()}", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Report Info
-    info_data = [
-        [Paragraph("<b>Report Type:</b>", normal_style), report_type.title()],
-        [Paragraph("<b>Period:</b>", normal_style), f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"],
-        [Paragraph("<b>Generated On:</b>", normal_style), datetime.now().strftime('%d/%m/%Y %H:%M')]
-    ]
-    
-    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    story.append(info_table)
-    story.append(Spacer(1, 20))
-    
-    # Summary
-    story.append(Paragraph("Summary:", heading_style))
-    summary_data = [
-        ['Total Sales:', f"₹{report_data.get('total_sales', 0):.2f}"],
-        ['Total Invoices:', str(report_data.get('total_invoices', 0))],
-        ['Average Order Value:', f"₹{report_data.get('avg_order_value', 0):.2f}"],
-        ['Total Tax Collected:', f"₹{report_data.get('total_tax', 0):.2f}"]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    story.append(summary_table)
-    
-    # Build PDF
-    doc.build(story)
-    return filepath
+    """Generate PDF for sales report using ReportLab; returns an in-memory file"""
+    from pdf_service import render_pdf
+    return BytesIO(render_pdf('sales_report', report_data, report_type, start_date, end_date))
+
+def render_quick_invoice_pdf(data):
+    """Render the ad-hoc invoice posted to /api/generate-pdf and return the PDF bytes"""
+    return get_template('quick_invoice').render(data)
+
+# Renderers the PDF worker pool may run, by job kind. Each takes plain,
+# picklable arguments and returns PDF bytes.
+RENDERERS = {
+    'invoice': render_invoice_pdf,
+    'gst_report': render_gst_report_pdf,
+    'sales_report': render_sales_report_pdf,
+    'quick_invoice': render_quick_invoice_pdf
+}
@@ -0,0 +1,274 @@
+"""
+PDF rendering off the request thread.
+
+ReportLab rendering is CPU-bound, so running it inside a gunicorn request
+thread lets a burst of downloads starve the API. Jobs are sent to a small
+``ProcessPoolExecutor`` instead; each worker process builds the
+``pdf_templates`` registry once and reuses it for every job.
+
+Two ways to use it:
+
+* ``render_pdf(kind, *args)`` blocks until the PDF is ready and raises
+  ``RenderTimeout`` after ``PDF_RENDER_TIMEOUT`` seconds.
+* ``submit_pdf(kind, *args)`` returns a job id straight away; poll it with
+  ``job_status`` and collect the bytes with ``job_result``. Job state is
+  kept in ``PDF_JOBS_DIR`` so every gunicorn worker on the host can answer
+  the poll.
+
+At most ``PDF_RENDER_QUEUE`` jobs may be queued or running per process;
+beyond that ``RenderQueueFull`` is raised so callers can answer 503 rather
+than pile up work. Setting ``PDF_RENDER_WORKERS`` to 0 renders inline,
+which is convenient for development and tests.
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 32
+DEFAULT_TIMEOUT = 30
+DEFAULT_JOBS_DIR = os.path.join('cache', 'pdf_jobs')
+# Uncollected async jobs are removed after this many seconds
+JOB_TTL = 600
+
+class RenderQueueFull(Exception):
+    """Raised when too many PDF jobs are already queued"""
+
+class RenderTimeout(Exception):
+    """Raised when a synchronous render does not finish in time"""
+
+def _config(name, default):
+    try:
+        from flask import current_app, has_app_context
+        if has_app_context():
+            return current_app.config.get(name, default)
+    except ImportError:
+        pass
+    return default
+
+def jobs_dir():
+    directory = os.path.abspath(_config('PDF_JOBS_DIR', DEFAULT_JOBS_DIR))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def _write_bytes(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+
+def _write_json(path, data):
+    _write_bytes(path, json.dumps(data).encode('utf-8'))
+
+def _warm_up():
+    # Build styles, fonts and layouts before the first job arrives
+    import pdf_generator  # noqa: F401
+    from pdf_templates import warm_up
+    warm_up()
+
+def _render(kind, args):
+    import pdf_generator
+    return pdf_generator.RENDERERS[kind](*args)
+
+def _observe(kind, mode, started):
+    # Wall time as the caller sees it, queueing included
+    from metrics import observe_pdf_render
+    observe_pdf_render(kind, mode, time.perf_counter() - started)
+
+class PDFRenderService:
+    """Bounded process pool with synchronous and render-then-poll APIs"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE, timeout=DEFAULT_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_up
+                )
+            return self._executor
+
+    def _submit(self, kind, args, block=False):
+        acquired = self._slots.acquire(timeout=self.timeout) if block else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise RenderQueueFull('Too many PDF jobs in progress, try again shortly')
+        try:
+            future = self._pool().submit(_render, kind, args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def render(self, kind, *args, timeout=None):
+        """Render and wait for the PDF bytes"""
+        started = time.perf_counter()
+        if not self.max_workers:
+            pdf_bytes = _render(kind, args)
+            _observe(kind, 'sync', started)
+            return pdf_bytes
+        future = self._submit(kind, args)
+        try:
+            pdf_bytes = future.result(timeout=timeout or self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise RenderTimeout(f'PDF rendering took longer than {timeout or self.timeout}s')
+        _observe(kind, 'sync', started)
+        return pdf_bytes
+
+    def render_many(self, kind, args_list, window=None):
+        """Render many jobs in parallel, yielding PDF bytes in input order
+
+        At most ``window`` jobs are in flight at once, so a long export
+        neither floods the queue nor holds more than a few PDFs in memory.
+        """
+        if not self.max_workers:
+            for args in args_list:
+                started = time.perf_counter()
+                pdf_bytes = _render(kind, args)
+                _observe(kind, 'batch', started)
+                yield pdf_bytes
+            return
+        window = window or self.max_workers * 2
+        in_flight = deque()
+
+        def collect():
+            started, future = in_flight.popleft()
+            pdf_bytes = future.result(timeout=self.timeout)
+            _observe(kind, 'batch', started)
+            return pdf_bytes
+
+        for args in args_list:
+            in_flight.append((time.perf_counter(), self._submit(kind, args, block=True)))
+            if len(in_flight) >= window:
+                yield collect()
+        while in_flight:
+            yield collect()
+
+    def submit(self, kind, *args, owner=None, tag=None):
+        """Queue a render and return its job id
+
+        Job state and results live in the jobs directory rather than in
+        this process, so any gunicorn worker can answer the poll.
+        """
+        directory = jobs_dir()
+        self._expire_jobs(directory)
+        job_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        _write_json(os.path.join(directory, f'{job_id}.json'), {
+            'status': 'pending', 'kind': kind, 'owner': owner, 'tag': tag, 'created': time.time()
+        })
+
+        def finished(future):
+            meta = {'kind': kind, 'owner': owner, 'tag': tag, 'created': time.time()}
+            try:
+                _write_bytes(os.path.join(directory, f'{job_id}.pdf'), future.result())
+                meta['status'] = 'done'
+                _observe(kind, 'job', started)
+            except Exception as e:
+                meta.update(status='failed', error=str(e))
+            _write_json(os.path.join(directory, f'{job_id}.json'), meta)
+
+        if not self.max_workers:
+            future = Future()
+            try:
+                future.set_result(_render(kind, args))
+            except Exception as e:
+                future.set_exception(e)
+            finished(future)
+        else:
+            self._submit(kind, args).add_done_callback(finished)
+        return job_id
+
+    def status(self, job_id, owner=None):
+        """{'status': 'pending'|'done'|'failed', ...}, or None for unknown jobs"""
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(jobs_dir(), f'{job_id}.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if owner is not None and meta.get('owner') != owner:
+            return None
+        return {key: meta[key] for key in ('status', 'kind', 'tag', 'error') if key in meta}
+
+    def result(self, job_id, owner=None):
+        """PDF bytes of a finished job; the job is removed once collected"""
+        status = self.status(job_id, owner)
+        if not status or status['status'] != 'done':
+            return None
+        directory = jobs_dir()
+        try:
+            with open(os.path.join(directory, f'{job_id}.pdf'), 'rb') as f:
+                pdf_bytes = f.read()
+        except FileNotFoundError:
+            # Collected by a concurrent poll
+            return None
+        for suffix in ('.pdf', '.json'):
+            try:
+                os.remove(os.path.join(directory, job_id + suffix))
+            except FileNotFoundError:
+                pass
+        return pdf_bytes
+
+    def _expire_jobs(self, directory):
+        cutoff = time.time() - JOB_TTL
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    """Process-wide service configured from the Flask app config"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = PDFRenderService(
+                    max_workers=_config('PDF_RENDER_WORKERS', DEFAULT_WORKERS),
+                    max_queue=_config('PDF_RENDER_QUEUE', DEFAULT_QUEUE),
+                    timeout=_config('PDF_RENDER_TIMEOUT', DEFAULT_TIMEOUT)
+                )
+    return _service
+
+def render_pdf(kind, *args, timeout=None):
+    return get_service().render(kind, *args, timeout=timeout)
+
+def render_many(kind, args_list, window=None):
+    return get_service().render_many(kind, args_list, window=window)
+
+def submit_pdf(kind, *args, owner=None, tag=None):
+    return get_service().submit(kind, *args, owner=owner, tag=tag)
+
+def job_status(job_id, owner=None):
+    return get_service().status(job_id, owner)
+
+def job_result(job_id, owner=None):
+    return get_service().result(job_id, owner)
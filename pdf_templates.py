@@ -0,0 +1,488 @@
+"""
+Precompiled PDF templates.
+
+Every paragraph style, table style, column layout and font a document needs
+is built once per process, when its template is first requested from
+``get_template``; rendering then only lays out data. Templates take plain
+dicts (see ``pdf_generator``) and return PDF bytes, so they run unchanged in
+the PDF worker processes.
+
+Hindi product names (``vegetable_name_hindi``) are printed with a Devanagari
+TrueType font. ReportLab has no built-in one, so the first file found among
+``PDF_DEVANAGARI_FONT`` and ``DEVANAGARI_FONT_PATHS`` is registered; without
+one, Hindi names are left off rather than printed as empty boxes.
+"""
+import logging
+import os
+import threading
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+logger = logging.getLogger(__name__)
+
+DEVANAGARI_FONT_NAME = 'Devanagari'
+DEVANAGARI_FONT_PATHS = (
+    os.path.join('static', 'fonts', 'NotoSansDevanagari-Regular.ttf'),
+    '/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf',
+    '/usr/share/fonts/opentype/noto/NotoSansDevanagari-Regular.ttf',
+    '/usr/share/fonts/truetype/lohit-devanagari/Lohit-Devanagari.ttf',
+    '/usr/share/fonts/truetype/fonts-deva-extra/kalimati.ttf',
+)
+
+# Styles are built once per process and shared by every render
+STYLES = getSampleStyleSheet()
+NORMAL_STYLE = STYLES['Normal']
+
+INVOICE_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=STYLES['Heading1'],
+    fontSize=24,
+    spaceAfter=30,
+    alignment=TA_CENTER,
+    textColor=colors.HexColor('#007bff')
+)
+
+REPORT_TITLE_STYLE = ParagraphStyle(
+    'ReportTitle',
+    parent=STYLES['Heading1'],
+    fontSize=20,
+    spaceAfter=30,
+    alignment=TA_CENTER,
+    textColor=colors.HexColor('#007bff')
+)
+
+QUICK_INVOICE_TITLE_STYLE = ParagraphStyle(
+    'QuickInvoiceTitle',
+    parent=STYLES['Heading1'],
+    fontSize=16,
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+HEADING_STYLE = ParagraphStyle(
+    'CustomHeading',
+    parent=STYLES['Heading2'],
+    fontSize=14,
+    spaceAfter=12,
+    textColor=colors.HexColor('#333333')
+)
+
+FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=STYLES['Normal'],
+    fontSize=8,
+    alignment=TA_CENTER,
+    textColor=colors.grey
+)
+
+ITEM_NAME_STYLE = ParagraphStyle(
+    'ItemName',
+    parent=STYLES['Normal'],
+    fontSize=9,
+    leading=11
+)
+
+BUSINESS_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+CUSTOMER_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8f9fa')),
+    ('ROUNDEDCORNERS', [6]),
+])
+
+ITEM_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),  # Headers
+    ('ALIGN', (0, 1), (-1, -1), 'LEFT'),   # Data
+    ('ALIGN', (3, 1), (-1, -1), 'RIGHT'),  # Numbers
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#007bff')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+])
+
+TOTALS_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 14),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#007bff')),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+REPORT_INFO_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+GST_SUMMARY_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#007bff')),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+SALES_SUMMARY_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+QUICK_INFO_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+QUICK_ITEMS_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),  # Header row
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),  # Total row
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -2), 1, colors.black),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+QUICK_CUSTOM_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+def register_devanagari_font():
+    """Register the first Devanagari TTF found; returns its font name or None"""
+    if DEVANAGARI_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return DEVANAGARI_FONT_NAME
+    candidates = [os.environ.get('PDF_DEVANAGARI_FONT')] + list(DEVANAGARI_FONT_PATHS)
+    for path in candidates:
+        if path and os.path.exists(path):
+            try:
+                pdfmetrics.registerFont(TTFont(DEVANAGARI_FONT_NAME, path))
+                return DEVANAGARI_FONT_NAME
+            except Exception as e:
+                logger.warning("Could not register Devanagari font %s: %s", path, e)
+    return None
+
+class InvoiceTemplate:
+    """The tax invoice layout"""
+
+    # Bump whenever the layout changes so cached PDFs are re-rendered
+    version = '3'
+
+    # Fixed widths, so tables never measure their contents to size columns
+    BUSINESS_COL_WIDTHS = (4*inch, 3*inch)
+    CUSTOMER_COL_WIDTHS = (7*inch,)
+    ITEM_COL_WIDTHS = (0.5*inch, 2*inch, 0.8*inch, 0.6*inch, 1*inch, 0.6*inch, 1*inch, 1*inch)
+    TOTALS_COL_WIDTHS = (2*inch, 1.5*inch)
+    ITEM_HEADERS = ('S.No', 'Item', 'HSN', 'Qty', 'Rate', 'GST %', 'GST Amt', 'Total')
+
+    def __init__(self, devanagari_font=None):
+        self.devanagari_font = devanagari_font
+
+    def item_name(self, item):
+        hindi = item.get('name_hindi')
+        if not hindi or not self.devanagari_font:
+            return item['name']
+        # Only lines with a Hindi name pay for a Paragraph
+        return Paragraph(
+            f"{escape(item['name'])}<br/><font name='{self.devanagari_font}'>{escape(hindi)}</font>",
+            ITEM_NAME_STYLE
+        )
+
+    def render(self, context):
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        story = []
+        business = context['business']
+        customer = context['customer']
+
+        # Title
+        story.append(Paragraph("TAX INVOICE", INVOICE_TITLE_STYLE))
+        story.append(Spacer(1, 20))
+
+        # Business and Invoice Info
+        business_data = [
+            [Paragraph(f"<b>{business['name']}</b>", NORMAL_STYLE),
+             Paragraph(f"<b>Invoice No:</b> {context['invoice_number']}", NORMAL_STYLE)],
+            [Paragraph(f"GST: {business['gst_number']}", NORMAL_STYLE),
+             Paragraph(f"<b>Date:</b> {context['invoice_date']}", NORMAL_STYLE)],
+            [Paragraph(f"Address: {business['address']}", NORMAL_STYLE),
+             Paragraph(f"<b>Due Date:</b> {context['due_date']}", NORMAL_STYLE)],
+            [Paragraph(f"Phone: {business['phone']}", NORMAL_STYLE), ""],
+            [Paragraph(f"Email: {business['email']}", NORMAL_STYLE), ""]
+        ]
+        story.append(Table(business_data, colWidths=self.BUSINESS_COL_WIDTHS, style=BUSINESS_TABLE_STYLE))
+        story.append(Spacer(1, 20))
+
+        # Customer Info
+        story.append(Paragraph("Bill To:", HEADING_STYLE))
+        customer_data = [
+            [f"Name: {customer['name']}"],
+            [f"GSTIN: {customer['gstin']}"],
+            [f"Address: {customer['address']}"],
+            [f"Phone: {customer['phone']}"],
+            [f"Email: {customer['email']}"],
+            [f"State: {customer['state']} - {customer['pincode']}"]
+        ]
+        story.append(Table(customer_data, colWidths=self.CUSTOMER_COL_WIDTHS, style=CUSTOMER_TABLE_STYLE))
+        story.append(Spacer(1, 20))
+
+        # Invoice Items Table; stored item totals are taxable values, so the
+        # printed line total includes the line's GST
+        story.append(Paragraph("Invoice Items:", HEADING_STYLE))
+        table_data = [list(self.ITEM_HEADERS)]
+        for i, item in enumerate(context['items'], 1):
+            table_data.append([
+                str(i),
+                self.item_name(item),
+                item['hsn_code'],
+                str(item['quantity']),
+                f"₹{item['unit_price']:.2f}",
+                f"{item['gst_rate']}%",
+                f"₹{item['gst_amount']:.2f}",
+                f"₹{item['total'] + item['gst_amount']:.2f}"
+            ])
+        # Long invoices repeat the header row on every page
+        story.append(Table(table_data, colWidths=self.ITEM_COL_WIDTHS, style=ITEM_TABLE_STYLE, repeatRows=1))
+        story.append(Spacer(1, 20))
+
+        # Totals, as stored on the invoice
+        totals_data = [['Subtotal:', f"₹{context['subtotal']:.2f}"]]
+        if context['igst_amount']:
+            totals_data.append(['IGST:', f"₹{context['igst_amount']:.2f}"])
+        else:
+            totals_data.append(['CGST:', f"₹{context['cgst_amount']:.2f}"])
+            totals_data.append(['SGST:', f"₹{context['sgst_amount']:.2f}"])
+        totals_data.append(['Total Amount:', f"₹{context['total_amount']:.2f}"])
+        story.append(Table(totals_data, colWidths=self.TOTALS_COL_WIDTHS, style=TOTALS_TABLE_STYLE))
+
+        # Add notes if available
+        if context['notes']:
+            story.append(Spacer(1, 20))
+            story.append(Paragraph("Notes:", HEADING_STYLE))
+            story.append(Paragraph(context['notes'], NORMAL_STYLE))
+
+        # Add footer
+        story.append(Spacer(1, 30))
+        story.append(Paragraph(f"Thank you for your business! | {business['name']}", FOOTER_STYLE))
+
+        doc.build(story)
+        return buffer.getvalue()
+
+class GSTReportTemplate:
+    """GSTR summary report layout"""
+
+    version = '1'
+    INFO_COL_WIDTHS = (2*inch, 4*inch)
+    SUMMARY_COL_WIDTHS = (3*inch, 2*inch)
+
+    def render(self, context):
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        story = []
+
+        # Title
+        story.append(Paragraph(f"GST {context['report_type'].upper()} Report", REPORT_TITLE_STYLE))
+        story.append(Spacer(1, 20))
+
+        # Report Info
+        info_data = [
+            [Paragraph("<b>Report Type:</b>", NORMAL_STYLE), context['report_type'].upper()],
+            [Paragraph("<b>Period:</b>", NORMAL_STYLE), f"{context['period_month']}/{context['period_year']}"],
+            [Paragraph("<b>Generated On:</b>", NORMAL_STYLE), context['generated_on']],
+            [Paragraph("<b>Business:</b>", NORMAL_STYLE), context['business_name']],
+            [Paragraph("<b>GST Number:</b>", NORMAL_STYLE), context['gst_number']]
+        ]
+        story.append(Table(info_data, colWidths=self.INFO_COL_WIDTHS, style=REPORT_INFO_TABLE_STYLE))
+        story.append(Spacer(1, 20))
+
+        # Summary
+        total_tax = context['total_cgst'] + context['total_sgst'] + context['total_igst']
+        story.append(Paragraph("Summary:", HEADING_STYLE))
+        summary_data = [
+            ['Total Taxable Value:', f"₹{context['total_taxable_value']:.2f}"],
+            ['Total CGST:', f"₹{context['total_cgst']:.2f}"],
+            ['Total SGST:', f"₹{context['total_sgst']:.2f}"],
+            ['Total IGST:', f"₹{context['total_igst']:.2f}"],
+            ['Total Tax:', f"₹{total_tax:.2f}"]
+        ]
+        story.append(Table(summary_data, colWidths=self.SUMMARY_COL_WIDTHS, style=GST_SUMMARY_TABLE_STYLE))
+
+        doc.build(story)
+        return buffer.getvalue()
+
+class SalesReportTemplate:
+    """Sales summary report layout"""
+
+    version = '1'
+    INFO_COL_WIDTHS = (2*inch, 4*inch)
+    SUMMARY_COL_WIDTHS = (3*inch, 2*inch)
+
+    def render(self, context):
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        story = []
+        report_data = context['report_data']
+
+        # Title
+        story.append(Paragraph(f"Sales Report - {context['report_type'].title()}", REPORT_TITLE_STYLE))
+        story.append(Spacer(1, 20))
+
+        # Report Info
+        info_data = [
+            [Paragraph("<b>Report Type:</b>", NORMAL_STYLE), context['report_type'].title()],
+            [Paragraph("<b>Period:</b>", NORMAL_STYLE), context['period']],
+            [Paragraph("<b>Generated On:</b>", NORMAL_STYLE), context['generated_on']]
+        ]
+        story.append(Table(info_data, colWidths=self.INFO_COL_WIDTHS, style=REPORT_INFO_TABLE_STYLE))
+        story.append(Spacer(1, 20))
+
+        # Summary
+        story.append(Paragraph("Summary:", HEADING_STYLE))
+        summary_data = [
+            ['Total Sales:', f"₹{report_data.get('total_sales', 0):.2f}"],
+            ['Total Invoices:', str(report_data.get('total_invoices', 0))],
+            ['Average Order Value:', f"₹{report_data.get('avg_order_value', 0):.2f}"],
+            ['Total Tax Collected:', f"₹{report_data.get('total_tax', 0):.2f}"]
+        ]
+        story.append(Table(summary_data, colWidths=self.SUMMARY_COL_WIDTHS, style=SALES_SUMMARY_TABLE_STYLE))
+
+        doc.build(story)
+        return buffer.getvalue()
+
+class QuickInvoiceTemplate:
+    """Ad-hoc invoice posted from the frontend to /api/generate-pdf"""
+
+    version = '1'
+    INFO_COL_WIDTHS = (2*inch, 4*inch)
+    ITEM_COL_WIDTHS = (0.5*inch, 1.5*inch, 2*inch, 0.8*inch, 1*inch, 1*inch)
+    CUSTOM_COL_WIDTHS = (2*inch, 4*inch)
+    ITEM_HEADERS = ('S.No', 'Product', 'Description', 'Quantity', 'Unit Price', 'Total')
+
+    def render(self, data):
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        elements = []
+
+        # Business Header
+        business_address = data.get('business_address', '')
+        business_phone = data.get('business_phone', '')
+        elements.append(Paragraph(data.get('business_name', ''), QUICK_INVOICE_TITLE_STYLE))
+        if business_address:
+            elements.append(Paragraph(business_address, NORMAL_STYLE))
+        if business_phone:
+            elements.append(Paragraph(f"Phone: {business_phone}", NORMAL_STYLE))
+        elements.append(Spacer(1, 20))
+
+        # Invoice Details
+        invoice_info = [
+            ['Invoice Number:', data.get('invoice_number', '')],
+            ['Date:', data.get('invoice_date', '')],
+            ['Customer:', data.get('customer_name', '')],
+            ['Address:', data.get('customer_address', '')],
+            ['Phone:', data.get('customer_phone', '')]
+        ]
+        elements.append(Table(invoice_info, colWidths=self.INFO_COL_WIDTHS, style=QUICK_INFO_TABLE_STYLE))
+        elements.append(Spacer(1, 20))
+
+        # Items Table
+        items = data.get('items', [])
+        if items:
+            table_data = [list(self.ITEM_HEADERS)]
+            for i, item in enumerate(items, 1):
+                product = item.get('product', {})
+                table_data.append([
+                    str(i),
+                    product.get('name', ''),
+                    product.get('description', ''),
+                    str(item.get('quantity', 0)),
+                    f"₹{item.get('unit_price', 0):.2f}",
+                    f"₹{item.get('total', 0):.2f}"
+                ])
+            table_data.append(['', '', '', '', 'Total:', f"₹{data.get('total_amount', 0):.2f}"])
+            elements.append(Table(table_data, colWidths=self.ITEM_COL_WIDTHS, style=QUICK_ITEMS_TABLE_STYLE, repeatRows=1))
+
+        # Custom columns if any
+        custom_columns = data.get('custom_columns', {})
+        if custom_columns:
+            elements.append(Spacer(1, 20))
+            elements.append(Paragraph("Additional Information:", STYLES['Heading2']))
+            custom_data = [[key, value] for key, value in custom_columns.items()]
+            elements.append(Table(custom_data, colWidths=self.CUSTOM_COL_WIDTHS, style=QUICK_CUSTOM_TABLE_STYLE))
+
+        # Notes
+        notes = data.get('notes', '')
+        if notes:
+            elements.append(Spacer(1, 20))
+            elements.append(Paragraph("Notes:", STYLES['Heading2']))
+            elements.append(Paragraph(notes, NORMAL_STYLE))
+
+        doc.build(elements)
+        return buffer.getvalue()
+
+TEMPLATE_CLASSES = {
+    'invoice': InvoiceTemplate,
+    'gst_report': GSTReportTemplate,
+    'sales_report': SalesReportTemplate,
+    'quick_invoice': QuickInvoiceTemplate
+}
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+def get_template(name):
+    """The process-wide instance of a template, built on first use"""
+    template = _templates.get(name)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(name)
+            if template is None:
+                if name == 'invoice':
+                    template = InvoiceTemplate(devanagari_font=register_devanagari_font())
+                else:
+                    template = TEMPLATE_CLASSES[name]()
+                _templates[name] = template
+    return template
+
+def warm_up():
+    """Build every template now, e.g. in a freshly started worker process"""
+    for name in TEMPLATE_CLASSES:
+        get_template(name)
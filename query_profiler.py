@@ -0,0 +1,283 @@
+"""
+Per-request MongoDB command profiling.
+
+A pymongo ``CommandListener`` attributes every command to the Flask request
+that issued it: command count, time spent in MongoDB and documents
+returned, broken down by the *shape* of each query (command, collection and
+filter with the values blanked out). When one request runs the same shape
+at least ``QUERY_N_PLUS_ONE_THRESHOLD`` times, the request is flagged as a
+likely N+1, which is what a ``find_by_id`` inside a loop looks like.
+
+Results surface in three places:
+
+* a ``Server-Timing`` header (``db;dur=...;desc="N queries"`` and
+  ``app;dur=...``) that browser dev tools show next to each request;
+* a warning logged for each N+1 detection;
+* ``GET /api/debug/queries``: totals per blueprint and endpoint, the most
+  recent request profiles and the N+1 detections. Add ``?reset=1`` to
+  start over.
+
+Listeners run synchronously on the thread that issued the command, so a
+command belongs to whichever request context is active on that thread.
+Commands from background threads, such as the report sheet pool, are not
+attributed. A streamed response reads most of its documents after the
+headers are sent. Its ``Server-Timing`` header therefore covers only the
+work done before streaming. The totals and the debug endpoint are
+recorded at teardown and include everything.
+
+Profiling is off unless ``QUERY_PROFILER`` is set; development enables it.
+The endpoint is limited to super admins, in debug mode too. Figures are
+per gunicorn worker process.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from flask import g, has_request_context, jsonify, request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 5
+DEFAULT_HISTORY = 100
+DEBUG_ENDPOINT = '/api/debug/queries'
+# Handshake, auth and session housekeeping say nothing about the view
+IGNORED_COMMANDS = frozenset((
+    'hello', 'isMaster', 'ismaster', 'ping', 'buildInfo', 'saslStart', 'saslContinue',
+    'endSessions', 'killCursors'
+))
+FILTER_KEYS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'delete': 'deletes',
+    'update': 'updates'
+}
+
+def _blank(value):
+    # Keep keys and operators, drop values; lists collapse to one element
+    if isinstance(value, dict):
+        return {key: _blank(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_blank(value[0])] if value else []
+    return '?'
+
+def query_shape(command_name, command):
+    """'find products {_id: ?}'-style key identifying a query up to its values"""
+    collection = command.get(command_name)
+    if command_name == 'aggregate':
+        body = [_blank(stage) for stage in command.get('pipeline') or []]
+    elif command_name == 'getMore':
+        return f"getMore {command.get('collection')}"
+    elif command_name in ('update', 'delete'):
+        statements = command.get(FILTER_KEYS[command_name]) or [{}]
+        body = _blank(statements[0].get('q') or {})
+    elif command_name == 'insert':
+        body = None
+    else:
+        body = _blank(command.get(FILTER_KEYS.get(command_name), {}))
+    shape = f'{command_name} {collection}'
+    if body is not None:
+        shape += f' {body}'.replace("'", '')
+    return shape
+
+def _documents(command_name, reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or ())
+    if command_name == 'findAndModify':
+        return 1 if reply.get('value') else 0
+    if command_name in ('count', 'insert', 'update', 'delete'):
+        return 0
+    return 1 if reply.get('ok') else 0
+
+class RequestProfile:
+    """MongoDB work done while serving one request"""
+
+    __slots__ = ('started', 'pending', 'commands', 'duration_us', 'documents', 'failures', 'shapes', 'shape_us')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.pending = {}
+        self.commands = 0
+        self.duration_us = 0
+        self.documents = 0
+        self.failures = 0
+        self.shapes = Counter()
+        self.shape_us = Counter()
+
+    def record(self, shape, duration_us, documents=0, failed=False):
+        self.commands += 1
+        self.duration_us += duration_us
+        self.documents += documents
+        self.failures += 1 if failed else 0
+        self.shapes[shape] += 1
+        self.shape_us[shape] += duration_us
+
+    def repeated(self, threshold):
+        """[(shape, count)] run at least ``threshold`` times, getMore excluded"""
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold and not shape.startswith('getMore ')
+        ]
+
+    def server_timing(self):
+        app_ms = (time.perf_counter() - self.started) * 1000
+        return (
+            f'db;dur={self.duration_us / 1000:.2f};desc="{self.commands} queries", '
+            f'app;dur={app_ms:.2f}'
+        )
+
+def _current_profile():
+    if not has_request_context():
+        return None
+    return g.get('_query_profile')
+
+class ProfilingListener(monitoring.CommandListener):
+    """Feeds command events into the active request's profile"""
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        profile = _current_profile()
+        if profile is not None:
+            profile.pending[event.request_id] = query_shape(event.command_name, event.command)
+
+    def succeeded(self, event):
+        profile = _current_profile()
+        if profile is None:
+            return
+        shape = profile.pending.pop(event.request_id, None)
+        if shape is not None:
+            profile.record(shape, event.duration_micros, _documents(event.command_name, event.reply))
+
+    def failed(self, event):
+        profile = _current_profile()
+        if profile is None:
+            return
+        shape = profile.pending.pop(event.request_id, None)
+        if shape is not None:
+            profile.record(shape, event.duration_micros, failed=True)
+
+class ProfilerStats:
+    """Per-process totals by endpoint plus the most recent request profiles"""
+
+    def __init__(self, history=DEFAULT_HISTORY):
+        self._lock = threading.Lock()
+        self.history = history
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.recent = deque(maxlen=self.history)
+            self.n_plus_one = deque(maxlen=self.history)
+
+    def add(self, blueprint, endpoint, method, path, profile, elapsed_ms, threshold):
+        repeated = profile.repeated(threshold)
+        entry = {
+            'method': method,
+            'path': path,
+            'endpoint': endpoint,
+            'blueprint': blueprint,
+            'elapsed_ms': round(elapsed_ms, 2),
+            'commands': profile.commands,
+            'db_ms': round(profile.duration_us / 1000, 2),
+            'documents': profile.documents,
+            'failures': profile.failures,
+            'top_queries': [
+                {'shape': shape, 'count': count, 'db_ms': round(profile.shape_us[shape] / 1000, 2)}
+                for shape, count in profile.shapes.most_common(5)
+            ],
+            'n_plus_one': [{'shape': shape, 'count': count} for shape, count in repeated],
+            'at': time.time()
+        }
+        with self._lock:
+            totals = self.endpoints.setdefault(endpoint or path, {
+                'blueprint': blueprint, 'requests': 0, 'commands': 0, 'db_ms': 0.0,
+                'documents': 0, 'max_commands': 0, 'n_plus_one_requests': 0
+            })
+            totals['requests'] += 1
+            totals['commands'] += profile.commands
+            totals['db_ms'] += profile.duration_us / 1000
+            totals['documents'] += profile.documents
+            totals['max_commands'] = max(totals['max_commands'], profile.commands)
+            totals['n_plus_one_requests'] += 1 if repeated else 0
+            self.recent.append(entry)
+            if repeated:
+                self.n_plus_one.append(entry)
+        return repeated
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {
+                name: dict(totals, db_ms=round(totals['db_ms'], 2),
+                           avg_commands=round(totals['commands'] / totals['requests'], 2))
+                for name, totals in self.endpoints.items()
+            }
+            return {
+                'endpoints': endpoints,
+                'recent': list(self.recent),
+                'n_plus_one': list(self.n_plus_one)
+            }
+
+_listener = None
+_listener_lock = threading.Lock()
+stats = ProfilerStats()
+
+def _register_listener():
+    # Listeners registered globally apply to clients created afterwards,
+    # so this has to run before database.init_app builds the MongoClient
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = ProfilingListener()
+            monitoring.register(_listener)
+
+def init_app(app):
+    """Enable profiling when QUERY_PROFILER is set; call before init_db"""
+    if not app.config.get('QUERY_PROFILER'):
+        return
+    _register_listener()
+    threshold = app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', DEFAULT_THRESHOLD)
+    stats.history = app.config.get('QUERY_PROFILE_HISTORY', DEFAULT_HISTORY)
+    stats.reset()
+
+    @app.before_request
+    def start_query_profile():
+        g._query_profile = RequestProfile()
+
+    @app.after_request
+    def add_server_timing(response):
+        profile = g.get('_query_profile')
+        if profile is not None:
+            response.headers.add('Server-Timing', profile.server_timing())
+        return response
+
+    @app.teardown_request
+    def finish_query_profile(exc=None):
+        profile = g.pop('_query_profile', None)
+        if profile is None:
+            return
+        elapsed_ms = (time.perf_counter() - profile.started) * 1000
+        repeated = stats.add(
+            request.blueprint, request.endpoint, request.method, request.path,
+            profile, elapsed_ms, threshold
+        )
+        for shape, count in repeated:
+            logger.warning("Possible N+1 in %s %s (%s): %s ran %s times", request.method, request.path, request.endpoint, shape, count)
+
+    def query_profile():
+        """Query totals per endpoint, recent request profiles and N+1 detections"""
+        # Development config is the default when FLASK_ENV is unset, so debug
+        # mode is no proof of a private deployment
+        from flask_login import current_user
+        from models import SuperAdmin
+        if not isinstance(current_user._get_current_object(), SuperAdmin):
+            return jsonify({'success': False, 'error': 'Super admin access required'}), 403
+        if request.args.get('reset'):
+            stats.reset()
+        return jsonify(dict(stats.snapshot(), success=True, threshold=threshold))
+
+    app.add_url_rule(DEBUG_ENDPOINT, 'query_profile', query_profile)
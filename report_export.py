@@ -0,0 +1,277 @@
+"""
+Excel export of the sales reports.
+
+Every sheet is an independent aggregation, so the sheets of a download run
+concurrently on a small thread pool and the workbook is assembled once they
+finish. The workbook is opened in openpyxl's ``write_only`` mode: rows are
+appended straight from the aggregation cursors into the sheet's XML stream
+and no cell objects are kept around.
+
+Column widths are tracked while the rows are produced instead of walking
+every cell afterwards. The ``<cols>`` element comes before the sheet data
+in the file, so each sheet's rows (top-N lists and period buckets, never
+raw invoices) are collected before the sheet is written.
+
+The pipeline builders are shared with the JSON endpoints in
+``routes/report_routes.py`` so both always report the same figures. Both
+run them through ``cold_storage.aggregate``, which adds archived invoices
+when a period reaches back past the archive horizon.
+"""
+import importlib.util
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+import cold_storage
+
+# openpyxl is imported on the first export, not while a worker boots
+OPENPYXL_AVAILABLE = importlib.util.find_spec('openpyxl') is not None
+
+MAX_COLUMN_WIDTH = 50
+MAX_SHEET_WORKERS = 4
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def _to_object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+def period_match(user_id, start_date):
+    return {'user_id': _to_object_id(user_id), 'created_at': {'$gte': start_date}}
+
+# Pipelines
+
+def summary_pipeline(user_id, start_date):
+    """Revenue, invoice count and active customers in one pass"""
+    return [
+        {'$match': period_match(user_id, start_date)},
+        {'$group': {
+            '_id': '$customer_id',
+            'orders': {'$sum': 1},
+            'revenue': {'$sum': '$total_amount'}
+        }},
+        {'$group': {
+            '_id': None,
+            'total_revenue': {'$sum': '$revenue'},
+            'total_orders': {'$sum': '$orders'},
+            'active_customers': {'$sum': 1}
+        }}
+    ]
+
+def top_customers_pipeline(user_id, start_date, limit):
+    return [
+        {'$match': period_match(user_id, start_date)},
+        {'$group': {
+            '_id': '$customer_id',
+            'order_count': {'$sum': 1},
+            'total_spent': {'$sum': '$total_amount'}
+        }},
+        {'$sort': {'total_spent': -1}},
+        {'$limit': limit},
+        {'$lookup': {
+            'from': 'customers',
+            'localField': '_id',
+            'foreignField': '_id',
+            'as': 'customer'
+        }},
+        {'$unwind': {'path': '$customer', 'preserveNullAndEmptyArrays': True}}
+    ]
+
+def top_products_pipeline(user_id, start_date, limit):
+    return [
+        {'$match': period_match(user_id, start_date)},
+        {'$unwind': '$items'},
+        {'$group': {
+            '_id': '$items.product_id',
+            'quantity_sold': {'$sum': '$items.quantity'},
+            'revenue': {'$sum': '$items.total'}
+        }},
+        {'$sort': {'quantity_sold': -1}},
+        {'$limit': limit},
+        {'$lookup': {
+            'from': 'products',
+            'localField': '_id',
+            'foreignField': '_id',
+            'as': 'product'
+        }},
+        {'$unwind': {'path': '$product', 'preserveNullAndEmptyArrays': True}}
+    ]
+
+def trends_pipeline(user_id, start_date, period='daily'):
+    if period == 'daily':
+        group_id = {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}
+        sort = {'_id': 1}
+    elif period == 'weekly':
+        group_id = {'year': {'$year': '$created_at'}, 'week': {'$week': '$created_at'}}
+        sort = {'_id.year': 1, '_id.week': 1}
+    else:
+        group_id = {'year': {'$year': '$created_at'}, 'month': {'$month': '$created_at'}}
+        sort = {'_id.year': 1, '_id.month': 1}
+    return [
+        {'$match': period_match(user_id, start_date)},
+        {'$group': {
+            '_id': group_id,
+            'orders': {'$sum': 1},
+            'revenue': {'$sum': '$total_amount'}
+        }},
+        {'$sort': sort}
+    ]
+
+def trend_label(period, trend_id):
+    if period == 'daily':
+        return trend_id
+    if period == 'weekly':
+        return f"Week {trend_id['week']}, {trend_id['year']}"
+    return f"{trend_id['month']}/{trend_id['year']}"
+
+def summary_metrics(database, user_id, start_date):
+    """Headline figures for a period, as returned by /api/sales-summary"""
+    result = next(iter(cold_storage.aggregate(database, 'invoices', summary_pipeline(user_id, start_date), since=start_date)), None) or {}
+    total_revenue = float(result.get('total_revenue') or 0)
+    total_orders = result.get('total_orders', 0)
+    return {
+        'total_revenue': total_revenue,
+        'total_orders': total_orders,
+        'total_customers': database['customers'].count_documents({'user_id': _to_object_id(user_id)}),
+        'active_customers': result.get('active_customers', 0),
+        'avg_order_value': total_revenue / total_orders if total_orders > 0 else 0.0
+    }
+
+# Sheets
+
+class SheetData:
+    """Rows of one sheet plus the widest value seen in each column"""
+
+    def __init__(self, title, header_rows=0):
+        self.title = title
+        self.header_rows = header_rows
+        self.rows = []
+        self.widths = []
+
+    def append(self, row):
+        for index, value in enumerate(row):
+            length = len(str(value)) if value is not None else 0
+            if index >= len(self.widths):
+                self.widths.append(length)
+            elif length > self.widths[index]:
+                self.widths[index] = length
+        self.rows.append(row)
+
+def _summary_sheet(database, user_id, start_date, options):
+    metrics = summary_metrics(database, user_id, start_date)
+    sheet = SheetData('Sales Summary')
+    sheet.append(['Sales Summary Report'])
+    sheet.append([f"Period: Last {options['days']} days"])
+    sheet.append([])
+    sheet.append(['Metric', 'Value'])
+    sheet.append(['Total Revenue', metrics['total_revenue']])
+    sheet.append(['Total Orders', metrics['total_orders']])
+    sheet.append(['Total Customers', metrics['total_customers']])
+    sheet.append(['Active Customers', metrics['active_customers']])
+    sheet.append(['Average Order Value', round(metrics['avg_order_value'], 2)])
+    return sheet
+
+def _customers_sheet(database, user_id, start_date, options):
+    sheet = SheetData('Top Customers', header_rows=1)
+    sheet.append(['Rank', 'Customer Name', 'Email', 'Orders', 'Total Spent'])
+    cursor = cold_storage.aggregate(database, 'invoices', top_customers_pipeline(user_id, start_date, options['limit']), since=start_date)
+    for rank, item in enumerate(cursor, 1):
+        customer = item.get('customer') or {}
+        sheet.append([
+            rank,
+            customer.get('name', 'Unknown'),
+            customer.get('email', ''),
+            item.get('order_count', 0),
+            float(item.get('total_spent') or 0)
+        ])
+    return sheet
+
+def _products_sheet(database, user_id, start_date, options):
+    sheet = SheetData('Top Products', header_rows=1)
+    sheet.append(['Rank', 'Product Name', 'SKU', 'Quantity Sold', 'Revenue'])
+    cursor = cold_storage.aggregate(database, 'invoices', top_products_pipeline(user_id, start_date, options['limit']), since=start_date)
+    for rank, item in enumerate(cursor, 1):
+        product = item.get('product') or {}
+        sheet.append([
+            rank,
+            product.get('name', 'Unknown'),
+            product.get('sku', ''),
+            int(item.get('quantity_sold') or 0),
+            float(item.get('revenue') or 0)
+        ])
+    return sheet
+
+def _trends_sheet(database, user_id, start_date, options):
+    period = options['period']
+    sheet = SheetData('Sales Trends', header_rows=1)
+    sheet.append(['Date' if period == 'daily' else 'Period', 'Orders', 'Revenue'])
+    for trend in cold_storage.aggregate(database, 'invoices', trends_pipeline(user_id, start_date, period), since=start_date):
+        sheet.append([trend_label(period, trend['_id']), trend.get('orders', 0), float(trend.get('revenue') or 0)])
+    return sheet
+
+SHEETS = {
+    'summary': _summary_sheet,
+    'customers': _customers_sheet,
+    'products': _products_sheet,
+    'trends': _trends_sheet
+}
+# 'full' puts every sheet in one workbook
+REPORT_SHEETS = dict({name: [name] for name in SHEETS}, full=list(SHEETS))
+
+# Workbook
+
+def _header_cell(ws, value):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = Font(bold=True, color="FFFFFF")
+    cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    return cell
+
+def _bold_cell(ws, value, size=None):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = Font(bold=True, size=size) if size else Font(bold=True)
+    return cell
+
+def _write_sheet(wb, sheet):
+    from openpyxl.utils import get_column_letter
+    ws = wb.create_sheet(sheet.title)
+    for index, width in enumerate(sheet.widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = min(width + 2, MAX_COLUMN_WIDTH)
+    for row_number, row in enumerate(sheet.rows, 1):
+        if row_number <= sheet.header_rows:
+            row = [_header_cell(ws, value) for value in row]
+        elif not sheet.header_rows and row_number <= 4 and row:
+            # Title, period and Metric/Value heading of the summary sheet
+            row = [_bold_cell(ws, value, size=16 if row_number == 1 else None) for value in row]
+        ws.append(row)
+
+def build_workbook(database, user_id, report_type='summary', days=30, limit=50, period='daily'):
+    """Write the report to a temporary file and return it, positioned at 0
+
+    Raises ValueError for an unknown report type.
+    """
+    if not OPENPYXL_AVAILABLE:
+        raise RuntimeError('Excel export requires the openpyxl package')
+    names = REPORT_SHEETS.get(report_type)
+    if not names:
+        raise ValueError(f'Unknown report type: {report_type}')
+    start_date = datetime.now() - timedelta(days=days)
+    options = {'days': days, 'limit': limit, 'period': period}
+
+    # pymongo's client is thread-safe; each sheet gets its own cursor
+    with ThreadPoolExecutor(max_workers=min(len(names), MAX_SHEET_WORKERS)) as pool:
+        futures = [pool.submit(SHEETS[name], database, user_id, start_date, options) for name in names]
+        sheets = [future.result() for future in futures]
+
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    for sheet in sheets:
+        _write_sheet(wb, sheet)
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return output
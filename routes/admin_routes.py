@@ -5,6 +5,10 @@ from database import db
 from bson import ObjectId
 from datetime import datetime, timedelta
 import uuid
+from tax_engine import compute_batch
+import logging
+
+logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -15,20 +19,20 @@ def get_customers():
     """Get all customers for the current admin (both active and inactive)"""
     try:
         # Debug: Check authentication status
-        print(f"[DEBUG] Current user: {current_user}")
-        print(f"[DEBUG] Current user type: {type(current_user)}")
-        print(f"[DEBUG] Has id attr: {hasattr(current_user, 'id') if current_user else False}")
+        logger.debug("[DEBUG] Current user: %s", current_user)
+        logger.debug("[DEBUG] Current user type: %s", type(current_user))
+        logger.debug("[DEBUG] Has id attr: %s", hasattr(current_user, 'id') if current_user else False)
         
         # Check if user is authenticated
         if not current_user:
-            print("[DEBUG] No current_user - returning 401")
+            logger.debug("[DEBUG] No current_user - returning 401")
             return jsonify({'success': False, 'error': 'User not authenticated'}), 401
         
         if not hasattr(current_user, 'id'):
-            print("[DEBUG] current_user has no id attribute - returning 401")
+            logger.debug("[DEBUG] current_user has no id attribute - returning 401")
             return jsonify({'success': False, 'error': 'User not authenticated - missing id'}), 401
         
-        print(f"[DEBUG] User ID: {current_user.id}")
+        logger.debug("[DEBUG] User ID: %s", current_user.id)
         
         # Get database connection
         from models import get_db
@@ -47,17 +51,15 @@ def get_customers():
             customers = []
             for doc in customers_docs:
                 if not isinstance(doc, dict):
-                    print(f"Warning: Skipping non-dict customer document: {doc}")
+                    logger.warning("Skipping non-dict customer document: %s", doc)
                     continue
                 customer = Customer.from_dict(doc)
                 if customer:
                     customers.append(customer)
                 else:
-                    print(f"Warning: Customer.from_dict returned None for document: {doc}")
+                    logger.warning("Customer.from_dict returned None for document: %s", doc)
         except Exception as query_error:
-            import traceback
-            print(f"Query error: {str(query_error)}")
-            traceback.print_exc()
+            logger.exception("Query error: %s", query_error)
             customers = []
         
         customers_data = []
@@ -68,7 +70,7 @@ def get_customers():
                 # Safely access all fields with null checks
                 customer_id = customer.id if hasattr(customer, 'id') and customer.id else None
                 if not customer_id:
-                    print(f"Warning: Skipping customer with no ID: {customer}")
+                    logger.warning("Skipping customer with no ID: %s", customer)
                     continue
                 
                 # Skip counting for list view - it's too slow. Counts are available in detail view.
@@ -88,18 +90,13 @@ def get_customers():
                     'is_active': getattr(customer, 'is_active', True) if getattr(customer, 'is_active', None) is not None else True
                 })
             except Exception as customer_error:
-                print(f"Error processing customer {getattr(customer, 'id', 'unknown')}: {str(customer_error)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error processing customer %s: %s", getattr(customer, 'id', 'unknown'), customer_error)
                 continue
         
         return jsonify({'success': True, 'customers': customers_data})
     
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error getting customers: {str(e)}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error getting customers: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @admin_bp.route('/customers', methods=['POST'])
@@ -108,12 +105,12 @@ def create_customer():
     """Create a new customer"""
     try:
         # Debug: Check authentication
-        print(f"[CREATE CUSTOMER] Current user: {current_user}")
-        print(f"[CREATE CUSTOMER] User ID: {current_user.id if current_user and hasattr(current_user, 'id') else 'N/A'}")
+        logger.debug("[CREATE CUSTOMER] Current user: %s", current_user)
+        logger.debug("[CREATE CUSTOMER] User ID: %s", current_user.id if current_user and hasattr(current_user, 'id') else 'N/A')
         
         # Get request data
         data = request.get_json()
-        print(f"[CREATE CUSTOMER] Received data: {data}")
+        logger.debug("[CREATE CUSTOMER] Received data: %s", data)
         
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
@@ -138,7 +135,7 @@ def create_customer():
         if not user_id:
             return jsonify({'success': False, 'error': 'User not authenticated'}), 401
         
-        print(f"[CREATE CUSTOMER] Creating customer with user_id: {user_id}")
+        logger.debug("[CREATE CUSTOMER] Creating customer with user_id: %s", user_id)
         
         # Create new customer with all fields - use safe defaults
         try:
@@ -169,16 +166,13 @@ def create_customer():
             password = data.get('password', 'default123')
             customer.set_password(password)
             
-            print(f"[CREATE CUSTOMER] Customer object created, saving...")
+            logger.debug("[CREATE CUSTOMER] Customer object created, saving...")
             customer.save()
-            print(f"[CREATE CUSTOMER] Customer ID: {customer.id}")
-            print(f"[CREATE CUSTOMER] Customer saved successfully")
+            logger.debug("[CREATE CUSTOMER] Customer ID: %s", customer.id)
+            logger.debug("[CREATE CUSTOMER] Customer saved successfully")
             
         except Exception as create_error:
-            import traceback
-            error_trace = traceback.format_exc()
-            print(f"[CREATE CUSTOMER] Error creating customer object: {str(create_error)}")
-            print(f"[CREATE CUSTOMER] Full traceback:\n{error_trace}")
+            logger.exception("[CREATE CUSTOMER] Error creating customer object: %s", create_error)
             return jsonify({'success': False, 'error': f'Database error: {str(create_error)}'}), 500
         
         return jsonify({
@@ -193,10 +187,7 @@ def create_customer():
         })
     
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"[CREATE CUSTOMER] Error creating customer: {str(e)}")
-        print(f"[CREATE CUSTOMER] Full traceback:\n{error_trace}")
+        logger.exception("[CREATE CUSTOMER] Error creating customer: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @admin_bp.route('/customers/<customer_id>', methods=['GET'])
@@ -235,7 +226,7 @@ def get_customer(customer_id):
                         'created_at': order.created_at.isoformat() if order.created_at else ''
                     })
             except Exception as order_error:
-                print(f"Error processing order: {order_error}")
+                logger.error("Error processing order: %s", order_error)
                 continue
         
         # Get products visible to this customer
@@ -265,10 +256,10 @@ def get_customer(customer_id):
                                 'sku': product.sku or ''
                             })
                     except Exception as product_error:
-                        print(f"Error processing product: {product_error}")
+                        logger.error("Error processing product: %s", product_error)
                         continue
             except Exception as products_error:
-                print(f"Error getting visible products for customer {customer_id}: {products_error}")
+                logger.error("Error getting visible products for customer %s: %s", customer_id, products_error)
         
         return jsonify({
             'success': True,
@@ -292,8 +283,7 @@ def get_customer(customer_id):
         })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_customer")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @admin_bp.route('/customers/<int:customer_id>', methods=['PUT'])
@@ -359,7 +349,7 @@ def update_customer(customer_id):
         })
     
     except Exception as e:
-        print(f"Error updating customer: {str(e)}")
+        logger.error("Error updating customer: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @admin_bp.route('/customers/<int:customer_id>', methods=['DELETE'])
@@ -398,7 +388,7 @@ def delete_customer(customer_id):
         return jsonify({'success': True, 'message': 'Customer deleted successfully'})
     
     except Exception as e:
-        print(f"Error deleting customer: {str(e)}")
+        logger.error("Error deleting customer: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @admin_bp.route('/customers/<int:customer_id>/toggle-status', methods=['POST'])
@@ -423,7 +413,7 @@ def toggle_customer_status(customer_id):
         })
     
     except Exception as e:
-        print(f"Error toggling customer status: {str(e)}")
+        logger.error("Error toggling customer status: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Order Management Routes
@@ -455,41 +445,41 @@ def get_orders():
         # Limit orders to prevent performance issues
         # Query all orders - no filtering needed, admins see all customer orders
         orders_docs = list(database['orders'].find(query).sort('created_at', -1).limit(500))
-        print(f"[ADMIN ORDERS] Admin {current_user.id} requesting orders. Query: {query}")
-        print(f"[ADMIN ORDERS] Found {len(orders_docs)} total orders in database")
+        logger.debug("[ADMIN ORDERS] Admin %s requesting orders. Query: %s", current_user.id, query)
+        logger.debug("[ADMIN ORDERS] Found %s total orders in database", len(orders_docs))
         
         # Also check total count without limit for debugging
         total_count = database['orders'].count_documents(query)
-        print(f"[ADMIN ORDERS] Total orders in database (no limit): {total_count}")
+        logger.debug("[ADMIN ORDERS] Total orders in database (no limit): %s", total_count)
         
         # List all order numbers for debugging
         if total_count > 0:
             sample_orders = list(database['orders'].find({}, {'order_number': 1, 'customer_id': 1, 'created_at': 1}).limit(10))
-            print(f"[ADMIN ORDERS] Sample orders: {[(o.get('order_number'), str(o.get('customer_id')), o.get('created_at')) for o in sample_orders]}")
+            logger.debug("[ADMIN ORDERS] Sample orders: %s", [(o.get('order_number'), str(o.get('customer_id')), o.get('created_at')) for o in sample_orders])
         else:
             # If no orders found, check if collection exists and list all collections
             collections = database.list_collection_names()
-            print(f"[ADMIN ORDERS] Available collections: {collections}")
+            logger.debug("[ADMIN ORDERS] Available collections: %s", collections)
             if 'orders' in collections:
                 # Check if collection is empty
                 order_count_check = database['orders'].count_documents({})
-                print(f"[ADMIN ORDERS] Orders collection exists but has {order_count_check} documents")
+                logger.debug("[ADMIN ORDERS] Orders collection exists but has %s documents", order_count_check)
             else:
-                print(f"[ADMIN ORDERS] WARNING: 'orders' collection does not exist!")
+                logger.warning("[ADMIN ORDERS] 'orders' collection does not exist!")
         
         orders_data = []
         
         for order_doc in orders_docs:
             try:
                 # Debug: print raw document
-                print(f"[ADMIN ORDERS] Raw order doc: {order_doc.get('_id')}, customer_id: {order_doc.get('customer_id')}, order_number: {order_doc.get('order_number')}")
+                logger.debug("[ADMIN ORDERS] Raw order doc: %s, customer_id: %s, order_number: %s", order_doc.get('_id'), order_doc.get('customer_id'), order_doc.get('order_number'))
                 
                 order = Order.from_dict(order_doc)
                 if not order:
-                    print(f"[ADMIN ORDERS] Order.from_dict returned None for doc: {order_doc.get('_id')}")
+                    logger.debug("[ADMIN ORDERS] Order.from_dict returned None for doc: %s", order_doc.get('_id'))
                     continue
                     
-                print(f"[ADMIN ORDERS] Processing order {order.id}: customer_id={order.customer_id} (type: {type(order.customer_id)}), order_number={order.order_number}")
+                logger.debug("[ADMIN ORDERS] Processing order %s: customer_id=%s (type: %s), order_number=%s", order.id, order.customer_id, type(order.customer_id), order.order_number)
                 # Get customer details - handle both string and ObjectId customer_id
                 customer = None
                 if order.customer_id:
@@ -497,9 +487,9 @@ def get_orders():
                         # Try to find customer by ID (handles both string and ObjectId)
                         customer = Customer.find_by_id(str(order.customer_id))
                         if not customer:
-                            print(f"[ADMIN ORDERS] Customer not found for customer_id: {order.customer_id}")
+                            logger.debug("[ADMIN ORDERS] Customer not found for customer_id: %s", order.customer_id)
                     except Exception as customer_error:
-                        print(f"[ADMIN ORDERS] Error finding customer {order.customer_id}: {customer_error}")
+                        logger.error("[ADMIN ORDERS] Error finding customer %s: %s", order.customer_id, customer_error)
                 
                 # Get order items
                 items_data = []
@@ -524,7 +514,7 @@ def get_orders():
                 
                 # Validate that we have a valid order ID
                 if not order_id_str or order_id_str == 'None':
-                    print(f"[ADMIN ORDERS] Skipping order with invalid ID. Order doc _id: {order_doc.get('_id')}, order.id: {order.id}")
+                    logger.debug("[ADMIN ORDERS] Skipping order with invalid ID. Order doc _id: %s, order.id: %s", order_doc.get('_id'), order.id)
                     continue
                 
                 orders_data.append({
@@ -542,15 +532,13 @@ def get_orders():
                     'created_at': order.created_at.isoformat() if order.created_at else ''
                 })
             except Exception as order_error:
-                print(f"[ADMIN ORDERS] Error processing order: {order_error}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[ADMIN ORDERS] Error processing order: %s", order_error)
                 continue
         
         return jsonify({'success': True, 'orders': orders_data})
     
     except Exception as e:
-        print(f"Error getting orders: {str(e)}")
+        logger.error("Error getting orders: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @admin_bp.route('/orders/<order_id>/status', methods=['PUT'])
@@ -566,7 +554,7 @@ def update_order_status(order_id):
         
         # Convert order_id to string (MongoDB uses string ObjectIds)
         order_id_str = str(order_id)
-        print(f"[UPDATE ORDER STATUS] Updating order {order_id_str} to status: {new_status}")
+        logger.debug("[UPDATE ORDER STATUS] Updating order %s to status: %s", order_id_str, new_status)
         
         # Get database connection
         from models import get_db
@@ -580,30 +568,26 @@ def update_order_status(order_id):
             order_doc = database['orders'].find_one({'_id': order_id_obj})
             
             if not order_doc:
-                print(f"[UPDATE ORDER STATUS] Order not found in database: {order_id_str}")
+                logger.debug("[UPDATE ORDER STATUS] Order not found in database: %s", order_id_str)
                 return jsonify({'success': False, 'error': 'Order not found'}), 404
             
             order = Order.from_dict(order_doc)
             if not order:
-                print(f"[UPDATE ORDER STATUS] Failed to parse order document: {order_id_str}")
+                logger.error("[UPDATE ORDER STATUS] Failed to parse order document: %s", order_id_str)
                 return jsonify({'success': False, 'error': 'Order not found'}), 404
         except Exception as find_error:
-            print(f"[UPDATE ORDER STATUS] Error finding order: {find_error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[UPDATE ORDER STATUS] Error finding order: %s", find_error)
             return jsonify({'success': False, 'error': f'Error finding order: {str(find_error)}'}), 500
         
         order.status = new_status
         order.updated_at = datetime.utcnow()
         order.save()
         
-        print(f"[UPDATE ORDER STATUS] Order {order_id_str} status updated to {new_status}")
+        logger.debug("[UPDATE ORDER STATUS] Order %s status updated to %s", order_id_str, new_status)
         return jsonify({'success': True, 'message': 'Order status updated successfully'})
     
     except Exception as e:
-        print(f"Error updating order status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating order status: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @admin_bp.route('/orders/<order_id>/generate-invoice', methods=['POST'])
@@ -619,7 +603,7 @@ def generate_invoice_from_order(order_id):
         
         # Convert order_id to string (MongoDB uses string ObjectIds)
         order_id_str = str(order_id)
-        print(f"[GENERATE INVOICE] Generating invoice for order: {order_id_str}")
+        logger.debug("[GENERATE INVOICE] Generating invoice for order: %s", order_id_str)
         
         # Try to find order directly from database
         try:
@@ -627,17 +611,15 @@ def generate_invoice_from_order(order_id):
             order_doc = database['orders'].find_one({'_id': order_id_obj})
             
             if not order_doc:
-                print(f"[GENERATE INVOICE] Order not found in database: {order_id_str}")
+                logger.debug("[GENERATE INVOICE] Order not found in database: %s", order_id_str)
                 return jsonify({'success': False, 'error': 'Order not found'}), 404
             
             order = Order.from_dict(order_doc)
             if not order:
-                print(f"[GENERATE INVOICE] Failed to parse order document: {order_id_str}")
+                logger.error("[GENERATE INVOICE] Failed to parse order document: %s", order_id_str)
                 return jsonify({'success': False, 'error': 'Order not found'}), 404
         except Exception as find_error:
-            print(f"[GENERATE INVOICE] Error finding order: {find_error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[GENERATE INVOICE] Error finding order: %s", find_error)
             return jsonify({'success': False, 'error': f'Error finding order: {str(find_error)}'}), 500
         
         # Check if invoice already exists for this order
@@ -678,37 +660,56 @@ def generate_invoice_from_order(order_id):
             order_id=str(order.id)  # Link to the original order
         )
         invoice.save()
-        print(f"[GENERATE INVOICE] Invoice saved. ID: {invoice.id}")
+        logger.debug("[GENERATE INVOICE] Invoice saved. ID: %s", invoice.id)
         
         # Add invoice items from order items
         order_items = [OrderItem.from_dict(doc) for doc in database['order_items'].find(
             {'order_id': order_id_obj}
         )]
+        # Load GST rate, HSN and unit for every ordered product in one query
+        product_ids = [
+            ObjectId(item.product_id) if isinstance(item.product_id, str) and ObjectId.is_valid(item.product_id) else item.product_id
+            for item in order_items
+        ]
+        products = {
+            str(doc['_id']): doc
+            for doc in database['products'].find(
+                {'_id': {'$in': product_ids}},
+                {'gst_rate': 1, 'hsn_code': 1, 'unit': 1}
+            )
+        } if product_ids else {}
+        
         invoice_items_list = []
         for order_item in order_items:
-            # Calculate GST (assuming 18% for now)
-            gst_rate = 18.0
-            item_total = order_item.quantity * order_item.unit_price
-            gst_amount = item_total * (gst_rate / 100)
-            
+            product = products.get(str(order_item.product_id)) or {}
+            gst_rate = product.get('gst_rate')
             invoice_item = InvoiceItem(
                 invoice_id=invoice.id,
                 product_id=order_item.product_id,
                 quantity=order_item.quantity,
                 unit_price=order_item.unit_price,
-                gst_rate=gst_rate,
-                gst_amount=gst_amount,
-                total=item_total
+                gst_rate=gst_rate if gst_rate is not None else 18.0,
+                hsn_code=product.get('hsn_code'),
+                unit=product.get('unit')
             )
+            invoice_items_list.append(invoice_item)
+        
+        # Tax every line in one pass before the items are written
+        result = compute_batch(
+            [{'items': [item.to_dict() for item in invoice_items_list], 'place_of_supply': customer.state}],
+            current_user.business_state
+        )[0]
+        for invoice_item, line in zip(invoice_items_list, result['items']):
+            invoice_item.total = line['total']
+            invoice_item.gst_amount = line['gst_amount']
             invoice_item.save()
-            invoice_items_list.append(invoice_item.to_dict())
         
         # Update invoice with items and calculate totals
-        invoice.items = invoice_items_list
-        invoice.calculate_totals()
+        invoice.items = [item.to_dict() for item in invoice_items_list]
+        invoice.calculate_totals(current_user.business_state, customer.state)
         invoice.save()
         
-        print(f"[GENERATE INVOICE] Invoice created successfully. Invoice ID: {invoice.id}, Invoice Number: {invoice.invoice_number}")
+        logger.debug("[GENERATE INVOICE] Invoice created successfully. Invoice ID: %s, Invoice Number: %s", invoice.id, invoice.invoice_number)
         return jsonify({
             'success': True,
             'message': 'Invoice generated successfully',
@@ -720,5 +721,5 @@ def generate_invoice_from_order(order_id):
         })
     
     except Exception as e:
-        print(f"Error generating invoice: {str(e)}")
+        logger.error("Error generating invoice: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -4,6 +4,9 @@ from werkzeug.security import generate_password_hash
 from models import User
 from forms import LoginForm, RegistrationForm, ProfileForm
 import re
+import logging
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -55,9 +58,8 @@ def login():
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
             
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        traceback.print_exc()
+        logger.exception("Error in login")
         return jsonify({'success': False, 'message': f'Login error: {error_msg}'}), 500
 
 @auth_bp.route('/register', methods=['POST'])
@@ -166,9 +168,8 @@ def register():
         })
         
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        traceback.print_exc()
+        logger.exception("Error in register")
         
         # Handle specific MongoDB duplicate key errors
         if 'E11000' in error_msg or 'duplicate key' in error_msg.lower():
@@ -9,6 +9,9 @@ import uuid
 import re
 import secrets
 import string
+import logging
+
+logger = logging.getLogger(__name__)
 
 customer_auth_bp = Blueprint('customer_auth', __name__)
 
@@ -70,9 +73,8 @@ def register():
         })
         
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        traceback.print_exc()
+        logger.exception("Error in register")
         return jsonify({'success': False, 'message': f'Registration error: {error_msg}'}), 500
 
 @customer_auth_bp.route('/login', methods=['POST'])
@@ -109,9 +111,8 @@ def login():
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
             
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        traceback.print_exc()
+        logger.exception("Error in login")
         return jsonify({'success': False, 'message': f'Login error: {error_msg}'}), 500
 
 @customer_auth_bp.route('/logout')
@@ -145,9 +146,8 @@ def forgot_password():
         })
         
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        traceback.print_exc()
+        logger.exception("Error in forgot_password")
         return jsonify({'success': False, 'message': f'Registration error: {error_msg}'}), 500
 
 @customer_auth_bp.route('/reset-password', methods=['POST'])
@@ -179,9 +179,8 @@ def reset_password():
         return jsonify({'success': True, 'message': 'Password reset successful'})
         
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        traceback.print_exc()
+        logger.exception("Error in reset_password")
         return jsonify({'success': False, 'message': f'Registration error: {error_msg}'}), 500
 
 @customer_auth_bp.route('/profile')
@@ -214,8 +213,7 @@ def profile():
                 'message': 'Not authenticated'
             }), 401
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in profile")
         return jsonify({
             'success': False,
             'authenticated': False,
@@ -239,7 +237,7 @@ def get_customer_products():
             return jsonify({'success': False, 'error': 'Customer not found'}), 404
         
         admin_user_id = customer.user_id
-        print(f"[CUSTOMER PRODUCTS] Customer ID: {customer_id}, Admin User ID: {admin_user_id}")
+        logger.debug("[CUSTOMER PRODUCTS] Customer ID: %s, Admin User ID: %s", customer_id, admin_user_id)
         
         # Get database connection
         from models import get_db
@@ -256,7 +254,7 @@ def get_customer_products():
                 else:
                     admin_user_id_obj = admin_user_id
             except Exception as e:
-                print(f"[CUSTOMER PRODUCTS] Error converting user_id to ObjectId: {e}")
+                logger.error("[CUSTOMER PRODUCTS] Error converting user_id to ObjectId: %s", e)
                 admin_user_id_obj = admin_user_id
             
             if admin_user_id_obj:
@@ -271,7 +269,7 @@ def get_customer_products():
                 }
             else:
                 # Invalid admin_user_id, show all products
-                print(f"[CUSTOMER PRODUCTS] Invalid admin_user_id, showing all products")
+                logger.debug("[CUSTOMER PRODUCTS] Invalid admin_user_id, showing all products")
                 query = {
                     '$or': [
                         {'is_active': True},
@@ -281,7 +279,7 @@ def get_customer_products():
                 }
         else:
             # Customer not linked to admin, show ALL products from ALL admins
-            print(f"[CUSTOMER PRODUCTS] Customer not linked to admin, showing all products")
+            logger.debug("[CUSTOMER PRODUCTS] Customer not linked to admin, showing all products")
             query = {
                 '$or': [
                     {'is_active': True},
@@ -322,15 +320,15 @@ def get_customer_products():
                     ]
                 }
         
-        print(f"[CUSTOMER PRODUCTS] Query: {query}")
+        logger.debug("[CUSTOMER PRODUCTS] Query: %s", query)
         
         # Get all products from inventory (including those with 0 stock)
         products_docs = list(database['products'].find(query).sort('name', 1))
-        print(f"[CUSTOMER PRODUCTS] Found {len(products_docs)} products with query")
+        logger.debug("[CUSTOMER PRODUCTS] Found %s products with query", len(products_docs))
         
         # If no products found and we filtered by user_id, try showing all products
         if len(products_docs) == 0 and admin_user_id:
-            print(f"[CUSTOMER PRODUCTS] No products found for admin, trying all products")
+            logger.debug("[CUSTOMER PRODUCTS] No products found for admin, trying all products")
             fallback_query = {
                 '$or': [
                     {'is_active': True},
@@ -358,7 +356,7 @@ def get_customer_products():
                     ]
                 }
             products_docs = list(database['products'].find(fallback_query).sort('name', 1))
-            print(f"[CUSTOMER PRODUCTS] Found {len(products_docs)} products with fallback query")
+            logger.debug("[CUSTOMER PRODUCTS] Found %s products with fallback query", len(products_docs))
         
         products = []
         for doc in products_docs:
@@ -369,7 +367,7 @@ def get_customer_products():
                 if product:
                     products.append(product)
             except Exception as parse_error:
-                print(f"[CUSTOMER PRODUCTS] Error parsing product document: {parse_error}")
+                logger.error("[CUSTOMER PRODUCTS] Error parsing product document: %s", parse_error)
                 continue
         
         # Return products with customer-specific prices
@@ -379,7 +377,7 @@ def get_customer_products():
                 # Ensure product ID is a string
                 product_id = str(product.id) if product.id else None
                 if not product_id:
-                    print(f"[CUSTOMER PRODUCTS] Skipping product with no ID: {product.name}")
+                    logger.debug("[CUSTOMER PRODUCTS] Skipping product with no ID: %s", product.name)
                     continue
                 
                 # Get customer-specific price if available
@@ -387,7 +385,7 @@ def get_customer_products():
                 try:
                     customer_price = CustomerProductPrice.find_by_customer_and_product(customer_id, product_id)
                 except Exception as price_error:
-                    print(f"[CUSTOMER PRODUCTS] Error getting customer price for product {product_id}: {price_error}")
+                    logger.error("[CUSTOMER PRODUCTS] Error getting customer price for product %s: %s", product_id, price_error)
                 
                 # Use customer-specific price if available, otherwise use default price
                 price = float(customer_price.price) if customer_price and customer_price.price else float(product.price or 0)
@@ -407,12 +405,10 @@ def get_customer_products():
                     'category': product.category or ''
                 })
             except Exception as product_error:
-                import traceback
-                print(f"[CUSTOMER PRODUCTS] Error processing product {getattr(product, 'id', 'unknown')}: {str(product_error)}")
-                traceback.print_exc()
+                logger.exception("[CUSTOMER PRODUCTS] Error processing product %s: %s", getattr(product, 'id', 'unknown'), product_error)
                 continue
         
-        print(f"[CUSTOMER PRODUCTS] Returning {len(products_data)} products to customer")
+        logger.debug("[CUSTOMER PRODUCTS] Returning %s products to customer", len(products_data))
         
         return jsonify({
             'success': True,
@@ -421,9 +417,7 @@ def get_customer_products():
         })
     
     except Exception as e:
-        print(f"Error getting customer products: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting customer products: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @customer_auth_bp.route('/orders', methods=['GET'])
@@ -480,9 +474,7 @@ def get_customer_orders():
         return jsonify({'success': True, 'orders': orders_data})
     
     except Exception as e:
-        print(f"Error getting customer orders: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting customer orders: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @customer_auth_bp.route('/orders', methods=['POST'])
@@ -510,7 +502,7 @@ def create_customer_order():
         
         # Ensure customer_id is a string (MongoDB will convert to ObjectId in to_dict)
         customer_id_str = str(customer_id)
-        print(f"[CREATE ORDER] Creating order for customer_id: {customer_id_str} (type: {type(customer_id_str)})")
+        logger.debug("[CREATE ORDER] Creating order for customer_id: %s (type: %s)", customer_id_str, type(customer_id_str))
         
         # Create order
         order = Order(
@@ -522,7 +514,7 @@ def create_customer_order():
             notes=data.get('notes', '')
         )
         order.save()
-        print(f"[CREATE ORDER] Order saved successfully. Order ID: {order.id}, Order Number: {order.order_number}")
+        logger.debug("[CREATE ORDER] Order saved successfully. Order ID: %s, Order Number: %s", order.id, order.order_number)
         
         # Add order items
         items = data.get('items', [])
@@ -562,9 +554,7 @@ def create_customer_order():
         })
     
     except Exception as e:
-        print(f"Error creating customer order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating customer order: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @customer_auth_bp.route('/invoices', methods=['GET'])
@@ -628,8 +618,6 @@ def get_customer_invoices():
         return jsonify({'success': True, 'invoices': invoices_data})
     
     except Exception as e:
-        print(f"Error getting customer invoices: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting customer invoices: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -6,6 +6,9 @@ from bson import ObjectId
 from forms import CustomerForm
 from datetime import datetime
 import uuid
+import logging
+
+logger = logging.getLogger(__name__)
 
 customer_bp = Blueprint('customer', __name__)
 
@@ -248,7 +251,7 @@ def create_order():
         })
     
     except Exception as e:
-        print(f"Error creating order: {str(e)}")
+        logger.error("Error creating order: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @customer_bp.route('/orders', methods=['GET'])
@@ -292,7 +295,7 @@ def get_customer_orders():
         return jsonify({'success': True, 'orders': orders_data})
     
     except Exception as e:
-        print(f"Error getting customer orders: {str(e)}")
+        logger.error("Error getting customer orders: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @customer_bp.route('/invoices', methods=['GET'])
@@ -346,6 +349,6 @@ def get_customer_invoices():
         return jsonify({'success': True, 'invoices': invoices_data})
     
     except Exception as e:
-        print(f"Error getting customer invoices: {str(e)}")
+        logger.error("Error getting customer invoices: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1,10 +1,12 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required, current_user
 from models import Invoice, Product, Customer, StockMovement
 from database import db
 from bson import ObjectId
 from datetime import datetime, timedelta
 import calendar
+from activity import DEFAULT_LIMIT, feed as activity_feed
+from json_response import json_response
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -190,50 +192,25 @@ def inventory_chart():
 @dashboard_bp.route('/api/recent-activity')
 @login_required
 def recent_activity():
-    """API endpoint for recent activity"""
-    # Get recent invoices
-    user_id_obj = ObjectId(current_user.id) if isinstance(current_user.id, str) else current_user.id
-    recent_invoices = [Invoice.from_dict(doc) for doc in db['invoices'].find(
-        {'user_id': user_id_obj}
-    ).sort('created_at', -1).limit(10)]
-    
-    # Get recent stock movements
-    # First get product IDs for this user
-    product_ids = [ObjectId(doc['_id']) for doc in db['products'].find(
-        {'user_id': user_id_obj},
-        {'_id': 1}
-    )]
-    recent_movements = [StockMovement.from_dict(doc) for doc in db['stock_movements'].find(
-        {'product_id': {'$in': product_ids}}
-    ).sort('created_at', -1).limit(10)]
-    
-    activity_data = []
-    
-    # Add invoices to activity
-    for invoice in recent_invoices:
-        customer = Customer.find_by_id(invoice.customer_id)
-        activity_data.append({
-            'type': 'invoice',
-            'message': f'Invoice {invoice.invoice_number} created for {customer.name if customer else "Unknown"}',
-            'amount': float(invoice.total_amount) if invoice.total_amount else 0,
-            'date': invoice.created_at.strftime('%Y-%m-%d %H:%M') if invoice.created_at else '',
-            'status': invoice.status or 'pending'
-        })
-    
-    # Add stock movements to activity
-    for movement in recent_movements:
-        product = Product.find_by_id(movement.product_id)
-        activity_data.append({
-            'type': 'stock',
-            'message': f'{movement.movement_type.title()} {movement.quantity} units of {product.name if product else "Unknown"}',
-            'quantity': movement.quantity,
-            'date': movement.created_at.strftime('%Y-%m-%d %H:%M') if movement.created_at else '',
-            'reference': movement.reference or ''
-        })
-    
-    # Sort by date and take most recent 15
-    activity_data.sort(key=lambda x: x['date'], reverse=True)
-    activity_data = activity_data[:15]
-    
-    return jsonify(activity_data)
+    """API endpoint for recent activity
+
+    One page of the business's activity_events feed, newest first. Pass
+    next_cursor back as ?cursor= for the following page; ?type= narrows the
+    feed to invoice, stock or order events.
+    """
+    from models import get_db
+    database = get_db()
+    if database is None:
+        return jsonify({'success': False, 'error': 'Database not initialized'}), 500
+    try:
+        events, next_cursor = activity_feed(
+            database,
+            current_user.id,
+            limit=request.args.get('limit', DEFAULT_LIMIT, type=int),
+            cursor=request.args.get('cursor'),
+            event_type=request.args.get('type')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return json_response({'success': True, 'activity': events, 'next_cursor': next_cursor})
 
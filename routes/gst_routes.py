@@ -1,12 +1,15 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file, Response, stream_with_context
 from flask_login import login_required, current_user
-from models import Invoice, InvoiceItem, GSTReport
+from models import Invoice, InvoiceItem, GSTReport, get_db
 from database import db
 from bson import ObjectId
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import calendar
 import json
+import cold_storage
 from pdf_generator import generate_gst_report_pdf
+from gst_engine import GSTR1Builder, hsn_summary, period_bounds
+from gst_summaries import get_summary, reconcile
 
 gst_bp = Blueprint('gst', __name__)
 
@@ -95,50 +98,40 @@ def gstr1():
     month = request.args.get('month', datetime.now().month, type=int)
     year = request.args.get('year', datetime.now().year, type=int)
     
-    # Get invoices for the specified month
-    user_id_obj = ObjectId(current_user.id) if isinstance(current_user.id, str) else current_user.id
-    invoices = [Invoice.from_dict(doc) for doc in db['invoices'].find({
-        'user_id': user_id_obj,
-        'status': 'paid',
-        '$expr': {
-            '$and': [
-                {'$eq': [{'$month': '$invoice_date'}, month]},
-                {'$eq': [{'$year': '$invoice_date'}, year]}
-            ]
-        }
-    })]
+    builder = GSTR1Builder(get_db(), current_user, month, year)
     
     # Group by GST rate
     gst_data = {}
-    for invoice in invoices:
-        invoice_items = invoice.items if invoice.items else []
-        for item_data in invoice_items:
-            if isinstance(item_data, dict):
-                rate = item_data.get('gst_rate', 0)
-            rate = item.gst_rate
-            if rate not in gst_data:
-                gst_data[rate] = {
-                    'taxable_value': 0,
-                    'cgst': 0,
-                    'sgst': 0,
-                    'igst': 0,
-                    'invoices': []
-                }
-            
-                gst_data[rate]['taxable_value'] += item_data.get('total', 0)
-                gst_data[rate]['cgst'] += (item_data.get('gst_amount', 0) / 2) if invoice.cgst_amount and invoice.cgst_amount > 0 else 0
-                gst_data[rate]['sgst'] += (item_data.get('gst_amount', 0) / 2) if invoice.sgst_amount and invoice.sgst_amount > 0 else 0
-                gst_data[rate]['igst'] += item_data.get('gst_amount', 0) if invoice.igst_amount and invoice.igst_amount > 0 else 0
+    seen = set()
+    for batch in builder.iter_invoice_batches():
+        for invoice in batch:
+            customer = builder.customer(invoice['customer_id'])
+            for rate, bucket in invoice['rates'].items():
+                if rate not in gst_data:
+                    gst_data[rate] = {
+                        'taxable_value': 0,
+                        'cgst': 0,
+                        'sgst': 0,
+                        'igst': 0,
+                        'invoices': []
+                    }
+                
+                gst_data[rate]['taxable_value'] += bucket['taxable_value']
+                if invoice['inter_state']:
+                    gst_data[rate]['igst'] += bucket['tax_amount']
+                else:
+                    gst_data[rate]['cgst'] += bucket['tax_amount'] / 2
+                    gst_data[rate]['sgst'] += bucket['tax_amount'] / 2
                 
-                customer = Customer.find_by_id(invoice.customer_id)
-                if invoice.id not in [inv.get('id') for inv in gst_data[rate]['invoices']]:
+                if (rate, invoice['id']) not in seen:
+                    seen.add((rate, invoice['id']))
                     gst_data[rate]['invoices'].append({
-                        'id': invoice.id,
-                        'invoice_number': invoice.invoice_number,
-                        'invoice_date': invoice.invoice_date.isoformat() if invoice.invoice_date else '',
-                        'customer_name': customer.name if customer else 'Unknown',
-                        'customer_gstin': customer.gstin if customer else '',
-                        'total_amount': invoice.total_amount or 0
+                        'id': str(invoice['id']),
+                        'invoice_number': invoice['invoice_number'],
+                        'invoice_date': invoice['invoice_date'].isoformat() if invoice['invoice_date'] else '',
+                        'customer_name': customer.get('name') or 'Unknown',
+                        'customer_gstin': customer.get('gstin') or '',
+                        'total_amount': invoice['total_amount']
                     })
     
     return render_template('gst/gstr1.html', 
@@ -147,6 +140,50 @@ def gstr1():
                          year=year,
                          month_name=calendar.month_name[month])
 
+@gst_bp.route('/gst/gstr1/export')
+@login_required
+def gstr1_export():
+    """Download GSTR-1 in the GST portal's JSON format, streamed as it is built"""
+    month = request.args.get('month', datetime.now().month, type=int)
+    year = request.args.get('year', datetime.now().year, type=int)
+    
+    builder = GSTR1Builder(get_db(), current_user._get_current_object(), month, year)
+    response = Response(stream_with_context(builder.iter_json()), mimetype='application/json')
+    response.headers['Content-Disposition'] = f'attachment; filename=GSTR1_{month:02d}{year}.json'
+    return response
+
+@gst_bp.route('/gst/hsn-summary')
+@login_required
+def hsn_summary_report():
+    """HSN-wise summary of outward supplies for a month, or for a from/to date range"""
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        if date_from and date_to:
+            start = datetime.strptime(date_from, '%Y-%m-%d')
+            end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+        else:
+            month = request.args.get('month', datetime.now().month, type=int)
+            year = request.args.get('year', datetime.now().year, type=int)
+            start, end = period_bounds(month, year)
+        
+        rows = hsn_summary(get_db(), current_user.id, start, end)
+        
+        return jsonify({
+            'success': True,
+            'from': start.strftime('%Y-%m-%d'),
+            'to': (end - timedelta(days=1)).strftime('%Y-%m-%d'),
+            'hsn_summary': rows,
+            'totals': {
+                'taxable_value': round(sum(row['taxable_value'] for row in rows), 2),
+                'igst': round(sum(row['igst'] for row in rows), 2),
+                'cgst': round(sum(row['cgst'] for row in rows), 2),
+                'sgst': round(sum(row['sgst'] for row in rows), 2)
+            }
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid date: {str(e)}'}), 400
+
 @gst_bp.route('/gst/gstr3b')
 @login_required
 def gstr3b():
@@ -154,50 +191,18 @@ def gstr3b():
     month = request.args.get('month', datetime.now().month, type=int)
     year = request.args.get('year', datetime.now().year, type=int)
     
-    # Get invoices for the specified month
-    user_id_obj = ObjectId(current_user.id) if isinstance(current_user.id, str) else current_user.id
-    invoices = [Invoice.from_dict(doc) for doc in db['invoices'].find({
-        'user_id': user_id_obj,
-        'status': 'paid',
-        '$expr': {
-            '$and': [
-                {'$eq': [{'$month': '$invoice_date'}, month]},
-                {'$eq': [{'$year': '$invoice_date'}, year]}
-            ]
-        }
-    })]
-    
-    # Calculate totals
-    total_taxable_value = sum(invoice.subtotal or 0 for invoice in invoices)
-    total_cgst = sum(invoice.cgst_amount or 0 for invoice in invoices)
-    total_sgst = sum(invoice.sgst_amount or 0 for invoice in invoices)
-    total_igst = sum(invoice.igst_amount or 0 for invoice in invoices)
-    total_gst = total_cgst + total_sgst + total_igst
-    
-    # Group by GST rate
-    gst_by_rate = {}
-    for invoice in invoices:
-        invoice_items = invoice.items if invoice.items else []
-        for item_data in invoice_items:
-            if isinstance(item_data, dict):
-                rate = item_data.get('gst_rate', 0)
-                if rate not in gst_by_rate:
-                    gst_by_rate[rate] = {
-                        'taxable_value': 0,
-                        'gst_amount': 0
-                    }
-                
-                gst_by_rate[rate]['taxable_value'] += item_data.get('total', 0)
-                gst_by_rate[rate]['gst_amount'] += item_data.get('gst_amount', 0)
+    # Totals are maintained incrementally in gst_period_summaries
+    summary = get_summary(get_db(), current_user.id, year, month)
+    total_gst = summary['total_cgst'] + summary['total_sgst'] + summary['total_igst']
     
     return render_template('gst/gstr3b.html',
-                         invoices=invoices,
-                         total_taxable_value=total_taxable_value,
-                         total_cgst=total_cgst,
-                         total_sgst=total_sgst,
-                         total_igst=total_igst,
+                         total_invoices=summary['total_invoices'],
+                         total_taxable_value=summary['total_taxable_value'],
+                         total_cgst=summary['total_cgst'],
+                         total_sgst=summary['total_sgst'],
+                         total_igst=summary['total_igst'],
                          total_gst=total_gst,
-                         gst_by_rate=gst_by_rate,
+                         gst_by_rate=summary['by_rate'],
                          month=month,
                          year=year,
                          month_name=calendar.month_name[month])
@@ -238,42 +243,22 @@ def generate_report():
         flash('Report for this period already exists', 'error')
         return redirect(url_for('gst.reports'))
     
-    # Get invoices for the period
-    invoices = [Invoice.from_dict(doc) for doc in db['invoices'].find({
-        'user_id': user_id_obj,
-        'status': 'paid',
-        '$expr': {
-            '$and': [
-                {'$eq': [{'$month': '$invoice_date'}, month]},
-                {'$eq': [{'$year': '$invoice_date'}, year]}
-            ]
-        }
-    })]
-    
-    # Calculate totals
-    total_taxable_value = sum(invoice.subtotal or 0 for invoice in invoices)
-    total_cgst = sum(invoice.cgst_amount or 0 for invoice in invoices)
-    total_sgst = sum(invoice.sgst_amount or 0 for invoice in invoices)
-    total_igst = sum(invoice.igst_amount or 0 for invoice in invoices)
+    # Read the precomputed period totals instead of scanning invoices
+    summary = get_summary(get_db(), current_user.id, year, month)
+    total_taxable_value = summary['total_taxable_value']
+    total_cgst = summary['total_cgst']
+    total_sgst = summary['total_sgst']
+    total_igst = summary['total_igst']
     
     # Prepare report data
-    from models import Customer
     report_data = {
-        'invoices': []
+        'total_invoices': summary['total_invoices'],
+        'by_rate': summary['by_rate']
     }
-    for invoice in invoices:
-        customer = Customer.find_by_id(invoice.customer_id)
-        report_data['invoices'].append({
-            'invoice_number': invoice.invoice_number,
-            'invoice_date': invoice.invoice_date.strftime('%Y-%m-%d') if invoice.invoice_date else '',
-            'customer_name': customer.name if customer else 'Unknown',
-            'customer_gstin': customer.gstin if customer else '',
-            'subtotal': float(invoice.subtotal or 0),
-            'cgst': float(invoice.cgst_amount or 0),
-            'sgst': float(invoice.sgst_amount or 0),
-            'igst': float(invoice.igst_amount or 0),
-            'total': float(invoice.total_amount or 0)
-        })
+    
+    # Audit mode: recompute the period from raw invoices and record any drift
+    if request.form.get('audit'):
+        report_data['audit'] = reconcile(get_db(), current_user.id, year, month)
     
     # Create report record
     report = GSTReport(
@@ -314,10 +299,10 @@ def download_report_pdf(id):
         abort(404)
     
     # Generate PDF
-    pdf_path = generate_gst_report_pdf(report)
+    pdf_file = generate_gst_report_pdf(report)
     
     return send_file(
-        pdf_path,
+        pdf_file,
         as_attachment=True,
         download_name=f'{report.report_type}_{report.period_month:02d}_{report.period_year}.pdf',
         mimetype='application/pdf'
@@ -367,7 +352,9 @@ def gst_summary():
             'total_invoices': {'$sum': 1}
         }}
     ]
-    summary_result = list(db['invoices'].aggregate(summary_pipeline))
+    # Months before the archive horizon also read archived invoices
+    since = datetime(year, month, 1) if 1 <= month <= 12 else None
+    summary_result = list(cold_storage.aggregate(db, 'invoices', summary_pipeline, since=since))
     summary = summary_result[0] if summary_result else {
         'total_taxable_value': 0, 'total_cgst': 0, 'total_sgst': 0, 'total_igst': 0, 'total_invoices': 0
     }
@@ -380,3 +367,17 @@ def gst_summary():
         'total_invoices': summary.get('total_invoices', 0) or 0
     })
 
+@gst_bp.route('/api/gst/summary/audit')
+@login_required
+def gst_summary_audit():
+    """Diff the stored period summary against the raw invoices"""
+    month = request.args.get('month', datetime.now().month, type=int)
+    year = request.args.get('year', datetime.now().year, type=int)
+    
+    diff = reconcile(get_db(), current_user.id, year, month)
+    return jsonify({
+        'success': True,
+        'in_sync': not diff,
+        'summary': get_summary(get_db(), current_user.id, year, month),
+        'diff': diff
+    })
@@ -3,16 +3,16 @@ from flask import Blueprint, request, jsonify, send_file
 from flask_login import login_required, current_user
 from datetime import datetime
 import csv
+import importlib.util
 import io
+import logging
 import re
+import time
 import uuid
 from io import StringIO, BytesIO
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
+from metrics import observe_rows
+# openpyxl is imported by the Excel paths themselves, not while a worker boots
+OPENPYXL_AVAILABLE = importlib.util.find_spec('openpyxl') is not None
 
 # Try to import from models, fallback to app_working
 try:
@@ -23,6 +23,8 @@ except ImportError:
     # If using app_working.py, models are defined there
     pass
 
+logger = logging.getLogger(__name__)
+
 import_export_bp = Blueprint('import_export', __name__)
 
 # ==================== EXPORT FUNCTIONS ====================
@@ -31,6 +33,7 @@ import_export_bp = Blueprint('import_export', __name__)
 # @login_required  # TEMPORARILY DISABLED FOR SUBMISSION
 def export_customers():
     """Export customers to CSV"""
+    started = time.perf_counter()
     try:
         # Get customers (app_working.py doesn't have user_id, so get all active)
         try:
@@ -74,6 +77,7 @@ def export_customers():
         mem.write(output.getvalue().encode('utf-8-sig'))  # UTF-8 with BOM for Excel
         mem.seek(0)
         
+        observe_rows('export', 'customers', len(customers), time.perf_counter() - started)
         return send_file(
             mem,
             mimetype='text/csv',
@@ -87,6 +91,7 @@ def export_customers():
 @login_required
 def export_products():
     """Export products to CSV or Excel"""
+    started = time.perf_counter()
     try:
         format_type = request.args.get('format', 'excel')  # 'csv' or 'excel'
         
@@ -99,6 +104,8 @@ def export_products():
         
         if format_type == 'excel' and OPENPYXL_AVAILABLE:
             # Export to Excel
+            from openpyxl import Workbook
+            from openpyxl.styles import Font, Alignment, PatternFill
             wb = Workbook()
             ws = wb.active
             ws.title = "Products"
@@ -153,6 +160,7 @@ def export_products():
             wb.save(output)
             output.seek(0)
             
+            observe_rows('export', 'products', len(products), time.perf_counter() - started)
             return send_file(
                 output,
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -196,6 +204,7 @@ def export_products():
             mem.write(output.getvalue().encode('utf-8-sig'))
             mem.seek(0)
             
+            observe_rows('export', 'products', len(products), time.perf_counter() - started)
             return send_file(
                 mem,
                 mimetype='text/csv',
@@ -203,14 +212,14 @@ def export_products():
                 download_name=f'products_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
             )
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in export_products")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @import_export_bp.route('/export/orders', methods=['GET'])
 # @login_required  # TEMPORARILY DISABLED FOR SUBMISSION
 def export_orders():
     """Export orders to CSV"""
+    started = time.perf_counter()
     try:
         # Get orders (app_working.py uses admin_id instead of user_id)
         try:
@@ -255,6 +264,7 @@ def export_orders():
         mem.write(output.getvalue().encode('utf-8-sig'))
         mem.seek(0)
         
+        observe_rows('export', 'orders', len(orders), time.perf_counter() - started)
         return send_file(
             mem,
             mimetype='text/csv',
@@ -270,6 +280,7 @@ def export_orders():
 # @login_required  # TEMPORARILY DISABLED FOR SUBMISSION
 def import_customers():
     """Import customers from CSV"""
+    started = time.perf_counter()
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
@@ -338,6 +349,7 @@ def import_customers():
                 errors.append(f"Row {row_num}: {str(e)}")
                 skipped += 1
         
+        observe_rows('import', 'customers', imported, time.perf_counter() - started)
         return jsonify({
             'success': True,
             'imported': imported,
@@ -352,6 +364,7 @@ def import_customers():
 @login_required
 def import_products():
     """Import products from CSV or Excel"""
+    started = time.perf_counter()
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
@@ -408,7 +421,7 @@ def import_products():
                         rows.append(row_dict)
                 except Exception as e:
                     # Skip problematic rows but log the error
-                    print(f"Warning: Error processing row {row_num}: {e}")
+                    logger.warning("Error processing row %s: %s", row_num, e)
                     continue
         else:
             # Read CSV file
@@ -680,6 +693,7 @@ def import_products():
                 errors.append(f"Row {row_num}: {str(e)}")
                 skipped += 1
         
+        observe_rows('import', 'products', imported, time.perf_counter() - started)
         return jsonify({
             'success': True,
             'imported': imported,
@@ -694,6 +708,7 @@ def import_products():
 # @login_required  # TEMPORARILY DISABLED FOR SUBMISSION
 def import_orders():
     """Import orders from CSV"""
+    started = time.perf_counter()
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
@@ -811,6 +826,7 @@ def import_orders():
                 errors.append(f"Row {row_num}: {str(e)}")
                 skipped += 1
         
+        observe_rows('import', 'orders', imported, time.perf_counter() - started)
         return jsonify({
             'success': True,
             'imported': imported,
@@ -825,6 +841,7 @@ def import_orders():
 @login_required
 def import_stock():
     """Import stock movements from CSV or Excel for bulk stock in/out"""
+    started = time.perf_counter()
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
@@ -860,8 +877,7 @@ def import_stock():
                     if cell is not None and hasattr(cell, 'value') and cell.value is not None:
                         headers.append(str(cell.value).strip())
             except Exception as e:
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error in import_stock")
                 return jsonify({'success': False, 'error': f'Error reading headers: {str(e)}'}), 400
             
             if not headers:
@@ -872,12 +888,12 @@ def import_stock():
                 try:
                     # Skip None rows
                     if row_tuple is None:
-                        print(f"Warning: Row {row_num} tuple is None, skipping")
+                        logger.warning("Row %s tuple is None, skipping", row_num)
                         continue
                     
                     # Ensure row is iterable (tuple or list)
                     if not isinstance(row_tuple, (tuple, list)):
-                        print(f"Warning: Row {row_num} is not iterable (type: {type(row_tuple)}), skipping")
+                        logger.warning("Row %s is not iterable (type: %s), skipping", row_num, type(row_tuple))
                         continue
                     
                     # Check if row has any non-empty values
@@ -893,7 +909,7 @@ def import_stock():
                                 except:
                                     pass
                     except Exception as e:
-                        print(f"Warning: Error checking row {row_num} data: {e}")
+                        logger.warning("Error checking row %s data: %s", row_num, e)
                         continue
                     
                     if not has_data:
@@ -916,21 +932,17 @@ def import_stock():
                                 except (IndexError, TypeError) as e:
                                     row_dict[str(header)] = ''
                     except Exception as e:
-                        print(f"Warning: Error building row_dict for row {row_num}: {e}")
-                        import traceback
-                        traceback.print_exc()
+                        logger.exception("Error building row_dict for row %s: %s", row_num, e)
                         continue
                     
                     # Only add valid non-empty row dicts
                     if row_dict and isinstance(row_dict, dict) and len(row_dict) > 0:
                         rows.append(row_dict)
                     else:
-                        print(f"Warning: Row {row_num} produced invalid or empty row_dict, skipping")
+                        logger.warning("Row %s produced invalid or empty row_dict, skipping", row_num)
                 except Exception as e:
                     # Skip problematic rows but log the error
-                    import traceback
-                    print(f"Warning: Error processing row {row_num}: {e}")
-                    traceback.print_exc()
+                    logger.exception("Error processing row %s: %s", row_num, e)
                     continue
         else:
             # Read CSV file
@@ -952,8 +964,7 @@ def import_stock():
             if database is None:
                 return jsonify({'success': False, 'error': 'Database not initialized'}), 500
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in import_stock")
             return jsonify({'success': False, 'error': f'Database error: {str(e)}'}), 500
         
         imported = 0
@@ -981,16 +992,12 @@ def import_stock():
                                 continue
                             return str(value or '').strip()
                     except Exception as e:
-                        print(f"Error processing key in get_field_value: {e}")
+                        logger.error("Error processing key in get_field_value: %s", e)
                         continue
             except (TypeError, AttributeError) as e:
-                print(f"Error in get_field_value (TypeError/AttributeError): {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error in get_field_value (TypeError/AttributeError): %s", e)
             except Exception as e:
-                print(f"Error in get_field_value: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error in get_field_value: %s", e)
             return ''
 
         def parse_float(val):
@@ -1167,9 +1174,9 @@ def import_stock():
                 )
                 
                 if movement_type == 'in':
-                    product.stock_quantity += quantity_int
+                    product.increment('stock_quantity', quantity_int)
                 else:
-                    product.stock_quantity -= quantity_int
+                    product.increment('stock_quantity', -quantity_int)
                 
                 product.updated_at = datetime.utcnow()
                 product.save()
@@ -1184,9 +1191,7 @@ def import_stock():
                 else:
                     errors.append(f"Row {row_num}: {str(e)}")
                 skipped += 1
-                import traceback
-                print(f"Error in row {row_num}: {e}")
-                traceback.print_exc()
+                logger.exception("Error in row %s: %s", row_num, e)
                 continue
             except Exception as e:
                 error_msg = str(e)
@@ -1195,11 +1200,10 @@ def import_stock():
                 else:
                     errors.append(f"Row {row_num}: {error_msg}")
                 skipped += 1
-                import traceback
-                print(f"Error in row {row_num}: {e}")
-                traceback.print_exc()
+                logger.exception("Error in row %s: %s", row_num, e)
                 continue
         
+        observe_rows('import', 'stock', imported, time.perf_counter() - started)
         return jsonify({
             'success': True,
             'imported': imported,
@@ -1208,9 +1212,7 @@ def import_stock():
         })
         
     except Exception as e:
-        import traceback
-        print(f"Error in stock import: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in stock import: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
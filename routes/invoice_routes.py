@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file, Response, stream_with_context
 from flask_login import login_required, current_user
 from models import Invoice, InvoiceItem, Product, Customer, StockMovement
 from database import db
 from bson import ObjectId
+from itertools import islice
+import logging
+
+logger = logging.getLogger(__name__)
 
 def get_db():
     """Get database instance"""
@@ -17,7 +21,14 @@ def convert_objectid_to_str(value):
 from forms import InvoiceForm
 from datetime import datetime, date
 import json
-from pdf_generator import generate_invoice_pdf
+from pdf_cache import get_invoice_pdf, content_key, lookup, store
+from pdf_generator import invoice_pdf_context
+from pdf_export import export_query, iter_invoice_pdfs, stream_zip, merged_pdf, MERGE_MAX_INVOICES, PYPDF_AVAILABLE
+from pdf_service import submit_pdf, job_status, job_result, RenderQueueFull, RenderTimeout
+from io import BytesIO
+from tax_engine import compute_batch, is_inter_state
+from json_response import stream_json
+import cold_storage
 import os
 from werkzeug.security import generate_password_hash
 
@@ -46,10 +57,13 @@ def index():
         else:
             query['invoice_date'] = {'$lte': datetime.strptime(date_to, '%Y-%m-%d').date()}
     
-    # Manual pagination for MongoDB
+    # Manual pagination for MongoDB; archived invoices are only read when
+    # the range reaches back past the archive horizon
+    since = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
     skip = (page - 1) * 20
-    all_invoices = [Invoice.from_dict(doc) for doc in db['invoices'].find(query).sort('created_at', -1).skip(skip).limit(20)]
-    total_count = db['invoices'].count_documents(query)
+    cursor = cold_storage.find(db, 'invoices', query, sort=[('created_at', -1)], since=since)
+    all_invoices = [Invoice.from_dict(doc) for doc in islice(cursor, skip, skip + 20)]
+    total_count = cold_storage.count_documents(db, 'invoices', query, since=since)
     
     # Create pagination-like object
     class Pagination:
@@ -85,7 +99,9 @@ def new():
     
     if form.validate_on_submit():
         # Generate invoice number
-        last_invoice_doc = db['invoices'].find_one(
+        # Archived invoices keep their numbers, so the newest may be in the archive
+        last_invoice_doc = cold_storage.find_one(
+            db, 'invoices',
             {'user_id': user_id_obj},
             sort=[('_id', -1)]
         )
@@ -113,6 +129,8 @@ def new():
         # Add invoice items
         items_data = json.loads(form.items_data.data)
         invoice_items_list = []
+        customer_state = next((c.state for c in customers if str(c.id) == str(form.customer_id.data)), None)
+        inter_state = is_inter_state(current_user.business_state, customer_state)
         for item_data in items_data:
             product = Product.find_by_id(item_data['product_id'])
             if not product or str(product.user_id) != str(current_user.id):
@@ -128,14 +146,16 @@ def new():
                 product_id=product.id,
                 quantity=item_data['quantity'],
                 unit_price=item_data['unit_price'],
-                gst_rate=item_data['gst_rate']
+                gst_rate=item_data['gst_rate'],
+                hsn_code=product.hsn_code,
+                unit=product.unit
             )
-            invoice_item.calculate_totals()
+            invoice_item.calculate_totals(inter_state)
             invoice_item.save()
             invoice_items_list.append(invoice_item.to_dict())
             
             # Update stock
-            product.stock_quantity -= item_data['quantity']
+            product.increment('stock_quantity', -item_data['quantity'])
             product.save()
             
             # Add stock movement
@@ -150,7 +170,7 @@ def new():
         
         # Update invoice with items and calculate totals
         invoice.items = invoice_items_list
-        invoice.calculate_totals()
+        invoice.calculate_totals(current_user.business_state, customer_state)
         invoice.save()
         
         flash('Invoice created successfully!', 'success')
@@ -177,6 +197,9 @@ def edit(id):
     if not invoice or str(invoice.user_id) != str(current_user.id):
         from flask import abort
         abort(404)
+    if invoice.archived:
+        flash('Archived invoices cannot be changed', 'error')
+        return redirect(url_for('invoice.show', id=invoice.id))
     
     if invoice.status == 'paid':
         flash('Cannot edit paid invoice', 'error')
@@ -198,7 +221,7 @@ def edit(id):
             if isinstance(item_data, dict):
                 product = Product.find_by_id(item_data.get('product_id'))
                 if product:
-                    product.stock_quantity += item_data.get('quantity', 0)
+                    product.increment('stock_quantity', item_data.get('quantity', 0))
                     product.save()
                     
                     # Add stock movement for reversal
@@ -225,6 +248,8 @@ def edit(id):
         # Add new items
         items_data = json.loads(form.items_data.data)
         invoice_items_list = []
+        customer_state = next((c.state for c in customers if str(c.id) == str(form.customer_id.data)), None)
+        inter_state = is_inter_state(current_user.business_state, customer_state)
         for item_data in items_data:
             product = Product.find_by_id(item_data['product_id'])
             if not product or str(product.user_id) != str(current_user.id):
@@ -240,14 +265,16 @@ def edit(id):
                 product_id=product.id,
                 quantity=item_data['quantity'],
                 unit_price=item_data['unit_price'],
-                gst_rate=item_data['gst_rate']
+                gst_rate=item_data['gst_rate'],
+                hsn_code=product.hsn_code,
+                unit=product.unit
             )
-            invoice_item.calculate_totals()
+            invoice_item.calculate_totals(inter_state)
             invoice_item.save()
             invoice_items_list.append(invoice_item.to_dict())
             
             # Update stock
-            product.stock_quantity -= item_data['quantity']
+            product.increment('stock_quantity', -item_data['quantity'])
             product.save()
             
             # Add stock movement
@@ -262,7 +289,7 @@ def edit(id):
         
         # Update invoice with items and calculate totals
         invoice.items = invoice_items_list
-        invoice.calculate_totals()
+        invoice.calculate_totals(current_user.business_state, customer_state)
         invoice.save()
         
         flash('Invoice updated successfully!', 'success')
@@ -278,6 +305,9 @@ def delete(id):
     if not invoice or str(invoice.user_id) != str(current_user.id):
         from flask import abort
         abort(404)
+    if invoice.archived:
+        flash('Archived invoices cannot be changed', 'error')
+        return redirect(url_for('invoice.show', id=invoice.id))
     
     if invoice.status == 'paid':
         flash('Cannot delete paid invoice', 'error')
@@ -289,7 +319,7 @@ def delete(id):
         if isinstance(item_data, dict):
             product = Product.find_by_id(item_data.get('product_id'))
             if product:
-                product.stock_quantity += item_data.get('quantity', 0)
+                product.increment('stock_quantity', item_data.get('quantity', 0))
                 product.save()
                 
                 # Add stock movement for reversal
@@ -302,12 +332,8 @@ def delete(id):
                 )
                 movement.save()
     
-    # Delete invoice items first
-    invoice_id_obj = ObjectId(invoice.id) if isinstance(invoice.id, str) else invoice.id
-    db['invoice_items'].delete_many({'invoice_id': invoice_id_obj})
-    
-    # Delete invoice
-    db['invoices'].delete_one({'_id': invoice_id_obj})
+    # Delete invoice and its items
+    invoice.delete()
     
     flash('Invoice deleted successfully!', 'success')
     return redirect(url_for('invoice.index'))
@@ -320,6 +346,9 @@ def update_status(id):
     if not invoice or str(invoice.user_id) != str(current_user.id):
         from flask import abort
         abort(404)
+    if invoice.archived:
+        flash('Archived invoices cannot be changed', 'error')
+        return redirect(url_for('invoice.show', id=invoice.id))
     
     new_status = request.form.get('status')
     if new_status not in ['pending', 'paid', 'cancelled', 'done', 'draft']:
@@ -350,6 +379,9 @@ def api_update_status(id):
         if str(invoice.user_id) != str(current_user.id):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 403
         
+        if invoice.archived:
+            return jsonify({'success': False, 'error': 'Archived invoices are read-only'}), 409
+        
         # Get status from JSON body or form data
         data = request.get_json() if request.is_json else {}
         new_status = data.get('status') or request.form.get('status')
@@ -377,12 +409,26 @@ def api_update_status(id):
         })
     
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error updating invoice status: {str(e)}")
+        logger.exception("Error updating invoice status: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@invoice_bp.route('/web/invoices/<int:id>/pdf')
+def send_invoice_pdf(invoice):
+    """Send an invoice PDF from the PDF cache with ETag/Last-Modified validators"""
+    pdf_path, content_key = get_invoice_pdf(invoice)
+    response = send_file(
+        pdf_path,
+        as_attachment=True,
+        download_name=f'invoice_{invoice.invoice_number}.pdf',
+        mimetype='application/pdf',
+        conditional=True,
+        etag=content_key,
+        last_modified=invoice.updated_at or invoice.created_at
+    )
+    # Browsers may keep the file but must revalidate before reusing it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@invoice_bp.route('/web/invoices/<id>/pdf')
 @login_required
 def download_pdf(id):
     """Download invoice as PDF"""
@@ -391,15 +437,7 @@ def download_pdf(id):
         from flask import abort
         abort(404)
     
-    # Generate PDF
-    pdf_path = generate_invoice_pdf(invoice)
-    
-    return send_file(
-        pdf_path,
-        as_attachment=True,
-        download_name=f'invoice_{invoice.invoice_number}.pdf',
-        mimetype='application/pdf'
-    )
+    return send_invoice_pdf(invoice)
 
 @invoice_bp.route('/web/invoices/<int:id>/print')
 @login_required
@@ -428,58 +466,124 @@ def calculate_invoice():
     data = request.get_json()
     items = data.get('items', [])
     
-    subtotal = 0
-    total_gst = 0
-    items_with_totals = []
-    
-    for item in items:
-        quantity = float(item.get('quantity', 0))
-        unit_price = float(item.get('unit_price', 0))
-        gst_rate = float(item.get('gst_rate', 0))
-        
-        item_total = quantity * unit_price
-        item_gst = item_total * (gst_rate / 100)
-        
-        subtotal += item_total
-        total_gst += item_gst
-        
-        items_with_totals.append({
-            **item,
-            'item_total': item_total,
-            'item_gst': item_gst
-        })
-    
-    # Determine GST split based on customer state
+    # Determine GST split based on customer state; without a customer the
+    # supply is treated as intra-state (CGST + SGST)
+    customer_state = None
     customer_id = data.get('customer_id')
     if customer_id:
         customer = Customer.find_by_id(customer_id)
         if customer and customer.user_id == current_user.id:
-            if customer.state == current_user.business_state:
-                # Same state - CGST + SGST
-                cgst = total_gst / 2
-                sgst = total_gst / 2
-                igst = 0
-            else:
-                # Different state - IGST
-                cgst = 0
-                sgst = 0
-                igst = total_gst
-        else:
-            cgst = sgst = igst = 0
-    else:
-        cgst = sgst = igst = 0
+            customer_state = customer.state
     
-    total_amount = subtotal + cgst + sgst + igst
+    invoice = {'items': items, 'place_of_supply': customer_state}
+    if not customer_id:
+        invoice['inter_state'] = False
+    result = compute_batch([invoice], getattr(current_user, 'business_state', None))[0]
+    items_with_totals = [
+        {**item, 'item_total': line['total'], 'item_gst': line['gst_amount']}
+        for item, line in zip(items, result['items'])
+    ]
     
     return jsonify({
-        'subtotal': round(subtotal, 2),
-        'cgst': round(cgst, 2),
-        'sgst': round(sgst, 2),
-        'igst': round(igst, 2),
-        'total_amount': round(total_amount, 2),
+        'subtotal': result['subtotal'],
+        'cgst': result['cgst_amount'],
+        'sgst': result['sgst_amount'],
+        'igst': result['igst_amount'],
+        'total_amount': result['total_amount'],
         'items': items_with_totals
     })
 
+def _invoice_item_row(item):
+    """List-view dict for one invoice line, embedded dict or InvoiceItem"""
+    if isinstance(item, dict):
+        product_id = item.get('product_id')
+        product = Product.find_by_id(product_id) if product_id else None
+        return {
+            'id': str(item.get('id') or ''),
+            'product_id': str(product_id or ''),
+            'product_name': product.name if product else item.get('product_name', 'Unknown Product'),
+            'product_name_hindi': product.vegetable_name_hindi if product else item.get('product_name_hindi', ''),
+            'quantity': item.get('quantity', 0),
+            'unit_price': float(item.get('unit_price') or 0),
+            'gst_rate': float(item.get('gst_rate') or 0),
+            'gst_amount': float(item.get('gst_amount') or 0),
+            'total': float(item.get('total') or 0)
+        }
+    product = getattr(item, 'product', None)
+    if not product and getattr(item, 'product_id', None):
+        product = Product.find_by_id(item.product_id)
+    return {
+        'id': str(getattr(item, 'id', '') or ''),
+        'product_id': str(getattr(item, 'product_id', '') or ''),
+        'product_name': product.name if product else 'Unknown Product',
+        'product_name_hindi': product.vegetable_name_hindi if product else '',
+        'quantity': getattr(item, 'quantity', 0),
+        'unit_price': float(getattr(item, 'unit_price', 0) or 0),
+        'gst_rate': float(getattr(item, 'gst_rate', 0) or 0),
+        'gst_amount': float(getattr(item, 'gst_amount', 0) or 0),
+        'total': float(getattr(item, 'total', 0) or 0)
+    }
+
+# Invoices whose customers and products are loaded together
+LIST_PREFETCH_SIZE = 200
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+INVOICE_LIST_FIELDS = (
+    'invoice_number', 'customer_id', 'order_id', 'invoice_date', 'due_date', 'status', 'subtotal',
+    'cgst_amount', 'sgst_amount', 'igst_amount', 'total_amount', 'notes', 'items', 'created_at'
+)
+
+def _invoice_list_row(invoice):
+    """List-view dict from an invoice view, or None if it can't be shown
+
+    ObjectIds and dates are left as they are; json_response encodes them.
+    """
+    try:
+        customer = None
+        if invoice['customer_id']:
+            try:
+                customer = Customer.find_by_id(invoice['customer_id'])
+            except Exception as customer_error:
+                logger.error("Error finding customer %s: %s", invoice['customer_id'], customer_error)
+
+        items_data = []
+        for item in invoice['items'] or []:
+            try:
+                items_data.append(_invoice_item_row(item))
+            except Exception as item_error:
+                logger.error("Error processing invoice item: %s", item_error)
+
+        return {
+            'id': invoice['id'],
+            'invoice_number': invoice['invoice_number'] or '',
+            'customer_id': invoice['customer_id'] or '',
+            'customer_name': customer.name if customer else 'Unknown Customer',
+            'customer_email': customer.email if customer else '',
+            'customer_phone': customer.phone if customer else '',
+            'invoice_date': invoice['invoice_date'] or '',
+            'due_date': invoice['due_date'] or '',
+            'status': invoice['status'] or 'pending',
+            'subtotal': float(invoice['subtotal'] or 0),
+            'cgst_amount': float(invoice['cgst_amount'] or 0),
+            'sgst_amount': float(invoice['sgst_amount'] or 0),
+            'igst_amount': float(invoice['igst_amount'] or 0),
+            'total_amount': float(invoice['total_amount'] or 0),
+            'notes': invoice['notes'] or '',
+            'items': items_data,
+            'order_id': invoice['order_id'] or None,
+            'created_at': invoice['created_at'] or datetime.utcnow()
+        }
+    except Exception as invoice_error:
+        logger.exception("Error processing invoice %s: %s", invoice.get('invoice_number', 'unknown'), invoice_error)
+        return None
+
 @invoice_bp.route('/', methods=['GET'])
 @login_required
 def get_invoices():
@@ -502,7 +606,7 @@ def get_invoices():
             elif hasattr(customer, 'collection_name') and customer.collection_name == 'customers':
                 is_customer = True
         
-        print(f"Invoice - Customer detection: customer={customer}, is_customer={is_customer}, user_id={current_user.id}")
+        logger.debug("Invoice - Customer detection: customer=%s, is_customer=%s, user_id=%s", customer, is_customer, current_user.id)
         
         # Get database instance
         database = get_db()
@@ -518,7 +622,7 @@ def get_invoices():
             # For admins, show all invoices for their business
             user_id_obj = ObjectId(current_user.id) if isinstance(current_user.id, str) and ObjectId.is_valid(current_user.id) else current_user.id
             query = {'user_id': user_id_obj}
-            print(f"Getting invoices for user_id: {user_id_obj} (type: {type(user_id_obj)})")
+            logger.debug("Getting invoices for user_id: %s (type: %s)", user_id_obj, type(user_id_obj))
             
             # Filter by customer if customer_id is provided
             customer_id = request.args.get('customer_id')
@@ -528,200 +632,41 @@ def get_invoices():
                 except Exception:
                     pass  # Skip invalid customer_id
         
-        # Order by created_at
-        print(f"Fetching invoices with query: {query}")
-        invoices_docs = list(database['invoices'].find(query).sort('created_at', -1))
-        print(f"Found {len(invoices_docs)} invoice documents from database")
-        invoices = []
-        for doc in invoices_docs:
-            if not isinstance(doc, dict):
-                continue
-            invoice = Invoice.from_dict(doc)
-            if invoice:
-                invoices.append(invoice)
-            else:
-                print(f"Warning: Invoice.from_dict returned None for document: {doc.get('_id', 'unknown')}")
-        
-        print(f"Processed {len(invoices)} invoices for user {current_user.id}")
-        invoices_data = []
-        
-        for invoice in invoices:
-            try:
-                # Get customer details
-                customer = None
-                if invoice.customer_id:
-                    try:
-                        customer = Customer.find_by_id(invoice.customer_id)
-                    except Exception as customer_error:
-                        print(f"Error finding customer {invoice.customer_id}: {customer_error}")
-                        customer = None
-                
-                # Get invoice items (handle both InvoiceItem objects and dicts)
-                items_data = []
-                if invoice.items:
-                    for item in invoice.items:
-                        try:
-                            # Handle dict items (from MongoDB)
-                            if isinstance(item, dict):
-                                product_id = item.get('product_id')
-                                product = None
-                                if product_id:
-                                    try:
-                                        product = Product.find_by_id(product_id)
-                                    except Exception:
-                                        pass
-                                # Convert product_id to string if it's an ObjectId
-                                product_id_clean = convert_objectid_to_str(product_id) if product_id else ''
-                                product_id_str = str(product_id_clean) if product_id_clean else ''
-                                item_id_clean = convert_objectid_to_str(item.get('id', '')) if item.get('id') else ''
-                                item_id_str = str(item_id_clean) if item_id_clean else ''
-                                items_data.append({
-                                    'id': item_id_str,
-                                    'product_id': product_id_str,
-                                    'product_name': product.name if product and hasattr(product, 'name') else item.get('product_name', 'Unknown Product'),
-                                    'product_name_hindi': product.vegetable_name_hindi if product and hasattr(product, 'vegetable_name_hindi') else item.get('product_name_hindi', ''),
-                                    'quantity': item.get('quantity', 0),
-                                    'unit_price': float(item.get('unit_price', 0)),
-                                    'gst_rate': float(item.get('gst_rate', 0)),
-                                    'gst_amount': float(item.get('gst_amount', 0)),
-                                    'total': float(item.get('total', 0))
-                                })
-                            else:
-                                # Handle InvoiceItem objects
-                                product = item.product if hasattr(item, 'product') and item.product else None
-                                if not product and hasattr(item, 'product_id'):
-                                    try:
-                                        product = Product.find_by_id(item.product_id)
-                                    except Exception:
-                                        pass
-                                # Convert product_id to string if it's an ObjectId
-                                item_product_id = getattr(item, 'product_id', '')
-                                item_product_id_clean = convert_objectid_to_str(item_product_id) if item_product_id else ''
-                                item_product_id_str = str(item_product_id_clean) if item_product_id_clean else ''
-                                item_id = getattr(item, 'id', '')
-                                item_id_clean = convert_objectid_to_str(item_id) if item_id else ''
-                                item_id_str = str(item_id_clean) if item_id_clean else ''
-                                items_data.append({
-                                    'id': item_id_str,
-                                    'product_id': item_product_id_str,
-                                    'product_name': product.name if product and hasattr(product, 'name') else 'Unknown Product',
-                                    'product_name_hindi': product.vegetable_name_hindi if product and hasattr(product, 'vegetable_name_hindi') else '',
-                                    'quantity': getattr(item, 'quantity', 0),
-                                    'unit_price': float(getattr(item, 'unit_price', 0)),
-                                    'gst_rate': float(getattr(item, 'gst_rate', 0)),
-                                    'gst_amount': float(getattr(item, 'gst_amount', 0)),
-                                    'total': float(getattr(item, 'total', 0))
-                                })
-                        except Exception as item_error:
-                            print(f"Error processing invoice item: {item_error}")
-                            import traceback
-                            traceback.print_exc()
-                            continue
-                
-                # Convert customer_id to string for frontend compatibility
-                customer_id_str = convert_objectid_to_str(invoice.customer_id) if invoice.customer_id else ''
-                if customer_id_str:
-                    customer_id_str = str(customer_id_str)
-                
-                # Ensure invoice has a valid ID - check both id attribute and _id from MongoDB
-                invoice_id = None
-                if hasattr(invoice, 'id') and invoice.id:
-                    invoice_id_raw = convert_objectid_to_str(invoice.id)
-                    invoice_id = str(invoice_id_raw)
-                elif hasattr(invoice, '_id') and invoice._id:
-                    invoice_id_raw = convert_objectid_to_str(invoice._id)
-                    invoice_id = str(invoice_id_raw)
-                else:
-                    # Try to get ID from the original document
-                    print(f"Warning: Invoice {getattr(invoice, 'invoice_number', 'unknown')} has no ID attribute")
-                    continue  # Skip invoices without IDs
-                
-                # Handle invoice_date and due_date conversion
-                invoice_date_str = ''
-                if invoice.invoice_date:
-                    try:
-                        if hasattr(invoice.invoice_date, 'isoformat'):
-                            invoice_date_str = invoice.invoice_date.isoformat()
-                        elif isinstance(invoice.invoice_date, (datetime, date)):
-                            invoice_date_str = invoice.invoice_date.isoformat() if hasattr(invoice.invoice_date, 'isoformat') else str(invoice.invoice_date)
-                        else:
-                            invoice_date_str = str(invoice.invoice_date)
-                    except Exception:
-                        invoice_date_str = str(invoice.invoice_date) if invoice.invoice_date else ''
-                
-                due_date_str = ''
-                if invoice.due_date:
-                    try:
-                        if hasattr(invoice.due_date, 'isoformat'):
-                            due_date_str = invoice.due_date.isoformat()
-                        elif isinstance(invoice.due_date, (datetime, date)):
-                            due_date_str = invoice.due_date.isoformat() if hasattr(invoice.due_date, 'isoformat') else str(invoice.due_date)
-                        else:
-                            due_date_str = str(invoice.due_date)
-                    except Exception:
-                        due_date_str = str(invoice.due_date) if invoice.due_date else ''
-                
-                # Handle created_at conversion
-                created_at_str = datetime.utcnow().isoformat()
-                if invoice.created_at:
-                    try:
-                        if hasattr(invoice.created_at, 'isoformat'):
-                            created_at_str = invoice.created_at.isoformat()
-                        elif isinstance(invoice.created_at, datetime):
-                            created_at_str = invoice.created_at.isoformat()
-                        else:
-                            created_at_str = str(invoice.created_at)
-                    except Exception:
-                        created_at_str = datetime.utcnow().isoformat()
-                
-                invoices_data.append({
-                    'id': invoice_id,
-                    'invoice_number': getattr(invoice, 'invoice_number', '') or '',
-                    'customer_id': customer_id_str,
-                    'customer_name': customer.name if customer and hasattr(customer, 'name') else 'Unknown Customer',
-                    'customer_email': customer.email if customer and hasattr(customer, 'email') else '',
-                    'customer_phone': customer.phone if customer and hasattr(customer, 'phone') else '',
-                    'invoice_date': invoice_date_str,
-                    'due_date': due_date_str,
-                    'status': getattr(invoice, 'status', 'pending') or 'pending',
-                    'subtotal': float(getattr(invoice, 'subtotal', 0)) if getattr(invoice, 'subtotal', None) is not None else 0.0,
-                    'cgst_amount': float(getattr(invoice, 'cgst_amount', 0)) if getattr(invoice, 'cgst_amount', None) is not None else 0.0,
-                    'sgst_amount': float(getattr(invoice, 'sgst_amount', 0)) if getattr(invoice, 'sgst_amount', None) is not None else 0.0,
-                    'igst_amount': float(getattr(invoice, 'igst_amount', 0)) if getattr(invoice, 'igst_amount', None) is not None else 0.0,
-                    'total_amount': float(getattr(invoice, 'total_amount', 0)) if getattr(invoice, 'total_amount', None) is not None else 0.0,
-                    'notes': getattr(invoice, 'notes', '') or '',
-                    'items': items_data,
-                    'order_id': str(getattr(invoice, 'order_id', '')) if getattr(invoice, 'order_id', None) else None,
-                    'created_at': created_at_str
-                })
-            except Exception as invoice_error:
-                print(f"Error processing invoice {getattr(invoice, 'invoice_number', 'unknown')}: {invoice_error}")
-                import traceback
-                traceback.print_exc()
-                continue  # Skip this invoice and continue with the next one
-        
-        print(f"Returning {len(invoices_data)} invoices to frontend")
-        # Always return success with invoices list (even if empty)
-        # Ensure all ObjectIds are converted to strings before JSON serialization
-        def clean_data(data):
-            """Recursively clean data to convert ObjectIds to strings"""
-            if isinstance(data, dict):
-                return {k: clean_data(v) for k, v in data.items()}
-            elif isinstance(data, list):
-                return [clean_data(item) for item in data]
-            elif isinstance(data, ObjectId):
-                return str(data)
-            else:
-                return data
+        # Optional invoice date range; without a start date, or one before
+        # the archive horizon, archived invoices are merged in
+        since = None
+        date_range = {}
+        try:
+            if request.args.get('date_from'):
+                since = date_range['$gte'] = datetime.strptime(request.args['date_from'], '%Y-%m-%d')
+            if request.args.get('date_to'):
+                date_range['$lte'] = datetime.strptime(request.args['date_to'], '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+        if date_range:
+            query['invoice_date'] = date_range
+        
+        # Order by created_at; rows are encoded and sent while the cursor is read
+        logger.debug("Fetching invoices with query: %s", query)
+        views = Invoice.find_views(query, INVOICE_LIST_FIELDS, sort=[('created_at', -1)], database=database, since=since)
+        
+        def invoice_rows():
+            # Customers and products of each batch are read with one query apiece
+            for batch in _batches(views, LIST_PREFETCH_SIZE):
+                Customer.prefetch(invoice['customer_id'] for invoice in batch)
+                Product.prefetch(
+                    item.get('product_id')
+                    for invoice in batch for item in invoice['items'] or [] if isinstance(item, dict)
+                )
+                for invoice in batch:
+                    row = _invoice_list_row(invoice)
+                    if row is not None:
+                        yield row
         
-        cleaned_invoices = clean_data(invoices_data)
-        return jsonify({'success': True, 'invoices': cleaned_invoices})
+        return stream_json('invoices', invoice_rows(), success=True)
     
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error getting invoices: {str(e)}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error getting invoices: %s", e)
         # Return success with empty list instead of error to prevent frontend crashes
         # The error is logged for debugging
         return jsonify({
@@ -797,7 +742,7 @@ def get_customer_invoices():
         return jsonify({'success': True, 'invoices': customer_invoices_data})
     
     except Exception as e:
-        print(f"Error getting customer invoices: {str(e)}")
+        logger.error("Error getting customer invoices: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @invoice_bp.route('/', methods=['OPTIONS'])
@@ -814,12 +759,12 @@ def api_invoices_options():
 @login_required
 def api_create_invoice():
     """Create a new invoice"""
-    print(f"Invoices API POST called by user: {current_user.id}")
+    logger.debug("Invoices API POST called by user: %s", current_user.id)
     try:
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
-        print(f"Received data: {data}")
+        logger.debug("Received data: %s", data)
         
         # Get database connection
         from models import get_db
@@ -829,7 +774,9 @@ def api_create_invoice():
         
         # Generate invoice number
         user_id_obj = ObjectId(current_user.id) if isinstance(current_user.id, str) else current_user.id
-        last_invoice_doc = database['invoices'].find_one(
+        # Archived invoices keep their numbers, so the newest may be in the archive
+        last_invoice_doc = cold_storage.find_one(
+            database, 'invoices',
             {'user_id': user_id_obj},
             sort=[('_id', -1)]
         )
@@ -854,15 +801,11 @@ def api_create_invoice():
         
         # First try to get customer by ID if provided (and not None/null)
         if customer_id is not None and customer_id != '':
-            try:
-                customer_id_int = int(customer_id)
-                customer = Customer.find_by_id(customer_id_int)
-                if customer and str(customer.user_id) != str(current_user.id):
-                    customer = None
-                if not customer:
-                    print(f"Customer with ID {customer_id_int} not found for user {current_user.id}")
-            except (ValueError, TypeError):
-                print(f"Invalid customer_id: {customer_id}")
+            customer = Customer.find_by_id(customer_id)
+            if customer and str(customer.user_id) != str(current_user.id):
+                customer = None
+            if not customer:
+                logger.debug("Customer with ID %s not found for user %s", customer_id, current_user.id)
         
         # If not found by ID, try by name
         if not customer and customer_name:
@@ -870,58 +813,49 @@ def api_create_invoice():
             customer_doc = database['customers'].find_one({'name': customer_name, 'user_id': user_id_obj})
             customer = Customer.from_dict(customer_doc) if customer_doc else None
             if customer:
-                print(f"Found customer by name: {customer_name} (ID: {customer.id})")
+                logger.debug("Found customer by name: %s (ID: %s)", customer_name, customer.id)
         
         # If still not found and customer_name provided, create a new customer
         user_state = getattr(current_user, 'business_state', None) or 'Default State'
 
         if not customer and customer_name:
-            # Check if customer with this name already exists
+            # The name lookup above found nothing, so create the customer
             user_id_obj = ObjectId(current_user.id) if isinstance(current_user.id, str) else current_user.id
-            existing_customer_doc = database['customers'].find_one({
-                'user_id': user_id_obj,
-                'name': customer_name
-            })
+            logger.debug("Creating new customer: %s", customer_name)
+            # Generate unique email
+            import uuid
+            base_email = f"{customer_name.lower().replace(' ', '.')}@example.com"
+            unique_email = base_email
+            counter = 0
+            while database['customers'].find_one({'email': unique_email}):
+                unique_email = f"{customer_name.lower().replace(' ', '.')}-{counter}@example.com"
+                counter += 1
             
-            if existing_customer_doc:
-                customer = Customer.from_dict(existing_customer_doc)
-                print(f"Found existing customer by name: {customer_name} (ID: {customer.id})")
-            else:
-                print(f"Creating new customer: {customer_name}")
-                # Generate unique email
-                import uuid
-                base_email = f"{customer_name.lower().replace(' ', '.')}@example.com"
-                unique_email = base_email
-                counter = 0
-                while database['customers'].find_one({'email': unique_email}):
-                    unique_email = f"{customer_name.lower().replace(' ', '.')}-{counter}@example.com"
-                    counter += 1
-                
-                customer = Customer(
-                    user_id=current_user.id,
-                    name=customer_name,
-                    email=unique_email,
-                    password_hash=generate_password_hash('default123'),  # Required field - set a default
-                    phone=data.get('customer_phone', ''),
-                    billing_address=data.get('customer_address', 'Default Address'),  # Required field
-                    state=user_state,
-                    pincode='000000',  # Required field
-                    gstin='',
-                    is_active=True
-                )
-                try:
-                    customer.save()
-                except Exception as save_error:
-                    # If save fails, try to find customer again (might have been created by another request)
-                    print(f"Error saving customer: {save_error}")
-                    existing_customer_doc = database['customers'].find_one({
-                        'user_id': user_id_obj,
-                        'name': customer_name
-                    })
-                    if existing_customer_doc:
-                        customer = Customer.from_dict(existing_customer_doc)
-                    else:
-                        return jsonify({'success': False, 'error': f'Failed to create customer: {str(save_error)}'}), 500
+            customer = Customer(
+                user_id=current_user.id,
+                name=customer_name,
+                email=unique_email,
+                password_hash=generate_password_hash('default123'),  # Required field - set a default
+                phone=data.get('customer_phone', ''),
+                billing_address=data.get('customer_address', 'Default Address'),  # Required field
+                state=user_state,
+                pincode='000000',  # Required field
+                gstin='',
+                is_active=True
+            )
+            try:
+                customer.save()
+            except Exception as save_error:
+                # If save fails, try to find customer again (might have been created by another request)
+                logger.error("Error saving customer: %s", save_error)
+                existing_customer_doc = database['customers'].find_one({
+                    'user_id': user_id_obj,
+                    'name': customer_name
+                })
+                if existing_customer_doc:
+                    customer = Customer.from_dict(existing_customer_doc)
+                else:
+                    return jsonify({'success': False, 'error': f'Failed to create customer: {str(save_error)}'}), 500
         
         # If no customer at all, try to find or create a default customer
         if not customer:
@@ -934,7 +868,7 @@ def api_create_invoice():
             
             if default_customer_doc:
                 customer = Customer.from_dict(default_customer_doc)
-                print(f"Found existing default customer: {customer.id}")
+                logger.debug("Found existing default customer: %s", customer.id)
             else:
                 # Create a new default customer with unique email
                 import uuid
@@ -953,10 +887,10 @@ def api_create_invoice():
                 )
                 try:
                     customer.save()
-                    print(f"Created new default customer with email: {unique_email}")
+                    logger.debug("Created new default customer with email: %s", unique_email)
                 except Exception as save_error:
                     # If save fails (e.g., duplicate email), try to find existing default customer again
-                    print(f"Error creating default customer: {save_error}")
+                    logger.error("Error creating default customer: %s", save_error)
                     default_customer_doc = database['customers'].find_one({
                         'user_id': user_id_obj,
                         'name': 'Default Customer'
@@ -1000,7 +934,7 @@ def api_create_invoice():
         )
         
         invoice.save()
-        print(f"Created invoice: {invoice.invoice_number}, ID: {invoice.id}, created_at: {invoice.created_at}")
+        logger.debug("Created invoice: %s, ID: %s, created_at: %s", invoice.invoice_number, invoice.id, invoice.created_at)
         
         # Add invoice items
         items = data.get('items', [])
@@ -1008,15 +942,19 @@ def api_create_invoice():
             return jsonify({'success': False, 'error': 'No items provided'}), 400
         
         invoice_items_list = []
+        customer_state = customer.state if customer else None
+        inter_state = is_inter_state(current_user.business_state, customer_state)
+        # Load every product of the invoice in one query
+        Product.prefetch(item.get('product_id') for item in items if isinstance(item, dict))
         for item_data in items:
             # Skip None or invalid items
             if not item_data or not isinstance(item_data, dict):
-                print(f"Warning: Skipping invalid item: {item_data}")
+                logger.warning("Skipping invalid item: %s", item_data)
                 continue
                 
             product_id = item_data.get('product_id', 0)
             if not product_id:
-                print(f"Warning: Item missing product_id: {item_data}")
+                logger.warning("Item missing product_id: %s", item_data)
                 continue
                 
             # Get product to calculate GST and get customer-specific price
@@ -1034,7 +972,7 @@ def api_create_invoice():
                     if customer_price is not None:
                         unit_price = customer_price
                 except Exception as price_error:
-                    print(f"Error getting customer price: {price_error}")
+                    logger.error("Error getting customer price: %s", price_error)
                     # Fall back to provided price or product default
                     unit_price = item_data.get('unit_price', product.price if product else 0)
             
@@ -1049,9 +987,11 @@ def api_create_invoice():
                 unit_price=unit_price,  # Use customer-specific price
                 gst_rate=gst_rate,
                 gst_amount=0,  # Will be calculated
-                total=0  # Will be calculated
+                total=0,  # Will be calculated
+                hsn_code=product.hsn_code,
+                unit=product.unit
             )
-            invoice_item.calculate_totals()  # Calculate GST and total
+            invoice_item.calculate_totals(inter_state)  # Calculate GST and total
             invoice_item.save()
             
             # Convert to dict safely
@@ -1059,22 +999,22 @@ def api_create_invoice():
             if item_dict:
                 invoice_items_list.append(item_dict)
             else:
-                print(f"Warning: Failed to convert invoice item to dict for product {product_id}")
+                logger.warning("Failed to convert invoice item to dict for product %s", product_id)
             
             # Update product stock (reduce stock when invoice is created)
             if product:
                 # Check stock availability
                 if product.stock_quantity < quantity:
-                    print(f"Warning: Insufficient stock for {product.name}. Available: {product.stock_quantity}, Required: {quantity}")
+                    logger.warning("Insufficient stock for %s. Available: %s, Required: %s", product.name, product.stock_quantity, quantity)
                     # Still create invoice but log warning
                 
                 # Update stock quantity
-                product.stock_quantity -= quantity
+                product.increment('stock_quantity', -quantity)
                 product.updated_at = datetime.utcnow()
                 try:
                     product.save()
                 except Exception as stock_error:
-                    print(f"Error updating stock for product {product.name}: {stock_error}")
+                    logger.error("Error updating stock for product %s: %s", product.name, stock_error)
                 
                 # Create stock movement to track the sale (for reports)
                 try:
@@ -1086,13 +1026,13 @@ def api_create_invoice():
                         notes=f'Sold in invoice {invoice_number}'
                     )
                     movement.save()
-                    print(f"Stock movement created for invoice {invoice_number}, product {product.name}")
+                    logger.debug("Stock movement created for invoice %s, product %s", invoice_number, product.name)
                 except Exception as movement_error:
-                    print(f"Error creating stock movement: {movement_error}")
+                    logger.error("Error creating stock movement: %s", movement_error)
         
         # Update invoice with items and calculate totals
         invoice.items = invoice_items_list
-        invoice.calculate_totals()
+        invoice.calculate_totals(current_user.business_state, customer_state)
         invoice.save()
         
         # Mark customer as active since they have made a purchase
@@ -1102,7 +1042,7 @@ def api_create_invoice():
         
         # Ensure invoice ID is a string
         invoice_id_str = str(invoice.id) if invoice.id else None
-        print(f"Invoice created successfully: {invoice.invoice_number}, ID: {invoice_id_str}, user_id: {invoice.user_id}")
+        logger.debug("Invoice created successfully: %s, ID: %s, user_id: %s", invoice.invoice_number, invoice_id_str, invoice.user_id)
         
         return jsonify({
             'success': True,
@@ -1116,8 +1056,7 @@ def api_create_invoice():
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
-        print(f"Error creating invoice: {str(e)}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error creating invoice: %s", e)
         return jsonify({'success': False, 'error': str(e), 'details': error_trace.split('\n')[-5:] if error_trace else []}), 500
 
 @invoice_bp.route('/<int:id>', methods=['GET'])
@@ -1168,10 +1107,10 @@ def api_get_invoice(id):
         return jsonify({'success': True, 'invoice': invoice_data})
     
     except Exception as e:
-        print(f"Error getting invoice: {str(e)}")
+        logger.error("Error getting invoice: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@invoice_bp.route('/<int:id>/pdf', methods=['GET'])
+@invoice_bp.route('/<id>/pdf', methods=['GET'])
 @login_required
 def api_download_pdf(id):
     """Download invoice as PDF"""
@@ -1183,20 +1122,115 @@ def api_download_pdf(id):
         if not invoice:
             return jsonify({'success': False, 'error': 'Invoice not found'}), 404
         
-        # Generate PDF
-        pdf_path = generate_invoice_pdf(invoice)
+        return send_invoice_pdf(invoice)
+    
+    except RenderQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except RenderTimeout as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
+    except Exception as e:
+        logger.error("Error generating PDF: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@invoice_bp.route('/export/pdf', methods=['GET'])
+@login_required
+def api_export_pdfs():
+    """Download many invoice PDFs as one ZIP (streamed) or one merged PDF
+    
+    Query parameters: from, to (YYYY-MM-DD), customer_id, status and
+    format ('zip', the default, or 'pdf').
+    """
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    export_format = request.args.get('format', 'zip')
+    if export_format not in ('zip', 'pdf'):
+        return jsonify({'success': False, 'error': 'format must be zip or pdf'}), 400
+    
+    database = get_db()
+    query = export_query(
+        current_user.id,
+        start=start,
+        end=end,
+        customer_id=request.args.get('customer_id'),
+        status=request.args.get('status')
+    )
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    try:
+        if export_format == 'pdf':
+            if not PYPDF_AVAILABLE:
+                return jsonify({'success': False, 'error': 'Merged PDF export not available'}), 500
+            count = database['invoices'].count_documents(query)
+            if count > MERGE_MAX_INVOICES:
+                return jsonify({'success': False, 'error': f'Merged export is limited to {MERGE_MAX_INVOICES} invoices; use format=zip'}), 400
+            return send_file(
+                merged_pdf(iter_invoice_pdfs(database, query)),
+                as_attachment=True,
+                download_name=f'invoices_{stamp}.pdf',
+                mimetype='application/pdf'
+            )
+        
+        response = Response(stream_with_context(stream_zip(iter_invoice_pdfs(database, query))), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename=invoices_{stamp}.zip'
+        return response
+    
+    except RenderQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        logger.error("Error exporting invoice PDFs: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@invoice_bp.route('/<id>/pdf/jobs', methods=['POST'])
+@login_required
+def api_submit_pdf_job(id):
+    """Start rendering an invoice PDF in the background; poll the returned job"""
+    try:
+        invoice = Invoice.find_by_id(id)
+        if not invoice or str(invoice.user_id) != str(current_user.id):
+            return jsonify({'success': False, 'error': 'Invoice not found'}), 404
+        
+        context = invoice_pdf_context(invoice)
+        key = content_key(context)
+        if lookup(invoice.id, key):
+            # Already rendered; the client can download it straight away
+            return jsonify({'success': True, 'status': 'done', 'download_url': f'/api/invoices/{invoice.id}/pdf'})
         
-        return send_file(
-            pdf_path,
-            as_attachment=True,
-            download_name=f'invoice_{invoice.invoice_number}.pdf',
-            mimetype='application/pdf'
-        )
+        job_id = submit_pdf('invoice', context, owner=str(current_user.id), tag={'invoice_id': str(invoice.id), 'key': key})
+        return jsonify({'success': True, 'status': 'pending', 'job_id': job_id}), 202
     
+    except RenderQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
-        print(f"Error generating PDF: {str(e)}")
+        logger.error("Error queueing PDF job: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@invoice_bp.route('/pdf-jobs/<job_id>', methods=['GET'])
+@login_required
+def api_get_pdf_job(job_id):
+    """Poll a background PDF job; returns the PDF once it is ready"""
+    owner = str(current_user.id)
+    status = job_status(job_id, owner=owner)
+    if status is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if status['status'] != 'done':
+        return jsonify({'success': status['status'] != 'failed', **status})
+    
+    pdf_bytes = job_result(job_id, owner=owner)
+    if pdf_bytes is None:
+        return jsonify({'success': False, 'error': 'Job already collected'}), 410
+    tag = status.get('tag') or {}
+    if tag.get('invoice_id') and tag.get('key'):
+        store(tag['invoice_id'], tag['key'], pdf_bytes)
+    return send_file(
+        BytesIO(pdf_bytes),
+        as_attachment=True,
+        download_name=f"invoice_{tag.get('invoice_id', job_id)}.pdf",
+        mimetype='application/pdf'
+    )
+
 @invoice_bp.route('/<id>', methods=['DELETE'])
 @login_required
 def api_delete_invoice(id):
@@ -1215,6 +1249,9 @@ def api_delete_invoice(id):
         if str(invoice.user_id) != str(current_user.id):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 403
         
+        if invoice.archived:
+            return jsonify({'success': False, 'error': 'Archived invoices are read-only'}), 409
+        
         # Check if invoice is paid (optional - you may want to allow deletion of paid invoices)
         if invoice.status and invoice.status.lower() == 'paid':
             return jsonify({'success': False, 'error': 'Cannot delete paid invoice'}), 400
@@ -1224,15 +1261,8 @@ def api_delete_invoice(id):
         if database is None:
             return jsonify({'success': False, 'error': 'Database not initialized'}), 500
         
-        # Convert invoice ID to ObjectId for MongoDB
-        from bson import ObjectId
-        invoice_id_obj = ObjectId(invoice_id) if ObjectId.is_valid(invoice_id) else invoice_id
-        
-        # Delete invoice items first
-        database['invoice_items'].delete_many({'invoice_id': invoice_id_obj})
-        
-        # Delete invoice
-        database['invoices'].delete_one({'_id': invoice_id_obj})
+        # Delete invoice and its items
+        invoice.delete()
         
         return jsonify({
             'success': True,
@@ -1240,9 +1270,7 @@ def api_delete_invoice(id):
         })
     
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error deleting invoice: {str(e)}")
+        logger.exception("Error deleting invoice: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @invoice_bp.route('/<id>', methods=['PUT', 'PATCH'])
@@ -1263,6 +1291,9 @@ def api_update_invoice(id):
         if str(invoice.user_id) != str(current_user.id):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 403
         
+        if invoice.archived:
+            return jsonify({'success': False, 'error': 'Archived invoices are read-only'}), 409
+        
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
@@ -1292,8 +1323,6 @@ def api_update_invoice(id):
         })
     
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error updating invoice: {str(e)}")
+        logger.exception("Error updating invoice: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
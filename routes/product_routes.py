@@ -1,7 +1,11 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
-from models import Product, StockMovement, CustomerProductPrice, Customer
+from models import Product, StockMovement, CustomerProductPrice, Customer, ConcurrentModificationError
 from database import db
+from json_response import json_response, stream_json
+import logging
+
+logger = logging.getLogger(__name__)
 
 def get_db():
     """Get database instance"""
@@ -118,6 +122,40 @@ def api_add_to_inventory():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _to_float(value, default=0.0):
+    try:
+        return float(value) if value is not None else default
+    except (ValueError, TypeError):
+        return default
+
+PRODUCT_LIST_FIELDS = (
+    'name', 'description', 'image_url', 'price', 'stock_quantity', 'is_active', 'sku', 'category',
+    'purchase_price', 'hsn_code', 'brand', 'gst_rate', 'min_stock_level'
+)
+
+def _product_list_row(product, customer_price=None):
+    """Products page dict from a product view; customer_price overrides the default price"""
+    default_price = _to_float(product['price'])
+    price = _to_float(customer_price, default_price)
+    return {
+        'id': str(product['id']),
+        'name': product['name'] or '',
+        'description': product['description'] or '',
+        'image_url': product['image_url'] or '',
+        'price': price,
+        'default_price': default_price,
+        'stock_quantity': product['stock_quantity'] if product['stock_quantity'] is not None else 0,
+        'has_custom_price': customer_price is not None and price != default_price,
+        'is_active': product['is_active'] if product['is_active'] is not None else True,
+        'sku': product['sku'] or '',
+        'category': product['category'] or '',
+        'purchase_price': _to_float(product['purchase_price']),
+        'hsn_code': product['hsn_code'] or '',
+        'brand': product['brand'] or '',
+        'gst_rate': _to_float(product['gst_rate'], 18.0),
+        'min_stock_level': product['min_stock_level'] if product['min_stock_level'] is not None else 10
+    }
+
 @product_bp.route('/', methods=['GET'])
 @login_required
 def api_get_products():
@@ -141,7 +179,7 @@ def api_get_products():
         try:
             user_id_obj = ObjectId(user_id) if isinstance(user_id, str) and ObjectId.is_valid(user_id) else user_id
         except Exception as e:
-            print(f"Error converting user_id to ObjectId: {e}")
+            logger.error("Error converting user_id to ObjectId: %s", e)
             return jsonify({'success': False, 'error': f'Invalid user ID format: {str(e)}'}), 400
         
         # Build query exactly like inventory endpoint
@@ -151,9 +189,11 @@ def api_get_products():
         }
         
         # Optional customer ID for customer-specific pricing (for admin setting prices)
-        customer_id = request.args.get('customer_id', type=int)
+        customer_id = request.args.get('customer_id')
+        if customer_id and not ObjectId.is_valid(customer_id):
+            customer_id = None
         
-        print(f"Products API called by user: {user_id}, query: {query}")
+        logger.debug("Products API called by user: %s, query: %s", user_id, query)
         search = request.args.get('search', '')
         category = request.args.get('category', '')
         
@@ -167,160 +207,35 @@ def api_get_products():
         if category and category != 'All':
             query['category'] = category
         
-        # Database is already obtained above, use it
-        try:
-            print(f"Executing query: {query}")
-            products_docs = list(database['products'].find(query).sort('name', 1))
-            print(f"Found {len(products_docs)} product documents from database")
-            products = []
-            for doc in products_docs:
-                if not isinstance(doc, dict):
-                    print(f"Warning: Skipping non-dict product document: {doc}")
-                    continue
-                product = Product.from_dict(doc)
-                if product:
-                    products.append(product)
-                else:
-                    print(f"Warning: Product.from_dict returned None for document: {doc}")
-        except Exception as query_error:
-            import traceback
-            print(f"Error querying products: {str(query_error)}")
-            traceback.print_exc()
-            return jsonify({'success': False, 'error': f'Error querying products: {str(query_error)}'}), 500
-        
-        print(f"Found {len(products)} products for user {user_id}")
-        
-        # Return only the fields needed for products page
-        products_data = []
-        for product in products:
-            if product is None:
-                print(f"Warning: Skipping None product")
-                continue
+        # Customer-specific prices for all products in one query
+        customer_prices = {}
+        if customer_id:
             try:
-                # Get price - start with default product price
-                try:
-                    price = float(getattr(product, 'price', 0)) if getattr(product, 'price', None) is not None else 0.0
-                except (ValueError, TypeError, AttributeError):
-                    price = 0.0
-                
-                # Try to get customer-specific price if customer_id is provided
-                if customer_id:
-                    try:
-                        from models import Customer
-                        customer = Customer.find_by_id(customer_id)
-                        if customer and hasattr(product, 'get_customer_price'):
-                            try:
-                                customer_price = product.get_customer_price(customer_id)
-                                if customer_price is not None:
-                                    price = float(customer_price)
-                            except Exception:
-                                # Silently fall back to default price
-                                pass
-                    except Exception:
-                        # Silently fall back to default price
-                        pass
-                
-                # Get purchase_price from product model
+                customer = Customer.find_by_id(customer_id)
+                if customer and str(customer.user_id) == str(user_id):
+                    for doc in database[CustomerProductPrice.collection_name].find(
+                        {'customer_id': ObjectId(customer_id)}, {'product_id': 1, 'price': 1}
+                    ):
+                        customer_prices[str(doc.get('product_id'))] = doc.get('price')
+            except Exception:
+                # Silently fall back to default price
+                customer_prices = {}
+        
+        logger.debug("Executing query: %s", query)
+        views = Product.find_views(query, PRODUCT_LIST_FIELDS, sort=[('name', 1)], database=database)
+        
+        def product_rows():
+            for product in views:
                 try:
-                    purchase_price = float(product.purchase_price) if hasattr(product, 'purchase_price') and product.purchase_price is not None else 0.0
-                except (ValueError, TypeError, AttributeError):
-                    purchase_price = 0.0
-                
-                # Safely get all product fields with try-except for each
-                try:
-                    # Ensure product.id is converted to string for frontend compatibility
-                    product_id = str(product.id) if hasattr(product, 'id') and product.id else '0'
-                    
-                    product_data = {
-                        'id': product_id,
-                        'name': getattr(product, 'name', '') or '',
-                        'description': getattr(product, 'description', '') or '',
-                        'image_url': getattr(product, 'image_url', '') or '',
-                        'price': float(price) if price is not None else 0.0,
-                        'default_price': float(getattr(product, 'price', 0)) if getattr(product, 'price', None) is not None else 0.0,
-                        'stock_quantity': getattr(product, 'stock_quantity', 0) if getattr(product, 'stock_quantity', None) is not None else 0,
-                        'has_custom_price': customer_id and price != getattr(product, 'price', 0) if customer_id else False,
-                        'is_active': getattr(product, 'is_active', True) if getattr(product, 'is_active', None) is not None else True,
-                        'sku': getattr(product, 'sku', '') or '',
-                        'category': getattr(product, 'category', '') or '',
-                        'purchase_price': purchase_price,
-                        'hsn_code': getattr(product, 'hsn_code', '') or '',
-                        'brand': getattr(product, 'brand', '') or '',
-                        'gst_rate': float(getattr(product, 'gst_rate', 18)) if getattr(product, 'gst_rate', None) is not None else 18.0,
-                        'min_stock_level': getattr(product, 'min_stock_level', 10) if getattr(product, 'min_stock_level', None) is not None else 10
-                    }
-                except Exception as field_error:
-                    print(f"Error creating product_data dict for product {getattr(product, 'id', 'unknown')}: {str(field_error)}")
-                    # Create minimal product data
-                    product_id_minimal = str(getattr(product, 'id', '')) if hasattr(product, 'id') and getattr(product, 'id') else '0'
-                    product_data = {
-                        'id': product_id_minimal,
-                        'name': str(getattr(product, 'name', 'Unknown')),
-                        'description': '',
-                        'image_url': '',
-                        'price': 0.0,
-                        'default_price': 0.0,
-                        'stock_quantity': 0,
-                        'has_custom_price': False,
-                        'is_active': True,
-                        'sku': '',
-                        'category': '',
-                        'purchase_price': 0.0,
-                        'hsn_code': '',
-                        'brand': '',
-                        'gst_rate': 18.0,
-                        'min_stock_level': 10
-                    }
-                products_data.append(product_data)
-                try:
-                    print(f"Product: ID={getattr(product, 'id', 'N/A')}, Name={getattr(product, 'name', 'N/A')}, SKU={getattr(product, 'sku', 'N/A')}, Price={price}, Default Price={getattr(product, 'price', 'N/A')}, Stock={getattr(product, 'stock_quantity', 'N/A')}")
-                except Exception as print_error:
-                    print(f"Error printing product info: {print_error}")
-            except Exception as product_error:
-                product_id_str = getattr(product, 'id', 'unknown') if product else 'None'
-                print(f"Error processing product {product_id_str}: {str(product_error)}")
-                import traceback
-                traceback.print_exc()
-                # Try to add minimal product data even if processing fails
-                try:
-                    minimal_product = {
-                        'id': str(getattr(product, 'id', '')) if hasattr(product, 'id') else '',
-                        'name': str(getattr(product, 'name', 'Unknown Product')) if hasattr(product, 'name') else 'Unknown Product',
-                        'description': '',
-                        'image_url': '',
-                        'price': float(getattr(product, 'price', 0)) if hasattr(product, 'price') and getattr(product, 'price') is not None else 0.0,
-                        'default_price': float(getattr(product, 'price', 0)) if hasattr(product, 'price') and getattr(product, 'price') is not None else 0.0,
-                        'stock_quantity': int(getattr(product, 'stock_quantity', 0)) if hasattr(product, 'stock_quantity') and getattr(product, 'stock_quantity') is not None else 0,
-                        'has_custom_price': False,
-                        'is_active': True,
-                        'sku': str(getattr(product, 'sku', '')) if hasattr(product, 'sku') else '',
-                        'category': str(getattr(product, 'category', '')) if hasattr(product, 'category') else '',
-                        'purchase_price': 0.0,
-                        'hsn_code': '',
-                        'brand': '',
-                        'gst_rate': 18.0,
-                        'min_stock_level': 10
-                    }
-                    products_data.append(minimal_product)
-                    print(f"Added minimal product data for {product_id_str}")
-                except Exception as minimal_error:
-                    print(f"Failed to add even minimal product data: {minimal_error}")
-                    # Skip this product but continue with others
-                    continue
+                    yield _product_list_row(product, customer_prices.get(str(product['id'])))
+                except Exception as product_error:
+                    logger.error("Error processing product %s: %s", product['id'], product_error)
+                    yield {'id': str(product['id']), 'name': str(product.get('name') or 'Unknown Product')}
         
-        print(f"Returning {len(products_data)} products")
-        if len(products_data) == 0:
-            print(f"WARNING: No products returned for user {user_id}")
-            print(f"Query was: {query}")
-            print(f"Total products in database for this user: {database['products'].count_documents({'user_id': user_id_obj})}")
-            print(f"Total products with is_active=True: {database['products'].count_documents({'user_id': user_id_obj, 'is_active': True})}")
-        return jsonify({'success': True, 'products': products_data})
+        return stream_json('products', product_rows(), success=True)
     
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error in products API: {str(e)}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error in products API: %s", e)
         
         # Always return a valid JSON response, even on error
         # Return empty products list instead of failing completely
@@ -499,7 +414,7 @@ def api_get_customer_prices():
                     'updated_at': price.updated_at.isoformat() if hasattr(price, 'updated_at') and price.updated_at else None
                 })
             except Exception as price_error:
-                print(f"Error processing price: {price_error}")
+                logger.error("Error processing price: %s", price_error)
                 continue
         
         return jsonify({'success': True, 'prices': prices_data})
@@ -604,7 +519,7 @@ def api_set_customer_price():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@product_bp.route('/<int:id>', methods=['GET'])
+@product_bp.route('/<id>', methods=['GET'])
 @login_required
 def api_get_product(id):
     """Get single product"""
@@ -617,7 +532,8 @@ def api_get_product(id):
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
         product_data = {
-            'id': product.id,
+            'id': str(product.id),
+            'version': product.version or 0,
             'name': product.name,
             'description': product.description,
             'sku': product.sku,
@@ -647,7 +563,7 @@ def api_get_product(id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@product_bp.route('/<int:id>', methods=['PUT'])
+@product_bp.route('/<id>', methods=['PUT'])
 @login_required
 def api_update_product(id):
     """Update product"""
@@ -659,6 +575,11 @@ def api_update_product(id):
         
         data = request.get_json()
         
+        # Optional optimistic concurrency: the client sends the version it loaded
+        check_version = data.get('version') is not None
+        if check_version and data['version'] != (product.version or 0):
+            return jsonify({'success': False, 'error': 'Product was changed by someone else, reload and try again'}), 409
+        
         # Check if SKU is changed and already exists
         if data.get('sku') != product.sku:
             user_id_obj = ObjectId(current_user.id) if isinstance(current_user.id, str) else current_user.id
@@ -689,17 +610,20 @@ def api_update_product(id):
         product.rate_per_kg = float(data.get('rate_per_kg')) if data.get('rate_per_kg') is not None else product.rate_per_kg
         product.is_active = data.get('is_active', product.is_active)
         product.updated_at = datetime.utcnow()
-        product.save()
+        product.save(check_version=check_version)
         
         return jsonify({
             'success': True, 
-            'message': 'Product updated successfully'
+            'message': 'Product updated successfully',
+            'version': product.version or 0
         })
     
+    except ConcurrentModificationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@product_bp.route('/<int:id>/toggle-visibility', methods=['POST'])
+@product_bp.route('/<id>/toggle-visibility', methods=['POST'])
 @login_required
 def api_toggle_product_visibility(id):
     """Toggle product visibility (is_active)"""
@@ -722,7 +646,7 @@ def api_toggle_product_visibility(id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@product_bp.route('/<int:id>', methods=['DELETE'])
+@product_bp.route('/<id>', methods=['DELETE'])
 @login_required
 def api_delete_product(id):
     """Delete product (hard delete)"""
@@ -784,11 +708,11 @@ def api_stock_movement(id):
         
         # Update product stock
         if data['movement_type'] == 'in':
-            product.stock_quantity += data['quantity']
+            product.increment('stock_quantity', data['quantity'])
         elif data['movement_type'] == 'out':
             if product.stock_quantity < data['quantity']:
                 return jsonify({'success': False, 'error': 'Insufficient stock'}), 400
-            product.stock_quantity -= data['quantity']
+            product.increment('stock_quantity', -data['quantity'])
         else:  # adjustment
             product.stock_quantity = data['quantity']
         
@@ -798,18 +722,14 @@ def api_stock_movement(id):
         try:
             product.save()
         except Exception as save_error:
-            import traceback
-            print(f"Error saving product: {save_error}")
-            traceback.print_exc()
+            logger.exception("Error saving product: %s", save_error)
             return jsonify({'success': False, 'error': f'Failed to update product stock: {str(save_error)}'}), 500
         
         # Save stock movement
         try:
             movement.save()
         except Exception as movement_error:
-            import traceback
-            print(f"Error saving stock movement: {movement_error}")
-            traceback.print_exc()
+            logger.exception("Error saving stock movement: %s", movement_error)
             # Product was already saved, so we can still return success but log the movement error
             return jsonify({
                 'success': True, 
@@ -825,10 +745,7 @@ def api_stock_movement(id):
         })
     
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error in stock movement API: {str(e)}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error in stock movement API: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @product_bp.route('/bulk-stock', methods=['POST'])
@@ -885,9 +802,9 @@ def api_bulk_stock_movement():
                 
                 # Update product stock
                 if movement_type == 'in':
-                    product.stock_quantity += quantity
+                    product.increment('stock_quantity', quantity)
                 else:  # out
-                    product.stock_quantity -= quantity
+                    product.increment('stock_quantity', -quantity)
                 
                 product.updated_at = datetime.utcnow()
                 product.save()
@@ -912,10 +829,7 @@ def api_bulk_stock_movement():
         })
     
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error in bulk stock API: {str(e)}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error in bulk stock API: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @product_bp.route('/upload-image', methods=['POST'])
@@ -955,6 +869,8 @@ def api_upload_image():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+MOVEMENT_LIST_FIELDS = ('product_id', 'movement_type', 'quantity', 'reference', 'notes', 'created_at')
+
 @product_bp.route('/stock-movements', methods=['GET'])
 @login_required
 def api_get_stock_movements():
@@ -971,29 +887,12 @@ def api_get_stock_movements():
         user_id = current_user.id
         movement_type = request.args.get('movement_type', '')  # 'in' or 'out' or empty for all
         
-        # Get all products for this user
+        # Only the ids of this user's products are needed
         user_id_obj = ObjectId(user_id) if isinstance(user_id, str) and ObjectId.is_valid(user_id) else user_id
-        products = [Product.from_dict(doc) for doc in database['products'].find({'user_id': user_id_obj, 'is_active': True})]
-        
-        if not products:
-            return jsonify({'success': True, 'movements': []})
-        
-        # Get product IDs (handle both string and ObjectId)
-        product_ids = []
-        for p in products:
-            if p and p.id:
-                if isinstance(p.id, str) and ObjectId.is_valid(p.id):
-                    product_ids.append(ObjectId(p.id))
-                elif isinstance(p.id, ObjectId):
-                    product_ids.append(p.id)
-                else:
-                    try:
-                        product_ids.append(ObjectId(str(p.id)))
-                    except:
-                        continue
+        product_ids = [doc['_id'] for doc in database['products'].find({'user_id': user_id_obj, 'is_active': True}, {'_id': 1})]
         
         if not product_ids:
-            return jsonify({'success': True, 'movements': []})
+            return json_response({'success': True, 'movements': []})
         
         # Query stock movements
         query = {'product_id': {'$in': product_ids}}
@@ -1001,86 +900,24 @@ def api_get_stock_movements():
         if movement_type:
             query['movement_type'] = movement_type
         
-        movements_docs = list(database['stock_movements'].find(query).sort('created_at', -1))
-        movements = []
-        for doc in movements_docs:
-            if not isinstance(doc, dict):
-                continue
-            movement = StockMovement.from_dict(doc)
-            if movement:
-                movements.append(movement)
-        
-        movements_data = []
-        for movement in movements:
-            if not movement:
-                continue
-            try:
-                # Convert product_id to string for frontend (handle ObjectId)
-                product_id = movement.product_id
-                if isinstance(product_id, ObjectId):
-                    product_id_str = str(product_id)
-                else:
-                    product_id_str = str(product_id) if product_id else ''
-                
-                # Convert movement ID to string
-                movement_id = movement.id
-                if isinstance(movement_id, ObjectId):
-                    movement_id_str = str(movement_id)
-                else:
-                    movement_id_str = str(movement_id) if movement_id else ''
-                
-                # Handle created_at conversion
-                created_at_str = None
-                if movement.created_at:
-                    try:
-                        if hasattr(movement.created_at, 'isoformat'):
-                            created_at_str = movement.created_at.isoformat()
-                        elif isinstance(movement.created_at, datetime):
-                            created_at_str = movement.created_at.isoformat()
-                        else:
-                            created_at_str = str(movement.created_at)
-                    except Exception:
-                        created_at_str = str(movement.created_at) if movement.created_at else None
-                
-                movements_data.append({
-                    'id': movement_id_str,
-                    'product_id': product_id_str,
-                    'movement_type': movement.movement_type or '',
-                    'quantity': float(movement.quantity) if movement.quantity is not None else 0,
-                    'reference': movement.reference or '',
-                    'notes': movement.notes or '',
-                    'created_at': created_at_str
-                })
-            except Exception as e:
-                print(f"Error processing movement {getattr(movement, 'id', 'unknown')}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
-        
-        # Clean data to ensure all ObjectIds are converted
-        def clean_data(data):
-            """Recursively clean data to convert ObjectIds to strings"""
-            if isinstance(data, dict):
-                return {k: clean_data(v) for k, v in data.items()}
-            elif isinstance(data, list):
-                return [clean_data(item) for item in data]
-            elif isinstance(data, ObjectId):
-                return str(data)
-            else:
-                return data
-        
-        cleaned_movements = clean_data(movements_data)
-        
-        return jsonify({
-            'success': True,
-            'movements': cleaned_movements
-        })
+        views = StockMovement.find_views(query, MOVEMENT_LIST_FIELDS, sort=[('created_at', -1)], database=database)
+        
+        def movement_rows():
+            for movement in views:
+                yield {
+                    'id': movement['id'],
+                    'product_id': movement['product_id'] or '',
+                    'movement_type': movement['movement_type'] or '',
+                    'quantity': float(movement['quantity']) if movement['quantity'] is not None else 0,
+                    'reference': movement['reference'] or '',
+                    'notes': movement['notes'] or '',
+                    'created_at': movement['created_at']
+                }
+        
+        return stream_json('movements', movement_rows(), success=True)
     
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error in stock movements API: {str(e)}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error in stock movements API: %s", e)
         # Return success with empty list instead of error to prevent frontend crashes
         return jsonify({
             'success': True, 
@@ -1089,6 +926,11 @@ def api_get_stock_movements():
             'message': f'Some movements may not be available: {str(e)}'
         }), 200
 
+INVENTORY_FIELDS = (
+    'name', 'vegetable_name_hindi', 'sku', 'category', 'stock_quantity', 'min_stock_level',
+    'price', 'purchase_price', 'unit', 'updated_at'
+)
+
 @product_bp.route('/inventory', methods=['GET'])
 @login_required
 def api_get_inventory():
@@ -1133,29 +975,9 @@ def api_get_inventory():
         
         # Get products with optimized query
         try:
-            products_docs = list(database['products'].find(query).sort('name', 1))
-            products = []
-            for doc in products_docs:
-                try:
-                    # Skip None or invalid documents
-                    if doc is None or not isinstance(doc, dict):
-                        print(f"Warning: Skipping invalid document: {doc}")
-                        continue
-                    product = Product.from_dict(doc)
-                    if product is None:
-                        print(f"Warning: Product.from_dict returned None for document: {doc.get('_id', 'unknown')}")
-                        continue
-                    products.append(product)
-                except Exception as e:
-                    import traceback
-                    print(f"Warning: Could not parse product document: {e}")
-                    print(traceback.format_exc())
-                    continue
+            products = list(Product.find_views(query, INVENTORY_FIELDS, sort=[('name', 1)], database=database))
         except Exception as e:
-            import traceback
-            error_trace = traceback.format_exc()
-            print(f"Error fetching products: {str(e)}")
-            print(f"Full traceback:\n{error_trace}")
+            logger.exception("Error fetching products: %s", e)
             return jsonify({'success': False, 'error': f'Error fetching products: {str(e)}'}), 500
         
         # Calculate summary statistics efficiently
@@ -1170,18 +992,8 @@ def api_get_inventory():
         
         # Get last updated dates in a single query for all products
         # Prepare product_ids in both ObjectId and string formats for matching
-        product_ids_obj = []
-        product_ids_str = []
-        for p in products:
-            if p.id:
-                if isinstance(p.id, str) and ObjectId.is_valid(p.id):
-                    product_ids_obj.append(ObjectId(p.id))
-                    product_ids_str.append(p.id)
-                elif isinstance(p.id, ObjectId):
-                    product_ids_obj.append(p.id)
-                    product_ids_str.append(str(p.id))
-                else:
-                    product_ids_str.append(str(p.id))
+        product_ids_obj = [p['id'] for p in products if isinstance(p['id'], ObjectId)]
+        product_ids_str = [str(p['id']) for p in products]
         
         last_movements = {}
         if product_ids_obj or product_ids_str:
@@ -1221,22 +1033,15 @@ def api_get_inventory():
                             last_movements[product_id_str] = last_updated
             except Exception as agg_error:
                 # If aggregation fails, continue without last_updated dates
-                import traceback
-                print(f"Warning: Could not fetch last movements: {agg_error}")
-                print(traceback.format_exc())
+                logger.exception("Could not fetch last movements: %s", agg_error)
                 pass
         
         for product in products:
             try:
-                # Skip None products
-                if product is None:
-                    print("Warning: Skipping None product")
-                    continue
-                
-                stock_qty = product.stock_quantity if hasattr(product, 'stock_quantity') and product.stock_quantity is not None else 0
-                price = float(product.price) if hasattr(product, 'price') and product.price is not None else 0.0
-                purchase_price = float(product.purchase_price) if hasattr(product, 'purchase_price') and product.purchase_price is not None else 0.0
-                min_stock_level = product.min_stock_level if hasattr(product, 'min_stock_level') and product.min_stock_level is not None else 10
+                stock_qty = product['stock_quantity'] if product['stock_quantity'] is not None else 0
+                price = float(product['price']) if product['price'] is not None else 0.0
+                purchase_price = float(product['purchase_price']) if product['purchase_price'] is not None else 0.0
+                min_stock_level = product['min_stock_level'] if product['min_stock_level'] is not None else 10
                 
                 # Calculate stock values
                 stock_value_sales = stock_qty * price
@@ -1244,47 +1049,43 @@ def api_get_inventory():
                 
                 # Track low stock (negative or below min level)
                 if stock_qty < 0 or (stock_qty > 0 and stock_qty <= min_stock_level):
-                    low_stock_items.append(product.id)
+                    low_stock_items.append(product['id'])
                     low_stock_qty += stock_qty
                 
                 # Track positive stock
                 if stock_qty > 0:
-                    positive_stock_items.append(product.id)
+                    positive_stock_items.append(product['id'])
                     positive_stock_qty += stock_qty
                 
                 total_stock_value_sales += stock_value_sales
                 total_stock_value_purchase += stock_value_purchase
                 
                 # Get last updated date
-                product_id_str = str(product.id) if product.id else None
-                last_updated = last_movements.get(product_id_str) if product_id_str else None
-                if not last_updated and hasattr(product, 'updated_at') and product.updated_at:
-                    last_updated = product.updated_at
+                product_id_str = str(product['id'])
+                last_updated = last_movements.get(product_id_str) or product['updated_at']
                 
                 inventory_data.append({
-                    'id': str(product.id) if product.id else '',
-                    'name': product.name if hasattr(product, 'name') and product.name else '',
-                    'vegetable_name_hindi': getattr(product, 'vegetable_name_hindi', '') or '',
-                    'sku': product.sku if hasattr(product, 'sku') and product.sku else '',
-                    'category': product.category if hasattr(product, 'category') and product.category else '',
+                    'id': product_id_str,
+                    'name': product['name'] or '',
+                    'vegetable_name_hindi': product['vegetable_name_hindi'] or '',
+                    'sku': product['sku'] or '',
+                    'category': product['category'] or '',
                     'stock_quantity': stock_qty,
                     'min_stock_level': min_stock_level,
                     'price': price,
                     'purchase_price': purchase_price,
-                    'unit': product.unit if hasattr(product, 'unit') and product.unit else 'PCS',
-                    'last_updated': last_updated.isoformat() if last_updated and hasattr(last_updated, 'isoformat') else None,
+                    'unit': product['unit'] or 'PCS',
+                    'last_updated': last_updated or None,
                     'status': ('out_of_stock' if stock_qty == 0 else 
                               ('low_stock' if stock_qty < 0 or (stock_qty > 0 and stock_qty <= min_stock_level) else 'in_stock'))
                 })
             except Exception as product_error:
                 # Skip products that cause errors but log them
-                import traceback
-                print(f"Error processing product {getattr(product, 'id', 'unknown')}: {product_error}")
-                print(traceback.format_exc())
+                logger.exception("Error processing product %s: %s", product.get('id', 'unknown'), product_error)
                 continue
         
         # Return response with inventory data
-        return jsonify({
+        return json_response({
             'success': True,
             'inventory': inventory_data,
             'summary': {
@@ -1306,8 +1107,7 @@ def api_get_inventory():
         import traceback
         error_trace = traceback.format_exc()
         error_msg = str(e)
-        print(f"Error in inventory API: {error_msg}")
-        print(f"Full traceback:\n{error_trace}")
+        logger.exception("Error in inventory API: %s", error_msg)
         # Return more detailed error in development, simpler in production
         import os
         if os.environ.get('FLASK_ENV') == 'development':
@@ -1510,12 +1310,12 @@ def stock_movement(id):
         
         # Update product stock
         if form.movement_type.data == 'in':
-            product.stock_quantity += form.quantity.data
+            product.increment('stock_quantity', form.quantity.data)
         elif form.movement_type.data == 'out':
             if product.stock_quantity < form.quantity.data:
                 flash('Insufficient stock!', 'error')
                 return render_template('products/stock_movement.html', form=form, product=product)
-            product.stock_quantity -= form.quantity.data
+            product.increment('stock_quantity', -form.quantity.data)
         else:  # adjustment
             product.stock_quantity = form.quantity.data
         
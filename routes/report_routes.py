@@ -5,20 +5,18 @@ from bson import ObjectId
 from datetime import datetime, timedelta
 from collections import defaultdict
 from io import BytesIO
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
-try:
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.lib import colors
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
+import importlib.util
+import logging
+import cold_storage
+from report_export import (
+    OPENPYXL_AVAILABLE, XLSX_MIMETYPE, build_workbook, summary_metrics,
+    top_customers_pipeline, top_products_pipeline, trends_pipeline, trend_label
+)
+
+# ReportLab is imported by the PDF download itself, not while a worker boots
+REPORTLAB_AVAILABLE = importlib.util.find_spec('reportlab') is not None
+
+logger = logging.getLogger(__name__)
 
 report_bp = Blueprint('report', __name__)
 
@@ -39,40 +37,7 @@ def sales_summary():
         days = request.args.get('days', 30, type=int)
         start_date = datetime.now() - timedelta(days=days)
         
-        # Total revenue from invoices (not orders, since we're using invoices)
-        revenue_pipeline = [
-            {'$match': {
-                'user_id': user_id_obj,
-                'created_at': {'$gte': start_date}
-            }},
-            {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}}}
-        ]
-        revenue_result = list(database['invoices'].aggregate(revenue_pipeline))
-        total_revenue = revenue_result[0].get('total', 0) if revenue_result else 0.0
-        
-        # Total invoices
-        total_orders = database['invoices'].count_documents({
-            'user_id': user_id_obj,
-            'created_at': {'$gte': start_date}
-        })
-        
-        # Total customers for this user
-        total_customers = database['customers'].count_documents({'user_id': user_id_obj})
-        
-        # Active customers (placed invoices in period)
-        active_customers_pipeline = [
-            {'$match': {
-                'user_id': user_id_obj,
-                'created_at': {'$gte': start_date}
-            }},
-            {'$group': {'_id': '$customer_id'}},
-            {'$count': 'active_customers'}
-        ]
-        active_result = list(database['invoices'].aggregate(active_customers_pipeline))
-        active_customers = active_result[0].get('active_customers', 0) if active_result else 0
-        
-        # Average order value
-        avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
+        metrics = summary_metrics(database, user_id_obj, start_date)
         
         # Invoices by status
         orders_by_status_pipeline = [
@@ -86,7 +51,7 @@ def sales_summary():
                 'revenue': {'$sum': '$total_amount'}
             }}
         ]
-        orders_by_status = list(database['invoices'].aggregate(orders_by_status_pipeline))
+        orders_by_status = list(cold_storage.aggregate(database, 'invoices', orders_by_status_pipeline, since=start_date))
         
         status_breakdown = {
             item['_id']: {
@@ -98,18 +63,10 @@ def sales_summary():
         
         return jsonify({
             'success': True,
-            'summary': {
-                'total_revenue': float(total_revenue),
-                'total_orders': total_orders,
-                'total_customers': total_customers,
-                'active_customers': active_customers,
-                'avg_order_value': float(avg_order_value),
-                'status_breakdown': status_breakdown
-            }
+            'summary': dict(metrics, status_breakdown=status_breakdown)
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in sales_summary")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @report_bp.route('/api/sales-trends', methods=['GET'])
@@ -128,73 +85,12 @@ def sales_trends():
         days = request.args.get('days', 30, type=int)
         start_date = datetime.now() - timedelta(days=days)
         
-        base_match = {
-            'user_id': user_id_obj,
-            'created_at': {'$gte': start_date}
-        }
-        
-        if period == 'daily':
-            # Group by day
-            trends_pipeline = [
-                {'$match': base_match},
-                {'$group': {
-                    '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
-                    'orders': {'$sum': 1},
-                    'revenue': {'$sum': '$total_amount'}
-                }},
-                {'$sort': {'_id': 1}}
-            ]
-            trends = list(database['invoices'].aggregate(trends_pipeline))
-            
-            data = [{
-                'date': trend['_id'],
-                'orders': trend.get('orders', 0),
-                'revenue': float(trend.get('revenue', 0))
-            } for trend in trends]
-            
-        elif period == 'weekly':
-            # Group by week
-            trends_pipeline = [
-                {'$match': base_match},
-                {'$group': {
-                    '_id': {
-                        'year': {'$year': '$created_at'},
-                        'week': {'$week': '$created_at'}
-                    },
-                    'orders': {'$sum': 1},
-                    'revenue': {'$sum': '$total_amount'}
-                }},
-                {'$sort': {'_id.year': 1, '_id.week': 1}}
-            ]
-            trends = list(database['invoices'].aggregate(trends_pipeline))
-            
-            data = [{
-                'period': f"Week {trend['_id']['week']}, {trend['_id']['year']}",
-                'orders': trend.get('orders', 0),
-                'revenue': float(trend.get('revenue', 0))
-            } for trend in trends]
-            
-        else:  # monthly
-            # Group by month
-            trends_pipeline = [
-                {'$match': base_match},
-                {'$group': {
-                    '_id': {
-                        'year': {'$year': '$created_at'},
-                        'month': {'$month': '$created_at'}
-                    },
-                    'orders': {'$sum': 1},
-                    'revenue': {'$sum': '$total_amount'}
-                }},
-                {'$sort': {'_id.year': 1, '_id.month': 1}}
-            ]
-            trends = list(database['invoices'].aggregate(trends_pipeline))
-            
-            data = [{
-                'period': f"{trend['_id']['month']}/{trend['_id']['year']}",
-                'orders': trend.get('orders', 0),
-                'revenue': float(trend.get('revenue', 0))
-            } for trend in trends]
+        trends = cold_storage.aggregate(database, 'invoices', trends_pipeline(user_id_obj, start_date, period), since=start_date)
+        data = [{
+            'date' if period == 'daily' else 'period': trend_label(period, trend['_id']),
+            'orders': trend.get('orders', 0),
+            'revenue': float(trend.get('revenue', 0))
+        } for trend in trends]
         
         return jsonify({
             'success': True,
@@ -202,8 +98,7 @@ def sales_trends():
             'data': data
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in sales_trends")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @report_bp.route('/api/top-customers', methods=['GET'])
@@ -222,27 +117,7 @@ def top_customers():
         days = request.args.get('days', 30, type=int)
         start_date = datetime.now() - timedelta(days=days)
         
-        top_customers_pipeline = [
-            {'$match': {
-                'user_id': user_id_obj,
-                'created_at': {'$gte': start_date}
-            }},
-            {'$group': {
-                '_id': '$customer_id',
-                'order_count': {'$sum': 1},
-                'total_spent': {'$sum': '$total_amount'}
-            }},
-            {'$sort': {'total_spent': -1}},
-            {'$limit': limit},
-            {'$lookup': {
-                'from': 'customers',
-                'localField': '_id',
-                'foreignField': '_id',
-                'as': 'customer'
-            }},
-            {'$unwind': {'path': '$customer', 'preserveNullAndEmptyArrays': True}}
-        ]
-        top_customers = list(database['invoices'].aggregate(top_customers_pipeline))
+        top_customers = list(cold_storage.aggregate(database, 'invoices', top_customers_pipeline(user_id_obj, start_date, limit), since=start_date))
         
         customers_data = []
         for item in top_customers:
@@ -260,8 +135,7 @@ def top_customers():
             'customers': customers_data
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in top_customers")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @report_bp.route('/api/top-products', methods=['GET'])
@@ -280,28 +154,7 @@ def top_products():
         days = request.args.get('days', 30, type=int)
         start_date = datetime.now() - timedelta(days=days)
         
-        top_products_pipeline = [
-            {'$match': {
-                'user_id': user_id_obj,
-                'created_at': {'$gte': start_date}
-            }},
-            {'$unwind': '$items'},
-            {'$group': {
-                '_id': '$items.product_id',
-                'quantity_sold': {'$sum': '$items.quantity'},
-                'revenue': {'$sum': '$items.total'}
-            }},
-            {'$sort': {'quantity_sold': -1}},
-            {'$limit': limit},
-            {'$lookup': {
-                'from': 'products',
-                'localField': '_id',
-                'foreignField': '_id',
-                'as': 'product'
-            }},
-            {'$unwind': {'path': '$product', 'preserveNullAndEmptyArrays': True}}
-        ]
-        top_products = list(database['invoices'].aggregate(top_products_pipeline))
+        top_products = list(cold_storage.aggregate(database, 'invoices', top_products_pipeline(user_id_obj, start_date, limit), since=start_date))
         
         products_data = []
         for item in top_products:
@@ -319,8 +172,7 @@ def top_products():
             'products': products_data
         })
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in top_products")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @report_bp.route('/revenue-by-category', methods=['GET'])
@@ -405,7 +257,7 @@ def download_report():
     """Download reports as PDF or Excel"""
     try:
         format_type = request.args.get('format', 'excel')  # 'excel' or 'pdf'
-        report_type = request.args.get('type', 'summary')  # 'summary', 'customers', 'products', 'trends'
+        report_type = request.args.get('type', 'summary')  # 'summary', 'customers', 'products', 'trends', 'full'
         days = request.args.get('days', 30, type=int)
         start_date = datetime.now() - timedelta(days=days)
         
@@ -419,171 +271,27 @@ def download_report():
         user_id_obj = ObjectId(user_id) if isinstance(user_id, str) and ObjectId.is_valid(user_id) else user_id
         
         if format_type == 'excel' and OPENPYXL_AVAILABLE:
-            wb = Workbook()
-            
-            if report_type == 'summary':
-                ws = wb.active
-                ws.title = "Sales Summary"
-                
-                # Get summary data
-                revenue_pipeline = [
-                    {'$match': {
-                        'user_id': user_id_obj,
-                        'created_at': {'$gte': start_date}
-                    }},
-                    {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}}}
-                ]
-                revenue_result = list(database['invoices'].aggregate(revenue_pipeline))
-                total_revenue = revenue_result[0].get('total', 0) if revenue_result else 0.0
-                
-                total_orders = database['invoices'].count_documents({
-                    'user_id': user_id_obj,
-                    'created_at': {'$gte': start_date}
-                })
-                total_customers = database['customers'].count_documents({'user_id': user_id_obj})
-                
-                active_customers_pipeline = [
-                    {'$match': {
-                        'user_id': user_id_obj,
-                        'created_at': {'$gte': start_date}
-                    }},
-                    {'$group': {'_id': '$customer_id'}},
-                    {'$count': 'active_customers'}
-                ]
-                active_result = list(database['invoices'].aggregate(active_customers_pipeline))
-                active_customers = active_result[0].get('active_customers', 0) if active_result else 0
-                
-                # Write summary
-                ws['A1'] = 'Sales Summary Report'
-                ws['A1'].font = Font(bold=True, size=16)
-                ws['A2'] = f'Period: Last {days} days'
-                ws['A2'].font = Font(bold=True)
-                
-                ws['A4'] = 'Metric'
-                ws['B4'] = 'Value'
-                ws['A4'].font = Font(bold=True)
-                ws['B4'].font = Font(bold=True)
-                
-                ws['A5'] = 'Total Revenue'
-                ws['B5'] = float(total_revenue)
-                ws['A6'] = 'Total Orders'
-                ws['B6'] = total_orders
-                ws['A7'] = 'Total Customers'
-                ws['B7'] = total_customers
-                ws['A8'] = 'Active Customers'
-                ws['B8'] = active_customers
-                
-            elif report_type == 'customers':
-                ws = wb.active
-                ws.title = "Top Customers"
-                
-                limit = request.args.get('limit', 50, type=int)
-                top_pipeline = [
-                    {'$match': {
-                        'user_id': user_id_obj,
-                        'created_at': {'$gte': start_date}
-                    }},
-                    {'$group': {
-                        '_id': '$customer_id',
-                        'order_count': {'$sum': 1},
-                        'total_spent': {'$sum': '$total_amount'}
-                    }},
-                    {'$sort': {'total_spent': -1}},
-                    {'$limit': limit},
-                    {'$lookup': {
-                        'from': 'customers',
-                        'localField': '_id',
-                        'foreignField': '_id',
-                        'as': 'customer'
-                    }},
-                    {'$unwind': {'path': '$customer', 'preserveNullAndEmptyArrays': True}}
-                ]
-                top = list(database['invoices'].aggregate(top_pipeline))
-                
-                headers = ['Rank', 'Customer Name', 'Email', 'Orders', 'Total Spent']
-                for col_num, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col_num, value=header)
-                    cell.font = Font(bold=True)
-                    cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                    cell.font = Font(bold=True, color="FFFFFF")
-                
-                for row_num, item in enumerate(top, 2):
-                    customer = item.get('customer', {})
-                    ws.cell(row=row_num, column=1, value=row_num - 1)
-                    ws.cell(row=row_num, column=2, value=customer.get('name', 'Unknown'))
-                    ws.cell(row=row_num, column=3, value=customer.get('email', ''))
-                    ws.cell(row=row_num, column=4, value=item.get('order_count', 0))
-                    ws.cell(row=row_num, column=5, value=float(item.get('total_spent', 0)))
-                    
-            elif report_type == 'products':
-                ws = wb.active
-                ws.title = "Top Products"
-                
-                limit = request.args.get('limit', 50, type=int)
-                top_pipeline = [
-                    {'$match': {
-                        'user_id': user_id_obj,
-                        'created_at': {'$gte': start_date}
-                    }},
-                    {'$unwind': '$items'},
-                    {'$group': {
-                        '_id': '$items.product_id',
-                        'quantity_sold': {'$sum': '$items.quantity'},
-                        'revenue': {'$sum': '$items.total'}
-                    }},
-                    {'$sort': {'quantity_sold': -1}},
-                    {'$limit': limit},
-                    {'$lookup': {
-                        'from': 'products',
-                        'localField': '_id',
-                        'foreignField': '_id',
-                        'as': 'product'
-                    }},
-                    {'$unwind': {'path': '$product', 'preserveNullAndEmptyArrays': True}}
-                ]
-                top = list(database['invoices'].aggregate(top_pipeline))
-                
-                headers = ['Rank', 'Product Name', 'SKU', 'Quantity Sold', 'Revenue']
-                for col_num, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col_num, value=header)
-                    cell.font = Font(bold=True)
-                    cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                    cell.font = Font(bold=True, color="FFFFFF")
-                
-                for row_num, item in enumerate(top, 2):
-                    product = item.get('product', {})
-                    ws.cell(row=row_num, column=1, value=row_num - 1)
-                    ws.cell(row=row_num, column=2, value=product.get('name', 'Unknown'))
-                    ws.cell(row=row_num, column=3, value=product.get('sku', ''))
-                    ws.cell(row=row_num, column=4, value=int(item.get('quantity_sold', 0)))
-                    ws.cell(row=row_num, column=5, value=float(item.get('revenue', 0)))
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
+            limit = request.args.get('limit', 50, type=int)
+            period = request.args.get('period', 'daily')
+            try:
+                output = build_workbook(database, user_id_obj, report_type, days=days, limit=limit, period=period)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
             
             return send_file(
                 output,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                mimetype=XLSX_MIMETYPE,
                 as_attachment=True,
                 download_name=f'report_{report_type}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
             )
         else:
             # PDF export (if reportlab available)
             if REPORTLAB_AVAILABLE:
+                from reportlab.lib.pagesizes import A4
+                from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+                from reportlab.lib.styles import getSampleStyleSheet
+                from reportlab.lib import colors
+                
                 buffer = BytesIO()
                 doc = SimpleDocTemplate(buffer, pagesize=A4)
                 elements = []
@@ -594,21 +302,9 @@ def download_report():
                 elements.append(title)
                 elements.append(Spacer(1, 12))
                 
-                # Get summary data
-                revenue_pipeline = [
-                    {'$match': {
-                        'user_id': user_id_obj,
-                        'created_at': {'$gte': start_date}
-                    }},
-                    {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}}}
-                ]
-                revenue_result = list(database['invoices'].aggregate(revenue_pipeline))
-                total_revenue = revenue_result[0].get('total', 0) if revenue_result else 0.0
-                
-                total_orders = database['invoices'].count_documents({
-                    'user_id': user_id_obj,
-                    'created_at': {'$gte': start_date}
-                })
+                metrics = summary_metrics(database, user_id_obj, start_date)
+                total_revenue = metrics['total_revenue']
+                total_orders = metrics['total_orders']
                 
                 # Summary table
                 data = [['Metric', 'Value']]
@@ -641,6 +337,5 @@ def download_report():
                 return jsonify({'success': False, 'error': 'PDF export not available'}), 500
                 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in download_report")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -7,6 +7,9 @@ from datetime import datetime
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+import logging
+
+logger = logging.getLogger(__name__)
 
 super_admin_bp = Blueprint('super_admin', __name__)
 
@@ -20,8 +23,8 @@ def login():
         if super_admin and super_admin.check_password(data['password']):
             login_user(super_admin, remember=data.get('remember_me', False))
             session.permanent = True
-            print(f"Login successful for super admin: {super_admin.email}")
-            print(f"Session after login: {session}")
+            logger.debug("Login successful for super admin: %s", super_admin.email)
+            logger.debug("Session after login: %s", session)
             
             return jsonify({
                 'success': True,
@@ -50,9 +53,9 @@ def logout():
 def dashboard():
     """Super admin dashboard"""
     try:
-        print(f"Current user: {current_user}")
-        print(f"User authenticated: {current_user.is_authenticated}")
-        print(f"Session: {session}")
+        logger.debug("Current user: %s", current_user)
+        logger.debug("User authenticated: %s", current_user.is_authenticated)
+        logger.debug("Session: %s", session)
         # Get pending admin registrations
         pending_admins = [User.from_dict(doc) for doc in db['users'].find(
             {'is_approved': False, 'is_active': True}
@@ -105,9 +108,7 @@ def dashboard():
         })
         
     except Exception as e:
-        print(f"Dashboard error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Dashboard error: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @super_admin_bp.route('/approve-admin/<int:admin_id>', methods=['POST'])
@@ -172,9 +173,9 @@ def send_approval_email(email, business_name):
     try:
         # For now, just print the email content
         # In production, you would use a proper email service
-        print(f"APPROVAL EMAIL TO: {email}")
-        print(f"Subject: Your Business Registration Has Been Approved")
-        print(f"Content: Dear {business_name}, your business registration has been approved. You can now login to your dashboard.")
+        logger.debug("APPROVAL EMAIL TO: %s", email)
+        logger.debug("Subject: Your Business Registration Has Been Approved")
+        logger.debug("Content: Dear %s, your business registration has been approved. You can now login to your dashboard.", business_name)
         
         # Example email sending code (uncomment and configure for production):
         # import smtplib
@@ -207,16 +208,16 @@ def send_approval_email(email, business_name):
         # server.quit()
         
     except Exception as e:
-        print(f"Error sending approval email: {e}")
+        logger.error("Error sending approval email: %s", e)
 
 def send_rejection_email(email, business_name):
     """Send rejection email to admin"""
     try:
         # For now, just print the email content
         # In production, you would use a proper email service
-        print(f"REJECTION EMAIL TO: {email}")
-        print(f"Subject: Business Registration Update")
-        print(f"Content: Dear {business_name}, your business registration has been reviewed and unfortunately not approved at this time.")
+        logger.debug("REJECTION EMAIL TO: %s", email)
+        logger.debug("Subject: Business Registration Update")
+        logger.debug("Content: Dear %s, your business registration has been reviewed and unfortunately not approved at this time.", business_name)
         
         # Example email sending code (uncomment and configure for production):
         # import smtplib
@@ -250,4 +251,4 @@ def send_rejection_email(email, business_name):
         # server.quit()
         
     except Exception as e:
-        print(f"Error sending rejection email: {e}")
+        logger.error("Error sending rejection email: %s", e)
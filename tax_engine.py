@@ -0,0 +1,188 @@
+"""
+Columnar GST computation for one or many invoices at once.
+
+All line items of a batch are flattened into arrays (quantity, unit price,
+rate, owning invoice) and taxed in a handful of vector operations; invoice
+totals are then reduced per invoice with ``bincount``. NumPy is used when it
+is installed, with an equivalent pure-Python path otherwise.
+
+Rounding follows GST invoicing practice: every line's taxable value and each
+tax head (CGST, SGST or IGST) are rounded half-up to the paisa, and invoice
+totals are the sums of the rounded lines. ``round_total`` additionally rounds
+the grand total to the nearest rupee and reports the ``round_off``.
+
+Callers pass the supplier's state and each invoice's place of supply, so no
+database lookups happen here.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from gst_engine import state_code
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_GST_RATE = 18.0
+
+def _state_key(state):
+    state = str(state).strip()
+    if state.isdigit():
+        return state.zfill(2)
+    return state_code(state) or state.lower()
+
+def is_inter_state(business_state, place_of_supply):
+    """True when the place of supply is in a different state from the supplier
+
+    Accepts state names or two digit state codes. As when the states were
+    compared directly, a supply with only one of the two states known is
+    inter-state (IGST), and one with neither is intra-state.
+    """
+    if not business_state or not place_of_supply:
+        return bool(business_state) != bool(place_of_supply)
+    return _state_key(business_state) != _state_key(place_of_supply)
+
+def round_half_up(value, places=2):
+    """Round a single amount half-up (0.125 -> 0.13), unlike round()'s half-even"""
+    quantum = Decimal(1).scaleb(-places)
+    # Trim float noise first so 3 * 33.335 (100.00499999...) rounds like 100.005
+    return float(Decimal(str(round(value, 8))).quantize(quantum, rounding=ROUND_HALF_UP))
+
+def _round_array(values, places=2):
+    factor = 10 ** places
+    # Round the scaled value first so 0.145 * 100 = 14.499999... still rounds up
+    scaled = np.round(np.abs(values) * factor, 6)
+    return np.sign(values) * np.floor(scaled + 0.5) / factor
+
+def _number(value, default=0.0):
+    try:
+        return float(value) if value is not None and value != '' else default
+    except (TypeError, ValueError):
+        return default
+
+def compute_line(quantity, unit_price, gst_rate, inter_state=False):
+    """Taxes for a single line: returns (taxable_value, cgst, sgst, igst)"""
+    result = compute_batch([{
+        'items': [{'quantity': quantity, 'unit_price': unit_price, 'gst_rate': gst_rate}],
+        'inter_state': inter_state
+    }])[0]
+    line = result['items'][0]
+    return line['total'], line['cgst'], line['sgst'], line['igst']
+
+def compute_batch(invoices, business_state=None, round_total=False):
+    """Compute line and invoice totals for a batch of invoices
+
+    Each invoice is a dict with ``items`` (dicts with quantity, unit_price
+    and gst_rate) and either ``inter_state`` or a ``place_of_supply`` state
+    that is compared against ``business_state``. Returns one result per
+    invoice, in order::
+
+        {'items': [{'total', 'gst_amount', 'cgst', 'sgst', 'igst', 'line_total'}, ...],
+         'subtotal', 'cgst_amount', 'sgst_amount', 'igst_amount',
+         'total_gst', 'round_off', 'total_amount', 'inter_state'}
+
+    ``total`` on an item is its taxable value, matching what invoices store.
+    """
+    inter = []
+    owner = []
+    quantities = []
+    prices = []
+    rates = []
+    for index, invoice in enumerate(invoices):
+        if 'inter_state' in invoice:
+            inter.append(bool(invoice['inter_state']))
+        else:
+            inter.append(is_inter_state(business_state, invoice.get('place_of_supply')))
+        for item in invoice.get('items') or []:
+            owner.append(index)
+            if item.get('unit_price') in (None, '') and item.get('total') not in (None, ''):
+                # Legacy lines that only stored their taxable total
+                quantities.append(1.0)
+                prices.append(_number(item.get('total')))
+            else:
+                quantities.append(_number(item.get('quantity')))
+                prices.append(_number(item.get('unit_price')))
+            rates.append(_number(item.get('gst_rate'), DEFAULT_GST_RATE))
+
+    if NUMPY_AVAILABLE:
+        lines, totals = _compute_numpy(len(invoices), inter, owner, quantities, prices, rates)
+    else:
+        lines, totals = _compute_python(len(invoices), inter, owner, quantities, prices, rates)
+
+    results = [{'items': [], 'inter_state': inter[index]} for index in range(len(invoices))]
+    for index, line in zip(owner, lines):
+        results[index]['items'].append(line)
+    for index, result in enumerate(results):
+        subtotal, cgst, sgst, igst = totals[index]
+        total_gst = round_half_up(cgst + sgst + igst)
+        grand_total = round_half_up(subtotal + total_gst)
+        round_off = 0.0
+        if round_total:
+            round_off = round_half_up(round_half_up(grand_total, 0) - grand_total)
+            grand_total = round_half_up(grand_total + round_off)
+        result.update({
+            'subtotal': subtotal,
+            'cgst_amount': cgst,
+            'sgst_amount': sgst,
+            'igst_amount': igst,
+            'total_gst': total_gst,
+            'round_off': round_off,
+            'total_amount': grand_total
+        })
+    return results
+
+def _compute_numpy(count, inter, owner, quantities, prices, rates):
+    owner = np.asarray(owner, dtype=np.int64)
+    inter_line = np.asarray(inter, dtype=bool)[owner] if len(owner) else np.zeros(0, dtype=bool)
+    taxable = _round_array(np.asarray(quantities, dtype=np.float64) * np.asarray(prices, dtype=np.float64))
+    rate = np.asarray(rates, dtype=np.float64)
+    igst = np.where(inter_line, _round_array(taxable * rate / 100), 0.0)
+    half = np.where(inter_line, 0.0, _round_array(taxable * rate / 200))
+    line_tax = igst + 2 * half
+
+    def per_invoice(values):
+        return _round_array(np.bincount(owner, weights=values, minlength=count)) if count else np.zeros(0)
+
+    subtotal, cgst, igst_total = per_invoice(taxable), per_invoice(half), per_invoice(igst)
+    lines = [
+        {
+            'total': float(taxable[i]),
+            'gst_amount': float(round(line_tax[i], 2)),
+            'cgst': float(half[i]),
+            'sgst': float(half[i]),
+            'igst': float(igst[i]),
+            'line_total': float(round(taxable[i] + line_tax[i], 2))
+        }
+        for i in range(len(owner))
+    ]
+    totals = [
+        (float(subtotal[i]), float(cgst[i]), float(cgst[i]), float(igst_total[i]))
+        for i in range(count)
+    ]
+    return lines, totals
+
+def _compute_python(count, inter, owner, quantities, prices, rates):
+    sums = [[0.0, 0.0, 0.0] for _ in range(count)]
+    lines = []
+    for index, quantity, price, rate in zip(owner, quantities, prices, rates):
+        taxable = round_half_up(quantity * price)
+        if inter[index]:
+            igst, half = round_half_up(taxable * rate / 100), 0.0
+        else:
+            igst, half = 0.0, round_half_up(taxable * rate / 200)
+        line_tax = round_half_up(igst + 2 * half)
+        lines.append({
+            'total': taxable,
+            'gst_amount': line_tax,
+            'cgst': half,
+            'sgst': half,
+            'igst': igst,
+            'line_total': round_half_up(taxable + line_tax)
+        })
+        sums[index][0] += taxable
+        sums[index][1] += half
+        sums[index][2] += igst
+    totals = [
+        (round_half_up(subtotal), round_half_up(half), round_half_up(half), round_half_up(igst))
+        for subtotal, half, igst in sums
+    ]
+    return lines, totals
@@ -0,0 +1,280 @@
+"""
+Resumable recalculation of GST on stored invoices.
+
+Older invoices were saved with ``gst_amount=0`` on every line and only a
+``total_amount``, so GST reports under-report them. ``TaxRecalculation``
+walks the ``invoices`` collection in ``_id`` order, one batch at a time,
+recomputes every line with ``tax_engine.compute_batch`` from the GST rate
+snapshot stored on the line (falling back to the product's current rate
+when the line never recorded one) and writes only the invoices whose
+figures changed with ``bulk_write``. Invoices whose customer has no state
+are left alone, since their place of supply, and so the CGST/SGST versus
+IGST split, can't be told; the run counts them in
+``unknown_place_of_supply``.
+
+Each write is conditional on the invoice's ``version`` and ``updated_at``
+as read, so an invoice edited by live traffic meanwhile is skipped (and
+counted) rather than reverted; only written invoices reach the GST period
+summaries and the report. Written invoices carry the run's id in
+``tax_recalc_run``.
+
+Progress is checkpointed in the ``tax_recalc_runs`` collection after every
+batch, so an interrupted run resumes from the last ``_id`` it finished.
+Each corrected invoice is appended to a JSON Lines diff report; nothing
+beyond the current batch is held in memory.
+"""
+import json
+import time
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from gst_summaries import record_invoice_changes
+from tax_engine import DEFAULT_GST_RATE, compute_batch
+
+RUNS_COLLECTION = 'tax_recalc_runs'
+TOLERANCE = 0.01
+AMOUNT_FIELDS = ('subtotal', 'cgst_amount', 'sgst_amount', 'igst_amount', 'total_amount')
+PROJECTION = {
+    'user_id': 1, 'customer_id': 1, 'invoice_number': 1, 'invoice_date': 1,
+    'status': 1, 'items': 1, 'subtotal': 1, 'cgst_amount': 1, 'sgst_amount': 1,
+    'igst_amount': 1, 'total_amount': 1, 'updated_at': 1, 'version': 1
+}
+
+def _to_object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+def _differs(old, new):
+    return abs(float(old or 0) - float(new or 0)) > TOLERANCE
+
+class TaxRecalculation:
+    """One recalculation run over the invoices collection
+
+    ``pause`` seconds are slept between batches to leave room for live
+    traffic. With ``dry_run`` the diff report is produced but nothing is
+    written to the invoices.
+    """
+
+    def __init__(self, database, user_id=None, batch_size=500, pause=0.0, dry_run=False,
+                 report_path=None, run_id=None):
+        self.database = database
+        self.user_id = _to_object_id(user_id)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.dry_run = dry_run
+        self.report_path = report_path
+        self.run_id = _to_object_id(run_id)
+        self._business_states = {}
+        self.state = None
+        self.unknown_place_of_supply = 0
+
+    def _load_run(self):
+        runs = self.database[RUNS_COLLECTION]
+        if self.run_id is not None:
+            self.state = runs.find_one({'_id': self.run_id})
+            if not self.state:
+                raise ValueError(f'No recalculation run {self.run_id}')
+            if self.state.get('status') == 'completed':
+                raise ValueError(f'Recalculation run {self.run_id} already completed')
+            # Resumed runs keep the scope they were started with
+            self.user_id = self.state.get('user_id')
+            self.dry_run = self.state.get('dry_run', False)
+            self.report_path = self.report_path or self.state.get('report_path')
+            self._checkpoint(status='running')
+            return
+        self.state = {
+            'user_id': self.user_id,
+            'dry_run': self.dry_run,
+            'report_path': self.report_path,
+            'last_id': None,
+            'scanned': 0,
+            'changed': 0,
+            'skipped': 0,
+            'unknown_place_of_supply': 0,
+            'tax_added': 0.0,
+            'status': 'running',
+            'started_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
+        }
+        self.run_id = runs.insert_one(self.state).inserted_id
+        self.state['_id'] = self.run_id
+
+    def _checkpoint(self, **fields):
+        fields['updated_at'] = datetime.utcnow()
+        self.state.update(fields)
+        self.database[RUNS_COLLECTION].update_one({'_id': self.run_id}, {'$set': fields})
+
+    def _next_batch(self):
+        query = {}
+        if self.state.get('last_id') is not None:
+            query['_id'] = {'$gt': self.state['last_id']}
+        if self.user_id is not None:
+            query['user_id'] = self.user_id
+        return list(self.database['invoices'].find(query, PROJECTION).sort('_id', 1).limit(self.batch_size))
+
+    def _business_state(self, user_ids):
+        missing = [uid for uid in user_ids if uid not in self._business_states]
+        if missing:
+            for doc in self.database['users'].find({'_id': {'$in': missing}}, {'business_state': 1}):
+                self._business_states[doc['_id']] = doc.get('business_state')
+            for uid in missing:
+                self._business_states.setdefault(uid, None)
+        return self._business_states
+
+    def _customer_states(self, invoices):
+        customer_ids = list({_to_object_id(doc.get('customer_id')) for doc in invoices if doc.get('customer_id')})
+        if not customer_ids:
+            return {}
+        return {
+            str(doc['_id']): doc.get('state')
+            for doc in self.database['customers'].find({'_id': {'$in': customer_ids}}, {'state': 1})
+        }
+
+    def _product_rates(self, invoices):
+        """Current gst_rate for products on lines that never stored one"""
+        product_ids = list({
+            _to_object_id(item.get('product_id'))
+            for doc in invoices for item in doc.get('items') or []
+            if isinstance(item, dict) and item.get('gst_rate') is None and item.get('product_id')
+        })
+        if not product_ids:
+            return {}
+        return {
+            str(doc['_id']): doc.get('gst_rate')
+            for doc in self.database['products'].find({'_id': {'$in': product_ids}}, {'gst_rate': 1})
+        }
+
+    def recalculate(self, invoices):
+        """Recompute a batch; returns a list of (before, after) for changed invoices"""
+        user_ids = list({_to_object_id(doc.get('user_id')) for doc in invoices if doc.get('user_id')})
+        business_states = self._business_state(user_ids)
+        customer_states = self._customer_states(invoices)
+
+        # Without a place of supply the CGST/SGST or IGST split can't be recomputed
+        known = [doc for doc in invoices if customer_states.get(str(doc.get('customer_id')))]
+        self.unknown_place_of_supply = len(invoices) - len(known)
+        invoices = known
+        product_rates = self._product_rates(invoices)
+
+        requests = []
+        for doc in invoices:
+            items = []
+            for item in doc.get('items') or []:
+                if not isinstance(item, dict):
+                    continue
+                item = dict(item)
+                if item.get('gst_rate') is None:
+                    rate = product_rates.get(str(item.get('product_id')))
+                    item['gst_rate'] = rate if rate is not None else DEFAULT_GST_RATE
+                items.append(item)
+            requests.append({'items': items, 'place_of_supply': customer_states.get(str(doc.get('customer_id')))})
+
+        # compute_batch takes one supplier state, so group by business
+        results = [None] * len(invoices)
+        by_state = {}
+        for index, doc in enumerate(invoices):
+            by_state.setdefault(business_states.get(_to_object_id(doc.get('user_id'))), []).append(index)
+        for business_state, indexes in by_state.items():
+            for index, result in zip(indexes, compute_batch([requests[i] for i in indexes], business_state)):
+                results[index] = result
+
+        changes = []
+        for doc, request_data, result in zip(invoices, requests, results):
+            after = dict(doc)
+            after['items'] = []
+            for item, line in zip(request_data['items'], result['items']):
+                after['items'].append(dict(item, total=line['total'], gst_amount=line['gst_amount']))
+            for field in AMOUNT_FIELDS:
+                after[field] = result[field]
+            line_changed = any(
+                _differs(old.get('gst_amount'), new['gst_amount']) or _differs(old.get('total'), new['total'])
+                for old, new in zip(request_data['items'], after['items'])
+            )
+            if line_changed or any(_differs(doc.get(field), after[field]) for field in AMOUNT_FIELDS):
+                changes.append((doc, after))
+        return changes
+
+    def _write(self, changes):
+        """Write a batch of changes; returns the ones that were written"""
+        invoice_ops = []
+        now = datetime.utcnow()
+        for before, after in changes:
+            fields = {field: after[field] for field in AMOUNT_FIELDS}
+            fields['items'] = after['items']
+            fields['updated_at'] = now
+            fields['tax_recalc_run'] = self.run_id
+            # None also matches invoices written before versioning
+            guard = {'_id': before['_id'], 'version': before.get('version'), 'updated_at': before.get('updated_at')}
+            invoice_ops.append(UpdateOne(guard, {'$set': fields, '$inc': {'version': 1}}))
+        result = self.database['invoices'].bulk_write(invoice_ops, ordered=False)
+        if result.matched_count < len(changes):
+            # Invoices edited since the batch was read keep their edits
+            written_ids = {doc['_id'] for doc in self.database['invoices'].find(
+                {'_id': {'$in': [before['_id'] for before, _ in changes]}, 'tax_recalc_run': self.run_id}, {'_id': 1}
+            )}
+            changes = [(before, after) for before, after in changes if before['_id'] in written_ids]
+
+        item_ops = [
+            UpdateOne(
+                {'_id': item['_id']},
+                {'$set': {'total': item['total'], 'gst_amount': item['gst_amount'], 'gst_rate': item['gst_rate']}}
+            )
+            for _, after in changes for item in after['items'] if item.get('_id') is not None
+        ]
+        if item_ops:
+            self.database['invoice_items'].bulk_write(item_ops, ordered=False)
+        record_invoice_changes(self.database, changes)
+        return changes
+
+    def _report_line(self, before, after):
+        return json.dumps({
+            'invoice_id': str(before['_id']),
+            'invoice_number': before.get('invoice_number'),
+            'user_id': str(before.get('user_id')),
+            'before': {field: before.get(field) for field in AMOUNT_FIELDS},
+            'after': {field: after[field] for field in AMOUNT_FIELDS}
+        }, default=str)
+
+    def run(self, max_batches=None):
+        """Process batches until the collection (or max_batches) is exhausted"""
+        self._load_run()
+        report = open(self.report_path, 'a', encoding='utf-8') if self.report_path else None
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                invoices = self._next_batch()
+                if not invoices:
+                    self._checkpoint(status='completed', finished_at=datetime.utcnow())
+                    break
+                changes = self.recalculate(invoices)
+                computed = len(changes)
+                if changes and not self.dry_run:
+                    changes = self._write(changes)
+                if report:
+                    for before, after in changes:
+                        report.write(self._report_line(before, after) + '\n')
+                    report.flush()
+                tax_added = sum(
+                    (after['total_amount'] - after['subtotal']) - (float(before.get('total_amount') or 0) - float(before.get('subtotal') or 0))
+                    for before, after in changes
+                )
+                self._checkpoint(
+                    last_id=invoices[-1]['_id'],
+                    scanned=self.state['scanned'] + len(invoices),
+                    changed=self.state['changed'] + len(changes),
+                    skipped=self.state.get('skipped', 0) + computed - len(changes),
+                    unknown_place_of_supply=self.state.get('unknown_place_of_supply', 0) + self.unknown_place_of_supply,
+                    tax_added=round(self.state['tax_added'] + tax_added, 2)
+                )
+                batches += 1
+                if self.pause:
+                    time.sleep(self.pause)
+        except Exception as e:
+            self._checkpoint(status='failed', error=str(e))
+            raise
+        finally:
+            if report:
+                report.close()
+        return self.state